@@ -0,0 +1,18 @@
+# Generated by Django 6.0.6 on 2026-10-19 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BW', '0011_applicationanswer_is_done'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationanswer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='Zuletzt geändert'),
+        ),
+    ]
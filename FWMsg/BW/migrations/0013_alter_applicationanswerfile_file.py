@@ -0,0 +1,19 @@
+# Generated by Django 6.0.6 on 2026-10-19 17:20
+
+import Global.blob_store
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BW', '0012_applicationanswer_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='applicationanswerfile',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=Global.blob_store.DeduplicatingFileSystemStorage(), upload_to='bewerbung/', verbose_name='Datei'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from datetime import datetime
 from Global.models import Einsatzland2, Einsatzstelle2, PersonCluster
 from django.utils.translation import gettext_lazy as _
 from Global.models import get_current_request
+from Global.blob_store import document_storage
 
         
 # Create your models here.
@@ -375,6 +376,11 @@ class ApplicationAnswer(OrgModel):
         verbose_name="Erledigt",
         help_text="Vom Bewerber als erledigt markiert.",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        null=True,
+        verbose_name="Zuletzt geändert",
+    )
 
     def __str__(self):
         return self.answer
@@ -481,7 +487,7 @@ class ApplicationAnswerFile(OrgModel):
         ApplicationFileQuestion, on_delete=models.CASCADE, verbose_name="Datei"
     )
     file = models.FileField(
-        verbose_name="Datei", upload_to="bewerbung/", null=True, blank=True
+        verbose_name="Datei", upload_to="bewerbung/", storage=document_storage, null=True, blank=True
     )
     
     def save(self, *args, **kwargs):
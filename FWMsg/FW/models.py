@@ -6,7 +6,7 @@ from Global.models import CustomUser, OrgModel, Einsatzland2, Einsatzstelle2
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
-from simple_history.models import HistoricalRecords
+from Global.history import HistoricalRecords
 
 
 
@@ -3,7 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from django.utils.translation import gettext as _
 from Global.models import (
-    Ampel2, PersonCluster, UserAufgaben, Post2, Bilder2,
+    Ampel2, UserAufgaben,
 )
 from django.contrib.auth import get_user_model
 from FW.models import Freiwilliger
@@ -11,6 +11,8 @@ from TEAM.models import Team
 from django.contrib import messages
 from FWMsg.decorators import required_role
 from Global.templatetags.base_filter import format_text_with_link
+from Global.dashboard_feed import get_dashboard_feed, get_feed_person_cluster, get_feed_sources, get_task_counts
+from Global.link_resolver import get_country_link
 
 
 base_template = 'baseFw.html'
@@ -19,88 +21,33 @@ base_template = 'baseFw.html'
 @required_role('F')
 def home(request):
     """Dashboard view showing tasks, images and posts."""
-    from Global.views import get_bilder, get_posts
-    
     # Get task statistics
     user_aufgaben = None
     if request.user.person_cluster and request.user.person_cluster.aufgaben:
         task_queryset = UserAufgaben.objects.filter(user=request.user)
-    
-        erledigte_aufgaben = task_queryset.filter(erledigt=True).order_by('faellig')
-        offene_aufgaben = task_queryset.filter(erledigt=False, pending=False).order_by('faellig')
-        pending_aufgaben = task_queryset.filter(erledigt=False, pending=True).order_by('faellig')
-
-        len_erledigt = erledigte_aufgaben.count()
-        len_offen = offene_aufgaben.count() 
-        len_pending = pending_aufgaben.count()
-        gesamt = len_erledigt + len_offen + len_pending
+        counts = get_task_counts(task_queryset)
 
         # Calculate percentages safely
         def safe_percentage(part, total):
             return round(part / total * 100) if total > 0 else 0
 
         user_aufgaben = {
-            'erledigt': erledigte_aufgaben,
-            'erledigt_prozent': safe_percentage(len_erledigt, gesamt),
-            'pending': pending_aufgaben,
-            'pending_prozent': safe_percentage(len_pending, gesamt),
-            'offen': offene_aufgaben[:4],
-            'offen_prozent': safe_percentage(len_offen, gesamt),
+            'erledigt': task_queryset.filter(erledigt=True).order_by('faellig'),
+            'erledigt_prozent': safe_percentage(counts['erledigt'], counts['gesamt']),
+            'pending': task_queryset.filter(erledigt=False, pending=True).order_by('faellig'),
+            'pending_prozent': safe_percentage(counts['pending'], counts['gesamt']),
+            'offen': task_queryset.filter(erledigt=False, pending=False).order_by('faellig')[:4],
+            'offen_prozent': safe_percentage(counts['offen'], counts['gesamt']),
+            'counts': counts,
         }
         
-    current_person_cluster = None
-    person_cluster_param = request.GET.get('person_cluster_filter')
-    try:
-        if not person_cluster_param or person_cluster_param == 'None':
-            current_person_cluster = None
-        elif person_cluster_param:
-            current_person_cluster = PersonCluster.selectable_for_org(
-                request.user.org,
-                id=int(person_cluster_param),
-            ).get()
-        else:
-            current_person_cluster = request.user.person_cluster
-    except PersonCluster.DoesNotExist:
-        current_person_cluster = None
-    except Exception as e:
-        messages.error(request, f'Fehler beim Laden der Neuigkeiten: {str(e)}')
-        current_person_cluster = None
+    current_person_cluster = get_feed_person_cluster(request)
 
-    # Build unified feed (posts + images) sorted by date
-    feed = []
-    # Posts
-    if request.user.person_cluster and request.user.person_cluster.posts:
-        posts = get_posts(request.user.org, filter_person_cluster=request.user.person_cluster)
-        for post in posts:
-            feed.append({
-                'type': 'post',
-                'date': post.date_updated or post.date,
-                'post': post,
-            })
-    # Bilder
-    if request.user.person_cluster and request.user.person_cluster.bilder:
-        bilder_qs = (
-            Bilder2.objects
-            .filter(org=request.user.org)
-            .select_related('user')
-            .order_by('-date_created')
-        )
-        
-        if current_person_cluster:
-            bilder_qs = bilder_qs.filter(user__customuser__person_cluster=current_person_cluster)
-            
-        for bild in bilder_qs:
-            feed.append({
-                'type': 'image',
-                'date': bild.date_created,
-                'bild': bild,
-            })
-
-    # Sort and trim feed
-    feed.sort(key=lambda item: item['date'], reverse=True)
-    feed = feed[:12]
+    # Unified feed (posts + images), merged and limited in the database
+    posts, bilder = get_feed_sources(request.user, current_person_cluster)
+    feed, next_cursor = get_dashboard_feed(posts, bilder, viewer=request.user)
 
-    freiwilliger = Freiwilliger.objects.get(user=request.user) if Freiwilliger.objects.filter(user=request.user).exists() else None
+    freiwilliger = Freiwilliger.objects.filter(user=request.user).first()
 
     if freiwilliger and (freiwilliger.start_real or freiwilliger.start_geplant):
         days_until_start = ((freiwilliger.start_real or freiwilliger.start_geplant) - datetime.now().date()).days
@@ -118,6 +65,7 @@ def home(request):
     context = {
         'aufgaben': user_aufgaben,
         'feed': feed,
+        'feed_next_cursor': next_cursor,
         'freiwilliger': freiwilliger,
         'days_until_start': days_until_start,
         'last_ampel': last_ampel,
@@ -126,29 +74,6 @@ def home(request):
 
     return render(request, 'homeFw.html', context=context)
 
-def _get_auswaeriges_amt_link(value):
-    """Convert German special characters to their ASCII equivalents for URLs."""
-    replacements = {
-        'ä': 'ae',
-        'ö': 'oe', 
-        'ü': 'ue',
-        'ß': 'ss',
-        'Ä': 'Ae',
-        'Ö': 'Oe',
-        'Ü': 'Ue'
-    }
-    import requests
-    link = ''.join(replacements.get(c, c) for c in value.lower())
-    url = f"https://www.auswaertiges-amt.de/de/service/laender/{link}-node/"
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            return url
-    except:
-        pass
-    return 'https://www.auswaertiges-amt.de/de/reiseundsicherheit'
-
-
 @login_required
 @required_role('F')
 def laenderinfo(request):
@@ -198,7 +123,7 @@ def laenderinfo(request):
                         'icon': 'link',
                         'type': 'link',
                         'value': 'Auswärtiges Amt',
-                        'url': _get_auswaeriges_amt_link(land.name),
+                        'url': get_country_link(land, 'auswaertiges_amt'),
                         'external': True
                     }
                 ]
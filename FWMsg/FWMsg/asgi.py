@@ -21,6 +21,7 @@ django_asgi_app = get_asgi_application()
 from channels.auth import AuthMiddlewareStack       # noqa: E402
 from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
 import chat.routing                                  # noqa: E402
+from FWMsg.middleware import WebsocketRequestMiddleware  # noqa: E402
 
 application = ProtocolTypeRouter(
     {
@@ -29,8 +30,11 @@ application = ProtocolTypeRouter(
         # WebSocket connections go through Channels.
         # AuthMiddlewareStack reads the session cookie and populates
         # scope["user"] exactly like request.user in views.
+        # WebsocketRequestMiddleware scopes the consumers' queries by org.
         "websocket": AuthMiddlewareStack(
-            URLRouter(chat.routing.websocket_urlpatterns)
+            WebsocketRequestMiddleware(
+                URLRouter(chat.routing.websocket_urlpatterns)
+            )
         ),
     }
 )
@@ -1,19 +1,69 @@
-from threading import local
+"""
+The request being handled, for code without access to it (``OrgManager``
+scopes every query by the organisation of ``get_current_request().user``).
+
+The request is kept in a ``ContextVar`` instead of a thread local: every
+asyncio task has its own context, and asgiref copies the context into the
+threads of ``sync_to_async``/``database_sync_to_async``. Concurrent async
+views and consumers therefore each see their own request, and sync code called
+from them keeps the org scoping.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+_current_request = ContextVar('current_request', default=None)
 
-_thread_locals = local()
 
 class RequestMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Store request in thread local storage
-        _thread_locals.request = request
-        response = self.get_response(request)
-        # Clean up
-        del _thread_locals.request
-        return response
+        if self.async_mode:
+            return self.__acall__(request)
+        with request_context(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with request_context(request):
+            return await self.get_response(request)
+
+
+class WebsocketRequestMiddleware:
+    """
+    ASGI middleware for Channels: makes the connection's user available as
+    ``get_current_request().user`` for the lifetime of the consumer. Must be
+    wrapped by ``AuthMiddlewareStack`` so ``scope["user"]`` is set.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        with request_context(SimpleNamespace(scope=scope, user=scope.get('user'))):
+            return await self.inner(scope, receive, send)
+
+
+@contextmanager
+def request_context(request):
+    """Make ``request`` the current request inside the ``with`` block."""
+    token = _current_request.set(request)
+    try:
+        yield request
+    finally:
+        _current_request.reset(token)
+
 
 def get_current_request():
-    """Returns the current request from thread local storage"""
-    return getattr(_thread_locals, 'request', None) 
\ No newline at end of file
+    """Returns the request of the current context"""
+    return _current_request.get()
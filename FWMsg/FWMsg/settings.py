@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import json
+from datetime import timedelta
 from pathlib import Path
 
+from kombu import Queue
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -128,6 +131,21 @@ CHANNEL_LAYERS = {
     }
 }
 
+# =============================================================================
+# CACHE
+# =============================================================================
+
+# Shared by the web server and the Celery workers: cached results are
+# invalidated by bumping version keys, which has to reach every process.
+# Override via secrets.json key "cache_url" in production.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": secrets.get("cache_url", "redis://127.0.0.1:6379/1"),
+        "KEY_PREFIX": secrets.get("cache_key_prefix", DOMAIN),
+    }
+}
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -286,6 +304,10 @@ STORAGES = {
 MEDIA_ROOT_NAME = "media"
 MEDIA_ROOT = BASE_DIR / MEDIA_ROOT_NAME
 
+# Offline emoji PNGs (Twemoji 72x72, named by codepoint) used in generated PDFs.
+# Populate with `python manage.py bundle_pdf_emojis` when building the image.
+PDF_EMOJI_DIR = BASE_DIR / "Global/pdf-assets/emoji"
+
 # =============================================================================
 # AUTHENTICATION CONFIGURATION
 # =============================================================================
@@ -307,11 +329,80 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_RESULT_EXTENDED = True
+# Only tasks whose result is read (progress polling, reports) store one;
+# they opt in with ``ignore_result=False``. Results are deleted after a week
+# by Global.tasks.cleanup_task_results_task.
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_RESULT_EXPIRES = timedelta(days=7)
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 15 * 60  # 15 minutes
 CELERY_TIMEZONE = "Europe/Berlin"
 
+# Queues, each served by its own worker profile (see install.sh):
+#   mail           mails a user is waiting for (registration, decisions, ...)
+#   notifications  fan-out to many users (digests, new posts, daily reminders)
+#   media          image processing
+#   exports        PDFs, imports and exports
+#   default        everything else (maintenance)
+# A worker started without -Q consumes all of them, mail first.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_QUEUES = tuple(
+    Queue(name, routing_key=name) for name in ("mail", "notifications", "media", "exports", "default")
+)
+# Within a queue, lower numbers are delivered first
+CELERY_TASK_DEFAULT_PRIORITY = 5
+
+_MAIL_TASKS = [
+    "BW.tasks.send_account_created_email",
+    "BW.tasks.send_application_complete_email",
+    "BW.tasks.send_zuteilung_email",
+    "BW.tasks.send_reaktion_auf_zuteilung_email",
+    "FW.tasks.send_register_email_task",
+    "ORG.tasks.send_register_email_task",
+    "ORG.tasks.send_aufgabe_erledigt_email_task",
+    "ORG.tasks.send_feedback_email_task",
+    "ORG.tasks.send_ampel_email_task",
+    "Home.tasks.send_own_signin_org_notification_task",
+    "Home.tasks.send_own_signin_accepted_email_task",
+    "Home.tasks.send_own_signin_denied_email_task",
+    "Global.tasks.send_change_request_new_email_task",
+    "Global.tasks.send_change_request_decision_email_task",
+]
+_NOTIFICATION_TASKS = {
+    "chat.tasks.send_chat_digests_task": 0,
+    "chat.tasks.notify_users_about_new_direct_chat_message": 0,
+    "chat.tasks.notify_users_about_new_group_chat_message": 0,
+    "chat.tasks.notify_users_about_new_group_chat": 3,
+    "ORG.tasks.send_mail_calendar_reminder_task": 3,
+    "Global.tasks.send_post_response_email_task": 3,
+    "Global.tasks.send_image_uploaded_email_task": 3,
+    "Global.tasks.send_new_post_email_task": 6,
+    "Global.tasks.send_birthday_reminder_email_task": 6,
+    "send_email_aufgaben_daily": 9,
+    "send_birthday_reminder": 9,
+    "send_ampel_reminders_daily": 9,
+    "Global.tasks.dispatch_daily_jobs_task": 9,
+    "Global.tasks.run_daily_job_task": 9,
+    "Global.tasks.send_aufgaben_report_task": 9,
+}
+_MEDIA_TASKS = [
+    "chat.tasks.process_chat_image_task",
+    "Global.tasks.index_document_task",
+]
+_EXPORT_TASKS = [
+    "Global.tasks.render_pdf_task",
+    "ORG.tasks.import_objects_from_excel_task",
+    "ORG.tasks.export_applications_task",
+    "ORG.tasks.export_application_pdfs_task",
+]
+CELERY_TASK_ROUTES = {
+    **{name: {"queue": "mail", "priority": 0} for name in _MAIL_TASKS},
+    **{name: {"queue": "notifications", "priority": priority} for name, priority in _NOTIFICATION_TASKS.items()},
+    **{name: {"queue": "media"} for name in _MEDIA_TASKS},
+    **{name: {"queue": "exports"} for name in _EXPORT_TASKS},
+}
+
 # Enhanced Celery settings for better Redis connection handling
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_BROKER_CONNECTION_RETRY = True
@@ -360,6 +451,10 @@ CELERY_BROKER_CONNECTION_TIMEOUT = 30
 # Redis connection pool settings
 CELERY_BROKER_TRANSPORT_OPTIONS.update({
     'socket_keepalive': True,
+    # Message priorities 0-9, queues drained in CELERY_TASK_QUEUES order
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
 })
 
 # =============================================================================
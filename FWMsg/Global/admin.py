@@ -7,13 +7,14 @@ from django.urls import path, reverse
 from django.contrib import messages
 from django.utils.html import format_html
 from .models import (
-    Ampel2, AmpelConfiguration, Attribute, CustomUser, Einsatzland2, 
+    Ampel2, AmpelConfiguration, Attribute, CustomUser, Einsatzland2, EinsatzlandLink, 
     Einsatzstelle2, Feedback, KalenderEvent, PersonCluster, 
     Organisation, Aufgabe2, DokumentColor2, Dokument2, 
     Ordner2, Notfallkontakt2, Post2, PostResponse, AufgabeZwischenschritte2, PushSubscription, 
     UserAttribute, UserAufgabenZwischenschritte, UserAufgaben, 
     AufgabenCluster, Bilder2, BilderGallery2, BilderComment, BilderReaction, ProfilUser2, Maintenance,
-    PostSurveyAnswer, PostSurveyQuestion, EinsatzstelleNotiz, StickyNote, ChangeRequest, MapLocation
+    PostSurveyAnswer, PostSurveyQuestion, EinsatzstelleNotiz, StickyNote, ChangeRequest, MapLocation,
+    DailyJobRun
 )
 from TEAM.models import Team
 from FW.models import Freiwilliger
@@ -129,8 +130,8 @@ class CustomUserAdmin(SimpleHistoryAdmin):
 
     def send_daily_emails(self, request):
         try:
-            response = send_email_aufgaben_daily()
-            self.message_user(request, f'Daily task emails have been sent successfully. {response}', messages.SUCCESS)
+            response = send_email_aufgaben_daily(window=0)
+            self.message_user(request, f'Daily task emails have been scheduled successfully. {response}', messages.SUCCESS)
         except Exception as e:
             self.message_user(request, f'Error sending emails: {str(e)}', messages.ERROR)
         return HttpResponseRedirect("../")
@@ -276,6 +277,13 @@ class EinsatzlandAdmin(admin.ModelAdmin):
     search_fields = ['name', 'code']
 
 
+@admin.register(EinsatzlandLink)
+class EinsatzlandLinkAdmin(admin.ModelAdmin):
+    list_display = ['land', 'kind', 'resolved', 'url', 'checked_at']
+    list_filter = ['kind', 'resolved']
+    search_fields = ['land__name', 'url']
+
+
 @admin.register(Einsatzstelle2)
 class EinsatzstelleAdmin(admin.ModelAdmin):
     list_display = ['name', 'land']
@@ -888,4 +896,21 @@ class MapLocationAdmin(admin.ModelAdmin):
     list_display = ['city', 'country', 'zip_code', 'user', 'visibility', 'date_created', 'latitude', 'longitude']
     search_fields = ['city', 'country', 'zip_code', 'user__username', 'user__first_name', 'user__last_name']
     list_filter = ['visibility', 'country', 'date_created']
-    readonly_fields = ['date_created']
\ No newline at end of file
+    readonly_fields = ['date_created']
+
+
+@admin.register(DailyJobRun)
+class DailyJobRunAdmin(admin.ModelAdmin):
+    list_display = ['date', 'job', 'org', 'status', 'scheduled_for', 'started_at', 'finished_at', 'attempts']
+    list_filter = ['status', 'job', 'date', 'org']
+    readonly_fields = ['scheduled_for', 'started_at', 'finished_at', 'attempts', 'result', 'error']
+    actions = ['rerun_failed_runs']
+
+    def rerun_failed_runs(self, request, queryset):
+        from Global.tasks import run_daily_job_task
+
+        runs = list(queryset.filter(status='F'))
+        for run in runs:
+            run_daily_job_task.delay(run.job, run.org_id, run.date.isoformat())
+        messages.success(request, f'{len(runs)} fehlgeschlagene Läufe werden erneut ausgeführt.')
+    rerun_failed_runs.short_description = 'Fehlgeschlagene Läufe erneut ausführen'
@@ -0,0 +1,127 @@
+"""
+Content-addressed storage of uploaded documents.
+
+Every file saved through ``DeduplicatingFileSystemStorage`` is hard-linked to
+a blob named after the SHA-256 of its content (``<blob root>/ab/cd/abcd…``).
+When the same content is uploaded again, the new file becomes another link to
+the existing blob, so the data is stored once however many folders, years and
+applications reference it. Files keep their usual names and paths, so code
+reading ``field.path`` and deleting files with ``os.remove`` keeps working;
+removing a file only drops one link. Blobs no longer linked from anywhere are
+deleted by ``collect_garbage``.
+
+Hard links require the blob root to be on the same file system as the media
+files. If linking fails the file is simply stored as a full copy.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_blob_root():
+    return str(getattr(settings, 'BLOB_STORE_ROOT', os.path.join(settings.MEDIA_ROOT, 'blobs')))
+
+
+def blob_path(digest):
+    return os.path.join(get_blob_root(), digest[:2], digest[2:4], digest)
+
+
+def file_digest(path):
+    """SHA-256 hex digest of the file at ``path``."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def content_digest(content):
+    """SHA-256 hex digest of a Django ``File``; the file position is reset afterwards."""
+    sha256 = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        sha256.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha256.hexdigest()
+
+
+def store(path):
+    """
+    Deduplicate the file at ``path`` against the blob store and return its
+    digest and the number of bytes saved (the file's size if identical content
+    was already stored, otherwise 0).
+    """
+    digest = file_digest(path)
+    blob = blob_path(digest)
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    try:
+        os.link(path, blob)
+        return digest, 0
+    except FileExistsError:
+        pass
+    except OSError as e:
+        logger.warning("Could not link %s into the blob store: %s", path, e)
+        return digest, 0
+
+    if os.path.samefile(path, blob):
+        return digest, 0
+    # Replace the file by a link to the existing blob without a moment in
+    # which the path does not exist
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        os.link(blob, tmp_path)
+        size = os.path.getsize(path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not deduplicate %s: %s", path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return digest, 0
+    return digest, size
+
+
+def iter_blobs():
+    for dirpath, _, filenames in os.walk(get_blob_root()):
+        for filename in filenames:
+            yield os.path.join(dirpath, filename)
+
+
+def collect_garbage(dry_run=False):
+    """Delete blobs that no file links to anymore; returns ``(count, bytes)``."""
+    count = size = 0
+    for blob in iter_blobs():
+        stat = os.stat(blob)
+        if stat.st_nlink == 1:
+            count += 1
+            size += stat.st_size
+            if not dry_run:
+                os.remove(blob)
+    return count, size
+
+
+@deconstructible
+class DeduplicatingFileSystemStorage(FileSystemStorage):
+    """``FileSystemStorage`` that stores each distinct content once (see module docstring)."""
+
+    def _save(self, name, content):
+        name = super()._save(name, content)
+        try:
+            store(self.path(name))
+        except OSError as e:
+            logger.warning("Could not add %s to the blob store: %s", name, e)
+        return name
+
+
+document_storage = DeduplicatingFileSystemStorage()
@@ -0,0 +1,602 @@
+"""
+Daily jobs, split per organisation and staggered.
+
+At 10:00 the beat entry ``dispatch_daily_jobs`` splits every job of
+``DAILY_JOBS`` into one run per organisation. The runs are spread evenly over
+``DAILY_JOBS_WINDOW`` seconds, the jobs interleaved, plus up to
+``DAILY_JOBS_JITTER`` seconds of random jitter, so the scans and their mail
+and push fan-out do not hit the database and the SMTP relay all at once.
+
+``DailyJobRun`` is the run ledger with one row per job, organisation and
+date. The dispatcher only schedules the runs it created, and a run only
+starts after claiming its row, so a second dispatch, a redelivered task or an
+overlapping worker never sends twice. Failed runs, and runs stuck for
+``DAILY_JOBS_STALE_AFTER`` seconds, may be claimed again.
+
+Before every message a run takes a slot of ``DAILY_JOBS_ORG_RATE`` messages
+per minute for the organisation and of ``DAILY_JOBS_SMTP_RATE`` per minute for
+the SMTP relay, shared by all runs through the cache. When no slot is left the
+run does not wait: it records its progress, goes back to "scheduled" and is
+queued again for the next minute, so the notification workers stay free.
+Every recipient is recorded in the run's ``result`` after the message to
+them, and a run that is rescheduled, retried or reclaimed skips them. The
+ledger row is written every ``DAILY_JOBS_PROGRESS_EVERY`` recipients and
+whenever the run stops, so only a worker killed in between repeats messages.
+"""
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import mail_admins
+from django.db.models import F, Q
+from django.utils import timezone
+
+DAILY_JOBS_WINDOW = getattr(settings, 'DAILY_JOBS_WINDOW', 60 * 60)
+DAILY_JOBS_JITTER = getattr(settings, 'DAILY_JOBS_JITTER', 60)
+DAILY_JOBS_STALE_AFTER = getattr(settings, 'DAILY_JOBS_STALE_AFTER', 2 * 60 * 60)
+DAILY_JOBS_ORG_RATE = getattr(settings, 'DAILY_JOBS_ORG_RATE', 60)
+DAILY_JOBS_SMTP_RATE = getattr(settings, 'DAILY_JOBS_SMTP_RATE', 120)
+DAILY_JOBS_PROGRESS_EVERY = getattr(settings, 'DAILY_JOBS_PROGRESS_EVERY', 25)
+# The summary of the task reminders is mailed to the admins after the window
+REPORT_DELAY = 10 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """No message slot left in this minute; try again in ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Rate limit reached, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+def _take_slot(scope, per_minute):
+    """Count a message of ``scope`` in this minute; raises RateLimited when the minute is full."""
+    if not per_minute:
+        return
+    now = time.time()
+    key = f'daily-jobs-rate:{scope}:{int(now // 60)}'
+    cache.add(key, 0, 120)
+    if cache.incr(key) > per_minute:
+        raise RateLimited(60 - now % 60)
+
+
+class RunProgress:
+    """
+    Handed to the jobs: ``throttle()`` before every message, ``pending(key)``
+    and ``done(key)`` around it, with ``key`` naming the recipient.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.org = run.org
+        self.result = run.result or {}
+        self._done = set(self.result.setdefault('done', []))
+        self._unsaved = 0
+
+    def throttle(self):
+        _take_slot(f'org:{self.org.id}', DAILY_JOBS_ORG_RATE)
+        _take_slot(f'smtp:{getattr(settings, "EMAIL_HOST", "")}', DAILY_JOBS_SMTP_RATE)
+
+    def pending(self, key):
+        return key not in self._done
+
+    def done(self, key):
+        self._done.add(key)
+        self.result['done'].append(key)
+        self._unsaved += 1
+        if self._unsaved >= DAILY_JOBS_PROGRESS_EVERY:
+            self.save()
+
+    def save(self):
+        """Write ``result`` to the ledger row; ``run_daily_job`` does so when the run stops."""
+        type(self.run)._base_manager.filter(pk=self.run.pk).update(result=self.result)
+        self._unsaved = 0
+
+
+# ---------------------------------------------------------------------------
+# Jobs: job(org, today, progress) -> JSON-serialisable result, built in progress.result
+# ---------------------------------------------------------------------------
+
+def get_faellige_aufgaben(org, before_date=False):
+    from Global.models import UserAufgaben
+
+    current_time = datetime.now()
+
+    # Get all overdue tasks that haven't been completed or marked as pending
+    overdue_tasks = UserAufgaben.objects.filter(
+        org=org,
+        erledigt=False,
+        pending=False,
+        last_reminder__isnull=False,
+        faellig__lt=current_time
+    ).select_related('aufgabe')
+
+    # For each task, check if enough days have passed since the last reminder
+    tasks_to_remind = []
+    for task in overdue_tasks:
+        reminder_threshold = current_time.date() - timedelta(days=(task.aufgabe.repeat_push_days + 1))
+        if task.last_reminder is None or task.last_reminder < reminder_threshold:
+            tasks_to_remind.append(task)
+
+    if before_date:
+        overdue_tasks_2 = UserAufgaben.objects.filter(
+            org=org,
+            erledigt=False,
+            pending=False,
+            last_reminder__isnull=False,
+            faellig__gte=current_time
+        ).select_related('aufgabe')
+
+        for task in overdue_tasks_2:
+            if task.aufgabe.repeat_push_days:
+                if (task.faellig - current_time.date()).days < task.aufgabe.repeat_push_days and (current_time.date() - task.last_reminder).days > task.aufgabe.repeat_push_days:
+                    tasks_to_remind.append(task)
+
+    return UserAufgaben.objects.filter(id__in=[task.id for task in tasks_to_remind])
+
+
+def get_new_aufgaben(org):
+    from Global.models import UserAufgaben
+
+    return UserAufgaben.objects.filter(
+        org=org,
+        erledigt=False,
+        pending=False,
+        last_reminder__isnull=True
+    )
+
+
+def send_aufgaben_reminders(org, today, progress):
+    """Emails about new tasks (one per user) and reminders about due tasks."""
+    from Global.send_email import send_aufgaben_email, send_new_aufgaben_email
+
+    result = progress.result
+    for key in ('aufgaben_sent', 'aufgaben_failed', 'new_aufgaben_sent', 'new_aufgaben_failed'):
+        result.setdefault(key, [])
+
+    new_aufgaben = get_new_aufgaben(org).select_related('aufgabe', 'user__customuser')
+    user_ids = new_aufgaben.order_by().values_list('user', flat=True).distinct()
+    for user_id in user_ids:
+        if not progress.pending(f'new:{user_id}'):
+            continue
+        aufgaben = list(new_aufgaben.filter(user_id=user_id))
+        progress.throttle()
+        entry = {'aufgaben': [aufgabe.aufgabe.name for aufgabe in aufgaben], 'user': aufgaben[0].user.first_name}
+        if send_new_aufgaben_email(aufgaben, org):
+            result['new_aufgaben_sent'].append(entry)
+        else:
+            result['new_aufgaben_failed'].append(entry)
+        progress.done(f'new:{user_id}')
+
+    faellige_aufgaben = get_faellige_aufgaben(org, before_date=True).select_related('aufgabe', 'user__customuser')
+    for aufgabe in faellige_aufgaben:
+        if not progress.pending(f'due:{aufgabe.id}'):
+            continue
+        progress.throttle()
+        entry = {'id': aufgabe.id, 'name': aufgabe.aufgabe.name, 'user': aufgabe.user.first_name}
+        if send_aufgaben_email(aufgabe, org):
+            result['aufgaben_sent'].append(entry)
+        else:
+            result['aufgaben_failed'].append(entry)
+        progress.done(f'due:{aufgabe.id}')
+    result['count'] = len(result['aufgaben_sent']) + len(result['aufgaben_failed'])
+    return result
+
+
+def send_birthday_reminders(org, today, progress):
+    """Tell the organisation about the birthdays of today and tomorrow."""
+    from Global.models import CustomUser
+    from Global.tasks import send_birthday_reminder_email_task
+
+    result = progress.result
+    result.setdefault('sent', 0)
+    tomorrow = today + timedelta(days=1)
+    for day, is_tomorrow in ((tomorrow, True), (today, False)):
+        users = CustomUser.objects.filter(org=org, geburtsdatum__day=day.day, geburtsdatum__month=day.month)
+        for user_id in users.values_list('id', flat=True):
+            key = f'{"tomorrow" if is_tomorrow else "today"}:{user_id}'
+            if not progress.pending(key):
+                continue
+            progress.throttle()
+            send_birthday_reminder_email_task(user_id, is_tomorrow=is_tomorrow)
+            result['sent'] += 1
+            progress.done(key)
+    return result
+
+
+def send_ampel_reminders(org, today, progress):
+    """Ampel submission reminders based on the AmpelConfiguration per PersonCluster."""
+    from Global.models import AmpelConfiguration
+    from Global.send_email import send_ampel_reminder, user_needs_ampel_reminder
+
+    result = progress.result
+    result.setdefault('sent', 0)
+    result.setdefault('failed', 0)
+    configs = AmpelConfiguration.objects.filter(
+        org=org,
+        enabled=True,
+        reminder_interval_days__gt=0,
+        person_cluster__active=True,
+        person_cluster__ampel=True,
+    ).select_related('person_cluster', 'org')
+
+    for config in configs:
+        for user in config.person_cluster.get_users().select_related('customuser'):
+            key = f'{config.id}:{user.id}'
+            if not progress.pending(key):
+                continue
+            try:
+                if not user_needs_ampel_reminder(user, config, today=today):
+                    continue
+                progress.throttle()
+                send_ampel_reminder(user, config)
+                result['sent'] += 1
+            except RateLimited:
+                raise
+            except Exception:
+                logger.exception("Error sending ampel reminder to user %s", user.id)
+                result['failed'] += 1
+            progress.done(key)
+    return result
+
+
+DAILY_JOBS = {
+    'aufgaben': send_aufgaben_reminders,
+    'birthdays': send_birthday_reminders,
+    'ampel': send_ampel_reminders,
+}
+
+
+# ---------------------------------------------------------------------------
+# Dispatching and running
+# ---------------------------------------------------------------------------
+
+def dispatch_daily_jobs(jobs=None, today=None, window=None):
+    """
+    Create the ledger rows of ``jobs`` (all by default) for every organisation
+    and schedule a run for each row created; returns the number of runs scheduled.
+    """
+    from Global.models import DailyJobRun
+    from Global.tasks import run_daily_job_task, send_aufgaben_report_task
+    from ORG.models import Organisation
+
+    jobs = list(jobs or DAILY_JOBS)
+    unknown = set(jobs) - set(DAILY_JOBS)
+    if unknown:
+        raise ValueError(f'Unknown daily jobs: {", ".join(sorted(unknown))}')
+    today = today or timezone.localdate()
+    window = DAILY_JOBS_WINDOW if window is None else window
+
+    org_ids = list(Organisation.objects.order_by('id').values_list('id', flat=True))
+    existing = set(
+        DailyJobRun.objects.filter(date=today, job__in=jobs).values_list('job', 'org_id')
+    )
+    slot_width = window / max(len(org_ids) * len(jobs), 1)
+    now = timezone.now()
+    planned = []
+    for i, org_id in enumerate(org_ids):
+        for j, job in enumerate(jobs):
+            if (job, org_id) in existing:
+                continue
+            offset = (i * len(jobs) + j) * slot_width + random.uniform(0, min(DAILY_JOBS_JITTER, slot_width))
+            planned.append(DailyJobRun(
+                job=job, org_id=org_id, date=today, scheduled_for=now + timedelta(seconds=offset),
+            ))
+    DailyJobRun.objects.bulk_create(planned, ignore_conflicts=True)
+
+    for run in planned:
+        countdown = (run.scheduled_for - now).total_seconds()
+        run_daily_job_task.apply_async((run.job, run.org_id, today.isoformat()), countdown=countdown)
+    if planned and 'aufgaben' in jobs:
+        send_aufgaben_report_task.apply_async((today.isoformat(),), countdown=window + REPORT_DELAY)
+    return len(planned)
+
+
+def run_daily_job(job, org_id, date):
+    """
+    Run ``job`` for one organisation after claiming its ledger row; returns the
+    job's result, ``{'deferred': seconds}`` when the run hit the rate limit and
+    was queued again, or None when the run is done or running elsewhere.
+    """
+    from Global.models import DailyJobRun
+    from Global.tasks import run_daily_job_task
+
+    now = timezone.now()
+    claimable = Q(status__in=['S', 'F']) | Q(status='R', started_at__lt=now - timedelta(seconds=DAILY_JOBS_STALE_AFTER))
+    runs = DailyJobRun.objects.filter(job=job, org_id=org_id, date=date)
+    if not runs.filter(claimable).update(status='R', started_at=now, attempts=F('attempts') + 1, error=''):
+        return None
+
+    run = runs.select_related('org').get()
+    progress = RunProgress(run)
+    try:
+        result = DAILY_JOBS[job](run.org, date, progress)
+    except RateLimited as e:
+        countdown = e.retry_after + random.uniform(0, DAILY_JOBS_JITTER)
+        # Waiting for the rate limit is no attempt of its own
+        runs.update(
+            status='S', scheduled_for=timezone.now() + timedelta(seconds=countdown),
+            attempts=F('attempts') - 1, result=progress.result,
+        )
+        run_daily_job_task.apply_async((job, org_id, date.isoformat()), countdown=countdown)
+        return {'deferred': countdown}
+    except Exception as e:
+        runs.update(status='F', finished_at=timezone.now(), error=str(e), result=progress.result)
+        raise
+    runs.update(status='D', finished_at=timezone.now(), result=result)
+    return result
+
+
+def send_aufgaben_report(date):
+    """Mail the admins the summary of the task reminders of all organisations on ``date``."""
+    from Global.models import DailyJobRun
+
+    runs = list(DailyJobRun.objects.filter(job='aufgaben', date=date))
+    if not runs:
+        return None
+    report = {key: [] for key in ('aufgaben_sent', 'aufgaben_failed', 'new_aufgaben_sent', 'new_aufgaben_failed')}
+    for run in runs:
+        for key in report:
+            report[key] += (run.result or {}).get(key, [])
+    started = [run.started_at for run in runs if run.started_at]
+    finished = [run.finished_at for run in runs if run.finished_at]
+    duration = (max(finished) - min(started)).total_seconds() if started and finished else 0
+    not_done = sum(1 for run in runs if run.status != 'D')
+
+    plain_message, html_message = format_aufgaben_report(
+        report,
+        execution_time=datetime.now().strftime('%d.%m.%Y %H:%M:%S'),
+        duration_str=f"{duration:.2f} Sekunden",
+        not_done=not_done,
+    )
+    mail_admins(
+        subject='Aufgabenerinnerungen erfolgreich gesendet',
+        message=plain_message,
+        html_message=html_message
+    )
+    return {'organisations': len(runs), 'not_done': not_done}
+
+
+def format_aufgaben_report(response_json, execution_time, duration_str, not_done=0):
+    """Plain text and HTML of the admin report about the task reminders."""
+    # Calculate totals
+    total_reminders = len(response_json['aufgaben_sent']) + len(response_json['aufgaben_failed'])
+    total_new_tasks = len(response_json['new_aufgaben_sent']) + len(response_json['new_aufgaben_failed'])
+
+    # Format failed tasks for display
+    failed_tasks_list = ""
+    if response_json['aufgaben_failed']:
+        failed_tasks_list = "<ul style='margin: 8px 0; padding-left: 20px;'>"
+        for failed in response_json['aufgaben_failed']:
+            failed_tasks_list += f"<li style='margin: 4px 0;'>{failed.get('name', 'Unbekannt')} (User: {failed.get('user', 'Unbekannt')}, ID: {failed.get('id', 'N/A')})</li>"
+        failed_tasks_list += "</ul>"
+    else:
+        failed_tasks_list = "<p style='margin: 8px 0; color: #6c757d;'>Keine Fehler</p>"
+
+    # Format new tasks sent
+    new_tasks_sent_list = ""
+    if response_json['new_aufgaben_sent']:
+        new_tasks_sent_list = "<ul style='margin: 8px 0; padding-left: 20px;'>"
+        for sent in response_json['new_aufgaben_sent']:
+            aufgaben_names = ', '.join(sent.get('aufgaben', []))
+            new_tasks_sent_list += f"<li style='margin: 4px 0;'>{sent.get('user', 'Unbekannt')}: {aufgaben_names}</li>"
+        new_tasks_sent_list += "</ul>"
+    else:
+        new_tasks_sent_list = "<p style='margin: 8px 0; color: #6c757d;'>Keine neuen Aufgaben</p>"
+
+    # Format new tasks failed
+    new_tasks_failed_list = ""
+    if response_json['new_aufgaben_failed']:
+        new_tasks_failed_list = "<ul style='margin: 8px 0; padding-left: 20px;'>"
+        for failed in response_json['new_aufgaben_failed']:
+            aufgaben_names = ', '.join(failed.get('aufgaben', []))
+            new_tasks_failed_list += f"<li style='margin: 4px 0;'>{failed.get('user', 'Unbekannt')}: {aufgaben_names}</li>"
+        new_tasks_failed_list += "</ul>"
+    else:
+        new_tasks_failed_list = "<p style='margin: 8px 0; color: #6c757d;'>Keine Fehler</p>"
+
+    # Create beautiful HTML email
+    html_message = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            body {{
+                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+                line-height: 1.6;
+                color: #333;
+                max-width: 600px;
+                margin: 0 auto;
+                padding: 20px;
+            }}
+            .header {{
+                border-bottom: 2px solid #0d6efd;
+                padding-bottom: 12px;
+                margin-bottom: 24px;
+            }}
+            .header h1 {{
+                margin: 0;
+                font-size: 20px;
+                font-weight: 600;
+                color: #0d6efd;
+            }}
+            .section {{
+                margin-bottom: 24px;
+            }}
+            .section-title {{
+                font-size: 14px;
+                font-weight: 600;
+                color: #495057;
+                margin-bottom: 8px;
+                text-transform: uppercase;
+                letter-spacing: 0.5px;
+            }}
+            .stat-box {{
+                background: #f8f9fa;
+                border-left: 3px solid #0d6efd;
+                padding: 12px 16px;
+                margin: 8px 0;
+                border-radius: 4px;
+            }}
+            .stat-success {{
+                border-left-color: #198754;
+            }}
+            .stat-error {{
+                border-left-color: #dc3545;
+            }}
+            .stat-label {{
+                font-size: 12px;
+                color: #6c757d;
+                margin-bottom: 4px;
+            }}
+            .stat-value {{
+                font-size: 18px;
+                font-weight: 600;
+                color: #212529;
+            }}
+            .info-row {{
+                display: flex;
+                justify-content: space-between;
+                padding: 8px 0;
+                border-bottom: 1px solid #e9ecef;
+            }}
+            .info-row:last-child {{
+                border-bottom: none;
+            }}
+            .info-label {{
+                color: #6c757d;
+                font-size: 13px;
+            }}
+            .info-value {{
+                color: #212529;
+                font-weight: 500;
+                font-size: 13px;
+            }}
+            ul {{
+                margin: 8px 0;
+                padding-left: 20px;
+            }}
+            li {{
+                margin: 4px 0;
+                font-size: 13px;
+            }}
+            .footer {{
+                margin-top: 32px;
+                padding-top: 16px;
+                border-top: 1px solid #e9ecef;
+                font-size: 12px;
+                color: #6c757d;
+                text-align: center;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>✓ Aufgabenerinnerungen gesendet</h1>
+        </div>
+
+        <div class="section">
+            <div class="section-title">Ausführung</div>
+            <div class="info-row">
+                <span class="info-label">Uhrzeit:</span>
+                <span class="info-value">{execution_time}</span>
+            </div>
+            <div class="info-row">
+                <span class="info-label">Dauer:</span>
+                <span class="info-value">{duration_str}</span>
+            </div>
+            <div class="info-row">
+                <span class="info-label">Organisationen nicht abgeschlossen:</span>
+                <span class="info-value">{not_done}</span>
+            </div>
+        </div>
+
+        <div class="section">
+            <div class="section-title">Erinnerungen</div>
+            <div class="stat-box stat-success">
+                <div class="stat-label">Erfolgreich gesendet</div>
+                <div class="stat-value">{len(response_json['aufgaben_sent'])}</div>
+            </div>
+            <div class="stat-box stat-error">
+                <div class="stat-label">Fehlgeschlagen</div>
+                <div class="stat-value">{len(response_json['aufgaben_failed'])}</div>
+            </div>
+            <div class="stat-box">
+                <div class="stat-label">Gesamt</div>
+                <div class="stat-value">{total_reminders}</div>
+            </div>
+        </div>
+
+        <div class="section">
+            <div class="section-title">Fehlgeschlagene Erinnerungen</div>
+            {failed_tasks_list}
+        </div>
+
+        <div class="section">
+            <div class="section-title">Neue Aufgaben</div>
+            <div class="stat-box stat-success">
+                <div class="stat-label">Erfolgreich gesendet</div>
+                <div class="stat-value">{len(response_json['new_aufgaben_sent'])}</div>
+            </div>
+            <div class="stat-box stat-error">
+                <div class="stat-label">Fehlgeschlagen</div>
+                <div class="stat-value">{len(response_json['new_aufgaben_failed'])}</div>
+            </div>
+            <div class="stat-box">
+                <div class="stat-label">Gesamt</div>
+                <div class="stat-value">{total_new_tasks}</div>
+            </div>
+        </div>
+
+        <div class="section">
+            <div class="section-title">Erfolgreich gesendete neue Aufgaben</div>
+            {new_tasks_sent_list}
+        </div>
+
+        <div class="section">
+            <div class="section-title">Fehlgeschlagene neue Aufgaben</div>
+            {new_tasks_failed_list}
+        </div>
+
+        <div class="footer">
+            Automatische Benachrichtigung vom Aufgabenerinnerungs-System
+        </div>
+    </body>
+    </html>
+    """
+
+    # Plain text version for email clients that don't support HTML
+    plain_message = f"""Aufgabenerinnerungen erfolgreich gesendet
+
+Ausführung:
+Uhrzeit: {execution_time}
+Dauer: {duration_str}
+Organisationen nicht abgeschlossen: {not_done}
+
+Erinnerungen:
+Erfolgreich gesendet: {len(response_json['aufgaben_sent'])}
+Fehlgeschlagen: {len(response_json['aufgaben_failed'])}
+Gesamt: {total_reminders}
+
+Fehlgeschlagene Erinnerungen:
+{chr(10).join([f"- {f.get('name', 'Unbekannt')} (User: {f.get('user', 'Unbekannt')}, ID: {f.get('id', 'N/A')})" for f in response_json['aufgaben_failed']]) if response_json['aufgaben_failed'] else "Keine Fehler"}
+
+Neue Aufgaben:
+Erfolgreich gesendet: {len(response_json['new_aufgaben_sent'])}
+Fehlgeschlagen: {len(response_json['new_aufgaben_failed'])}
+Gesamt: {total_new_tasks}
+
+Erfolgreich gesendete neue Aufgaben:
+{chr(10).join([f"- {s.get('user', 'Unbekannt')}: {', '.join(s.get('aufgaben', []))}" for s in response_json['new_aufgaben_sent']]) if response_json['new_aufgaben_sent'] else "Keine neuen Aufgaben"}
+
+Fehlgeschlagene neue Aufgaben:
+{chr(10).join([f"- {f.get('user', 'Unbekannt')}: {', '.join(f.get('aufgaben', []))}" for f in response_json['new_aufgaben_failed']]) if response_json['new_aufgaben_failed'] else "Keine Fehler"}
+    """
+    return plain_message, html_message
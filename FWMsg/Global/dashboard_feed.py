@@ -0,0 +1,154 @@
+"""
+Merged news feed (posts and images) and task statistics for the dashboards.
+
+Posts and images are read with two queries that are ordered and limited in the
+database; the two sorted results are merged in Python. Feed items are ordered
+by ``(date, type, id)`` descending, which also defines the keyset cursor used
+to load the next page, so pages stay stable while new items are added.
+"""
+
+import base64
+import heapq
+from datetime import datetime
+
+from django.db.models import Count, Q
+
+from .models import Bilder2, PersonCluster, Post2
+from .posts_feed import annotate_posts, mark_unread
+
+FEED_PAGE_SIZE = 12
+
+# Date field per item type; the type names also break ties between equal dates
+FEED_DATE_FIELDS = {
+    'post': 'date_updated',
+    'image': 'date_created',
+}
+
+
+def encode_feed_cursor(item):
+    raw = f"{item['date'].isoformat()}|{item['type']}|{item['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_feed_cursor(cursor):
+    """Return ``(date, type, id)`` of a cursor or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        date, item_type, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        if item_type not in FEED_DATE_FIELDS:
+            return None
+        return datetime.fromisoformat(date), item_type, int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after_cursor(queryset, item_type, cursor):
+    """Restrict a queryset to the items that follow ``cursor`` in feed order."""
+    date_field = FEED_DATE_FIELDS[item_type]
+    queryset = queryset.order_by(f'-{date_field}', '-id')
+    if not cursor:
+        return queryset
+    date, cursor_type, cursor_id = cursor
+    after = Q(**{f'{date_field}__lt': date})
+    if item_type == cursor_type:
+        after |= Q(**{date_field: date, 'id__lt': cursor_id})
+    elif item_type < cursor_type:
+        after |= Q(**{date_field: date})
+    return queryset.filter(after)
+
+
+def get_feed_posts(org, person_cluster=None, viewer=None):
+    posts = Post2.objects.filter(org=org)
+    if person_cluster:
+        posts = posts.filter(person_cluster=person_cluster)
+    return annotate_posts(posts, viewer)
+
+
+def get_feed_bilder(org, person_cluster=None):
+    bilder = Bilder2.objects.filter(org=org)
+    if person_cluster:
+        bilder = bilder.filter(user__customuser__person_cluster=person_cluster)
+    return bilder.select_related('user', 'user__customuser').prefetch_related('bildergallery2_set')
+
+
+def get_feed_person_cluster(request):
+    """Person cluster selected with ``?person_cluster_filter=<id>``, or None for all."""
+    param = request.GET.get('person_cluster_filter')
+    if not param or param == 'None':
+        return None
+    try:
+        return PersonCluster.selectable_for_org(request.user.org, id=int(param)).get()
+    except (PersonCluster.DoesNotExist, ValueError):
+        return None
+
+
+def get_feed_sources(user, person_cluster=None):
+    """
+    Post and image querysets of the dashboard feed visible to ``user``.
+
+    Organisation and team members see everything of their org; everyone else
+    sees the posts of their own person cluster and, if their cluster may see
+    images, the org's images. ``person_cluster`` narrows down the images (and,
+    for O/T, the posts) to one cluster.
+    """
+    org = user.org
+    own_cluster = user.person_cluster
+    if user.role in ('O', 'T'):
+        return get_feed_posts(org, person_cluster, viewer=user), get_feed_bilder(org, person_cluster)
+
+    posts = bilder = None
+    if own_cluster and own_cluster.posts:
+        posts = get_feed_posts(org, own_cluster, viewer=user)
+    if own_cluster and own_cluster.bilder:
+        bilder = get_feed_bilder(org, person_cluster)
+    return posts, bilder
+
+
+def _post_items(posts, limit, viewer):
+    posts = mark_unread(list(posts[:limit]), viewer)
+    return [{'type': 'post', 'date': post.date_updated, 'id': post.id, 'post': post} for post in posts]
+
+
+def _image_items(bilder, limit):
+    return [{'type': 'image', 'date': bild.date_created, 'id': bild.id, 'bild': bild} for bild in bilder[:limit]]
+
+
+def get_dashboard_feed(posts=None, bilder=None, cursor=None, limit=FEED_PAGE_SIZE, viewer=None):
+    """
+    Return one page of the merged feed as ``(items, next_cursor)``.
+
+    ``posts`` and ``bilder`` are querysets already restricted to what the
+    viewer may see (None leaves the type out). Each item is a dict with
+    ``type`` ('post' or 'image'), ``date``, ``id`` and the object under
+    ``post`` or ``bild``; ``next_cursor`` is None on the last page.
+    """
+    cursor = decode_feed_cursor(cursor)
+    sources = []
+    # One extra row per source tells whether another page exists
+    if posts is not None:
+        sources.append(_post_items(_after_cursor(posts, 'post', cursor), limit + 1, viewer))
+    if bilder is not None:
+        sources.append(_image_items(_after_cursor(bilder, 'image', cursor), limit + 1))
+
+    merged = list(heapq.merge(
+        *sources,
+        key=lambda item: (item['date'], item['type'], item['id']),
+        reverse=True,
+    ))
+    items = merged[:limit]
+    next_cursor = encode_feed_cursor(items[-1]) if len(merged) > limit else None
+    return items, next_cursor
+
+
+def get_task_counts(user_aufgaben):
+    """Count completed, open and pending tasks of a ``UserAufgaben`` queryset in one query."""
+    # Aliases must not clash with the model fields erledigt/pending
+    counts = user_aufgaben.aggregate(
+        n_erledigt=Count('id', filter=Q(erledigt=True)),
+        n_offen=Count('id', filter=Q(erledigt=False, pending=False)),
+        n_pending=Count('id', filter=Q(erledigt=False, pending=True)),
+    )
+    counts = {key[2:]: value for key, value in counts.items()}
+    counts['gesamt'] = counts['erledigt'] + counts['offen'] + counts['pending']
+    return counts
@@ -0,0 +1,89 @@
+"""
+Folder tree of the documents page.
+
+The tree – the visible folders with their colour, person clusters and number
+of documents – takes two queries and is cached per organisation and person
+cluster. Saving or deleting a folder or document bumps the organisation's tree
+version (see the receivers in ``Global.models``) and thereby invalidates all
+cached trees of the organisation. The documents of a folder are only loaded
+when the folder is opened, one page at a time (``get_folder_documents``).
+"""
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count
+
+from .models import Dokument2, Ordner2
+
+TREE_CACHE_TIMEOUT = 60 * 60
+DOCUMENTS_PER_PAGE = 24
+
+
+def _version_key(org_id):
+    return f'document_tree_version_{org_id}'
+
+
+def invalidate_document_tree(org_id):
+    """Drop the cached folder trees of an organisation."""
+    try:
+        cache.incr(_version_key(org_id))
+    except ValueError:
+        cache.set(_version_key(org_id), 2, None)
+
+
+def visible_folders(org, person_cluster=None):
+    """Folders of ``org``, only those visible for ``person_cluster`` if given."""
+    folders = Ordner2.objects.filter(org=org)
+    if person_cluster is not None:
+        folders = folders.filter(typ=person_cluster)
+    return folders
+
+
+def compute_folder_tree(org, person_cluster=None):
+    """
+    The folders as a list of ``{'ordner': folder, 'count': number of
+    documents}`` in display order, with the folders' colour and person
+    clusters loaded.
+    """
+    folders = (
+        visible_folders(org, person_cluster)
+        .select_related('color')
+        .prefetch_related('typ')
+        .annotate(count=Count('dokument2', distinct=True))
+        .order_by('color', 'ordner_name')
+    )
+    return [{'ordner': folder, 'count': folder.count} for folder in folders]
+
+
+def get_folder_tree(org, person_cluster=None):
+    """Cached ``compute_folder_tree``."""
+    version = cache.get_or_set(_version_key(org.id), 1, None)
+    key = f'document_tree_{org.id}_{person_cluster.id if person_cluster else "all"}_v{version}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = compute_folder_tree(org, person_cluster)
+        cache.set(key, tree, TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def get_folder_documents(folder, page=1, per_page=DOCUMENTS_PER_PAGE):
+    """One page of the documents of ``folder``, newest first."""
+    documents = (
+        Dokument2.objects.filter(org_id=folder.org_id, ordner=folder)
+        .prefetch_related('darf_bearbeiten')
+        .order_by('-date_created', '-id')
+    )
+    return Paginator(documents, per_page).get_page(page)
+
+
+def folder_tree_as_json(tree):
+    return [
+        {
+            'id': entry['ordner'].id,
+            'name': entry['ordner'].ordner_name,
+            'color': entry['ordner'].color.color if entry['ordner'].color else None,
+            'person_clusters': [{'id': typ.id, 'name': typ.name} for typ in entry['ordner'].typ.all()],
+            'count': entry['count'],
+        }
+        for entry in tree
+    ]
@@ -0,0 +1,74 @@
+"""
+History policy on top of django-simple-history.
+
+``HistoricalRecords`` is a drop-in replacement for simple_history's. Fields
+that change on hot paths (presence, read flags, reminder stamps, derived
+files) are listed in ``excluded_fields`` of the model, and saves changing
+nothing but those fields and ``auto_now`` timestamps write no historical row:
+
+* saves with ``update_fields`` are decided without a query,
+* other updates are compared with the latest historical row of the object.
+
+``bulk_update_with_history`` does the same for bulk updates and writes the
+historical rows of a batch with a single insert.
+"""
+
+from django.conf import settings
+from simple_history import models as history_models
+from simple_history import utils as history_utils
+
+
+def untracked_fields(model, excluded_fields):
+    """Names and attnames of the fields whose changes alone are not recorded."""
+    names = set()
+    for field in model._meta.concrete_fields:
+        if field.name in excluded_fields or getattr(field, 'auto_now', False):
+            names.update((field.name, field.attname))
+    return names
+
+
+class HistoricalRecords(history_models.HistoricalRecords):
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        if (
+            not created
+            and not kwargs.get('raw', False)
+            and getattr(settings, 'SIMPLE_HISTORY_ENABLED', True)
+            and not hasattr(instance, 'skip_history_when_saving')
+            and self.is_unchanged(instance, kwargs.get('update_fields'))
+        ):
+            return
+        super().post_save(instance, created, using=using, **kwargs)
+
+    def is_unchanged(self, instance, update_fields=None):
+        """Whether saving ``instance`` leaves every tracked field as recorded last."""
+        untracked = untracked_fields(type(instance), self.excluded_fields)
+        if update_fields is not None:
+            return set(update_fields) <= untracked
+
+        fields = [field for field in self.fields_included(instance) if field.name not in untracked]
+        history_model = getattr(instance, self.manager_name).model
+        latest = (
+            history_model._default_manager
+            .filter(**{instance._meta.pk.attname: instance.pk})
+            .order_by('-history_date', f'-{history_model._meta.pk.attname}')
+            .values(*(field.attname for field in fields))
+            .first()
+        )
+        if latest is None:
+            return False
+        return all(
+            field.get_prep_value(getattr(instance, field.attname)) == field.get_prep_value(latest[field.attname])
+            for field in fields
+        )
+
+
+def bulk_update_with_history(objs, model, fields, batch_size=None):
+    """
+    ``bulk_update`` of ``objs``; historical rows are only written, in bulk, when
+    a tracked field is among ``fields``.
+    """
+    history_model = history_utils.get_history_model_for_model(model)
+    if set(fields) <= untracked_fields(model, history_model._history_excluded_fields):
+        return model.objects.bulk_update(objs, fields, batch_size=batch_size)
+    return history_utils.bulk_update_with_history(objs, model, fields, batch_size=batch_size)
@@ -0,0 +1,146 @@
+"""
+External links of countries, resolved in the background.
+
+Some country pages link to third-party sites whose URLs can only be guessed
+from the country name, e.g. the travel advice of the Auswärtiges Amt. Whether
+a guessed page exists is checked by ``refresh_country_links`` (run
+periodically by ``refresh_country_links_task``) and stored in
+``EinsatzlandLink``; views only read the stored result with
+``get_country_link`` and fall back to a general page while a link is not
+resolved, so rendering a page never waits on the external site.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Einsatzland2, EinsatzlandLink
+
+logger = logging.getLogger(__name__)
+
+LINK_RESOLVER_TTL = timedelta(days=7)
+LINK_RESOLVER_TIMEOUT = 5  # seconds
+DEFAULT_LINK_RESOLVER_CONCURRENCY = 8
+
+UMLAUT_REPLACEMENTS = {
+    'ä': 'ae',
+    'ö': 'oe',
+    'ü': 'ue',
+    'ß': 'ss',
+}
+
+# ``base_url_setting`` allows pointing a link kind to another host, e.g. in tests
+COUNTRY_LINKS = {
+    'auswaertiges_amt': {
+        'base_url_setting': 'AUSWAERTIGES_AMT_URL',
+        'base_url': 'https://www.auswaertiges-amt.de',
+        'path': '/de/service/laender/{slug}-node/',
+        'fallback': '/de/reiseundsicherheit',
+    },
+}
+
+
+def _base_url(kind):
+    link = COUNTRY_LINKS[kind]
+    return getattr(settings, link['base_url_setting'], None) or link['base_url']
+
+
+def country_slug(name):
+    """Lower case country name with German special characters spelled out in ASCII."""
+    return ''.join(UMLAUT_REPLACEMENTS.get(c, c) for c in name.lower())
+
+
+def candidate_url(kind, land):
+    return _base_url(kind) + COUNTRY_LINKS[kind]['path'].format(slug=country_slug(land.name))
+
+
+def fallback_url(kind):
+    return _base_url(kind) + COUNTRY_LINKS[kind]['fallback']
+
+
+def get_country_link(land, kind):
+    """Stored link of ``kind`` for a country or the general fallback page, without network access."""
+    link = EinsatzlandLink.objects.filter(land=land, kind=kind, resolved=True, resolved_for=land.name).first()
+    return link.url if link else fallback_url(kind)
+
+
+def _check_url(session, url):
+    """True if the page exists, False if not, None if the site could not be reached."""
+    try:
+        with session.get(url, timeout=LINK_RESOLVER_TIMEOUT, allow_redirects=True, stream=True) as response:
+            return response.status_code == 200
+    except requests.RequestException as e:
+        logger.warning("Could not check %s: %s", url, e)
+        return None
+
+
+def _lands_to_refresh(kind, lands, force):
+    if force:
+        return list(lands)
+    stored = {
+        link.land_id: link
+        for link in EinsatzlandLink.objects.filter(kind=kind, land__in=lands)
+    }
+    stale_before = timezone.now() - LINK_RESOLVER_TTL
+    return [
+        land for land in lands
+        if land.id not in stored
+        or stored[land.id].resolved_for != land.name
+        or stored[land.id].checked_at < stale_before
+    ]
+
+
+def refresh_country_links(land_ids=None, kinds=None, force=False):
+    """
+    Check the links of the given countries (all by default) that are missing,
+    stale or were resolved for another name, and store the results.
+
+    The checks share one HTTP session and run concurrently
+    (``settings.LINK_RESOLVER_CONCURRENCY``). Links whose site could not be
+    reached keep their previous state and are retried on the next run.
+    Returns the number of stored links.
+    """
+    lands = Einsatzland2._base_manager.all()
+    if land_ids is not None:
+        lands = lands.filter(id__in=land_ids)
+    lands = list(lands)
+
+    jobs = [
+        (kind, land, candidate_url(kind, land))
+        for kind in (kinds or COUNTRY_LINKS)
+        for land in _lands_to_refresh(kind, lands, force)
+    ]
+    if not jobs:
+        return 0
+
+    concurrency = getattr(settings, 'LINK_RESOLVER_CONCURRENCY', None) or DEFAULT_LINK_RESOLVER_CONCURRENCY
+    concurrency = max(1, min(concurrency, len(jobs)))
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda job: _check_url(session, job[2]), jobs))
+
+    stored = 0
+    now = timezone.now()
+    for (kind, land, url), exists in zip(jobs, results):
+        if exists is None:
+            continue
+        EinsatzlandLink._base_manager.update_or_create(
+            land=land,
+            kind=kind,
+            defaults={
+                'org_id': land.org_id,
+                'url': url if exists else fallback_url(kind),
+                'resolved': exists,
+                'resolved_for': land.name,
+                'checked_at': now,
+            },
+        )
+        stored += 1
+    return stored
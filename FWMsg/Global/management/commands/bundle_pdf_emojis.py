@@ -0,0 +1,51 @@
+import os
+import shutil
+import urllib.request
+
+import emoji
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Global.pdf_resources import LEGACY_EMOJI_CACHE_DIR_NAME, emoji_to_codepoint
+
+TWEMOJI_URL = "https://cdn.jsdelivr.net/gh/twitter/twemoji@latest/assets/72x72/{codepoint}.png"
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill settings.PDF_EMOJI_DIR with the emoji PNGs used when rendering PDFs, "
+        "so PDF generation never has to download them at request time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=TWEMOJI_URL, help='URL template with a {codepoint} placeholder')
+        parser.add_argument('--skip-download', action='store_true', help='Only copy images from the legacy media cache')
+
+    def handle(self, *args, **options):
+        target = str(settings.PDF_EMOJI_DIR)
+        os.makedirs(target, exist_ok=True)
+        legacy = os.path.join(settings.MEDIA_ROOT, LEGACY_EMOJI_CACHE_DIR_NAME)
+
+        copied = downloaded = missing = 0
+        codepoints = sorted({emoji_to_codepoint(char).replace('-fe0f', '') for char in emoji.EMOJI_DATA})
+        for codepoint in codepoints:
+            path = os.path.join(target, f"{codepoint}.png")
+            if os.path.exists(path):
+                continue
+            legacy_path = os.path.join(legacy, f"{codepoint}.png")
+            if os.path.exists(legacy_path):
+                shutil.copyfile(legacy_path, path)
+                copied += 1
+                continue
+            if options['skip_download']:
+                missing += 1
+                continue
+            try:
+                urllib.request.urlretrieve(options['url'].format(codepoint=codepoint), path)
+                downloaded += 1
+            except Exception:
+                missing += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{copied} copied, {downloaded} downloaded, {missing} not available ({target})"
+        ))
@@ -0,0 +1,77 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from Global.blob_store import DeduplicatingFileSystemStorage, blob_path, collect_garbage, file_digest, store
+
+
+def deduplicated_fields():
+    """``(model, field)`` of all file fields stored in the blob store."""
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, DeduplicatingFileSystemStorage):
+                yield model, field
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the existing uploaded documents into the content-addressed blob store, '
+        'so that files with the same content are stored only once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how much space would be saved')
+
+    def _dry_run_saving(self, path, digest, seen):
+        """Bytes that deduplicating ``path`` would save, without changing anything."""
+        inode = os.stat(path).st_ino
+        blob = blob_path(digest)
+        if digest not in seen:
+            seen[digest] = os.stat(blob).st_ino if os.path.exists(blob) else inode
+        return 0 if seen[digest] == inode else os.path.getsize(path)
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        would = 'would be ' if dry_run else ''
+        seen = {}
+        total_files = total_saved = 0
+        for model, field in deduplicated_fields():
+            files = saved = 0
+            hashes = []
+            rows = model._base_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            for pk, name in rows.values_list('pk', field.name).iterator():
+                path = field.storage.path(name)
+                if not os.path.isfile(path):
+                    continue
+                files += 1
+                if dry_run:
+                    digest = file_digest(path)
+                    saved += self._dry_run_saving(path, digest, seen)
+                else:
+                    digest, file_saved = store(path)
+                    saved += file_saved
+                hashes.append((pk, digest))
+
+            if not dry_run and any(f.name == 'content_hash' for f in model._meta.concrete_fields):
+                for pk, digest in hashes:
+                    model._base_manager.filter(pk=pk).exclude(content_hash=digest).update(content_hash=digest)
+
+            self.stdout.write(f'{model._meta.label}.{field.name}: {files} files, {_format_size(saved)} {would}saved')
+            total_files += files
+            total_saved += saved
+
+        count, size = collect_garbage(dry_run=dry_run)
+        self.stdout.write(f'{count} unused blobs ({_format_size(size)}) {would}removed')
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_files} files, {_format_size(total_saved + size)} {would}saved in total'
+        ))
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.utils import timezone
+from simple_history.utils import get_history_model_for_model
+
+BATCH_SIZE = 1000
+
+
+def history_models(labels=None):
+    """``(model, history model)`` of all models with ``HistoricalRecords``, or of ``labels``."""
+    if labels:
+        try:
+            selected = [apps.get_model(label) for label in labels]
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+    else:
+        selected = apps.get_models()
+    for model in selected:
+        if hasattr(model._meta, 'simple_history_manager_attribute'):
+            yield model, get_history_model_for_model(model)
+        elif labels:
+            raise CommandError(f'{model._meta.label} has no history')
+
+
+def prunable_rows(history_model, cutoff):
+    """
+    Historical rows older than ``cutoff``, except the latest row of every
+    object that still exists.
+    """
+    rows = history_model._default_manager
+    history_id = history_model._meta.pk.attname
+    object_id = history_model.instance_type._meta.pk.attname
+    latest = rows.values(object_id).annotate(latest=Max(history_id)).values('latest')
+    kept = rows.filter(**{f'{history_id}__in': latest}).exclude(history_type='-').values(history_id)
+    return rows.filter(history_date__lt=cutoff).exclude(**{f'{history_id}__in': kept})
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete historical rows older than the retention period, optionally archiving them '
+        'to gzipped JSON lines first. The latest row of every existing object is kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Only prune these models (app_label.ModelName)')
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'HISTORY_RETENTION_DAYS', 365),
+            help='Keep the history of the last DAYS days (default: HISTORY_RETENTION_DAYS or 365)',
+        )
+        parser.add_argument('--archive-dir', help='Write the deleted rows to <table>-<date>.jsonl.gz in this directory')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be deleted')
+
+    def _archive(self, path, rows):
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in rows.values():
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        cutoff = timezone.now() - timezone.timedelta(days=options['days'])
+        dry_run = options['dry_run']
+        archive_dir = options['archive_dir']
+        if archive_dir and not dry_run:
+            os.makedirs(archive_dir, exist_ok=True)
+        would = 'would be ' if dry_run else ''
+
+        total_rows = total_pruned = 0
+        for model, history_model in history_models(options['models']):
+            table = history_model._meta.db_table
+            history_id = history_model._meta.pk.attname
+            rows = history_model._default_manager.count()
+            prunable = prunable_rows(history_model, cutoff)
+
+            if dry_run:
+                pruned = prunable.count()
+            else:
+                archive_path = archive_dir and os.path.join(archive_dir, f'{table}-{timezone.localdate():%Y%m%d}.jsonl.gz')
+                pruned = 0
+                while True:
+                    ids = list(prunable.values_list(history_id, flat=True)[:BATCH_SIZE])
+                    if not ids:
+                        break
+                    batch = history_model._default_manager.filter(**{f'{history_id}__in': ids})
+                    if archive_path:
+                        self._archive(archive_path, batch)
+                    batch.delete()
+                    pruned += len(ids)
+
+            total_rows += rows
+            total_pruned += pruned
+            if rows:
+                self.stdout.write(f'{table}: {rows} rows, {pruned} {would}deleted')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_pruned} of {total_rows} historical rows older than {options["days"]} days {would}deleted'
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Global.search import SOURCES, build_entry, clear_index, get_backend, source_queryset, write_entries
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of posts, documents, chat messages, tasks and calendar events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', type=int, help='Only rebuild the entries of the organisation with this id')
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            raise CommandError('Full-text search is only supported on SQLite and PostgreSQL')
+        org_id = options['org']
+        start = time.perf_counter()
+        total = 0
+        with transaction.atomic():
+            clear_index(org_id)
+            for kind in SOURCES:
+                queryset = source_queryset(kind)
+                if org_id is not None:
+                    queryset = queryset.filter(org_id=org_id)
+                count = 0
+                batch = []
+                for instance in queryset.iterator(chunk_size=BATCH_SIZE):
+                    entry = build_entry(kind, instance)
+                    if entry is None:
+                        continue
+                    batch.append(entry)
+                    if len(batch) >= BATCH_SIZE:
+                        write_entries(batch)
+                        count += len(batch)
+                        batch = []
+                write_entries(batch)
+                count += len(batch)
+                self.stdout.write(f'{kind}: {count} entries')
+                total += count
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} entries indexed in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.6 on 2026-10-19 15:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Global', '0032_ampelconfiguration_date_help_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post2',
+            name='read_by',
+            field=models.ManyToManyField(blank=True, help_text='Benutzer, die diesen Post bereits geöffnet haben', related_name='read_posts', to=settings.AUTH_USER_MODEL, verbose_name='Gelesen von'),
+        ),
+    ]
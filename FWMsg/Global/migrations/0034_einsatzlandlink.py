@@ -0,0 +1,33 @@
+# Generated by Django 6.0.6 on 2026-10-19 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Global', '0033_post2_read_by'),
+        ('ORG', '0003_historicalorganisation_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EinsatzlandLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('auswaertiges_amt', 'Auswärtiges Amt')], max_length=30, verbose_name='Art')),
+                ('url', models.URLField(max_length=500, verbose_name='URL')),
+                ('resolved', models.BooleanField(default=False, help_text='Die länderspezifische Seite existiert', verbose_name='Aufgelöst')),
+                ('resolved_for', models.CharField(help_text='Ländername, für den der Link aufgelöst wurde', max_length=50, verbose_name='Aufgelöst für')),
+                ('checked_at', models.DateTimeField(verbose_name='Geprüft am')),
+                ('land', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='Global.einsatzland2', verbose_name='Einsatzland')),
+                ('org', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ORG.organisation', verbose_name='Organisation')),
+            ],
+            options={
+                'verbose_name': 'Einsatzland-Link',
+                'verbose_name_plural': 'Einsatzland-Links',
+                'unique_together': {('land', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.6 on 2026-10-19 16:56
+
+import mimetypes
+
+from django.db import migrations, models
+
+
+def populate_document_types(apps, schema_editor):
+    Dokument2 = apps.get_model('Global', 'Dokument2')
+    dokumente = list(Dokument2.objects.exclude(dokument='').exclude(dokument__isnull=True))
+    for dokument in dokumente:
+        mime_type, _ = mimetypes.guess_type(dokument.dokument.name)
+        dokument.mimetype = mime_type or ''
+        dokument.suffix = dokument.dokument.name.split('.')[-1]
+    Dokument2.objects.bulk_update(dokumente, ['mimetype', 'suffix'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Global', '0034_einsatzlandlink'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dokument2',
+            name='mimetype',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='MIME-Typ'),
+        ),
+        migrations.AddField(
+            model_name='dokument2',
+            name='suffix',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Dateiendung'),
+        ),
+        migrations.AddField(
+            model_name='historicaldokument2',
+            name='mimetype',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='MIME-Typ'),
+        ),
+        migrations.AddField(
+            model_name='historicaldokument2',
+            name='suffix',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Dateiendung'),
+        ),
+        migrations.RunPython(populate_document_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.6 on 2026-10-19 17:20
+
+import Global.blob_store
+import Global.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Global', '0035_dokument2_mimetype_suffix'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dokument2',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='SHA-256 des Dateiinhalts', max_length=64, verbose_name='Inhalts-Hash'),
+        ),
+        migrations.AddField(
+            model_name='historicaldokument2',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='SHA-256 des Dateiinhalts', max_length=64, verbose_name='Inhalts-Hash'),
+        ),
+        migrations.AlterField(
+            model_name='dokument2',
+            name='dokument',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=Global.blob_store.DeduplicatingFileSystemStorage(), upload_to=Global.models.upload_to_folder),
+        ),
+        migrations.AlterField(
+            model_name='useraufgaben',
+            name='file',
+            field=models.FileField(blank=True, help_text='Datei, die für diese Aufgabe hochgeladen wurde', max_length=255, null=True, storage=Global.blob_store.DeduplicatingFileSystemStorage(), upload_to='uploads/', verbose_name='Angehängte Datei'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.6 on 2026-10-19 18:05
+
+from django.db import migrations
+
+from Global.search import get_backend
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection.vendor)
+    if backend is not None:
+        for sql in backend.create_sql:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection.vendor)
+    if backend is not None:
+        for sql in backend.drop_sql:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    """
+    The full-text search index, filled by ``manage.py rebuild_search_index``
+    and kept up to date by the receivers in ``Global.models`` and ``chat.models``.
+    """
+
+    dependencies = [
+        ('Global', '0036_dokument2_content_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
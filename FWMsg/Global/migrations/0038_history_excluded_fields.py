@@ -0,0 +1,37 @@
+# Generated by Django 6.0.6 on 2026-10-19 20:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Global', '0037_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='historicalbildergallery2',
+            name='small_image',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcustomuser',
+            name='is_online',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcustomuser',
+            name='last_ampel_reminder',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcustomuser',
+            name='last_seen',
+        ),
+        migrations.RemoveField(
+            model_name='historicaldokument2',
+            name='preview_image',
+        ),
+        migrations.RemoveField(
+            model_name='historicaluseraufgaben',
+            name='last_reminder',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.6 on 2026-10-19 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Global', '0038_history_excluded_fields'),
+        ('ORG', '0004_alter_dokument_dokument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyJobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50, verbose_name='Job')),
+                ('date', models.DateField(verbose_name='Datum')),
+                ('status', models.CharField(choices=[('S', 'Geplant'), ('R', 'Läuft'), ('D', 'Erledigt'), ('F', 'Fehlgeschlagen')], default='S', max_length=1, verbose_name='Status')),
+                ('scheduled_for', models.DateTimeField(blank=True, null=True, verbose_name='Geplant für')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Gestartet am')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Beendet am')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Versuche')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Ergebnis')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Fehler')),
+                ('org', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ORG.organisation', verbose_name='Organisation')),
+            ],
+            options={
+                'verbose_name': 'Tagesjob-Lauf',
+                'verbose_name_plural': 'Tagesjob-Läufe',
+                'ordering': ['-date', 'job', 'scheduled_for'],
+                'constraints': [models.UniqueConstraint(fields=('job', 'org', 'date'), name='unique_daily_job_run')],
+            },
+        ),
+    ]
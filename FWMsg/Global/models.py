@@ -5,10 +5,11 @@ from django.dispatch import receiver
 from django.core import validators
 import random
 import string
-from simple_history.models import HistoricalRecords
+from Global.history import HistoricalRecords
 import os.path
-from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from FWMsg.middleware import get_current_request
+from Global.blob_store import content_digest, document_storage
 import os
 from ORG.models import Organisation
 import uuid
@@ -145,7 +146,7 @@ class CustomUser(OrgModel):
     last_seen = models.DateTimeField(blank=True, null=True, verbose_name=_('Zuletzt online'))
     is_online = models.BooleanField(default=False, verbose_name=_('Ist online'))
 
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['last_ampel_reminder', 'last_seen', 'is_online'])
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -471,11 +472,18 @@ def upload_to_preview_image(instance, filename):
     return os.path.join(folder, filename + '.jpg')
 
 
+def guess_document_type(name):
+    """Return ``(mimetype, suffix)`` of a file name; the mimetype is '' if unknown."""
+    import mimetypes
+    mime_type, _ = mimetypes.guess_type(name)
+    return mime_type or '', name.split('.')[-1]
+
+
 class Dokument2(models.Model):
     org = models.ForeignKey(Organisation, on_delete=models.CASCADE)
     identifier = models.CharField(max_length=255, null=True, blank=True, verbose_name=_('Identifier'), help_text=_('Eindeutige Kennung der Datei'))
     ordner = models.ForeignKey(Ordner2, on_delete=models.CASCADE)
-    dokument = models.FileField(upload_to=upload_to_folder, max_length=255, null=True, blank=True)
+    dokument = models.FileField(upload_to=upload_to_folder, storage=document_storage, max_length=255, null=True, blank=True)
     link = models.URLField(null=True, blank=True, verbose_name=_('Link'), help_text=_('Link zu einer externen Datei'))
     date_created = models.DateTimeField(auto_now_add=True, verbose_name=_('Erstellt am'), help_text=_('Datum der Erstellung der Datei'))
     date_modified = models.DateTimeField(auto_now=True, verbose_name=_('Zuletzt geändert am'), help_text=_('Datum der letzten Änderung der Datei'))
@@ -483,11 +491,24 @@ class Dokument2(models.Model):
     beschreibung = models.TextField(null=True, blank=True, verbose_name=_('Beschreibung'), help_text=_('Beschreibung der Datei'))
     darf_bearbeiten = models.ManyToManyField(PersonCluster, verbose_name=_('Darf bearbeiten'), help_text=_('Benutzergruppen, die diese Datei bearbeiten können'))
     preview_image = models.ImageField(upload_to=upload_to_preview_image, null=True, blank=True)
+    mimetype = models.CharField(max_length=255, blank=True, default='', editable=False, verbose_name=_('MIME-Typ'))
+    suffix = models.CharField(max_length=255, blank=True, default='', editable=False, verbose_name=_('Dateiendung'))
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False, db_index=True, verbose_name=_('Inhalts-Hash'), help_text=_('SHA-256 des Dateiinhalts'))
 
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['preview_image'])
 
     def __str__(self):
         return self.titel or self.dokument.name or self.link
+
+    def save(self, *args, **kwargs):
+        # Stored so that listing documents does not guess the type per document
+        if self.dokument:
+            self.mimetype, self.suffix = guess_document_type(self.dokument.name)
+            if not self.dokument._committed:
+                self.content_hash = content_digest(self.dokument)
+        else:
+            self.mimetype, self.suffix, self.content_hash = '', '', ''
+        super().save(*args, **kwargs)
     
     def update_identifier(self):
         self.identifier = get_random_hash(str(self.id), 64)
@@ -502,18 +523,13 @@ class Dokument2(models.Model):
 
     def get_document_type(self):
         if self.dokument:
-            import mimetypes
-            file_path = self.dokument.path
-            # Guess the MIME type based on file extension
-            mime_type, _ = mimetypes.guess_type(file_path)
-
-            return mime_type or 'unknown'
+            return self.mimetype or 'unknown'
         else:
             return 'unknown'
         
     def get_document_suffix(self):
         if self.dokument:
-            return self.dokument.name.split('.')[-1]
+            return self.suffix
         else:
             return 'unknown'
         
@@ -648,13 +664,25 @@ class Dokument2(models.Model):
         else:
             return None
         
+def shared_preview_image(dokument):
+    """The existing preview of another document with the same content, if any."""
+    if not dokument.content_hash:
+        return None
+    other = Dokument2.objects.filter(
+        content_hash=dokument.content_hash, preview_image__gt=''
+    ).exclude(id=dokument.id).exclude(preview_image=dokument.preview_image.name or '').first()
+    if other and os.path.exists(other.preview_image.path):
+        return other.preview_image.name
+    return None
+
+
 @receiver(post_save, sender=Dokument2)
 def create_preview_image(sender, instance, **kwargs):
     # Skip if we're already processing the preview image
     if hasattr(instance, '_creating_preview'):
         return
     
-    img_path = instance.get_preview_converted()
+    img_path = shared_preview_image(instance) or instance.get_preview_converted()
     if img_path:
         try:
             # Set flag to prevent recursive save
@@ -672,9 +700,30 @@ def remove_file(sender, instance, **kwargs):
     if instance.dokument and os.path.isfile(instance.dokument.path):
         os.remove(instance.dokument.path)
 
-    if instance.preview_image and os.path.isfile(instance.preview_image.path):
+    # Previews are shared by documents with the same content
+    if (
+        instance.preview_image and os.path.isfile(instance.preview_image.path)
+        and not Dokument2.objects.filter(preview_image=instance.preview_image.name).exists()
+    ):
         os.remove(instance.preview_image.path)
 
+
+@receiver(post_save, sender=Ordner2)
+@receiver(post_delete, sender=Ordner2)
+@receiver(post_save, sender=Dokument2)
+@receiver(post_delete, sender=Dokument2)
+def invalidate_document_tree_receiver(sender, instance, **kwargs):
+    from Global.document_tree import invalidate_document_tree
+    invalidate_document_tree(instance.org_id)
+
+
+@receiver(m2m_changed, sender=Ordner2.typ.through)
+def invalidate_document_tree_person_cluster_receiver(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Ordner2):
+        from Global.document_tree import invalidate_document_tree
+        invalidate_document_tree(instance.org_id)
+
+
 class DokumentColor2(models.Model):
     name = models.CharField(max_length=50, verbose_name=_('Farbname'))
     color = models.CharField(max_length=7, verbose_name=_('Farbcodes'))
@@ -780,6 +829,36 @@ class Einsatzland2(OrgModel):
     def __str__(self):
         return self.name
 
+
+class EinsatzlandLink(OrgModel):
+    """External link of a country, resolved in the background by ``Global.link_resolver``."""
+    KIND_CHOICES = [
+        ('auswaertiges_amt', 'Auswärtiges Amt'),
+    ]
+
+    land = models.ForeignKey(Einsatzland2, on_delete=models.CASCADE, related_name='links', verbose_name=_('Einsatzland'))
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, verbose_name=_('Art'))
+    url = models.URLField(max_length=500, verbose_name=_('URL'))
+    resolved = models.BooleanField(default=False, verbose_name=_('Aufgelöst'), help_text=_('Die länderspezifische Seite existiert'))
+    resolved_for = models.CharField(max_length=50, verbose_name=_('Aufgelöst für'), help_text=_('Ländername, für den der Link aufgelöst wurde'))
+    checked_at = models.DateTimeField(verbose_name=_('Geprüft am'))
+
+    class Meta:
+        verbose_name = _('Einsatzland-Link')
+        verbose_name_plural = _('Einsatzland-Links')
+        unique_together = ('land', 'kind')
+
+    def __str__(self):
+        return f"{self.land.name} - {self.get_kind_display()}"
+
+
+@receiver(post_save, sender=Einsatzland2)
+def refresh_einsatzland_links_receiver(sender, instance, **kwargs):
+    from django.db import transaction
+    from Global.tasks import refresh_country_links_task
+    transaction.on_commit(lambda: refresh_country_links_task.delay([instance.id]))
+
+
 class Einsatzstelle2(OrgModel):
     name = models.CharField(max_length=50, verbose_name=_('Einsatzstelle'))
     land = models.ForeignKey(Einsatzland2, on_delete=models.CASCADE, verbose_name=_('Einsatzland'), null=True, blank=True)
@@ -1055,11 +1134,11 @@ class UserAufgaben(OrgModel):
     faellig = models.DateField(blank=True, null=True, verbose_name=_('Fälligkeitsdatum'), help_text=_('Datum, bis zu dem die Aufgabe erledigt sein sollte'))
     last_reminder = models.DateField(blank=True, null=True, verbose_name=_('Letzte Erinnerung'), help_text=_('Datum der letzten versendeten Erinnerung'))
     erledigt_am = models.DateField(blank=True, null=True, verbose_name=_('Abgeschlossen am'), help_text=_('Datum, an dem die Aufgabe abgeschlossen wurde'))
-    file = models.FileField(upload_to='uploads/', max_length=255, blank=True, null=True, verbose_name=_('Angehängte Datei'), help_text=_('Datei, die für diese Aufgabe hochgeladen wurde'))
+    file = models.FileField(upload_to='uploads/', storage=document_storage, max_length=255, blank=True, null=True, verbose_name=_('Angehängte Datei'), help_text=_('Datei, die für diese Aufgabe hochgeladen wurde'))
     file_list = models.JSONField(blank=True, null=True, verbose_name=_('Angehängte Dateien'), help_text=_('Dateien, die für diese Aufgabe hochgeladen wurden'))
     file_downloaded_of = models.ManyToManyField(User, blank=True, verbose_name=_('Dateien heruntergeladen von'), help_text=_('Benutzer, die die Dateien heruntergeladen haben'), related_name='file_downloaded_of')
     benachrichtigung_cc = models.CharField(max_length=255, blank=True, null=True, verbose_name=_('E-Mail-Kopie an'), help_text=_('Weitere E-Mail-Adressen, die Benachrichtigungen erhalten sollen (kommagetrennt)'))
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['last_reminder'])
 
     def save(self, *args, **kwargs):
         from FW.models import Freiwilliger
@@ -1154,6 +1233,7 @@ class Post2(OrgModel):
     has_survey = models.BooleanField(default=False, verbose_name=_('Umfrage'), help_text=_('Post enthält eine Umfrage'))
     person_cluster = models.ManyToManyField(PersonCluster, verbose_name=_('Für Benutzergruppen'), help_text=_('Benutzergruppen, für die dieser Post relevant ist'), blank=True)
     already_sent_to = models.ManyToManyField(User, verbose_name=_('Bereits gesendet an'), help_text=_('Benutzer, die diesen Post bereits erhalten haben'), blank=True, related_name='already_sent_to')
+    read_by = models.ManyToManyField(User, verbose_name=_('Gelesen von'), help_text=_('Benutzer, die diesen Post bereits geöffnet haben'), blank=True, related_name='read_posts')
 
     history = HistoricalRecords()
     
@@ -1176,8 +1256,58 @@ def send_new_post_email_task_receiver(sender, instance, created, **kwargs):
     if created:
         from Global.tasks import send_new_post_email_task
         send_new_post_email_task.s(instance.id).apply_async(countdown=15*60)
-        
-        
+
+
+@receiver(post_save, sender=Post2)
+@receiver(post_delete, sender=Post2)
+def invalidate_posts_feed_receiver(sender, instance, **kwargs):
+    from Global.posts_feed import invalidate_posts_feed
+    invalidate_posts_feed(instance.org_id)
+
+
+@receiver(m2m_changed, sender=Post2.person_cluster.through)
+def invalidate_posts_feed_person_cluster_receiver(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Post2):
+        from Global.posts_feed import invalidate_posts_feed
+        invalidate_posts_feed(instance.org_id)
+
+
+@receiver(post_save, sender=Post2)
+@receiver(post_save, sender=Dokument2)
+@receiver(post_save, sender=Aufgabe2)
+@receiver(post_save, sender=KalenderEvent)
+def update_search_index_receiver(sender, instance, update_fields=None, **kwargs):
+    # The preview image does not change the indexed text
+    if hasattr(instance, '_creating_preview'):
+        return
+    from Global.search import changes_index, index_object
+    if changes_index(instance, update_fields):
+        index_object(instance, defer_file_text=True)
+
+
+@receiver(post_delete, sender=Post2)
+@receiver(post_delete, sender=Dokument2)
+@receiver(post_delete, sender=Aufgabe2)
+@receiver(post_delete, sender=KalenderEvent)
+def remove_from_search_index_receiver(sender, instance, **kwargs):
+    from Global.search import unindex_object
+    unindex_object(instance)
+
+
+@receiver(m2m_changed, sender=Post2.person_cluster.through)
+@receiver(m2m_changed, sender=Aufgabe2.person_cluster.through)
+@receiver(m2m_changed, sender=KalenderEvent.user.through)
+def update_search_index_access_receiver(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from Global.search import index_object
+    if not reverse:
+        index_object(instance)
+    elif pk_set:
+        for obj in model._base_manager.filter(pk__in=pk_set):
+            index_object(obj)
+
+
 class PostResponse(OrgModel):
     original_post = models.ForeignKey(Post2, on_delete=models.CASCADE, verbose_name=_('Originaler Post'), help_text=_('Originaler Post, auf den dieser Post antwortet'))
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_('Benutzer'), help_text=_('Benutzer, der die Antwort erstellt hat'))
@@ -1340,7 +1470,7 @@ class BilderGallery2(OrgModel):
     small_image = models.ImageField(upload_to='bilder/small/', blank=True, null=True, verbose_name=_('Kleines Bild'))
     bilder = models.ForeignKey(Bilder2, on_delete=models.CASCADE, verbose_name=_('Bild'))
 
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['small_image'])
 
     class Meta:
         verbose_name = _('Bilder Gallery')
@@ -1621,4 +1751,35 @@ class MapLocation(OrgModel):
         ordering = ['-date_created']
         
     def __str__(self):
-        return f'{self.city}, {self.country}'
\ No newline at end of file
+        return f'{self.city}, {self.country}'
+
+class DailyJobRun(models.Model):
+    """Run ledger of the daily jobs of Global.daily_jobs: one row per job, organisation and day."""
+    STATUS_CHOICES = [
+        ('S', 'Geplant'),
+        ('R', 'Läuft'),
+        ('D', 'Erledigt'),
+        ('F', 'Fehlgeschlagen'),
+    ]
+
+    job = models.CharField(max_length=50, verbose_name=_('Job'))
+    org = models.ForeignKey(Organisation, on_delete=models.CASCADE, verbose_name=_('Organisation'))
+    date = models.DateField(verbose_name=_('Datum'))
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='S', verbose_name=_('Status'))
+    scheduled_for = models.DateTimeField(blank=True, null=True, verbose_name=_('Geplant für'))
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Gestartet am'))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Beendet am'))
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_('Versuche'))
+    result = models.JSONField(blank=True, null=True, verbose_name=_('Ergebnis'))
+    error = models.TextField(blank=True, default='', verbose_name=_('Fehler'))
+
+    class Meta:
+        verbose_name = _('Tagesjob-Lauf')
+        verbose_name_plural = _('Tagesjob-Läufe')
+        ordering = ['-date', 'job', 'scheduled_for']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'org', 'date'], name='unique_daily_job_run'),
+        ]
+
+    def __str__(self):
+        return f'{self.job} {self.org} {self.date}'
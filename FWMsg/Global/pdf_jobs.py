@@ -0,0 +1,147 @@
+"""
+Background PDF rendering with a fingerprint-keyed file cache.
+
+Each job kind in ``PDF_JOBS`` names the model of the rendered object and the
+functions that compute its fingerprint, render it and name the download. The
+fingerprint covers everything shown in the document, so a cached file below
+``MEDIA_ROOT/pdf_cache`` can be served for as long as its fingerprint still
+matches. Otherwise ``render_pdf_task`` renders the document in a Celery worker
+while the browser polls ``pdf_job_status`` until the file can be downloaded.
+"""
+
+import glob
+import hashlib
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse
+from django.shortcuts import render
+from django.utils.module_loading import import_string
+
+from Global.templatetags.base_filter import get_base_template
+
+PDF_CACHE_DIR_NAME = 'pdf_cache'
+# Bump when the layout of the generated documents changes to invalidate the cache
+PDF_LAYOUT_VERSION = 1
+PDF_JOB_SIGNING_SALT = 'pdf-job'
+PDF_JOB_LINK_MAX_AGE = 24 * 60 * 60  # seconds
+
+PDF_JOBS = {
+    'application': {
+        'model': 'BW.Bewerber',
+        'fingerprint': 'ORG.pdf_utils.application_pdf_fingerprint',
+        'render': 'ORG.pdf_utils.generate_full_application_pdf',
+        'filename': 'ORG.pdf_utils.application_pdf_filename',
+    },
+    'survey_all_responses': {
+        'model': 'survey.Survey',
+        'fingerprint': 'survey.pdf_utils.survey_all_responses_pdf_fingerprint',
+        'render': 'survey.pdf_utils.generate_survey_all_responses_pdf',
+        'filename': 'survey.pdf_utils.survey_all_responses_pdf_filename',
+    },
+}
+
+
+def _call(kind, name, obj):
+    return import_string(PDF_JOBS[kind][name])(obj)
+
+
+def make_pdf_fingerprint(*parts):
+    """Hash the given values (e.g. ids and last-modified timestamps) into a cache key."""
+    data = '|'.join(str(part) for part in (PDF_LAYOUT_VERSION,) + parts)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+
+def get_job_object(kind, object_id):
+    model = apps.get_model(PDF_JOBS[kind]['model'])
+    return model._base_manager.get(id=object_id)
+
+
+def get_pdf_cache_dir(kind):
+    path = os.path.join(settings.MEDIA_ROOT, PDF_CACHE_DIR_NAME, kind)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_cached_pdf_path(kind, object_id, fingerprint):
+    path = os.path.join(get_pdf_cache_dir(kind), f'{object_id}_{fingerprint}.pdf')
+    return path if os.path.isfile(path) else None
+
+
+def store_pdf(kind, object_id, fingerprint, content):
+    """Write a rendered PDF to the cache and drop older versions for the same object."""
+    directory = get_pdf_cache_dir(kind)
+    path = os.path.join(directory, f'{object_id}_{fingerprint}.pdf')
+    for stale in glob.glob(os.path.join(directory, f'{object_id}_*.pdf')):
+        if stale != path:
+            os.remove(stale)
+    # Write to a temporary name first so a half-written file is never served
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def render_job_pdf(kind, obj):
+    """Return ``(path, fingerprint)`` of the PDF for ``obj``, rendering it if it is not cached."""
+    fingerprint = _call(kind, 'fingerprint', obj)
+    path = get_cached_pdf_path(kind, obj.id, fingerprint)
+    if not path:
+        path = store_pdf(kind, obj.id, fingerprint, _call(kind, 'render', obj))
+    return path, fingerprint
+
+
+def make_pdf_job_token(user_id, kind, object_id, fingerprint, filename):
+    return signing.dumps(
+        {'user': user_id, 'kind': kind, 'object': object_id, 'fingerprint': fingerprint, 'filename': filename},
+        salt=PDF_JOB_SIGNING_SALT,
+    )
+
+
+def resolve_pdf_job_token(token, user_id):
+    """Return ``(path, filename)`` of a rendered PDF for ``user_id`` or None if the token is invalid/expired."""
+    try:
+        data = signing.loads(token, salt=PDF_JOB_SIGNING_SALT, max_age=PDF_JOB_LINK_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if data.get('user') != user_id or data.get('kind') not in PDF_JOBS:
+        return None
+    path = get_cached_pdf_path(data['kind'], data['object'], data['fingerprint'])
+    if not path:
+        return None
+    return path, data['filename']
+
+
+def pdf_file_response(path, filename):
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+def pdf_job_response(request, kind, obj):
+    """
+    Serve the PDF for ``obj`` straight from the cache or start rendering it in
+    the background and show a page that downloads it once it is ready.
+    Callers are responsible for checking that the user may access ``obj``.
+    """
+    from Global.tasks import render_pdf_task
+
+    fingerprint = _call(kind, 'fingerprint', obj)
+    filename = _call(kind, 'filename', obj)
+    path = get_cached_pdf_path(kind, obj.id, fingerprint)
+    if path:
+        return pdf_file_response(path, filename)
+
+    result = render_pdf_task.delay(kind, obj.id, request.user.id, filename)
+    # Without a worker (CELERY_TASK_ALWAYS_EAGER) the task has already run
+    if result.ready() and result.successful():
+        path = get_cached_pdf_path(kind, obj.id, result.result['fingerprint'])
+        if path:
+            return pdf_file_response(path, filename)
+
+    return render(request, 'pdf_job_progress.html', {
+        'task_id': result.id,
+        'filename': filename,
+        'extends_base': get_base_template(request.user),
+    })
@@ -0,0 +1,78 @@
+"""
+Resources shared by the ReportLab PDF generators.
+
+Fonts, organisation logos and emoji images are loaded once per process (so
+once per web or Celery worker) and reused for every document that is rendered
+afterwards. Emoji images are only ever read from disk: first from the bundled
+set in ``settings.PDF_EMOJI_DIR``, then from the legacy download cache in
+``MEDIA_ROOT/emoji_cache``. Rendering never downloads anything.
+"""
+
+import functools
+import io
+import os
+
+from django.conf import settings
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+LEGACY_EMOJI_CACHE_DIR_NAME = 'emoji_cache'
+
+
+@functools.lru_cache(maxsize=None)
+def get_unicode_fonts():
+    """
+    Register the DejaVu Sans fonts (bundled with ReportLab) once and return
+    the names of the regular and bold font. Falls back to Helvetica.
+    """
+    try:
+        pdfmetrics.registerFont(TTFont('DejaVu-Sans', 'DejaVuSans.ttf'))
+        pdfmetrics.registerFont(TTFont('DejaVu-Sans-Bold', 'DejaVuSans-Bold.ttf'))
+        return 'DejaVu-Sans', 'DejaVu-Sans-Bold'
+    except Exception:
+        return 'Helvetica', 'Helvetica-Bold'
+
+
+@functools.lru_cache(maxsize=32)
+def _load_logo(path, mtime):
+    # mtime is part of the cache key so a replaced logo file is picked up
+    with open(path, 'rb') as file:
+        return ImageReader(io.BytesIO(file.read()))
+
+
+def get_org_logo(org):
+    """Return a cached ImageReader for the logo of ``org`` or None."""
+    if not org or not org.logo:
+        return None
+    path = os.path.join(settings.MEDIA_ROOT, str(org.logo))
+    try:
+        return _load_logo(path, os.path.getmtime(path))
+    except (OSError, ValueError):
+        return None
+
+
+def emoji_to_codepoint(emoji_char):
+    """Convert an emoji character to the codepoint string used by Twemoji file names."""
+    return '-'.join(f"{ord(c):x}" for c in emoji_char)
+
+
+def _emoji_dirs():
+    bundled = getattr(settings, 'PDF_EMOJI_DIR', None)
+    if bundled:
+        yield str(bundled)
+    yield os.path.join(settings.MEDIA_ROOT, LEGACY_EMOJI_CACHE_DIR_NAME)
+
+
+@functools.lru_cache(maxsize=2048)
+def get_emoji_image_path(emoji_char):
+    """Return the path of a PNG for ``emoji_char`` from the offline emoji sets or None."""
+    codepoint = emoji_to_codepoint(emoji_char)
+    # Twemoji omits the variation selector in most file names
+    candidates = [codepoint, codepoint.replace('-fe0f', '')]
+    for directory in _emoji_dirs():
+        for name in candidates:
+            path = os.path.join(directory, f"{name}.png")
+            if os.path.exists(path):
+                return path
+    return None
@@ -0,0 +1,117 @@
+"""
+Paginated posts feed.
+
+Builds the post listings shown on the posts overview and dashboards with a
+constant number of queries: authors are joined, response and vote counts are
+annotated as subqueries and the per-viewer unread marker is an ``EXISTS``
+check against ``Post2.read_by``. The first page of each (org, person cluster)
+feed is cached; saving or deleting a post of an org bumps the org's feed
+version and thereby invalidates all of its cached pages.
+"""
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Post2, PostResponse, PostSurveyAnswer
+
+POSTS_PER_PAGE = 12
+FIRST_PAGE_CACHE_TIMEOUT = 60 * 60
+
+
+def _feed_version_key(org_id):
+    return f'posts_feed_version_{org_id}'
+
+
+def _first_page_cache_key(org_id, person_cluster_id, per_page):
+    version = cache.get_or_set(_feed_version_key(org_id), 1, None)
+    return f'posts_feed_{org_id}_{person_cluster_id or "all"}_{per_page}_v{version}'
+
+
+def invalidate_posts_feed(org_id):
+    """Drop all cached feed pages of an organisation."""
+    try:
+        cache.incr(_feed_version_key(org_id))
+    except ValueError:
+        cache.set(_feed_version_key(org_id), 2, None)
+
+
+def _count_subquery(queryset, group_field):
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(group_field).annotate(c=Count('pk')).values('c')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def annotate_posts(posts, viewer=None):
+    """
+    Attach author, counts and read state to a ``Post2`` queryset.
+
+    Adds ``response_count``, ``vote_count`` and, if a viewer is given,
+    ``is_read`` for that viewer.
+    """
+    posts = posts.select_related('user', 'user__customuser').annotate(
+        response_count=_count_subquery(
+            PostResponse.objects.filter(original_post=OuterRef('pk')),
+            'original_post',
+        ),
+        vote_count=_count_subquery(
+            PostSurveyAnswer.votes.through.objects.filter(
+                postsurveyanswer__question__post=OuterRef('pk')
+            ),
+            'postsurveyanswer__question__post',
+        ),
+    )
+    if viewer is not None:
+        read = Post2.read_by.through.objects.filter(post2=OuterRef('pk'), user=viewer)
+        posts = posts.annotate(is_read=Exists(read))
+    return posts
+
+
+def get_feed_queryset(org, person_cluster=None):
+    posts = Post2.objects.filter(org=org)
+    if person_cluster:
+        posts = posts.filter(person_cluster=person_cluster)
+    return posts.order_by('-date_updated', '-pk')
+
+
+def mark_unread(posts, viewer):
+    """Set ``is_unread`` on each post; a viewer's own posts are never unread."""
+    for post in posts:
+        post.is_unread = viewer is not None and not post.is_read and post.user_id != viewer.id
+    return posts
+
+
+def get_posts_page(org, viewer=None, person_cluster=None, page_number=1, per_page=POSTS_PER_PAGE):
+    """
+    Return one page of the posts feed as a ``django.core.paginator.Page``.
+
+    The total count and the ids of the first page are cached per
+    (org, person cluster); annotations are always computed for the current
+    viewer, so unread markers stay exact.
+    """
+    posts = get_feed_queryset(org, person_cluster)
+    paginator = Paginator(annotate_posts(posts, viewer), per_page)
+
+    cache_key = _first_page_cache_key(org.id, getattr(person_cluster, 'id', None), per_page)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        paginator.count = cached['count']
+
+    page = paginator.get_page(page_number)
+
+    if page.number == 1 and cached is not None:
+        by_id = {post.pk: post for post in annotate_posts(Post2.objects.filter(pk__in=cached['ids']), viewer)}
+        page.object_list = [by_id[pk] for pk in cached['ids'] if pk in by_id]
+    else:
+        page.object_list = list(page.object_list)
+        if page.number == 1:
+            ids = [post.pk for post in page.object_list]
+            cache.set(cache_key, {'count': paginator.count, 'ids': ids}, FIRST_PAGE_CACHE_TIMEOUT)
+
+    mark_unread(page.object_list, viewer)
+    return page
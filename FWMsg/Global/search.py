@@ -0,0 +1,547 @@
+"""
+Full-text search over posts, documents (including the text of PDFs), chat
+messages, tasks and calendar events.
+
+All searchable objects live in one index table, ``global_search_index``: an
+FTS5 table on SQLite, a table with a weighted ``tsvector`` and GIN indexes on
+PostgreSQL (see migration ``0037_search_index``). Each entry carries the
+organisation and a list of access tokens, and a query only matches entries
+that share a token with the searching user:
+
+``org``         everything of the organisation, only for organisation users
+``all``         posts without person clusters
+``c<id>``       posts and tasks of a person cluster
+``f<id>``       documents of a folder
+``u<id>``       calendar events of a participant
+``d<id>/g<id>`` messages of a direct or group chat, only for its members
+
+The index is updated by the receivers in ``Global.models`` and
+``chat.models`` whenever one of the objects is saved with changes to its
+``INDEXED_FIELDS`` or deleted; the text of a document's file is read by
+``index_document_task`` after the commit, not in the saving request.
+``manage.py rebuild_search_index`` rebuilds the index from scratch.
+"""
+
+import html
+import logging
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'global_search_index'
+
+# The row id of an entry is ``object_id * KIND_FACTOR + kind code``
+KIND_CODES = {
+    'post': 1,
+    'dokument': 2,
+    'chat_direct': 3,
+    'chat_group': 4,
+    'aufgabe': 5,
+    'kalender': 6,
+}
+KIND_FACTOR = 8
+
+KIND_LABELS = {
+    'post': 'Post',
+    'dokument': 'Dokument',
+    'chat_direct': 'Chat',
+    'chat_group': 'Gruppenchat',
+    'aufgabe': 'Aufgabe',
+    'kalender': 'Termin',
+}
+
+# Person cluster flag needed to find objects of a kind, chats need none
+KIND_PERSON_CLUSTER_FLAGS = {
+    'post': 'posts',
+    'dokument': 'dokumente',
+    'aufgabe': 'aufgaben',
+    'kalender': 'calendar',
+}
+
+MAX_BODY_LENGTH = 200_000
+MAX_PDF_PAGES = 100
+DOCUMENT_TEXT_CACHE_TIMEOUT = 60 * 60 * 24
+
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_WORDS = 16
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 10
+
+
+@dataclass
+class SearchEntry:
+    kind: str
+    object_id: int
+    org_id: int
+    title: str
+    body: str
+    access: list = field(default_factory=list)
+    parent: str = ''
+
+    @property
+    def rowid(self):
+        return entry_rowid(self.kind, self.object_id)
+
+
+@dataclass
+class SearchResult:
+    kind: str
+    object_id: int
+    title: str
+    snippet: str
+    url: str
+
+    @property
+    def label(self):
+        return KIND_LABELS[self.kind]
+
+    def as_json(self):
+        return {
+            'kind': self.kind,
+            'label': self.label,
+            'id': self.object_id,
+            'title': self.title,
+            'snippet': self.snippet,
+            'url': self.url,
+        }
+
+
+def entry_rowid(kind, object_id):
+    return object_id * KIND_FACTOR + KIND_CODES[kind]
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _truncate(text):
+    return (text or '')[:MAX_BODY_LENGTH]
+
+
+# Text of uploaded documents
+
+def _extract_pdf_text(path):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    parts = []
+    length = 0
+    for page in reader.pages[:MAX_PDF_PAGES]:
+        text = page.extract_text() or ''
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_BODY_LENGTH:
+            break
+    return '\n'.join(parts)
+
+
+def _extract_plain_text(path):
+    with open(path, 'rb') as f:
+        return f.read(MAX_BODY_LENGTH).decode('utf-8', errors='ignore')
+
+
+def has_document_text(dokument):
+    """Whether the file of a document has text to index (PDFs and plain text files)."""
+    return bool(dokument.dokument) and (dokument.suffix == 'pdf' or dokument.mimetype.startswith('text/'))
+
+
+def extract_document_text(dokument):
+    """
+    Searchable text of a document's file: the text of PDFs and plain text
+    files, empty for everything else. Cached per content, so documents
+    uploaded several times are only read once.
+    """
+    if not has_document_text(dokument):
+        return ''
+    extract = _extract_pdf_text if dokument.suffix == 'pdf' else _extract_plain_text
+
+    cache_key = f'search_document_text_{dokument.content_hash}' if dokument.content_hash else None
+    if cache_key:
+        text = cache.get(cache_key)
+        if text is not None:
+            return text
+    try:
+        text = _truncate(extract(dokument.dokument.path))
+    except Exception as e:
+        logger.warning("Could not extract the text of %s: %s", dokument.dokument.name, e)
+        return ''
+    if cache_key:
+        cache.set(cache_key, text, DOCUMENT_TEXT_CACHE_TIMEOUT)
+    return text
+
+
+# Index entries of the searchable models
+
+def _cluster_tokens(obj):
+    return [f'c{cluster_id}' for cluster_id in obj.person_cluster.values_list('id', flat=True)]
+
+
+def post_entry(post):
+    access = _cluster_tokens(post) or ['all']
+    return SearchEntry('post', post.id, post.org_id, post.title, _truncate(post.text), ['org', *access])
+
+
+def dokument_entry(dokument, file_text=True):
+    title = dokument.titel or (dokument.dokument.name.rsplit('/', 1)[-1] if dokument.dokument else '') or dokument.link or ''
+    body = '\n'.join(filter(None, [
+        dokument.beschreibung, dokument.link, extract_document_text(dokument) if file_text else '',
+    ]))
+    return SearchEntry(
+        'dokument', dokument.id, dokument.org_id, title, _truncate(body),
+        ['org', f'f{dokument.ordner_id}'], parent=str(dokument.ordner_id),
+    )
+
+
+def aufgabe_entry(aufgabe):
+    return SearchEntry(
+        'aufgabe', aufgabe.id, aufgabe.org_id, aufgabe.name, _truncate(aufgabe.beschreibung),
+        ['org', *_cluster_tokens(aufgabe)],
+    )
+
+
+def kalender_entry(event):
+    body = '\n'.join(filter(None, [event.location, event.description]))
+    access = [f'u{user_id}' for user_id in event.user.values_list('id', flat=True)]
+    return SearchEntry('kalender', event.id, event.org_id, event.title, _truncate(body), ['org', *access])
+
+
+def chat_direct_entry(message):
+    if not message.message:
+        return None
+    return SearchEntry(
+        'chat_direct', message.id, message.org_id, message.user.get_full_name() or message.user.username,
+        _truncate(message.message), [f'd{message.chat_id}'], parent=message.chat.get_identifier(),
+    )
+
+
+def chat_group_entry(message):
+    if not message.message:
+        return None
+    return SearchEntry(
+        'chat_group', message.id, message.org_id, message.chat.name,
+        _truncate(message.message), [f'g{message.chat_id}'], parent=message.chat.get_identifier(),
+    )
+
+
+# kind: (model, entry builder, related objects loaded by the rebuild)
+SOURCES = {
+    'post': ('Global.Post2', post_entry, ('prefetch', 'person_cluster')),
+    'dokument': ('Global.Dokument2', dokument_entry, None),
+    'aufgabe': ('Global.Aufgabe2', aufgabe_entry, ('prefetch', 'person_cluster')),
+    'kalender': ('Global.KalenderEvent', kalender_entry, ('prefetch', 'user')),
+    'chat_direct': ('chat.ChatMessageDirect', chat_direct_entry, ('select', 'chat', 'user')),
+    'chat_group': ('chat.ChatMessageGroup', chat_group_entry, ('select', 'chat', 'user')),
+}
+
+
+# Fields (names and attnames) an index entry is built from; saves with
+# update_fields that contain none of them leave the entry as it is
+INDEXED_FIELDS = {
+    'post': {'title', 'text', 'org', 'org_id'},
+    'dokument': {'titel', 'dokument', 'link', 'beschreibung', 'ordner', 'ordner_id', 'org', 'org_id'},
+    'aufgabe': {'name', 'beschreibung', 'org', 'org_id'},
+    'kalender': {'title', 'location', 'description', 'org', 'org_id'},
+    'chat_direct': {'message', 'user', 'user_id', 'chat', 'chat_id', 'org', 'org_id'},
+    'chat_group': {'message', 'user', 'user_id', 'chat', 'chat_id', 'org', 'org_id'},
+}
+
+
+def kind_of(instance):
+    label = instance._meta.label
+    for kind, (model_label, _, _) in SOURCES.items():
+        if model_label == label:
+            return kind
+    return None
+
+
+def source_queryset(kind):
+    model_label, _, related = SOURCES[kind]
+    queryset = apps.get_model(model_label)._base_manager.order_by('pk')
+    if related and related[0] == 'prefetch':
+        queryset = queryset.prefetch_related(*related[1:])
+    elif related:
+        queryset = queryset.select_related(*related[1:])
+    return queryset
+
+
+def build_entry(kind, instance):
+    return SOURCES[kind][1](instance)
+
+
+# Backends
+
+class SQLiteBackend:
+    create_sql = [
+        f"""
+        CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+            title, body, org, access,
+            kind UNINDEXED, object_id UNINDEXED, parent UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+    ]
+    drop_sql = [f'DROP TABLE IF EXISTS {SEARCH_TABLE}']
+
+    def write(self, cursor, entries):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(e.rowid,) for e in entries])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE}(rowid, title, body, org, access, kind, object_id, parent) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+            [
+                (e.rowid, e.title, e.body, f'o{e.org_id}', ' '.join(e.access), e.kind, e.object_id, e.parent)
+                for e in entries
+            ],
+        )
+
+    def delete(self, cursor, rowids):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(rowid,) for rowid in rowids])
+
+    def clear(self, cursor, org_id=None):
+        if org_id is None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        else:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [f'org : "o{org_id}"'])
+
+    def search(self, cursor, terms, org_id, tokens, kinds, limit):
+        text_query = ' AND '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        access_query = ' OR '.join(f'"{token}"' for token in tokens)
+        match = f'org : "o{org_id}" AND access : ({access_query}) AND {{title body}} : ({text_query})'
+        kind_placeholders = ', '.join(['%s'] * len(kinds))
+        cursor.execute(
+            f"""
+            SELECT kind, object_id, parent, title,
+                   snippet({SEARCH_TABLE}, 1, %s, %s, '…', {SNIPPET_WORDS})
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s AND kind IN ({kind_placeholders})
+            ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0, 0.0, 0.0)
+            LIMIT %s
+            """,
+            [SNIPPET_START, SNIPPET_END, match, *kinds, limit],
+        )
+        return cursor.fetchall()
+
+
+class PostgreSQLBackend:
+    create_sql = [
+        f"""
+        CREATE TABLE {SEARCH_TABLE} (
+            id bigint PRIMARY KEY,
+            title text NOT NULL,
+            body text NOT NULL,
+            org varchar(20) NOT NULL,
+            access text[] NOT NULL,
+            kind varchar(20) NOT NULL,
+            object_id bigint NOT NULL,
+            parent varchar(255) NOT NULL,
+            document tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+            ) STORED
+        )
+        """,
+        f'CREATE INDEX {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)',
+        f'CREATE INDEX {SEARCH_TABLE}_access ON {SEARCH_TABLE} USING GIN (access)',
+        f'CREATE INDEX {SEARCH_TABLE}_org ON {SEARCH_TABLE} (org)',
+    ]
+    drop_sql = [f'DROP TABLE IF EXISTS {SEARCH_TABLE}']
+
+    def write(self, cursor, entries):
+        cursor.executemany(
+            f"""
+            INSERT INTO {SEARCH_TABLE}(id, title, body, org, access, kind, object_id, parent)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE SET
+                title = EXCLUDED.title, body = EXCLUDED.body, org = EXCLUDED.org,
+                access = EXCLUDED.access, parent = EXCLUDED.parent
+            """,
+            [
+                (e.rowid, e.title, e.body, f'o{e.org_id}', e.access, e.kind, e.object_id, e.parent)
+                for e in entries
+            ],
+        )
+
+    def delete(self, cursor, rowids):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE id = ANY(%s)', [list(rowids)])
+
+    def clear(self, cursor, org_id=None):
+        if org_id is None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        else:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE org = %s', [f'o{org_id}'])
+
+    def search(self, cursor, terms, org_id, tokens, kinds, limit):
+        text_query = ' & '.join("'{}':*".format(term.replace("'", "''")) for term in terms)
+        cursor.execute(
+            f"""
+            SELECT kind, object_id, parent, title,
+                   ts_headline('simple', body, query, %s)
+            FROM {SEARCH_TABLE}, to_tsquery('simple', %s) query
+            WHERE org = %s AND access && %s AND kind = ANY(%s) AND document @@ query
+            ORDER BY ts_rank(document, query) DESC
+            LIMIT %s
+            """,
+            [
+                f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords={SNIPPET_WORDS}, MinWords=5',
+                text_query, f'o{org_id}', list(tokens), list(kinds), limit,
+            ],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend(),
+    'postgresql': PostgreSQLBackend(),
+}
+
+
+def get_backend(vendor=None):
+    return BACKENDS.get(vendor or connection.vendor)
+
+
+# Updating the index
+
+def write_entries(entries):
+    backend = get_backend()
+    entries = [entry for entry in entries if entry is not None]
+    if backend is None or not entries:
+        return
+    with connection.cursor() as cursor:
+        backend.write(cursor, entries)
+
+
+def changes_index(instance, update_fields=None):
+    """Whether a save of ``instance`` with ``update_fields`` can change its index entry."""
+    kind = kind_of(instance)
+    if kind is None:
+        return False
+    return update_fields is None or not INDEXED_FIELDS[kind].isdisjoint(update_fields)
+
+
+def index_object(instance, defer_file_text=False):
+    """
+    Add or update the index entry of a searchable object. With
+    ``defer_file_text`` a document is indexed without the text of its file,
+    which ``index_document_task`` adds after the commit.
+    """
+    kind = kind_of(instance)
+    if kind is None or get_backend() is None:
+        return
+    if defer_file_text and kind == 'dokument' and has_document_text(instance):
+        from Global.tasks import index_document_task
+        entry = dokument_entry(instance, file_text=False)
+        transaction.on_commit(lambda: index_document_task.delay(instance.pk))
+    else:
+        entry = build_entry(kind, instance)
+    if entry is None:
+        unindex_object(instance)
+    else:
+        write_entries([entry])
+
+
+def unindex_object(instance):
+    """Remove the index entry of a searchable object."""
+    kind = kind_of(instance)
+    backend = get_backend()
+    if kind is None or backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, [entry_rowid(kind, instance.pk)])
+
+
+def clear_index(org_id=None):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.clear(cursor, org_id)
+
+
+# Searching
+
+def parse_terms(query):
+    """The words of a search query; each matches words starting with it."""
+    return TERM_RE.findall(query or '')[:MAX_TERMS]
+
+
+def access_tokens(user):
+    """The access tokens of the index entries ``user`` may find."""
+    from chat.models import ChatDirect, ChatGroup
+    from .document_tree import visible_folders
+
+    tokens = [f'u{user.id}', 'all']
+    person_cluster = user.person_cluster
+    if user.role == 'O':
+        tokens.append('org')
+    elif person_cluster is not None:
+        tokens.append(f'c{person_cluster.id}')
+        tokens += [f'f{folder_id}' for folder_id in visible_folders(user.org, person_cluster).values_list('id', flat=True)]
+    tokens += [f'd{chat_id}' for chat_id in ChatDirect.objects.filter(users=user).values_list('id', flat=True)]
+    tokens += [f'g{chat_id}' for chat_id in ChatGroup.objects.filter(users=user).values_list('id', flat=True)]
+    return tokens
+
+
+def searchable_kinds(user):
+    person_cluster = user.person_cluster
+    return [
+        kind for kind in KIND_CODES
+        if kind not in KIND_PERSON_CLUSTER_FLAGS
+        or (person_cluster is not None and getattr(person_cluster, KIND_PERSON_CLUSTER_FLAGS[kind]))
+    ]
+
+
+def format_snippet(snippet):
+    """HTML of a snippet with the matches in ``<mark>``."""
+    return html.escape(snippet or '').replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def result_url(user, kind, object_id, parent):
+    if kind == 'post':
+        return reverse('post_detail', args=[object_id])
+    if kind == 'dokument':
+        return reverse('dokumente', args=[int(parent)])
+    if kind == 'chat_direct':
+        return reverse('chat_direct', args=[parent])
+    if kind == 'chat_group':
+        return reverse('chat_group', args=[parent])
+    if kind == 'aufgabe':
+        if user.role == 'O':
+            return reverse('list_object_highlight', args=['aufgabe', object_id])
+        return reverse('aufgaben')
+    return reverse('kalender_event', args=[object_id])
+
+
+def search(user, query, kinds=None, limit=20):
+    """
+    The best matching objects ``user`` has access to, as ``SearchResult``s.
+    Every word of ``query`` has to occur, as a word or the beginning of one,
+    in the title or text; matches in the title rank higher.
+    """
+    backend = get_backend()
+    terms = parse_terms(query)
+    org = user.org
+    if backend is None or not terms or org is None:
+        return []
+    allowed = searchable_kinds(user)
+    kinds = [kind for kind in (kinds or allowed) if kind in allowed]
+    if not kinds:
+        return []
+
+    with connection.cursor() as cursor:
+        rows = backend.search(cursor, terms, org.id, access_tokens(user), kinds, limit)
+    return [
+        SearchResult(
+            kind=kind,
+            object_id=int(object_id),
+            title=title,
+            snippet=format_snippet(snippet),
+            url=result_url(user, kind, int(object_id), parent),
+        )
+        for kind, object_id, parent, title, snippet in rows
+    ]
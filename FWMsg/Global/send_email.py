@@ -482,6 +482,18 @@ def format_own_signin_denied_email(applicant_name, org_name, image_url, org_colo
     return render_to_string('mail/own_signin_denied.html', context)
 
 
+def format_export_ready_email(export_title, action_url, user_name, org_name, image_url, org_color):
+    context = {
+        'export_title': export_title,
+        'action_url': action_url,
+        'user_name': user_name,
+        'org_name': org_name,
+        'image_url': image_url,
+        'org_color': org_color,
+    }
+    return render_to_string('mail/export_ready.html', context)
+
+
 def user_display_name(user):
     return f"{user.first_name} {user.last_name}".strip() or user.username
 
@@ -514,6 +526,34 @@ def format_chat_new_message_email(
     return render_to_string('mail/chat_new_message.html', context)
 
 
+def format_chat_digest_email(
+    *,
+    chat_messages,
+    more_count,
+    group_name,
+    action_url,
+    unsubscribe_url,
+    user_name,
+    org_name,
+    image_url,
+    org_color,
+):
+    """Email listing several new chat messages; ``chat_messages`` are dicts with sender_name, message_text and has_image."""
+    context = {
+        'chat_messages': chat_messages,
+        'message_count': len(chat_messages) + more_count,
+        'more_count': more_count,
+        'group_name': group_name,
+        'action_url': action_url,
+        'unsubscribe_url': unsubscribe_url,
+        'user_name': user_name,
+        'org_name': org_name,
+        'image_url': image_url,
+        'org_color': org_color,
+    }
+    return render_to_string('mail/chat_digest.html', context)
+
+
 def format_chat_new_group_invite_email(
     *,
     sender_name,
@@ -598,6 +638,9 @@ def send_aufgaben_email(aufgabe, org):
     return True
 
 def send_new_aufgaben_email(aufgaben, org):
+    from Global.history import bulk_update_with_history
+    from Global.models import UserAufgaben
+
     action_url = f'{settings.DOMAIN_HOST}{reverse("aufgaben")}'
 
     org_color = get_org_color(org)
@@ -617,17 +660,12 @@ def send_new_aufgaben_email(aufgaben, org):
     if aufgaben[0].user.customuser.mail_notifications and send_email_with_archive(subject, email_content, settings.SERVER_EMAIL, [aufgaben[0].user.email], html_message=email_content, reply_to_list=[org.email]):
         for aufgabe in aufgaben:
             aufgabe.last_reminder = timezone.now()
-            aufgabe.currently_sending = False
-            aufgabe.save()
+        bulk_update_with_history(aufgaben, UserAufgaben, ['last_reminder'])
         return True
     
     push_content = f'Neue Aufgaben: {aufgaben[0].aufgabe.name}... und mehr'
     send_push_notification_to_user(aufgaben[0].user, subject, push_content, url=action_url)
     
-    for aufgabe in aufgaben:
-        aufgabe.currently_sending = False
-        aufgabe.save()
-    
     return False
 
 def send_new_post_email(post_id):
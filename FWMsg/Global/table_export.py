@@ -0,0 +1,197 @@
+"""
+Shared engine for tabular (XLSX/CSV) exports.
+
+Exports are described by a list of headers and an iterable of rows, so callers
+can feed rows straight from a chunked database cursor without materialising
+the whole result. CSV is streamed to the client as it is produced; XLSX is
+written with openpyxl in write-only mode into a temporary file which is then
+streamed from disk. Very large exports can instead be written in a Celery
+task which stores the file under ``MEDIA_ROOT/exports`` and emails the
+requesting user a signed download link. Stored files are deleted by a beat
+task once their link has expired.
+"""
+
+import csv
+import os
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_DIR_NAME = 'exports'
+EXPORT_LINK_MAX_AGE = 7 * 24 * 60 * 60  # seconds
+EXPORT_SIGNING_SALT = 'table-export'
+
+BOOLEAN_TRUE = {'true', '1', 'ja', 'yes'}
+BOOLEAN_FALSE = {'false', '0', 'nein', 'no'}
+
+
+def convert_attribute_column(series, attr_type):
+    """
+    Convert a column of raw ``UserAttribute`` values according to the
+    attribute type ('N' number, 'D' date, 'B' boolean; others stay text).
+    """
+    if attr_type == 'N':
+        return pd.to_numeric(series, errors='coerce')
+    if attr_type == 'D':
+        return pd.to_datetime(series, errors='coerce').dt.strftime('%d.%m.%Y')
+    if attr_type == 'B':
+        normalized = series.astype(str).str.strip().str.lower()
+        return normalized.map(
+            lambda v: True if v in BOOLEAN_TRUE else False if v in BOOLEAN_FALSE else None
+        ).where(series.notna(), None)
+    return series
+
+
+def _cell(value):
+    """Normalise pandas/numpy scalars so openpyxl and csv can write them."""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def write_xlsx(headers, rows, file):
+    """Write rows into ``file`` as an XLSX workbook using openpyxl write-only mode."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(headers))
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+    workbook.save(file)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(headers, rows):
+    writer = csv.writer(_Echo(), delimiter=';')
+    # BOM so Excel detects UTF-8
+    yield '\ufeff' + writer.writerow(list(headers))
+    for row in rows:
+        yield writer.writerow(['' if _cell(value) is None else _cell(value) for value in row])
+
+
+def _safe_filename(filename):
+    filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
+    return filename.replace(' ', '_')
+
+
+def table_response(headers, rows, filename, file_format='xlsx'):
+    """
+    Return a streaming download response for an export.
+
+    Args:
+        headers (list): Column headers
+        rows (iterable): Rows as sequences, may be a generator
+        filename (str): Download filename without extension
+        file_format (str): 'xlsx' or 'csv'
+    """
+    filename = _safe_filename(f'{filename}.{file_format}')
+    if file_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(headers, rows), content_type=CSV_CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # The temporary file is removed once the response closes it
+    file = tempfile.TemporaryFile()
+    write_xlsx(headers, rows, file)
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def get_export_dir():
+    path = os.path.join(settings.MEDIA_ROOT, EXPORT_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_export_path(filename, file_format):
+    """Return ``(stored_name, path)`` for a new file below MEDIA_ROOT/exports."""
+    stored_name = f'{uuid.uuid4().hex}_{_safe_filename(filename)}.{file_format}'
+    return stored_name, os.path.join(get_export_dir(), stored_name)
+
+
+def save_export_file(headers, rows, filename, file_format='xlsx'):
+    """Write an export below MEDIA_ROOT/exports and return the stored file name."""
+    stored_name, path = new_export_path(filename, file_format)
+    if file_format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            for line in iter_csv(headers, rows):
+                file.write(line)
+    else:
+        with open(path, 'wb') as file:
+            write_xlsx(headers, rows, file)
+    return stored_name
+
+
+def delete_expired_exports(max_age=EXPORT_LINK_MAX_AGE):
+    """Delete stored exports older than ``max_age`` seconds and return how many were deleted."""
+    export_dir = get_export_dir()
+    cutoff = time.time() - max_age
+    deleted = 0
+    for entry in os.scandir(export_dir):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            deleted += 1
+    return deleted
+
+
+def make_export_token(user_id, stored_name):
+    return signing.dumps({'user': user_id, 'file': stored_name}, salt=EXPORT_SIGNING_SALT)
+
+
+def resolve_export_token(token, user_id):
+    """Return the path of an exported file for ``user_id`` or None if the token is invalid/expired."""
+    try:
+        data = signing.loads(token, salt=EXPORT_SIGNING_SALT, max_age=EXPORT_LINK_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if data.get('user') != user_id:
+        return None
+    path = os.path.join(get_export_dir(), os.path.basename(data.get('file', '')))
+    if not os.path.isfile(path):
+        return None
+    return path
+
+
+def send_export_ready_email(user, stored_name, export_title):
+    """Email ``user`` a signed link to a stored export."""
+    from django.urls import reverse
+    from Global.send_email import format_export_ready_email, get_logo_url, get_org_color, send_email_with_archive
+
+    token = make_export_token(user.id, stored_name)
+    action_url = f"{settings.DOMAIN_HOST}{reverse('download_export', args=[token])}"
+    org = user.customuser.org
+    email_content = format_export_ready_email(
+        export_title=export_title,
+        action_url=action_url,
+        user_name=f"{user.first_name} {user.last_name}".strip() or user.username,
+        org_name=org.name,
+        image_url=get_logo_url(org),
+        org_color=get_org_color(org),
+    )
+    subject = f'Export bereit: {export_title}'
+    return send_email_with_archive(subject, email_content, settings.SERVER_EMAIL, [user.email], html_message=email_content, save_to_sent=False)
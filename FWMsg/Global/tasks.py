@@ -251,3 +251,116 @@ def send_change_request_decision_email_task(change_request_id):
     except Exception as e:
         logging.error(f"Error in send_change_request_decision_email_task: {e}")
         return False
+
+
+@shared_task(bind=True, ignore_result=False)
+def render_pdf_task(self, kind, object_id, user_id, filename):
+    """Render (or reuse) the cached PDF of a job kind from Global.pdf_jobs.PDF_JOBS."""
+    from Global.pdf_jobs import get_job_object, render_job_pdf
+
+    self.update_state(state='PROGRESS', meta={'user_id': user_id})
+    _, fingerprint = render_job_pdf(kind, get_job_object(kind, object_id))
+    return {
+        'user_id': user_id,
+        'kind': kind,
+        'object_id': object_id,
+        'fingerprint': fingerprint,
+        'filename': filename,
+    }
+
+
+@shared_task
+def refresh_country_links_task(land_ids=None, force=False):
+    """Resolve the external country links of Global.link_resolver (all countries by default)."""
+    from Global.link_resolver import refresh_country_links
+
+    return refresh_country_links(land_ids, force=force)
+
+
+@shared_task
+def index_document_task(dokument_id):
+    """Index a document together with the text of its file (see Global.search)."""
+    from Global.models import Dokument2
+    from Global.search import index_object
+
+    dokument = Dokument2._base_manager.filter(id=dokument_id).first()
+    if dokument is not None:
+        index_object(dokument)
+
+
+@shared_task
+def collect_blob_garbage_task():
+    """Delete blobs of Global.blob_store that no uploaded file links to anymore."""
+    from Global.blob_store import collect_garbage
+
+    count, size = collect_garbage()
+    return {'blobs': count, 'bytes': size}
+
+
+@shared_task
+def cleanup_exports_task():
+    """Delete stored exports whose download link has expired."""
+    from Global.table_export import delete_expired_exports
+
+    return {'deleted': delete_expired_exports()}
+
+
+@shared_task
+def cleanup_task_results_task(batch_size=5000):
+    """Delete task results older than CELERY_RESULT_EXPIRES in batches."""
+    from django_celery_results.models import GroupResult, TaskResult
+
+    deleted = {}
+    for model in (TaskResult, GroupResult):
+        expired = model.objects.get_all_expired(settings.CELERY_RESULT_EXPIRES)
+        count = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            model.objects.filter(id__in=ids).delete()
+            count += len(ids)
+        deleted[model._meta.model_name] = count
+    logging.info(f"Deleted expired task results: {deleted}")
+    return deleted
+
+
+@shared_task
+def dispatch_daily_jobs_task(jobs=None, window=None):
+    """Split the daily jobs of Global.daily_jobs per organisation and schedule them staggered."""
+    from Global.daily_jobs import dispatch_daily_jobs
+
+    return {'scheduled': dispatch_daily_jobs(jobs, window=window)}
+
+
+@shared_task(bind=True, max_retries=3, ignore_result=False)
+def run_daily_job_task(self, job, org_id, date):
+    """Run a daily job for one organisation; failed runs are retried with backoff."""
+    from datetime import date as date_cls
+
+    from django.core.mail import mail_admins
+
+    from Global.daily_jobs import run_daily_job
+
+    try:
+        return run_daily_job(job, org_id, date_cls.fromisoformat(date))
+    except Exception as exc:
+        logging.error(f"Daily job {job} of organisation {org_id} failed: {exc}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=60 * (2 ** self.request.retries), exc=exc)
+        mail_admins(
+            subject='Celery Task Failed',
+            message=f"Daily job {job} of organisation {org_id} on {date} failed after {self.max_retries} retries. Error: {exc}",
+            fail_silently=True,
+        )
+        raise
+
+
+@shared_task
+def send_aufgaben_report_task(date):
+    """Mail the admins the summary of the day's task reminders."""
+    from datetime import date as date_cls
+
+    from Global.daily_jobs import send_aufgaben_report
+
+    return send_aufgaben_report(date_cls.fromisoformat(date))
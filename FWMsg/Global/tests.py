@@ -3,6 +3,7 @@ from django.urls import reverse
 from django.contrib.auth.models import User
 from django.core import signing
 from datetime import datetime, timedelta
+from django.utils import timezone
 from .models import CustomUser, ProfilUser2, UserAufgaben, Aufgabe2, KalenderEvent, PersonCluster, Bilder2, BilderGallery2, Dokument2, Ordner2, DokumentColor2, ChangeRequest, Einsatzland2, Einsatzstelle2
 from ORG.models import Organisation
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -169,6 +170,9 @@ class FileServingViewsTests(TestCase):
     """Tests for file serving views: serve_bilder, serve_small_bilder, serve_dokument"""
     
     def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
         # Disable the post_save signal for Dokument2 to avoid PDF preview generation issues
         post_save.disconnect(receiver=None, sender=Dokument2, dispatch_uid='create_preview_image')
         
@@ -959,6 +963,9 @@ class DokumentViewsTests(TestCase):
     """Tests for document-related views: dokumente, add_dokument, add_ordner, remove_dokument, remove_ordner"""
     
     def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
         # Create test organization
         self.org = Organisation.objects.create(name="Test Org")
         
@@ -1500,13 +1507,81 @@ class DokumentViewsTests(TestCase):
         folder_names = [item['ordner'].ordner_name for item in response.context['folder_structure']]
         self.assertIn('Test Folder', folder_names)
         
-        # Check that our test document is in the structure
-        documents = []
-        for item in response.context['folder_structure']:
-            if item['ordner'] == self.doc_folder:
-                documents = item['dokumente']
-                break
-        self.assertIn(self.dokument, documents)
+        # Documents are counted in the tree and loaded when the folder is opened
+        counts = {item['ordner'].id: item['count'] for item in response.context['folder_structure']}
+        self.assertEqual(counts[self.doc_folder.id], 1)
+        response = self.client.get(reverse('dokumente_ordner', args=[self.doc_folder.id]))
+        self.assertIn(self.dokument, response.context['page'])
+
+    def test_document_type_is_stored_on_save(self):
+        self.assertEqual(self.dokument.mimetype, 'text/plain')
+        self.assertEqual(self.dokument.suffix, 'txt')
+        self.assertEqual(self.dokument.get_document_type(), 'text/plain')
+        link_dokument = Dokument2.objects.create(org=self.org, ordner=self.doc_folder, link='https://example.com')
+        self.assertEqual(link_dokument.get_document_type(), 'unknown')
+        self.assertEqual(link_dokument.suffix, '')
+
+    def test_folder_tree_is_cached_and_invalidated(self):
+        from .document_tree import get_folder_tree
+        tree = get_folder_tree(self.org)
+        self.assertEqual([(item['ordner'], item['count']) for item in tree], [(self.doc_folder, 1)])
+        with self.assertNumQueries(0):
+            tree = get_folder_tree(self.org)
+            [typ.name for item in tree for typ in item['ordner'].typ.all()]
+            [item['ordner'].color for item in tree]
+
+        Dokument2.objects.create(org=self.org, ordner=self.doc_folder, link='https://example.com')
+        self.assertEqual(get_folder_tree(self.org)[0]['count'], 2)
+
+        self.doc_folder.typ.remove(self.freiwillige_cluster)
+        self.assertEqual(get_folder_tree(self.org, self.freiwillige_cluster), [])
+
+    def test_folder_tree_query_count_does_not_grow_with_folders(self):
+        from .document_tree import compute_folder_tree
+        with self.assertNumQueries(2):
+            compute_folder_tree(self.org)
+        for i in range(5):
+            folder = Ordner2.objects.create(ordner_name=f"Folder {i}", org=self.org, color=self.doc_color)
+            folder.typ.add(self.admin_cluster)
+            Dokument2.objects.create(org=self.org, ordner=folder, link='https://example.com')
+        with self.assertNumQueries(2):
+            self.assertEqual(len(compute_folder_tree(self.org)), 6)
+
+    def test_dokumente_ordner_paginates(self):
+        for i in range(30):
+            Dokument2.objects.create(org=self.org, ordner=self.doc_folder, link=f'https://example.com/{i}')
+        self.client.force_login(self.freiwillige_user)
+        response = self.client.get(reverse('dokumente_ordner', args=[self.doc_folder.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 24)
+        self.assertContains(response, '?page=2')
+
+        response = self.client.get(reverse('dokumente_ordner', args=[self.doc_folder.id]) + '?page=2')
+        self.assertEqual(len(response.context['page']), 7)
+        self.assertIn(self.dokument, response.context['page'])
+        self.assertNotContains(response, 'load-more-documents')
+
+    def test_dokumente_ordner_hidden_folder(self):
+        hidden_folder = Ordner2.objects.create(ordner_name="Hidden", org=self.org)
+        hidden_folder.typ.add(self.org_cluster)
+        self.client.force_login(self.freiwillige_user)
+        response = self.client.get(reverse('dokumente_ordner', args=[hidden_folder.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_dokumente_tree_json(self):
+        self.client.force_login(self.freiwillige_user)
+        response = self.client.get(reverse('dokumente_tree'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['folders'], [{
+            'id': self.doc_folder.id,
+            'name': 'Test Folder',
+            'color': '#FF0000',
+            'person_clusters': [
+                {'id': cluster.id, 'name': cluster.name}
+                for cluster in self.doc_folder.typ.all()
+            ],
+            'count': 1,
+        }])
 
 
 class ProfileViewsTests(TestCase):
@@ -2838,3 +2913,948 @@ class ChangeRequestTests(TestCase):
         change_request.save()
         
         self.assertEqual(change_request.get_change_type_display(), 'Einsatzstelle')
+
+
+class PostsFeedTests(TestCase):
+    """Tests for the paginated posts feed used by posts_overview."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+        self.org = Organisation.objects.create(name="Test Org")
+        self.cluster = PersonCluster.objects.create(
+            org=self.org, name="Freiwillige", view='F', posts=True
+        )
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        CustomUser.objects.create(user=self.author, org=self.org, person_cluster=self.cluster)
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        CustomUser.objects.create(user=self.reader, org=self.org, person_cluster=self.cluster)
+
+    def _create_posts(self, count):
+        from Global.models import Post2
+        posts = []
+        with patch('Global.tasks.send_new_post_email_task'):
+            for i in range(count):
+                post = Post2.objects.create(org=self.org, user=self.author, title=f"Post {i}")
+                post.person_cluster.add(self.cluster)
+                posts.append(post)
+        return posts
+
+    def test_posts_overview_is_paginated(self):
+        from Global.posts_feed import POSTS_PER_PAGE
+        self._create_posts(POSTS_PER_PAGE + 3)
+
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts_overview'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['posts']), POSTS_PER_PAGE)
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+
+        response = self.client.get(reverse('posts_overview') + '?page=2')
+        self.assertEqual(len(response.context['posts']), 3)
+
+    def test_feed_annotates_counts_and_unread_state(self):
+        from Global.models import PostResponse
+        from Global.posts_feed import get_posts_page
+        post, other = self._create_posts(2)
+        PostResponse.objects.create(org=self.org, original_post=post, user=self.reader, text="Antwort")
+        post.read_by.add(self.reader)
+
+        page = get_posts_page(self.org, viewer=self.reader, person_cluster=self.cluster)
+        by_id = {p.pk: p for p in page.object_list}
+        self.assertEqual(by_id[post.pk].response_count, 1)
+        self.assertEqual(by_id[other.pk].response_count, 0)
+        self.assertFalse(by_id[post.pk].is_unread)
+        self.assertTrue(by_id[other.pk].is_unread)
+
+        page = get_posts_page(self.org, viewer=self.author, person_cluster=self.cluster)
+        self.assertFalse(any(p.is_unread for p in page.object_list))
+
+    def test_cached_first_page_is_invalidated_by_new_post(self):
+        from Global.posts_feed import get_posts_page
+        self._create_posts(2)
+        self.assertEqual(len(get_posts_page(self.org, viewer=self.reader, person_cluster=self.cluster).object_list), 2)
+
+        with self.assertNumQueries(1):
+            get_posts_page(self.org, viewer=self.reader, person_cluster=self.cluster)
+
+        self._create_posts(1)
+        self.assertEqual(len(get_posts_page(self.org, viewer=self.reader, person_cluster=self.cluster).object_list), 3)
+
+    def test_post_detail_marks_post_as_read(self):
+        post, = self._create_posts(1)
+        self.client.force_login(self.reader)
+        self.client.get(reverse('post_detail', args=[post.id]))
+        self.assertTrue(post.read_by.filter(pk=self.reader.pk).exists())
+
+
+class PdfJobTests(TestCase):
+    """Tests for background PDF rendering with the fingerprint cache (Global.pdf_jobs)."""
+
+    def setUp(self):
+        from BW.models import ApplicationAnswer, ApplicationQuestion, Bewerber
+
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.org = Organisation.objects.create(name="Test Org")
+        org_cluster = PersonCluster.objects.create(org=self.org, name="Organisation", view='O')
+        bw_cluster = PersonCluster.objects.create(org=self.org, name="Bewerber", view='B')
+        self.org_user = User.objects.create_user(username='orguser', password='testpass123')
+        CustomUser.objects.create(user=self.org_user, org=self.org, person_cluster=org_cluster)
+        self.other_user = User.objects.create_user(username='other', password='testpass123')
+        CustomUser.objects.create(user=self.other_user, org=self.org, person_cluster=org_cluster)
+
+        applicant = User.objects.create_user(username='applicant', first_name='Anna', last_name='Test')
+        CustomUser.objects.create(user=applicant, org=self.org, person_cluster=bw_cluster)
+        # Bewerber is created by the CustomUser post_save signal
+        self.bewerber = Bewerber.objects.get(user=applicant)
+        question = ApplicationQuestion.objects.create(org=self.org, question="Warum?")
+        self.answer = ApplicationAnswer.objects.create(org=self.org, user=applicant, question=question, answer="Darum")
+
+        self.client.force_login(self.org_user)
+
+    def _download(self):
+        return self.client.get(reverse('application_answer_download', args=[self.bewerber.id]))
+
+    def test_application_pdf_is_rendered_once_and_cached(self):
+        import ORG.pdf_utils
+
+        with patch('ORG.pdf_utils.generate_full_application_pdf', wraps=ORG.pdf_utils.generate_full_application_pdf) as render:
+            first = self._download()
+            second = self._download()
+
+        self.assertEqual(render.call_count, 1)
+        for response in (first, second):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_changed_answer_invalidates_cached_pdf(self):
+        from Global.pdf_jobs import PDF_CACHE_DIR_NAME
+        from ORG.pdf_utils import application_pdf_fingerprint
+
+        self._download()
+        fingerprint = application_pdf_fingerprint(self.bewerber)
+
+        self.answer.answer = "Weil"
+        self.answer.save()
+        self.assertNotEqual(application_pdf_fingerprint(self.bewerber), fingerprint)
+
+        with patch('ORG.pdf_utils.generate_full_application_pdf', return_value=b'%PDF-new') as render:
+            response = self._download()
+        render.assert_called_once()
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-new')
+        # The stale version has been replaced
+        cache_dir = os.path.join(self.media_root.name, PDF_CACHE_DIR_NAME, 'application')
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_pending_job_shows_progress_page(self):
+        pending = Mock(id='task-1')
+        pending.ready.return_value = False
+        with patch('Global.tasks.render_pdf_task.delay', return_value=pending):
+            response = self._download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'pdf_job_progress.html')
+        self.assertContains(response, reverse('pdf_job_status', args=['task-1']))
+
+    def test_job_status_and_download_are_bound_to_the_requesting_user(self):
+        from Global.tasks import render_pdf_task
+
+        result = render_pdf_task.apply(args=['application', self.bewerber.id, self.org_user.id, 'bewerbung.pdf'])
+        finished = Mock(state='SUCCESS', info=result.result)
+        finished.failed.return_value = False
+        finished.successful.return_value = True
+
+        with patch('Global.views.AsyncResult', return_value=finished):
+            data = self.client.get(reverse('pdf_job_status', args=[result.id])).json()
+            self.client.force_login(self.other_user)
+            other_data = self.client.get(reverse('pdf_job_status', args=[result.id])).json()
+
+        self.assertEqual(data['state'], 'SUCCESS')
+        self.assertEqual(other_data, {'state': 'PENDING'})
+        self.assertEqual(self.client.get(data['download_url']).status_code, 404)
+
+        self.client.force_login(self.org_user)
+        response = self.client.get(data['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('bewerbung.pdf', response['Content-Disposition'])
+
+    def test_emoji_images_are_only_read_from_disk(self):
+        from Global.pdf_resources import get_emoji_image_path
+
+        emoji_dir = os.path.join(self.media_root.name, 'emoji')
+        os.makedirs(emoji_dir)
+        with open(os.path.join(emoji_dir, '1f600.png'), 'wb') as file:
+            file.write(b'png')
+
+        get_emoji_image_path.cache_clear()
+        self.addCleanup(get_emoji_image_path.cache_clear)
+        with self.settings(PDF_EMOJI_DIR=emoji_dir), patch('urllib.request.urlretrieve') as download:
+            self.assertEqual(get_emoji_image_path('\U0001F600'), os.path.join(emoji_dir, '1f600.png'))
+            self.assertIsNone(get_emoji_image_path('\U0001F680'))
+        download.assert_not_called()
+
+
+class DashboardFeedTests(TestCase):
+    """Tests for the merged posts/images dashboard feed (Global.dashboard_feed)."""
+
+    def setUp(self):
+        self.org = Organisation.objects.create(name="Test Org")
+        self.cluster = PersonCluster.objects.create(
+            org=self.org, name="Freiwillige", view='F', posts=True, bilder=True
+        )
+        self.user = User.objects.create_user(username='fw', password='testpass123')
+        CustomUser.objects.create(user=self.user, org=self.org, person_cluster=self.cluster)
+        self.base = timezone.now()
+
+    def _post(self, minutes_ago):
+        from Global.models import Post2
+        with patch('Global.tasks.send_new_post_email_task'):
+            post = Post2.objects.create(org=self.org, user=self.user, title=f"Post {minutes_ago}")
+        post.person_cluster.add(self.cluster)
+        Post2.objects.filter(pk=post.pk).update(date_updated=self.base - timedelta(minutes=minutes_ago))
+        return post
+
+    def _bild(self, minutes_ago):
+        bild = Bilder2.objects.create(org=self.org, user=self.user, titel=f"Bild {minutes_ago}")
+        Bilder2.objects.filter(pk=bild.pk).update(date_created=self.base - timedelta(minutes=minutes_ago))
+        return bild
+
+    def _sources(self):
+        from Global.dashboard_feed import get_feed_sources
+        return get_feed_sources(self.user)
+
+    def test_feed_merges_posts_and_images_by_date(self):
+        from Global.dashboard_feed import get_dashboard_feed
+
+        post_new, bild_mid, post_old = self._post(1), self._bild(2), self._post(3)
+        self._bild(4)
+
+        posts, bilder = self._sources()
+        with self.assertNumQueries(3):  # posts, images, gallery prefetch
+            items, next_cursor = get_dashboard_feed(posts, bilder, limit=3, viewer=self.user)
+
+        self.assertEqual([(item['type'], item['id']) for item in items], [
+            ('post', post_new.id), ('image', bild_mid.id), ('post', post_old.id),
+        ])
+        self.assertIsNotNone(next_cursor)
+
+    def test_cursor_pages_through_feed_without_gaps_or_duplicates(self):
+        from Global.dashboard_feed import get_dashboard_feed
+
+        expected = set()
+        for minutes in range(5):
+            expected.add(('post', self._post(minutes).id))
+            # Images with the same timestamp as a post exercise the tie-breaking
+            expected.add(('image', self._bild(minutes).id))
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            posts, bilder = self._sources()
+            items, cursor = get_dashboard_feed(posts, bilder, cursor=cursor, limit=3, viewer=self.user)
+            seen.extend((item['type'], item['id']) for item in items)
+            pages += 1
+            if not cursor:
+                break
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), expected)
+
+    def test_invalid_cursor_starts_from_the_top(self):
+        from Global.dashboard_feed import get_dashboard_feed
+
+        post = self._post(1)
+        posts, bilder = self._sources()
+        items, _ = get_dashboard_feed(posts, bilder, cursor='not-a-cursor', viewer=self.user)
+        self.assertEqual([item['id'] for item in items], [post.id])
+
+    def test_load_more_endpoint(self):
+        from Global.dashboard_feed import FEED_PAGE_SIZE
+
+        for minutes in range(FEED_PAGE_SIZE + 2):
+            self._post(minutes)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('fw_home'))
+        cursor = response.context['feed_next_cursor']
+        self.assertEqual(len(response.context['feed']), FEED_PAGE_SIZE)
+
+        data = self.client.get(reverse('dashboard_feed'), {'cursor': cursor}).json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('Post %d' % (FEED_PAGE_SIZE + 1), data['html'])
+
+    def test_task_counts_use_one_query(self):
+        from Global.dashboard_feed import get_task_counts
+
+        aufgabe = Aufgabe2.objects.create(org=self.org, name="Aufgabe")
+        other_user = User.objects.create_user(username='fw2')
+        CustomUser.objects.create(user=other_user, org=self.org, person_cluster=self.cluster)
+        UserAufgaben.objects.create(org=self.org, user=self.user, aufgabe=aufgabe, erledigt=True)
+        UserAufgaben.objects.create(org=self.org, user=other_user, aufgabe=aufgabe, pending=True)
+
+        with self.assertNumQueries(1):
+            counts = get_task_counts(UserAufgaben.objects.filter(org=self.org))
+        self.assertEqual(counts, {'erledigt': 1, 'offen': 0, 'pending': 1, 'gesamt': 2})
+
+
+class CountryLinkResolverTests(TestCase):
+    """Tests for the background resolution of external country links against a local stub server."""
+
+    def setUp(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        requested = self.requested = []
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requested.append(self.path)
+                self.send_response(200 if self.path == '/de/service/laender/tuerkei-node/' else 404)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base_url = f'http://127.0.0.1:{server.server_port}'
+        url_override = self.settings(AUSWAERTIGES_AMT_URL=self.base_url)
+        url_override.enable()
+        self.addCleanup(url_override.disable)
+
+        self.org = Organisation.objects.create(name="Test Org")
+        self.tuerkei = Einsatzland2.objects.create(org=self.org, name='Türkei', code='TR')
+        self.atlantis = Einsatzland2.objects.create(org=self.org, name='Atlantis', code='AT')
+
+    def test_unresolved_link_falls_back_without_network(self):
+        from Global.link_resolver import get_country_link
+
+        self.assertEqual(get_country_link(self.tuerkei, 'auswaertiges_amt'), f'{self.base_url}/de/reiseundsicherheit')
+        self.assertEqual(self.requested, [])
+
+    def test_refresh_stores_resolved_and_fallback_links(self):
+        from Global.link_resolver import get_country_link, refresh_country_links
+
+        self.assertEqual(refresh_country_links(), 2)
+
+        self.assertEqual(
+            get_country_link(self.tuerkei, 'auswaertiges_amt'),
+            f'{self.base_url}/de/service/laender/tuerkei-node/'
+        )
+        self.assertEqual(get_country_link(self.atlantis, 'auswaertiges_amt'), f'{self.base_url}/de/reiseundsicherheit')
+
+    def test_fresh_links_are_not_checked_again(self):
+        from Global.link_resolver import refresh_country_links
+
+        refresh_country_links()
+        self.requested.clear()
+
+        self.assertEqual(refresh_country_links(), 0)
+        self.assertEqual(self.requested, [])
+
+        # Renaming a country resolves its link again
+        self.atlantis.name = 'Türkei'
+        self.atlantis.save()
+        self.assertEqual(refresh_country_links(), 1)
+        self.assertEqual(self.requested, ['/de/service/laender/tuerkei-node/'])
+
+    def test_unreachable_site_keeps_previous_link(self):
+        from Global.link_resolver import get_country_link, refresh_country_links
+
+        refresh_country_links()
+        with self.settings(AUSWAERTIGES_AMT_URL='http://127.0.0.1:1'), self.assertLogs('Global.link_resolver', 'WARNING'):
+            self.assertEqual(refresh_country_links(force=True), 0)
+
+        self.assertEqual(
+            get_country_link(self.tuerkei, 'auswaertiges_amt'),
+            f'{self.base_url}/de/service/laender/tuerkei-node/'
+        )
+
+
+class RequestContextTests(TestCase):
+    """The current request (and with it the org scoping) follows async tasks."""
+
+    def setUp(self):
+        self.org1 = Organisation.objects.create(name="Org One")
+        self.org2 = Organisation.objects.create(name="Org Two")
+
+    def _request(self, org):
+        from django.test import RequestFactory
+        request = RequestFactory().get('/')
+        request.user = Mock(org=org, is_superuser=False)
+        return request
+
+    def _scoped_org_id(self):
+        query = str(PersonCluster.objects.all().query)
+        return next(org.id for org in (self.org1, self.org2) if f'"org_id" = {org.id}' in query)
+
+    def test_sync_middleware_sets_and_clears_request(self):
+        from FWMsg.middleware import RequestMiddleware, get_current_request
+        request = self._request(self.org1)
+        seen = []
+        middleware = RequestMiddleware(lambda r: seen.append((get_current_request(), self._scoped_org_id())))
+        middleware(request)
+        self.assertEqual(seen, [(request, self.org1.id)])
+        self.assertIsNone(get_current_request())
+
+    def test_concurrent_async_requests_are_isolated(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from FWMsg.middleware import RequestMiddleware, get_current_request
+
+        both_started = asyncio.Barrier(2)
+
+        async def view(request):
+            # Both requests are in flight before either reads the context
+            await both_started.wait()
+            scoped_org_id = await sync_to_async(self._scoped_org_id, thread_sensitive=False)()
+            return get_current_request(), scoped_org_id
+
+        middleware = RequestMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request1, request2 = self._request(self.org1), self._request(self.org2)
+
+        async def run():
+            return await asyncio.gather(middleware(request1), middleware(request2))
+
+        self.assertEqual(asyncio.run(run()), [(request1, self.org1.id), (request2, self.org2.id)])
+        self.assertIsNone(get_current_request())
+
+    def test_async_middleware_clears_request_on_error(self):
+        import asyncio
+        from FWMsg.middleware import RequestMiddleware, get_current_request
+
+        async def view(request):
+            raise ValueError
+
+        async def run():
+            with self.assertRaises(ValueError):
+                await RequestMiddleware(view)(self._request(self.org1))
+            return get_current_request()
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_websocket_middleware_exposes_scope_user(self):
+        import asyncio
+        from FWMsg.middleware import WebsocketRequestMiddleware, get_current_request
+        user = Mock(org=self.org2, is_superuser=False)
+        seen = []
+
+        async def consumer(scope, receive, send):
+            seen.append((get_current_request().user, self._scoped_org_id()))
+
+        asyncio.run(WebsocketRequestMiddleware(consumer)({'user': user}, None, None))
+        self.assertEqual(seen, [(user, self.org2.id)])
+
+
+class BlobStoreTests(TestCase):
+    """Uploaded documents with the same content share one blob."""
+
+    def setUp(self):
+        import shutil
+        from django.test import override_settings
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.org = Organisation.objects.create(name="Blob Org")
+        self.folder1 = Ordner2.objects.create(ordner_name="Handbuch 2025", org=self.org)
+        self.folder2 = Ordner2.objects.create(ordner_name="Handbuch 2026", org=self.org)
+
+    def _upload(self, folder, content=b"Handbuch", name="handbuch.txt"):
+        return Dokument2.objects.create(
+            org=self.org, ordner=folder, dokument=SimpleUploadedFile(name, content, content_type="text/plain")
+        )
+
+    def test_same_content_is_stored_once(self):
+        from .blob_store import blob_path
+        dokument1 = self._upload(self.folder1)
+        dokument2 = self._upload(self.folder2)
+        other = self._upload(self.folder2, content=b"Formular", name="formular.txt")
+
+        self.assertNotEqual(dokument1.dokument.name, dokument2.dokument.name)
+        self.assertEqual(dokument1.content_hash, dokument2.content_hash)
+        self.assertTrue(os.path.samefile(dokument1.dokument.path, dokument2.dokument.path))
+        self.assertTrue(os.path.samefile(dokument1.dokument.path, blob_path(dokument1.content_hash)))
+        self.assertFalse(os.path.samefile(dokument1.dokument.path, other.dokument.path))
+        with open(dokument2.dokument.path, 'rb') as f:
+            self.assertEqual(f.read(), b"Handbuch")
+
+    def test_blob_is_removed_with_last_document(self):
+        from .blob_store import blob_path, collect_garbage
+        dokument1 = self._upload(self.folder1)
+        dokument2 = self._upload(self.folder2)
+        blob = blob_path(dokument1.content_hash)
+
+        dokument1.delete()
+        self.assertTrue(os.path.isfile(dokument2.dokument.path))
+        self.assertEqual(collect_garbage(), (0, 0))
+
+        dokument2.delete()
+        self.assertEqual(collect_garbage(), (1, len(b"Handbuch")))
+        self.assertFalse(os.path.exists(blob))
+
+    def test_preview_is_shared_by_same_content(self):
+        dokument1 = self._upload(self.folder1)
+        preview_name = 'media/dokument/preview.jpg'
+        os.makedirs(os.path.dirname(dokument1.preview_image.storage.path(preview_name)), exist_ok=True)
+        with open(dokument1.preview_image.storage.path(preview_name), 'wb') as f:
+            f.write(b"jpg")
+        Dokument2.objects.filter(pk=dokument1.pk).update(preview_image=preview_name)
+
+        with patch.object(Dokument2, 'get_preview_converted') as get_preview_converted:
+            dokument2 = self._upload(self.folder2)
+        get_preview_converted.assert_not_called()
+        self.assertEqual(dokument2.preview_image.name, preview_name)
+
+        preview_path = dokument2.preview_image.path
+        dokument2.delete()
+        self.assertTrue(os.path.isfile(preview_path))
+        Dokument2.objects.get(pk=dokument1.pk).delete()
+        self.assertFalse(os.path.isfile(preview_path))
+
+    def test_deduplicate_media_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .blob_store import file_digest
+
+        # Files stored before the blob store existed
+        dokumente = []
+        for folder in (self.folder1, self.folder2):
+            name = f'media/dokument/alt/{folder.id}.pdf'
+            path = Dokument2.dokument.field.storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b"%PDF" * 100)
+            dokument = Dokument2.objects.create(org=self.org, ordner=folder, link='https://example.com')
+            Dokument2.objects.filter(pk=dokument.pk).update(dokument=name)
+            dokumente.append(Dokument2.objects.get(pk=dokument.pk))
+        path1, path2 = dokumente[0].dokument.path, dokumente[1].dokument.path
+
+        out = StringIO()
+        call_command('deduplicate_media', '--dry-run', stdout=out)
+        self.assertIn('Global.Dokument2.dokument: 2 files, 400 B would be saved', out.getvalue())
+        self.assertFalse(os.path.samefile(path1, path2))
+
+        out = StringIO()
+        call_command('deduplicate_media', stdout=out)
+        self.assertIn('Global.Dokument2.dokument: 2 files, 400 B saved', out.getvalue())
+        self.assertTrue(os.path.samefile(path1, path2))
+        self.assertEqual(
+            set(Dokument2.objects.filter(pk__in=[d.pk for d in dokumente]).values_list('content_hash', flat=True)),
+            {file_digest(path1)},
+        )
+
+
+class SearchIndexTests(TestCase):
+    """Full-text search over posts, documents, chats, tasks and events."""
+
+    def setUp(self):
+        import shutil
+        from django.core.cache import cache
+        from django.test import override_settings
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.org = Organisation.objects.create(name="Search Org")
+        flags = dict(posts=True, dokumente=True, aufgaben=True, calendar=True)
+        self.org_cluster = PersonCluster.objects.create(org=self.org, name="Org", view='O', **flags)
+        self.fw_cluster = PersonCluster.objects.create(org=self.org, name="Freiwillige", view='F', **flags)
+        self.other_cluster = PersonCluster.objects.create(org=self.org, name="Team", view='T', **flags)
+        self.org_user = self._user('orguser', self.org, self.org_cluster)
+        self.volunteer = self._user('volunteer', self.org, self.fw_cluster)
+        self.other_volunteer = self._user('volunteer2', self.org, self.fw_cluster)
+
+        other_org = Organisation.objects.create(name="Other Org")
+        other_cluster = PersonCluster.objects.create(org=other_org, name="Org", view='O', **flags)
+        self.stranger = self._user('stranger', other_org, other_cluster)
+
+    def _user(self, username, org, cluster):
+        user = User.objects.create_user(username=username, password='testpass123')
+        CustomUser.objects.create(user=user, org=org, person_cluster=cluster)
+        return user
+
+    def _post(self, title, text='', clusters=(), org=None):
+        from .models import Post2
+        with patch('Global.tasks.send_new_post_email_task'):
+            post = Post2.objects.create(org=org or self.org, user=self.org_user, title=title, text=text)
+        post.person_cluster.set(clusters)
+        return post
+
+    def _titles(self, user, query, **kwargs):
+        from .search import search
+        return [result.title for result in search(user, query, **kwargs)]
+
+    def test_title_matches_rank_above_text_matches_and_prefixes_match(self):
+        self._post("Allgemeines", text="Bitte denkt an die Visumsanträge für Ghana.")
+        self._post("Visumsantrag Ghana")
+
+        self.assertEqual(self._titles(self.volunteer, "visum ghana"), ["Visumsantrag Ghana", "Allgemeines"])
+        self.assertEqual(self._titles(self.volunteer, "visumsantrage"), ["Allgemeines"])
+        self.assertEqual(self._titles(self.volunteer, "visum tansania"), [])
+
+    def test_results_are_scoped_to_organisation_and_person_cluster(self):
+        self._post("Seminar Freiwillige", clusters=[self.fw_cluster])
+        self._post("Seminar Team", clusters=[self.other_cluster])
+        self._post("Seminar Alle")
+        self._post("Seminar Fremd", org=self.stranger.org)
+        folder = Ordner2.objects.create(org=self.org, ordner_name="Team")
+        folder.typ.add(self.other_cluster)
+        Dokument2.objects.create(org=self.org, ordner=folder, titel="Seminarplan Team")
+
+        self.assertCountEqual(self._titles(self.volunteer, "seminar"), ["Seminar Freiwillige", "Seminar Alle"])
+        self.assertCountEqual(
+            self._titles(self.org_user, "seminar"),
+            ["Seminar Freiwillige", "Seminar Team", "Seminar Alle", "Seminarplan Team"],
+        )
+        self.assertEqual(self._titles(self.stranger, "seminar"), ["Seminar Fremd"])
+
+        self.fw_cluster.posts = False
+        self.fw_cluster.save()
+        self.assertEqual(self._titles(self.volunteer, "seminar"), [])
+
+    def test_chat_messages_are_only_found_by_chat_members(self):
+        from chat.models import ChatDirect, ChatMessageDirect
+        chat = ChatDirect.objects.create(org=self.org)
+        chat.users.add(self.volunteer, self.other_volunteer)
+        ChatMessageDirect.objects.create(org=self.org, chat=chat, user=self.volunteer, message="Treffpunkt am Bahnhof")
+
+        from .search import search
+        results = search(self.other_volunteer, "bahnhof")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].url, reverse('chat_direct', args=[chat.get_identifier()]))
+        self.assertIn('<mark>Bahnhof</mark>', results[0].snippet)
+        self.assertEqual(search(self.org_user, "bahnhof"), [])
+
+    def test_saves_without_indexed_fields_keep_the_entry(self):
+        from chat.models import ChatDirect, ChatMessageDirect
+        chat = ChatDirect.objects.create(org=self.org)
+        chat.users.add(self.volunteer, self.other_volunteer)
+        message = ChatMessageDirect.objects.create(org=self.org, chat=chat, user=self.volunteer, message="Hallo")
+
+        with patch('Global.search.index_object') as index_object:
+            message.mark_as_read()
+            message.message = "Hallo zusammen"
+            message.save(update_fields=['message', 'updated_at'])
+        index_object.assert_called_once_with(message)
+
+    def test_index_follows_changes_and_deletions(self):
+        event = KalenderEvent.objects.create(
+            org=self.org, title="Ausreisetreffen", start=timezone.now(), end=timezone.now() + timedelta(hours=2)
+        )
+        self.assertEqual(self._titles(self.volunteer, "ausreise"), [])
+        event.user.add(self.volunteer)
+        self.assertEqual(self._titles(self.volunteer, "ausreise"), ["Ausreisetreffen"])
+
+        event.title = "Rückkehrertreffen"
+        event.save()
+        self.assertEqual(self._titles(self.volunteer, "ausreise"), [])
+        self.assertEqual(self._titles(self.volunteer, "ruckkehr"), ["Rückkehrertreffen"])
+
+        event.delete()
+        self.assertEqual(self._titles(self.volunteer, "ruckkehr"), [])
+
+    def test_pdf_text_is_indexed(self):
+        from reportlab.pdfgen import canvas
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer)
+        pdf.drawString(100, 750, "Impfnachweis Gelbfieber")
+        pdf.save()
+        folder = Ordner2.objects.create(org=self.org, ordner_name="Gesundheit")
+        folder.typ.add(self.fw_cluster)
+        with patch.object(Dokument2, 'get_preview_converted', return_value=None), \
+                self.captureOnCommitCallbacks() as callbacks:
+            dokument = Dokument2.objects.create(
+                org=self.org, ordner=folder, titel="Nachweis",
+                dokument=SimpleUploadedFile("nachweis.pdf", buffer.getvalue(), content_type="application/pdf"),
+            )
+
+        # The file is read by a task after the commit, not while saving
+        from .search import search
+        self.assertEqual(self._titles(self.volunteer, "nachweis"), ["Nachweis"])
+        self.assertEqual(search(self.volunteer, "gelbfieber"), [])
+        for callback in callbacks:
+            callback()
+        results = search(self.volunteer, "gelbfieber")
+        self.assertEqual([result.object_id for result in results], [dokument.id])
+        self.assertEqual(results[0].url, reverse('dokumente', args=[folder.id]))
+
+    def test_rebuild_command_restores_index(self):
+        from django.core.management import call_command
+        from .search import clear_index
+        self._post("Länderabend")
+        Aufgabe2.objects.create(org=self.org, name="Länderbericht").person_cluster.add(self.fw_cluster)
+        clear_index()
+        self.assertEqual(self._titles(self.volunteer, "lander"), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertCountEqual(self._titles(self.volunteer, "lander"), ["Länderabend", "Länderbericht"])
+        self.assertIn('2 entries indexed', out.getvalue())
+
+    def test_search_view_returns_json(self):
+        self._post("Packliste", text="Regenjacke nicht vergessen")
+        self.client.force_login(self.volunteer)
+        response = self.client.get(reverse('search'), {'q': 'regenjacke', 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['title'] for result in response.json()['results']], ["Packliste"])
+
+        response = self.client.get(reverse('search'), {'q': 'regenjacke'})
+        self.assertContains(response, "Packliste")
+
+
+class HistoryPolicyTests(TestCase):
+    """Hot-path writes and no-op saves do not add historical rows."""
+
+    def setUp(self):
+        self.org = Organisation.objects.create(name="History Org")
+        self.cluster = PersonCluster.objects.create(org=self.org, name="Freiwillige", view='F')
+        self.user = User.objects.create_user(username='historyuser', password='testpass123')
+        self.custom_user = CustomUser.objects.create(user=self.user, org=self.org, person_cluster=self.cluster)
+        self.aufgabe = Aufgabe2.objects.create(org=self.org, name='Visum', faellig_tag=1, faellig_monat=1)
+
+    def test_excluded_fields_and_noop_saves_write_no_history(self):
+        count = self.custom_user.history.count()
+        with self.assertNumQueries(1):
+            self.custom_user.update_last_seen()
+        self.custom_user.save()
+        self.custom_user.last_ampel_reminder = timezone.localdate()
+        self.custom_user.save()
+        self.assertEqual(self.custom_user.history.count(), count)
+
+        self.custom_user.mail_notifications = False
+        self.custom_user.save()
+        self.assertEqual(self.custom_user.history.count(), count + 1)
+        self.assertFalse(self.custom_user.history.first().mail_notifications)
+
+    def test_bulk_update_writes_history_only_for_tracked_fields(self):
+        from .history import bulk_update_with_history
+        tasks = [
+            UserAufgaben.objects.create(org=self.org, user=self.user, aufgabe=self.aufgabe)
+            for _ in range(3)
+        ]
+        count = UserAufgaben.history.count()
+
+        for task in tasks:
+            task.last_reminder = timezone.localdate()
+        bulk_update_with_history(tasks, UserAufgaben, ['last_reminder'])
+        self.assertEqual(UserAufgaben.history.count(), count)
+        self.assertEqual(UserAufgaben.objects.filter(last_reminder__isnull=False).count(), 3)
+
+        for task in tasks:
+            task.pending = True
+        with self.assertNumQueries(2):
+            bulk_update_with_history(tasks, UserAufgaben, ['pending'])
+        self.assertEqual(UserAufgaben.history.count(), count + 3)
+
+    def test_prune_history_keeps_latest_row_and_archives(self):
+        from django.core.management import call_command
+        self.custom_user.mail_notifications = False
+        self.custom_user.save()
+        self.custom_user.history.update(history_date=timezone.now() - timedelta(days=400))
+        rows = self.custom_user.history.count()
+        self.assertEqual(rows, 2)
+
+        out = io.StringIO()
+        call_command('prune_history', 'Global.CustomUser', '--dry-run', stdout=out)
+        self.assertIn(', 1 would be deleted', out.getvalue())
+        self.assertEqual(self.custom_user.history.count(), 2)
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('prune_history', 'Global.CustomUser', '--archive-dir', archive_dir, stdout=io.StringIO())
+            self.assertEqual(list(self.custom_user.history.values_list('mail_notifications', flat=True)), [False])
+            import gzip
+            [archive] = os.listdir(archive_dir)
+            with gzip.open(os.path.join(archive_dir, archive), 'rt') as f:
+                self.assertEqual(len(f.readlines()), 1)
+
+
+class CeleryTopologyTests(TestCase):
+    """Task routing and result retention."""
+
+    def test_routes_point_to_registered_tasks_and_declared_queues(self):
+        from django.conf import settings
+        from FWMsg.celery import app
+        app.loader.import_default_modules()
+        queues = {queue.name for queue in settings.CELERY_TASK_QUEUES}
+        for name, route in settings.CELERY_TASK_ROUTES.items():
+            self.assertIn(name, app.tasks)
+            self.assertIn(route['queue'], queues)
+        self.assertEqual(app.amqp.router.route({}, 'ORG.tasks.send_register_email_task')['queue'].name, 'mail')
+        self.assertEqual(app.amqp.router.route({}, 'health_check')['queue'].name, 'default')
+
+    def test_only_polled_tasks_store_results(self):
+        from ORG.tasks import import_objects_from_excel_task, send_register_email_task
+        from .tasks import render_pdf_task, send_new_post_email_task
+        self.assertFalse(render_pdf_task.ignore_result)
+        self.assertFalse(import_objects_from_excel_task.ignore_result)
+        self.assertTrue(send_new_post_email_task.ignore_result)
+        self.assertTrue(send_register_email_task.ignore_result)
+
+    def test_cleanup_deletes_expired_results(self):
+        from django_celery_results.models import TaskResult
+        from .tasks import cleanup_task_results_task
+        TaskResult.objects.create(task_id='old', status='SUCCESS')
+        TaskResult.objects.create(task_id='new', status='SUCCESS')
+        TaskResult.objects.filter(task_id='old').update(date_done=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(cleanup_task_results_task(batch_size=1), {'taskresult': 1, 'groupresult': 0})
+        self.assertEqual(list(TaskResult.objects.values_list('task_id', flat=True)), ['new'])
+
+
+class DailyJobScheduleTests(TestCase):
+    """Daily jobs run per organisation, staggered and at most once a day."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.orgs = [Organisation.objects.create(name=f"Daily Org {i}") for i in range(2)]
+        self.cluster = PersonCluster.objects.create(org=self.orgs[0], name="Freiwillige", view='F')
+        self.user = User.objects.create_user(username='dailyuser', password='testpass123')
+        self.today = timezone.localdate()
+        CustomUser.objects.create(
+            user=self.user, org=self.orgs[0], person_cluster=self.cluster,
+            geburtsdatum=self.today.replace(year=2000),
+        )
+
+    @patch('Global.tasks.send_aufgaben_report_task.apply_async')
+    @patch('Global.tasks.run_daily_job_task.apply_async')
+    def test_dispatch_staggers_runs_and_is_idempotent(self, run_async, report_async):
+        from .daily_jobs import dispatch_daily_jobs
+        from .models import DailyJobRun
+
+        org_ids = [org.id for org in self.orgs]
+        self.assertEqual(dispatch_daily_jobs(today=self.today, window=600), 3 * len(org_ids))
+        runs = [c for c in run_async.call_args_list if c.args[0][1] in org_ids]
+        self.assertEqual(len(runs), 6)
+        countdowns = [c.kwargs['countdown'] for c in runs]
+        self.assertEqual(countdowns, sorted(countdowns))
+        self.assertTrue(all(0 <= countdown < 600 for countdown in countdowns))
+        self.assertEqual([c.args[0][1] for c in runs], [org_ids[0]] * 3 + [org_ids[1]] * 3)
+        report_async.assert_called_once()
+        self.assertGreater(report_async.call_args.kwargs['countdown'], 600)
+
+        run_async.reset_mock()
+        self.assertEqual(dispatch_daily_jobs(today=self.today, window=600), 0)
+        run_async.assert_not_called()
+        self.assertEqual(DailyJobRun.objects.filter(org_id__in=org_ids, status='S').count(), 6)
+
+    @patch('Global.tasks.send_birthday_reminder_email_task')
+    def test_run_claims_the_ledger_row_once(self, send_reminder):
+        from .daily_jobs import run_daily_job
+        from .models import DailyJobRun
+
+        DailyJobRun.objects.create(job='birthdays', org=self.orgs[0], date=self.today)
+        custom_user_id = self.user.customuser.id
+        self.assertEqual(
+            run_daily_job('birthdays', self.orgs[0].id, self.today), {'sent': 1, 'done': [f'today:{custom_user_id}']}
+        )
+        self.assertIsNone(run_daily_job('birthdays', self.orgs[0].id, self.today))
+        send_reminder.assert_called_once_with(self.user.customuser.id, is_tomorrow=False)
+
+        run = DailyJobRun.objects.get(job='birthdays', org=self.orgs[0])
+        self.assertEqual((run.status, run.attempts), ('D', 1))
+        self.assertIsNotNone(run.finished_at)
+
+    def test_failed_and_stale_runs_are_claimed_again(self):
+        from . import daily_jobs
+        from .models import DailyJobRun
+
+        run = DailyJobRun.objects.create(job='ampel', org=self.orgs[1], date=self.today)
+        with patch.dict(daily_jobs.DAILY_JOBS, {'ampel': Mock(side_effect=RuntimeError('SMTP down'))}):
+            with self.assertRaises(RuntimeError):
+                daily_jobs.run_daily_job('ampel', self.orgs[1].id, self.today)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.error), ('F', 'SMTP down'))
+
+        with patch.dict(daily_jobs.DAILY_JOBS, {'ampel': Mock(return_value={'sent': 2})}):
+            self.assertEqual(daily_jobs.run_daily_job('ampel', self.orgs[1].id, self.today), {'sent': 2})
+            DailyJobRun.objects.filter(pk=run.pk).update(status='R', started_at=timezone.now())
+            self.assertIsNone(daily_jobs.run_daily_job('ampel', self.orgs[1].id, self.today))
+            DailyJobRun.objects.filter(pk=run.pk).update(started_at=timezone.now() - timedelta(days=1))
+            self.assertEqual(daily_jobs.run_daily_job('ampel', self.orgs[1].id, self.today), {'sent': 2})
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.attempts), ('D', 3))
+
+    def _birthday_users(self, count):
+        return [
+            CustomUser.objects.create(
+                user=User.objects.create_user(username=f'birthday{i}'), org=self.orgs[0],
+                person_cluster=self.cluster, geburtsdatum=self.today.replace(year=2000),
+            ).id
+            for i in range(count)
+        ]
+
+    @patch('Global.tasks.run_daily_job_task.apply_async')
+    @patch('Global.tasks.send_birthday_reminder_email_task')
+    def test_rate_limited_run_is_rescheduled_instead_of_sleeping(self, send_reminder, run_async):
+        from . import daily_jobs
+        from .models import DailyJobRun
+
+        self._birthday_users(2)
+        run = DailyJobRun.objects.create(job='birthdays', org=self.orgs[0], date=self.today)
+        clock = [600.0]
+        with patch.object(daily_jobs.time, 'time', lambda: clock[0]), \
+                patch.object(daily_jobs, 'DAILY_JOBS_ORG_RATE', 2), patch.object(daily_jobs, 'DAILY_JOBS_JITTER', 0):
+            self.assertEqual(daily_jobs.run_daily_job('birthdays', self.orgs[0].id, self.today), {'deferred': 60.0})
+            run_async.assert_called_once_with(('birthdays', self.orgs[0].id, self.today.isoformat()), countdown=60.0)
+            run.refresh_from_db()
+            self.assertEqual((run.status, run.attempts, run.result['sent']), ('S', 0, 2))
+
+            clock[0] += 60
+            self.assertEqual(daily_jobs.run_daily_job('birthdays', self.orgs[0].id, self.today)['sent'], 3)
+        sent_to = [call.args[0] for call in send_reminder.call_args_list]
+        self.assertEqual(len(sent_to), 3)
+        self.assertEqual(len(set(sent_to)), 3)
+
+    @patch('Global.tasks.send_birthday_reminder_email_task')
+    def test_retry_after_partial_failure_skips_sent_recipients(self, send_reminder):
+        from .daily_jobs import run_daily_job
+        from .models import DailyJobRun
+
+        self._birthday_users(1)
+        DailyJobRun.objects.create(job='birthdays', org=self.orgs[0], date=self.today)
+        send_reminder.side_effect = [None, RuntimeError('SMTP down')]
+        with self.assertRaises(RuntimeError):
+            run_daily_job('birthdays', self.orgs[0].id, self.today)
+        first = send_reminder.call_args_list[0].args[0]
+
+        send_reminder.side_effect = None
+        send_reminder.reset_mock()
+        self.assertEqual(run_daily_job('birthdays', self.orgs[0].id, self.today)['sent'], 2)
+        send_reminder.assert_called_once()
+        self.assertNotEqual(send_reminder.call_args.args[0], first)
+
+    @patch('Global.daily_jobs.DAILY_JOBS_PROGRESS_EVERY', 2)
+    @patch('Global.tasks.send_birthday_reminder_email_task')
+    def test_progress_is_saved_every_few_recipients(self, send_reminder):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .daily_jobs import run_daily_job
+        from .models import DailyJobRun
+
+        self._birthday_users(4)
+        run = DailyJobRun.objects.create(job='birthdays', org=self.orgs[0], date=self.today)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(run_daily_job('birthdays', self.orgs[0].id, self.today)['sent'], 5)
+        table = DailyJobRun._meta.db_table
+        updates = [q for q in queries.captured_queries if q['sql'].startswith(f'UPDATE "{table}"')]
+        # The claim, after the second and fourth recipient and the finished run
+        self.assertEqual(len(updates), 4)
+        run.refresh_from_db()
+        self.assertEqual(len(run.result['done']), 5)
@@ -25,6 +25,7 @@ urlpatterns = [
     
 
     path('posts/', views.posts_overview, name='posts_overview'),
+    path('dashboard-feed/', views.dashboard_feed, name='dashboard_feed'),
     path('posts/add/', views.post_add, name='post_add'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/edit/<int:post_id>/', views.post_edit, name='post_edit'),
@@ -37,12 +38,16 @@ urlpatterns = [
 
     path('dokumente/', views.dokumente, name='dokumente'),
     path('dokumente/<int:ordner_id>/', views.dokumente, name='dokumente'),
+    path('dokumente/tree/', views.dokumente_tree, name='dokumente_tree'),
+    path('dokumente/<int:ordner_id>/dokumente/', views.dokumente_ordner, name='dokumente_ordner'),
     path('dokumente/add/', views.add_dokument, name='add_dokument'),
     path('dokumente/remove/', views.remove_dokument, name='remove_dokument'),
     path('dokument/<str:dokument_identifier>/', views.serve_dokument, name='serve_dokument'),
     path('dokumente/remove_ordner/', views.remove_ordner, name='remove_ordner'),
     path('dokumente/add_ordner/', views.add_ordner, name='add_ordner'),
     path('dokumente/get_public_link/<int:ordner_id>/', views.get_public_link_ordner, name='get_public_link_ordner'),
+
+    path('suche/', views.search, name='search'),
     
     path('profil_picture/', views.update_profil_picture, name='update_profil_picture'),
     path('profil_picture/<str:user_identifier>/', views.serve_profil_picture, name='serve_profil_picture'),
@@ -64,6 +69,9 @@ urlpatterns = [
     path('settings/', views.settings_view, name='settings'),
     path('settings/delete_account/', views.delete_account, name='delete_account'),
     path('settings/export_data/', views.export_data, name='export_data'),
+    path('exports/<str:token>/', views.download_export, name='download_export'),
+    path('pdf-jobs/<str:task_id>/status/', views.pdf_job_status, name='pdf_job_status'),
+    path('pdf-jobs/download/<str:token>/', views.pdf_job_download, name='pdf_job_download'),
 
     path('kalender/', views.kalender, name='kalender'),
     path('kalender/<int:kalender_id>/', views.kalender_event, name='kalender_event'),
@@ -37,7 +37,7 @@ from django.apps import apps
 # Django imports
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Max, F, Min
+from django.db.models import Q, Max, F, Min, Prefetch
 from django.contrib.auth.models import User
 from django.contrib.auth import login
 from django.conf import settings
@@ -51,6 +51,7 @@ from django.http import (
     HttpResponseNotFound,
     JsonResponse
 )
+from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
@@ -110,10 +111,17 @@ from FW.views import base_template as fw_base_template
 from BW.views import base_template as bw_base_template
 from Ehemalige.views import base_template as ehemalige_base_template
 from FWMsg.celery import send_email_aufgaben_daily
+from celery.result import AsyncResult
 from FWMsg.decorators import required_person_cluster, required_role
 from .forms import BewerberKommentarForm, EinsatzstelleNotizForm, FeedbackForm, AddPostForm, AddAmpelmeldungForm, KarteForm, PostResponseForm
 from ORG.forms import AddNotfallkontaktForm
 from .export_utils import export_user_data_securely
+from .posts_feed import annotate_posts, get_posts_page
+from .dashboard_feed import get_dashboard_feed, get_feed_person_cluster, get_feed_sources
+from .document_tree import folder_tree_as_json, get_folder_documents, get_folder_tree, visible_folders
+from .search import KIND_LABELS, search as search_index, searchable_kinds
+from .table_export import resolve_export_token
+from .pdf_jobs import make_pdf_job_token, pdf_file_response, resolve_pdf_job_token
 
 
 # Utility Functions
@@ -175,22 +183,18 @@ def get_bilder(org, filter_user=None, filter_person_cluster=None, limit=None):
     else:
         bilder = Bilder2.objects.filter(org=org).order_by('-date_created')
 
-    # Prefetch related data for better performance
+    # Prefetch related data for better performance; the gallery is ordered so
+    # that ``.first`` in the templates is answered from the prefetched rows
     bilder = bilder.prefetch_related(
         'comments__user',
         'reactions__user',
-        'bildergallery2_set'
-    ).select_related('user')
+        Prefetch('bildergallery2_set', queryset=BilderGallery2.objects.order_by('id')),
+    ).select_related('user', 'user__customuser')
 
     if limit:
         bilder = bilder[:limit]
 
-    gallery_images = []
-    for bild in bilder:
-        gallery_images.append({
-            bild: BilderGallery2.objects.filter(bilder=bild)
-        })
-    return gallery_images
+    return [{bild: bild.bildergallery2_set.all()} for bild in bilder]
 
 
 def get_posts(org, filter_user=None, filter_person_cluster=None, limit=None):
@@ -202,9 +206,9 @@ def get_posts(org, filter_user=None, filter_person_cluster=None, limit=None):
         limit (int, optional): Maximum number of posts to return. Defaults to None.
     
     Returns:
-        list: List of dictionaries containing posts and their metadata
+        QuerySet: Posts with author and response/vote counts attached
     """
-    posts = Post2.objects.filter(org=org).order_by('-date_updated')
+    posts = annotate_posts(Post2.objects.filter(org=org)).order_by('-date_updated')
     if filter_user:
         posts = posts.filter(user=filter_user)
     if filter_person_cluster:
@@ -898,6 +902,18 @@ def download_bild_as_zip(request, id):
         return HttpResponseNotFound('Nicht gefunden')
 
 
+def _dokumente_person_cluster(request, all_person_clusters, cookie_name=None):
+    """The person cluster whose folders an org user looks at; ``None`` for all folders."""
+    person_cluster_param = request.GET.get('person_cluster_filter')
+    if person_cluster_param == 'None':
+        return None
+    if not person_cluster_param and cookie_name:
+        person_cluster_param = request.COOKIES.get(cookie_name)
+    if person_cluster_param and person_cluster_param != 'None':
+        return all_person_clusters.get(id=int(person_cluster_param), org=request.user.org)
+    return None
+
+
 @login_required
 @required_person_cluster('dokumente')
 def dokumente(request, ordner_id=None):
@@ -908,50 +924,30 @@ def dokumente(request, ordner_id=None):
         dokumente=True,
     ).order_by('name')
     current_person_cluster = None
-    folder_structure = []
     
     if request.user.role == 'O':
         try:
-            person_cluster_param = request.GET.get('person_cluster_filter')
-            if person_cluster_param == 'None':
-                current_person_cluster = None
-            elif person_cluster_param:
-                    current_person_cluster = all_person_clusters.get(id=int(person_cluster_param), org=request.user.org)
-            else:
-                person_cluster_cookie = request.COOKIES.get(cookie_name)
-                if person_cluster_cookie is not None and person_cluster_cookie != 'None':
-                    current_person_cluster = all_person_clusters.get(id=int(person_cluster_cookie), org=request.user.org)
-        
+            current_person_cluster = _dokumente_person_cluster(request, all_person_clusters, cookie_name)
         except PersonCluster.DoesNotExist:
             current_person_cluster = None
         except Exception as e:
             messages.error(request, f'Fehler beim Laden der Dokumente: {str(e)}')
             current_person_cluster = None
     
-        if current_person_cluster:
-            ordners = Ordner2.objects.filter(org=request.user.org, typ=current_person_cluster).order_by('color', 'ordner_name')
-        else:
-            ordners = Ordner2.objects.filter(org=request.user.org).order_by('color', 'ordner_name')
-            
+        folder_structure = get_folder_tree(request.user.org, current_person_cluster)
     else:
-        ordners = Ordner2.objects.filter(org=request.user.org, typ=request.user.person_cluster).order_by('color', 'ordner_name')
+        folder_structure = get_folder_tree(request.user.org, request.user.person_cluster)
         
     # Validate ordner_id if provided
     if ordner_id:
-        if not ordners.filter(id=ordner_id).exists():
+        if not any(structure['ordner'].id == ordner_id for structure in folder_structure):
             messages.warning(request, f'Ordner nicht gefunden')
             return redirect('dokumente')
-    
-    for ordner in ordners:
-        folder_structure.append({
-            'ordner': ordner,
-            'dokumente': Dokument2.objects.filter(org=request.user.org, ordner=ordner).order_by('-date_created')
-        })
 
     colors = DokumentColor2.objects.all()
 
     context = {
-        'ordners': ordners,
+        'ordners': [structure['ordner'] for structure in folder_structure],
         'folder_structure': folder_structure,
         'ordner_id': ordner_id,
         'person_clusters': all_person_clusters,
@@ -970,6 +966,55 @@ def dokumente(request, ordner_id=None):
     
     return response
 
+
+@login_required
+@required_person_cluster('dokumente')
+def dokumente_tree(request):
+    if request.user.role == 'O':
+        all_person_clusters = PersonCluster.selectable_for_org(request.user.org, dokumente=True)
+        try:
+            person_cluster = _dokumente_person_cluster(request, all_person_clusters)
+        except (PersonCluster.DoesNotExist, ValueError):
+            return JsonResponse({'error': 'Benutzergruppe nicht gefunden'}, status=404)
+    else:
+        person_cluster = request.user.person_cluster
+    return JsonResponse({'folders': folder_tree_as_json(get_folder_tree(request.user.org, person_cluster))})
+
+
+@login_required
+@required_person_cluster('dokumente')
+def dokumente_ordner(request, ordner_id):
+    """One page of a folder's document cards, loaded when the folder is opened."""
+    person_cluster = None if request.user.role == 'O' else request.user.person_cluster
+    ordner = visible_folders(request.user.org, person_cluster).filter(id=ordner_id).first()
+    if ordner is None:
+        return HttpResponseNotFound('Ordner nicht gefunden')
+
+    context = {
+        'structure': {'ordner': ordner},
+        'page': get_folder_documents(ordner, request.GET.get('page')),
+    }
+    return render(request, 'components/folder_documents.html', context=context)
+
+@login_required
+def search(request):
+    """Full-text search over everything the user has access to; JSON with ``?format=json``."""
+    query = request.GET.get('q', '').strip()
+    kinds = request.GET.getlist('kind') or None
+    results = search_index(request.user, query, kinds=kinds) if query else []
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'query': query, 'results': [result.as_json() for result in results]})
+
+    context = {
+        'query': query,
+        'results': results,
+        'kinds': [(kind, KIND_LABELS[kind]) for kind in searchable_kinds(request.user)],
+        'selected_kinds': kinds or [],
+    }
+    context = check_organization_context(request, context)
+    return render(request, 'search.html', context=context)
+
 @login_required
 @required_person_cluster('dokumente')
 def add_dokument(request):
@@ -2016,6 +2061,15 @@ def download_aufgabe_attachment(request, aufgabe_id):
         return HttpResponse('Nicht erlaubt')
 
 
+@login_required
+def dashboard_feed(request):
+    """Next page of the dashboard feed (``?cursor=``) as rendered HTML and the following cursor."""
+    posts, bilder = get_feed_sources(request.user, get_feed_person_cluster(request))
+    feed, next_cursor = get_dashboard_feed(posts, bilder, cursor=request.GET.get('cursor'), viewer=request.user)
+    html = render_to_string('components/dashboard_feed_items.html', {'feed': feed}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
 @login_required
 @required_person_cluster('posts')
 def posts_overview(request):
@@ -2037,21 +2091,25 @@ def posts_overview(request):
                 person_cluster_cookie = request.COOKIES.get(cookie_name)
                 if person_cluster_cookie is not None and person_cluster_cookie != 'None':
                     current_person_cluster = all_person_clusters.get(id=int(person_cluster_cookie), org=request.user.org)
-        
-            posts = get_posts(request.user.org, filter_person_cluster=current_person_cluster)
         except PersonCluster.DoesNotExist:
             current_person_cluster = None
-            posts = get_posts(request.user.org)
         except Exception as e:
             messages.error(request, f'Fehler beim Laden der Beiträge: {str(e)}')
             current_person_cluster = None
-            posts = get_posts(request.user.org)
-    
+        feed_person_cluster = current_person_cluster
     else:
-        posts = get_posts(request.user.org, filter_person_cluster=request.user.person_cluster)
-    
+        feed_person_cluster = request.user.person_cluster
+
+    page_obj = get_posts_page(
+        request.user.org,
+        viewer=request.user,
+        person_cluster=feed_person_cluster,
+        page_number=request.GET.get('page', 1),
+    )
+
     context = {
-        'posts': posts,
+        'posts': page_obj.object_list,
+        'page_obj': page_obj,
         'person_clusters': all_person_clusters,
         'current_person_cluster': current_person_cluster,
     }
@@ -2180,6 +2238,8 @@ def post_detail(request, post_id):
         responses = post.get_all_responses()
         response_form = PostResponseForm(user=request.user, original_post=post)
 
+        post.read_by.add(request.user)
+
         context = {
             'post': post,
             'has_voted': has_voted,
@@ -2565,6 +2625,42 @@ def export_data(request):
         return redirect('settings')
 
 
+@login_required
+def download_export(request, token):
+    """Serve a background export from the emailed, signed link to the user who requested it."""
+    path = resolve_export_token(token, request.user.id)
+    if not path:
+        raise Http404('Export nicht gefunden oder abgelaufen')
+    filename = os.path.basename(path).split('_', 1)[-1]
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
+@login_required
+def pdf_job_status(request, task_id):
+    """State of a background PDF job as JSON; includes the download URL once it is done."""
+    result = AsyncResult(task_id)
+    if result.failed():
+        return JsonResponse({'state': 'FAILURE'})
+    info = result.info if isinstance(result.info, dict) else {}
+    if info.get('user_id') != request.user.id:
+        return JsonResponse({'state': 'PENDING'})
+    data = {'state': result.state}
+    if result.successful():
+        token = make_pdf_job_token(request.user.id, info['kind'], info['object_id'], info['fingerprint'], info['filename'])
+        data['download_url'] = reverse('pdf_job_download', args=[token])
+    return JsonResponse(data)
+
+
+@login_required
+def pdf_job_download(request, token):
+    """Serve a PDF rendered by a background job to the user who started it."""
+    resolved = resolve_pdf_job_token(token, request.user.id)
+    if not resolved:
+        raise Http404('PDF nicht gefunden oder abgelaufen')
+    path, filename = resolved
+    return pdf_file_response(path, filename)
+
+
 @login_required
 @required_role('ET')
 def list_bewerber(request):
@@ -0,0 +1,256 @@
+"""
+Cached widgets of the organisation dashboards (``home`` and ``home_2``).
+
+Each widget in ``DASHBOARD_WIDGETS`` declares the function computing its
+value, whether the value is shared by the whole organisation or belongs to one
+user, and the models whose changes invalidate it. Values are stored in the
+cache under a key that contains a version counter per (organisation, model);
+saving or deleting an instance of a model bumps the counter of its
+organisation (see ``invalidate_dashboard_widgets_receiver`` in ORG.models), so
+all widgets depending on it are recomputed on the next visit.
+
+Widgets missing from the cache are computed one after the other or, with
+``settings.DASHBOARD_WIDGET_WORKERS`` > 1, in a thread pool. Lazy widgets are
+left out of the page and fetched by the browser from ``dashboard_widget``.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+from Global.models import (
+    Ampel2, ChangeRequest, EinsatzstelleNotiz, StickyNote, UserAufgaben,
+)
+
+DASHBOARD_WIDGET_TIMEOUT = 5 * 60
+
+TASK_MODELS = ('Global.UserAufgaben', 'Global.Aufgabe2')
+
+
+def _tasks(org, **filters):
+    return UserAufgaben.objects.filter(org=org, erledigt=False, **filters).select_related(
+        'aufgabe', 'user', 'user__customuser'
+    ).prefetch_related('file_downloaded_of')
+
+
+def pending_tasks(org, user):
+    return list(_tasks(org, pending=True).order_by('-erledigt_am', 'faellig'))
+
+
+def open_tasks(org, user):
+    return list(_tasks(org, pending=False, faellig__lte=timezone.now().date()).order_by('faellig'))
+
+
+def my_open_tasks(org, user):
+    return list(_tasks(org, pending=False, user=user).order_by('faellig'))
+
+
+def posts(org, user, limit=4):
+    from Global.views import get_posts
+    return list(get_posts(org, limit=limit))
+
+
+def pinned_notizen(org, user):
+    return list(EinsatzstelleNotiz.objects.filter(org=org, pinned=True).select_related(
+        'user', 'einsatzstelle', 'einsatzstelle__land'
+    ).order_by('-date'))
+
+
+def sticky_notes(org, user):
+    return list(StickyNote.objects.filter(org=org, user=user, pinned=True).order_by('-priority', '-date'))
+
+
+def recent_ampel_entries(org, user):
+    return list(Ampel2.objects.filter(
+        org=org,
+        date__gte=timezone.now() - timezone.timedelta(days=5)
+    ).select_related('user').order_by('-date')[:10])
+
+
+def pending_change_requests(org, user):
+    return list(ChangeRequest.objects.filter(org=org, status='pending').select_related(
+        'requested_by'
+    ).order_by('-created_at'))
+
+
+def pending_own_signin_users(org, user):
+    from Home.models import OwnSigninUser
+    return list(OwnSigninUser.objects.filter(org=org).select_related(
+        'person_cluster', 'land'
+    ).order_by('-created_at'))
+
+
+def gallery_images(org, user, limit=4):
+    from Global.views import get_bilder
+    return get_bilder(org, limit=limit)
+
+
+DASHBOARD_WIDGETS = {
+    'pending_tasks': {
+        'compute': pending_tasks,
+        'scope': 'org',
+        'invalidated_by': TASK_MODELS,
+    },
+    'open_tasks': {
+        'compute': open_tasks,
+        'scope': 'org',
+        'invalidated_by': TASK_MODELS,
+    },
+    'my_open_tasks': {
+        'compute': my_open_tasks,
+        'scope': 'user',
+        'invalidated_by': TASK_MODELS,
+    },
+    'posts': {
+        'compute': posts,
+        'scope': 'org',
+        'invalidated_by': ('Global.Post2', 'Global.PostResponse', 'Global.PostSurveyAnswer'),
+    },
+    'pinned_notizen': {
+        'compute': pinned_notizen,
+        'scope': 'org',
+        'invalidated_by': ('Global.EinsatzstelleNotiz', 'Global.Einsatzstelle2'),
+    },
+    'sticky_notes': {
+        'compute': sticky_notes,
+        'scope': 'user',
+        'invalidated_by': ('Global.StickyNote',),
+    },
+    'recent_ampel_entries': {
+        'compute': recent_ampel_entries,
+        'scope': 'org',
+        'invalidated_by': ('Global.Ampel2',),
+    },
+    'pending_change_requests': {
+        'compute': pending_change_requests,
+        'scope': 'org',
+        'invalidated_by': ('Global.ChangeRequest',),
+    },
+    'pending_own_signin_users': {
+        'compute': pending_own_signin_users,
+        'scope': 'org',
+        'invalidated_by': ('Home.OwnSigninUser',),
+    },
+    'gallery_images': {
+        'compute': gallery_images,
+        'params': {'limit': 6},
+        'scope': 'org',
+        'invalidated_by': ('Global.Bilder2', 'Global.BilderGallery2', 'Global.BilderComment', 'Global.BilderReaction'),
+        'lazy': True,
+        'template': 'components/dashboard_gallery_widget.html',
+    },
+    'gallery_images_compact': {
+        'compute': gallery_images,
+        'params': {'limit': 4},
+        'scope': 'org',
+        'invalidated_by': ('Global.Bilder2', 'Global.BilderGallery2', 'Global.BilderComment', 'Global.BilderReaction'),
+        'lazy': True,
+        'template': 'components/dashboard_gallery_widget.html',
+    },
+}
+
+WATCHED_MODELS = frozenset(
+    label for widget in DASHBOARD_WIDGETS.values() for label in widget['invalidated_by']
+)
+
+
+def _version_key(org_id, label):
+    return f'dashboard_widget_version_{org_id}_{label}'
+
+
+def invalidate_dashboard_widgets(org_id, label):
+    """Drop the cached widgets of an organisation that depend on the model ``label``."""
+    try:
+        cache.incr(_version_key(org_id, label))
+    except ValueError:
+        cache.set(_version_key(org_id, label), 2, None)
+
+
+def _cache_keys(names, org, user):
+    labels = sorted({label for name in names for label in DASHBOARD_WIDGETS[name]['invalidated_by']})
+    versions = cache.get_many([_version_key(org.id, label) for label in labels])
+    keys = {}
+    for name in names:
+        widget = DASHBOARD_WIDGETS[name]
+        version = '.'.join(
+            str(versions.get(_version_key(org.id, label), 1)) for label in widget['invalidated_by']
+        )
+        owner = user.id if widget['scope'] == 'user' else 'org'
+        # The date keeps widgets filtering by today's date from going stale overnight
+        keys[name] = f'dashboard_widget_{name}_{org.id}_{owner}_{date.today().isoformat()}_v{version}'
+    return keys
+
+
+def _compute(name, org, user, close_connection=False):
+    widget = DASHBOARD_WIDGETS[name]
+    start = time.perf_counter()
+    try:
+        value = widget['compute'](org, user, **widget.get('params', {}))
+    finally:
+        if close_connection:
+            # Worker threads open their own database connections
+            connections.close_all()
+    return name, value, time.perf_counter() - start
+
+
+def get_dashboard_widgets(names, org, user):
+    """
+    Return ``(values, timings)`` for the widgets ``names`` of a dashboard.
+
+    ``values`` maps each widget name to its value; ``timings`` holds one dict
+    per widget with its ``name``, the time spent in ``ms`` and whether it was
+    served from the cache.
+    """
+    keys = _cache_keys(names, org, user)
+    start = time.perf_counter()
+    cached = cache.get_many(list(keys.values()))
+    lookup_ms = (time.perf_counter() - start) * 1000
+
+    values, timings = {}, {}
+    missing = []
+    for name in names:
+        if keys[name] in cached:
+            values[name] = cached[keys[name]]
+            timings[name] = {'name': name, 'ms': lookup_ms / len(names), 'cached': True}
+        else:
+            missing.append(name)
+
+    workers = min(getattr(settings, 'DASHBOARD_WIDGET_WORKERS', 1) or 1, len(missing))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda name: _compute(name, org, user, close_connection=True), missing))
+    else:
+        results = [_compute(name, org, user) for name in missing]
+
+    to_cache = {}
+    for name, value, seconds in results:
+        values[name] = value
+        timings[name] = {'name': name, 'ms': seconds * 1000, 'cached': False}
+        to_cache[keys[name]] = value
+    if to_cache:
+        cache.set_many(to_cache, DASHBOARD_WIDGET_TIMEOUT)
+
+    return values, [timings[name] for name in names]
+
+
+def get_dashboard_context(request, names):
+    """
+    Template context of a dashboard with the widgets ``names``.
+
+    Eager widgets are added under their name; lazy widgets are listed in
+    ``lazy_widgets`` and loaded by the browser. The timings are only shown in
+    the debug panel to staff members or with ``DEBUG`` enabled.
+    """
+    eager = [name for name in names if not DASHBOARD_WIDGETS[name].get('lazy')]
+    values, timings = get_dashboard_widgets(eager, request.user.org, request.user)
+    return {
+        **values,
+        'lazy_widgets': [name for name in names if name not in values],
+        'dashboard_widget_timings': timings,
+        'show_dashboard_widget_timings': settings.DEBUG or request.user.is_staff,
+    }
@@ -0,0 +1,295 @@
+"""
+Bulk import of organisation objects from Excel files.
+
+The uploaded sheet is mapped onto the model's fields column by column:
+headers are matched against field names and verbose names, and each column
+is coerced to the field's type in one vectorised pandas operation. Rows are
+then validated in memory (no queries per row) and the resulting report can be
+shown as a dry run. The actual import runs in a Celery task which writes the
+valid rows with ``bulk_create`` in chunks inside a single transaction,
+together with their history records. ``bulk_create`` sends no signals, so
+``post_save`` and ``m2m_changed`` are sent for the created rows afterwards:
+search index, feed versions, dashboard widgets and the other receivers see
+imported rows like saved ones.
+"""
+
+import math
+from datetime import date, datetime
+
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.db.models.signals import m2m_changed, post_save
+from django.utils.translation import gettext as _
+from simple_history.utils import bulk_create_with_history
+
+from Global.models import CustomUser, PersonCluster
+
+IMPORT_CHUNK_SIZE = 500
+
+TRUE_VALUES = {'1', 'true', 'wahr', 'ja', 'yes', 'x'}
+FALSE_VALUES = {'0', 'false', 'falsch', 'nein', 'no', ''}
+
+EXCLUDED_FIELDS = {'id', 'org'}
+
+
+def _needs_per_row_save(model):
+    """Models whose ``save()`` or post_save receivers do more than persist the row."""
+    return model.save is not models.Model.save or model is CustomUser
+
+
+def _importable_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if field.name not in EXCLUDED_FIELDS and field.editable and not field.auto_created
+    ]
+
+
+def map_columns(df, model):
+    """
+    Match the sheet's headers to model fields.
+
+    Returns:
+        tuple: (mapping of column -> field, list of ignored columns)
+    """
+    lookup = {}
+    for field in _importable_fields(model):
+        for key in (field.name, field.attname, str(field.verbose_name)):
+            lookup.setdefault(key.strip().lower(), field)
+
+    mapping = {}
+    ignored = []
+    used = set()
+    for column in df.columns:
+        field = lookup.get(str(column).strip().lower())
+        if field is None or field.name in used:
+            ignored.append(str(column))
+            continue
+        mapping[column] = field
+        used.add(field.name)
+    return mapping, ignored
+
+
+def _related_lookup(field, org):
+    related_model = field.related_model
+    queryset = related_model._default_manager.all()
+    if any(f.name == 'org' for f in related_model._meta.concrete_fields):
+        queryset = queryset.filter(org=org)
+    ids = set(queryset.values_list('pk', flat=True))
+    names = {}
+    if any(f.name == 'name' for f in related_model._meta.concrete_fields):
+        names = {str(name).strip().lower(): pk for pk, name in queryset.values_list('pk', 'name')}
+    return ids, names
+
+
+def _coerce_column(series, field, org):
+    """Convert one column to the python type of ``field``; unparsable cells become None."""
+    present = series.notna() & (series.astype(str).str.strip() != '')
+
+    if isinstance(field, models.ForeignKey):
+        ids, names = _related_lookup(field, org)
+        numeric = pd.to_numeric(series, errors='coerce')
+        by_id = numeric.where(numeric.isin(ids))
+        by_name = series.astype(str).str.strip().str.lower().map(names)
+        values = by_id.fillna(by_name)
+    elif isinstance(field, models.DateTimeField):
+        values = pd.to_datetime(series, errors='coerce', dayfirst=True)
+        if values.dt.tz is None:
+            values = values.dt.tz_localize(settings.TIME_ZONE, ambiguous='NaT', nonexistent='NaT')
+    elif isinstance(field, models.DateField):
+        values = pd.to_datetime(series, errors='coerce', dayfirst=True).dt.date
+    elif isinstance(field, models.BooleanField):
+        normalized = series.astype(str).str.strip().str.lower()
+        values = normalized.map(lambda v: True if v in TRUE_VALUES else False if v in FALSE_VALUES else None)
+    elif isinstance(field, (models.IntegerField, models.FloatField, models.DecimalField)):
+        values = pd.to_numeric(series, errors='coerce')
+    else:
+        values = series.astype(str).str.strip().where(present)
+
+    values = values.astype(object).where(pd.notna(values) & present, None)
+    invalid = present & values.isna()
+    if isinstance(field, (models.CharField, models.TextField)) and not field.null:
+        values = values.where(present, '')
+    return values, invalid
+
+
+def prepare_import(df, model, org, person_cluster=None):
+    """
+    Coerce and validate a sheet without touching the database (apart from
+    one lookup query per foreign key column).
+
+    Returns:
+        tuple: (rows, report) where ``rows`` are JSON-serialisable dicts of the
+        valid rows keyed by field attname and ``report`` summarises the result.
+    """
+    mapping, ignored = map_columns(df, model)
+    df = df.reset_index(drop=True)
+
+    columns = {}
+    errors = {}
+    for column, field in mapping.items():
+        values, invalid = _coerce_column(df[column], field, org)
+        columns[field.attname] = values
+        for index in invalid[invalid].index:
+            errors.setdefault(index, []).append(
+                _('Ungültiger Wert für %(field)s: %(value)s') % {'field': field.verbose_name, 'value': df.at[index, column]}
+            )
+
+    frame = pd.DataFrame(columns, index=df.index)
+
+    fk_person_cluster = next(
+        (f for f in model._meta.concrete_fields if f.name == 'person_cluster' and isinstance(f, models.ForeignKey)),
+        None,
+    )
+    if fk_person_cluster and person_cluster and fk_person_cluster.attname not in frame.columns:
+        frame[fk_person_cluster.attname] = person_cluster.id
+
+    skip_clean = [f.name for f in model._meta.concrete_fields if isinstance(f, models.ForeignKey)] + ['org']
+    # clean_fields() skips the foreign keys: a missing required one would only
+    # fail with an IntegrityError inside the import transaction
+    required_fks = [
+        f for f in model._meta.concrete_fields
+        if isinstance(f, models.ForeignKey) and f.name not in EXCLUDED_FIELDS and not f.null and not f.has_default()
+    ]
+
+    fields = {f.attname: f for f in model._meta.concrete_fields}
+    rows = []
+    for index, record in zip(frame.index, frame.to_dict('records')):
+        if index in errors:
+            continue
+        # Empty cells fall back to the field's default instead of overriding it
+        record = {
+            key: value for key, value in record.items()
+            if value is not None or not fields[key].has_default()
+        }
+        missing = [f for f in required_fks if record.get(f.attname) is None]
+        if missing:
+            errors.setdefault(index, []).extend(f'{f.name}: {f.error_messages["null"]}' for f in missing)
+            continue
+        instance = model(org=org, **record)
+        try:
+            instance.clean_fields(exclude=skip_clean)
+        except ValidationError as e:
+            for field_name, messages in e.message_dict.items():
+                errors.setdefault(index, []).extend(f'{field_name}: {message}' for message in messages)
+            continue
+        rows.append({key: _json_value(value) for key, value in record.items()})
+
+    report = {
+        'total': len(frame.index),
+        'valid': len(rows),
+        'columns': [str(field.verbose_name) for field in mapping.values()],
+        'ignored_columns': ignored,
+        # Excel rows are 1-based and the header occupies the first line
+        'errors': [{'row': index + 2, 'messages': errors[index]} for index in sorted(errors)],
+    }
+    return rows, report
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _build_instance(model, org, row):
+    fields = {f.attname: f for f in model._meta.concrete_fields}
+    instance = model(org=org)
+    for attname, value in row.items():
+        field = fields[attname]
+        setattr(instance, attname, field.to_python(value) if value is not None else None)
+    return instance
+
+
+class _skip_history:
+    """The history of bulk-created rows is written already: skip it while their signals are sent."""
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def __enter__(self):
+        self.instance.skip_history_when_saving = True
+
+    def __exit__(self, *exc):
+        del self.instance.skip_history_when_saving
+
+
+def _send_post_save(model, instances):
+    """Send the ``post_save`` that ``save()`` would have sent for bulk-created ``instances``."""
+    using = router.db_for_write(model)
+    for instance in instances:
+        with _skip_history(instance):
+            post_save.send(
+                sender=model, instance=instance, created=True, update_fields=None, raw=False, using=using,
+            )
+
+
+def _send_m2m_add(model, instances, m2m_field, related):
+    """Send the ``m2m_changed`` that ``add(related)`` would have sent for every instance."""
+    using = router.db_for_write(model)
+    for instance in instances:
+        with _skip_history(instance):
+            for action in ('pre_add', 'post_add'):
+                m2m_changed.send(
+                    sender=m2m_field.remote_field.through, instance=instance, action=action,
+                    reverse=False, model=m2m_field.related_model, pk_set={related.pk}, using=using,
+                )
+
+
+def import_rows(model, org, rows, person_cluster=None, user=None, progress=None):
+    """
+    Create objects for prepared rows in chunks inside one transaction.
+
+    Args:
+        progress (callable, optional): called with (done, total) after each chunk
+
+    Returns:
+        int: number of created objects
+    """
+    total = len(rows)
+    created = 0
+    m2m_person_cluster = next(
+        (f for f in model._meta.many_to_many if f.name == 'person_cluster'),
+        None,
+    )
+    has_history = hasattr(model, 'history')
+
+    with transaction.atomic():
+        for start in range(0, total, IMPORT_CHUNK_SIZE):
+            instances = [_build_instance(model, org, row) for row in rows[start:start + IMPORT_CHUNK_SIZE]]
+
+            if _needs_per_row_save(model):
+                for instance in instances:
+                    instance.save()
+            else:
+                if has_history:
+                    instances = bulk_create_with_history(instances, model, default_user=user)
+                else:
+                    instances = model.objects.bulk_create(instances)
+                _send_post_save(model, instances)
+
+            if m2m_person_cluster and person_cluster:
+                through = m2m_person_cluster.remote_field.through
+                source = m2m_person_cluster.m2m_field_name()
+                target = m2m_person_cluster.m2m_reverse_field_name()
+                through.objects.bulk_create([
+                    through(**{f'{source}_id': instance.pk, f'{target}_id': person_cluster.pk})
+                    for instance in instances
+                ])
+                _send_m2m_add(model, instances, m2m_person_cluster, person_cluster)
+
+            created += len(instances)
+            if progress:
+                progress(created, total)
+    return created
+
+
+def get_import_person_cluster(org, person_cluster_id):
+    if not person_cluster_id:
+        return None
+    return PersonCluster.selectable_for_org(org, id=person_cluster_id).first()
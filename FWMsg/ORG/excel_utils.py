@@ -0,0 +1,97 @@
+import pandas as pd
+
+from BW.models import Bewerber
+from Global.models import UserAttribute
+from Global.table_export import EXPORT_CHUNK_SIZE, convert_attribute_column
+
+# Exports with more applicants than this are generated in the background and emailed
+APPLICATION_EXPORT_BACKGROUND_THRESHOLD = 1000
+
+APPLICATION_EXPORT_FIELDS = [
+    ('user__first_name', 'Vorname'),
+    ('user__last_name', 'Nachname'),
+    ('user__email', 'E-Mail'),
+    ('zuteilung__name', 'Zuteilung Stelle'),
+    ('zuteilung__land__name', 'Zuteilung Land'),
+    ('endbewertung', 'Endbewertung'),
+    ('note', 'Note'),
+]
+
+
+def get_application_export_queryset(org, person_cluster=None, seminar_filter=None):
+    """Applicants included in the "all applications" export."""
+    bewerber = Bewerber.objects.filter(org=org)
+    if person_cluster:
+        bewerber = bewerber.filter(user__customuser__person_cluster=person_cluster)
+    if seminar_filter == 'yes':
+        bewerber = bewerber.filter(seminar_bewerber__isnull=False)
+    elif seminar_filter == 'no':
+        bewerber = bewerber.filter(seminar_bewerber__isnull=True)
+    return bewerber
+
+
+def _attribute_columns(bewerber):
+    """Attribute names (sorted) and their types for all applicants of the export."""
+    attribute_types = dict(
+        UserAttribute.objects.filter(user_id__in=bewerber.values('user_id'))
+        .values_list('attribute__name', 'attribute__type')
+        .distinct()
+    )
+    return sorted(attribute_types), attribute_types
+
+
+def _attribute_frame(user_ids, attribute_names, attribute_types):
+    """Pivoted and type-converted attribute values for one chunk of users."""
+    values = pd.DataFrame(
+        UserAttribute.objects.filter(user_id__in=user_ids).values_list('user_id', 'attribute__name', 'value'),
+        columns=['user_id', 'attribute__name', 'value'],
+    )
+    if values.empty:
+        frame = pd.DataFrame(index=pd.Index(user_ids), columns=attribute_names, dtype=object)
+    else:
+        frame = values.pivot_table(
+            index='user_id',
+            columns='attribute__name',
+            values='value',
+            aggfunc='first',
+        ).reindex(index=pd.Index(user_ids), columns=attribute_names)
+
+    for name in attribute_names:
+        frame[name] = convert_attribute_column(frame[name], attribute_types[name])
+    return frame
+
+
+def _iter_application_rows(bewerber, attribute_names, attribute_types):
+    fields = ['user_id'] + [field for field, _ in APPLICATION_EXPORT_FIELDS]
+    rows = bewerber.order_by('id').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield from _convert_chunk(chunk, attribute_names, attribute_types)
+            chunk = []
+    if chunk:
+        yield from _convert_chunk(chunk, attribute_names, attribute_types)
+
+
+def _convert_chunk(chunk, attribute_names, attribute_types):
+    if not attribute_names:
+        for row in chunk:
+            yield list(row[1:])
+        return
+    attributes = _attribute_frame([row[0] for row in chunk], attribute_names, attribute_types)
+    for row, attribute_values in zip(chunk, attributes.itertuples(index=False, name=None)):
+        yield list(row[1:]) + list(attribute_values)
+
+
+def get_application_export(bewerber):
+    """
+    Headers and a lazy row iterator for the "all applications" export.
+
+    Applicants are read in chunks; for each chunk the ``UserAttribute`` values
+    are fetched in one query, pivoted and converted per column.
+    """
+    attribute_names, attribute_types = _attribute_columns(bewerber)
+    headers = [header for _, header in APPLICATION_EXPORT_FIELDS] + attribute_names
+    return headers, _iter_application_rows(bewerber, attribute_names, attribute_types)
@@ -0,0 +1,96 @@
+import glob
+import os
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from BW.models import ApplicationAnswer, ApplicationQuestion, Bewerber
+from Global.pdf_jobs import get_pdf_cache_dir, render_job_pdf
+from ORG.models import Organisation
+from ORG.pdf_batch import application_pdf_render_tasks, application_pdfs
+from ORG.pdf_utils import generate_full_application_pdf
+
+ANSWER_TEXT = (
+    "Ich möchte einen Freiwilligendienst machen, weil ich neue Erfahrungen sammeln, "
+    "eine andere Kultur kennenlernen und mich für andere Menschen einsetzen möchte. "
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the render time of application PDFs for the bulk download: serially and fanned out '
+        'to one render_pdf_task per applicant like the download does (needs running exports workers). '
+        'Temporary applicants answering the questions of the organisation are created and deleted again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('org_id', type=int)
+        parser.add_argument('--documents', type=int, default=50)
+        parser.add_argument('--timeout', type=int, default=600, help='Seconds to wait for the workers')
+
+    def _report(self, label, count, wall, durations=None):
+        line = f"{label:<10} {count} documents in {wall:.2f}s ({count / wall:.1f}/s)"
+        if durations:
+            durations = sorted(durations)
+            p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+            line += (
+                f" - per document: mean {statistics.mean(durations) * 1000:.0f}ms, "
+                f"median {statistics.median(durations) * 1000:.0f}ms, "
+                f"p95 {p95 * 1000:.0f}ms"
+            )
+        self.stdout.write(line)
+
+    def _create_applicants(self, org, count):
+        questions = list(ApplicationQuestion._base_manager.filter(org=org))
+        bewerber = []
+        for i in range(count):
+            user = User.objects.create(
+                username=f'benchmark_{uuid.uuid4().hex[:12]}', first_name='Bewerber', last_name=str(i)
+            )
+            ApplicationAnswer._base_manager.bulk_create([
+                ApplicationAnswer(org=org, user=user, question=question, answer=ANSWER_TEXT * (1 + j % 5))
+                for j, question in enumerate(questions)
+            ])
+            bewerber.append(Bewerber._base_manager.create(org=org, user=user))
+        return bewerber
+
+    def _clear_cache(self, bewerber):
+        directory = get_pdf_cache_dir('application')
+        for b in bewerber:
+            for path in glob.glob(os.path.join(directory, f'{b.id}_*.pdf')):
+                os.remove(path)
+
+    def handle(self, *args, **options):
+        org = Organisation.objects.filter(id=options['org_id']).first()
+        if org is None:
+            raise CommandError(f"Organisation {options['org_id']} does not exist")
+        if not ApplicationQuestion._base_manager.filter(org=org).exists():
+            raise CommandError(f'{org} has no application questions')
+        if getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+            self.stdout.write(self.style.WARNING('CELERY_TASK_ALWAYS_EAGER is set, the fan-out runs serially in this process'))
+
+        bewerber = self._create_applicants(org, options['documents'])
+        try:
+            # Warm up fonts and cached styles like a long-running worker would
+            generate_full_application_pdf(bewerber[0])
+
+            durations = []
+            start = time.perf_counter()
+            for b in bewerber:
+                document_start = time.perf_counter()
+                render_job_pdf('application', b)
+                durations.append(time.perf_counter() - document_start)
+            self._report('serial', len(bewerber), time.perf_counter() - start, durations)
+
+            self._clear_cache(bewerber)
+            documents = application_pdfs(Bewerber._base_manager.filter(id__in=[b.id for b in bewerber]))
+            start = time.perf_counter()
+            application_pdf_render_tasks(documents, None).apply_async().get(timeout=options['timeout'])
+            self._report('fan-out', len(bewerber), time.perf_counter() - start)
+        finally:
+            self._clear_cache(bewerber)
+            User.objects.filter(id__in=[b.user_id for b in bewerber]).delete()
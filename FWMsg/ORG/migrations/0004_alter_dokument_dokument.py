@@ -0,0 +1,20 @@
+# Generated by Django 6.0.6 on 2026-10-19 17:20
+
+import Global.blob_store
+import ORG.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ORG', '0003_historicalorganisation_uuid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dokument',
+            name='dokument',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=Global.blob_store.DeduplicatingFileSystemStorage(), upload_to=ORG.models.upload_to_folder),
+        ),
+    ]
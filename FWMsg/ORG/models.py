@@ -2,7 +2,7 @@ import os.path
 import uuid as uuid_module
 
 from django.db import models
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -10,8 +10,9 @@ from datetime import timedelta
 from django.utils.translation import gettext_lazy as _
 import random
 import string
-from simple_history.models import HistoricalRecords
+from Global.history import HistoricalRecords
 from django.conf import settings
+from Global.blob_store import document_storage
 
 # Create your models here.
 class Organisation(models.Model):
@@ -169,7 +170,7 @@ def upload_to_preview_image(instance, filename):
 class Dokument(models.Model):
     org = models.ForeignKey(Organisation, on_delete=models.CASCADE)
     ordner = models.ForeignKey(Ordner, on_delete=models.CASCADE)
-    dokument = models.FileField(upload_to=upload_to_folder, max_length=255, null=True, blank=True)
+    dokument = models.FileField(upload_to=upload_to_folder, storage=document_storage, max_length=255, null=True, blank=True)
     link = models.URLField(null=True, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
@@ -398,4 +399,17 @@ def create_user(sender, instance, **kwargs):
         customuser = CustomUser.objects.create(user=user, org=instance.org, role='T', einmalpasswort=einmalpasswort)
         
         instance.user = user
-        instance.save()
\ No newline at end of file
+        instance.save()
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_dashboard_widgets_receiver(sender, instance, **kwargs):
+    from ORG.dashboard_widgets import WATCHED_MODELS, invalidate_dashboard_widgets
+    if sender._meta.label in WATCHED_MODELS and getattr(instance, 'org_id', None):
+        invalidate_dashboard_widgets(instance.org_id, sender._meta.label)
+
+
+@receiver(m2m_changed)
+def invalidate_dashboard_widgets_m2m_receiver(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_dashboard_widgets_receiver(type(instance), instance)
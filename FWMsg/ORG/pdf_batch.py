@@ -0,0 +1,129 @@
+"""
+Bulk download of application PDFs for a set of applicants.
+
+PDFs are taken from the fingerprint cache of ``Global.pdf_jobs``. When every
+document is uploaded or cached, the view streams them as a ZIP archive or
+merges them into one PDF with a bookmark per applicant. Otherwise
+``schedule_application_pdf_bundle`` renders the missing ones in parallel, one
+``render_pdf_task`` per applicant on the ``exports`` queue, and a chord
+callback stores the bundle and emails the user a link, so ReportLab never
+runs in the web process.
+"""
+
+import io
+import zipfile
+
+from celery import chord, group
+from PyPDF2 import PdfMerger
+
+from Global.pdf_jobs import get_cached_pdf_path, render_job_pdf
+from Global.table_export import new_export_path
+from .pdf_utils import application_pdf_filename, application_pdf_fingerprints
+
+
+def application_pdfs(bewerber):
+    """
+    ``(bewerber, path)`` for every applicant of the queryset: the uploaded
+    application PDF or the cached document, None if it has to be rendered.
+    """
+    bewerber = list(bewerber.select_related('user', 'org'))
+    fingerprints = application_pdf_fingerprints([b for b in bewerber if not b.application_pdf])
+    documents = []
+    for b in bewerber:
+        if b.application_pdf:
+            documents.append((b, b.application_pdf.path))
+        else:
+            documents.append((b, get_cached_pdf_path('application', b.id, fingerprints[b.id])))
+    return documents
+
+
+def render_missing_pdfs(documents):
+    """Render the documents of ``application_pdfs`` that have no path yet."""
+    return [(b, path or render_job_pdf('application', b)[0]) for b, path in documents]
+
+
+def application_pdf_render_tasks(documents, user_id):
+    """A group of one ``render_pdf_task`` per document of ``application_pdfs`` that has no path yet."""
+    from Global.tasks import render_pdf_task
+
+    return group(
+        render_pdf_task.s('application', b.id, user_id, application_pdf_filename(b))
+        for b, path in documents if path is None
+    )
+
+
+def schedule_application_pdf_bundle(documents, user_id, merged=False):
+    """
+    Render the missing documents in parallel, then store them as ZIP or merged
+    PDF and email ``user_id`` a download link (``export_application_pdfs_task``).
+    """
+    from .tasks import export_application_pdfs_task
+
+    bundle = export_application_pdfs_task.si([b.id for b, _ in documents], user_id, merged=merged)
+    render_tasks = application_pdf_render_tasks(documents, user_id)
+    if not render_tasks.tasks:
+        return bundle.apply_async()
+    return chord(render_tasks, bundle).apply_async()
+
+
+def _archive_name(bewerber):
+    # The id keeps names unique for applicants with the same name
+    return application_pdf_filename(bewerber).replace('.pdf', f'_{bewerber.id}.pdf')
+
+
+class _ZipBuffer:
+    """Write-only file object collecting the bytes zipfile produces, for streaming."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_application_pdf_zip(documents):
+    """Stream a ZIP archive of ``(bewerber, path)`` documents."""
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for b, path in documents:
+            archive.write(path, _archive_name(b))
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def merge_application_pdfs(documents):
+    """Merge ``(bewerber, path)`` documents into one PDF with a bookmark per applicant."""
+    documents = sorted(
+        documents,
+        key=lambda item: (item[0].user.last_name.lower(), item[0].user.first_name.lower(), item[0].id),
+    )
+    merger = PdfMerger()
+    try:
+        for b, path in documents:
+            merger.append(path, outline_item=f"{b.user.first_name} {b.user.last_name}".strip() or str(b.id))
+        output = io.BytesIO()
+        merger.write(output)
+        return output.getvalue()
+    finally:
+        merger.close()
+
+
+def save_application_pdfs(documents, merged=False):
+    """Store the documents below MEDIA_ROOT/exports as ZIP or merged PDF and return the stored file name."""
+    stored_name, path = new_export_path('bewerbungen', 'pdf' if merged else 'zip')
+    with open(path, 'wb') as file:
+        if merged:
+            file.write(merge_application_pdfs(documents))
+        else:
+            for chunk in iter_application_pdf_zip(documents):
+                file.write(chunk)
+    return stored_name
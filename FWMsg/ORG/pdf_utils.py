@@ -1,3 +1,4 @@
+import functools
 import io
 from datetime import datetime
 from django.http import HttpResponse
@@ -8,11 +9,12 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, Flowable
 from reportlab.platypus.flowables import HRFlowable
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from django.conf import settings
 import os
 
+from Global.pdf_resources import get_org_logo
+
 
 def hex_to_rgb(hex_color):
     """Convert hex color to RGB tuple"""
@@ -23,9 +25,9 @@ def hex_to_rgb(hex_color):
 class LogoWithBackground(Flowable):
     """Custom flowable for logo with colored background and rounded corners"""
     
-    def __init__(self, logo_path, width, height, bg_color, corner_radius=10):
+    def __init__(self, logo, width, height, bg_color, corner_radius=10):
         Flowable.__init__(self)
-        self.logo_path = logo_path
+        self.logo = logo
         self.width = width
         self.height = height
         self.bg_color = bg_color
@@ -63,9 +65,8 @@ class LogoWithBackground(Flowable):
         
         # Draw the logo
         try:
-            img = ImageReader(self.logo_path)
             # Get original image dimensions
-            img_width, img_height = img.getSize()
+            img_width, img_height = self.logo.getSize()
             
             # Calculate scaling to fit within the padded area while maintaining aspect ratio
             scale_x = logo_width / img_width
@@ -80,32 +81,15 @@ class LogoWithBackground(Flowable):
             final_x = logo_x + (logo_width - final_width) / 2
             final_y = logo_y + (logo_height - final_height) / 2
             
-            c.drawImage(self.logo_path, final_x, final_y, final_width, final_height, mask='auto')
+            c.drawImage(self.logo, final_x, final_y, final_width, final_height, mask='auto')
         except Exception:
             # If logo fails to load, just show the background
             pass
 
 
-def generate_application_pdf(bewerber, answers, title_text):
-    """Generate a PDF for application answers"""
-    buffer = io.BytesIO()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=18
-    )
-    
-    # Get organization details
-    org = bewerber.org
-    org_color = hex_to_rgb(org.farbe) if org and org.farbe else (0, 0.48, 1)  # Default blue
-    text_color = hex_to_rgb(org.text_color_on_org_color) if org and org.text_color_on_org_color else (0, 0, 0)
-    
-    # Define styles
+@functools.lru_cache(maxsize=32)
+def get_application_styles(org_color):
+    """Paragraph styles of the application PDF for an organisation color, built once per process."""
     styles = getSampleStyleSheet()
     
     # Custom styles with organization colors - consistent with survey PDF
@@ -170,61 +154,74 @@ def generate_application_pdf(bewerber, answers, title_text):
         fontName='Helvetica-Bold'
     )
     
+    org_header_style = ParagraphStyle(
+        'OrgHeader',
+        parent=styles['Normal'],
+        fontSize=12,
+        textColor=colors.Color(*org_color),
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold',
+        spaceAfter=15
+    )
+    
+    return {
+        'title': title_style,
+        'heading': heading_style,
+        'question': question_style,
+        'answer': answer_style,
+        'info': info_style,
+        'info_label': info_label_style,
+        'org_header': org_header_style,
+    }
+
+
+def generate_application_pdf(bewerber, answers, title_text):
+    """Generate a PDF for application answers"""
+    buffer = io.BytesIO()
+    
+    # Create the PDF document
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=18
+    )
+    
+    # Get organization details
+    org = bewerber.org
+    org_color = hex_to_rgb(org.farbe) if org and org.farbe else (0, 0.48, 1)  # Default blue
+    text_color = hex_to_rgb(org.text_color_on_org_color) if org and org.text_color_on_org_color else (0, 0, 0)
+    
+    # Styles are shared between all documents with the same organisation color
+    styles = get_application_styles(org_color)
+    title_style = styles['title']
+    heading_style = styles['heading']
+    question_style = styles['question']
+    answer_style = styles['answer']
+    info_style = styles['info']
+    info_label_style = styles['info_label']
+    
     # Build the PDF content
     story = []
     
-    # Add organization logo or header if available
+    # Add organization logo or, if there is none, the organization name as header
     if org:
-        if org.logo:
-            try:
-                logo_path = os.path.join(settings.MEDIA_ROOT, str(org.logo))
-                if os.path.exists(logo_path):
-                    # Create smaller, more elegant logo with colored background
-                    logo_with_bg = LogoWithBackground(
-                        logo_path=logo_path,
-                        width=1.8*inch,
-                        height=0.9*inch,
-                        bg_color=org_color,
-                        corner_radius=12
-                    )
-                    story.append(logo_with_bg)
-                    story.append(Spacer(1, 15))
-                else:
-                    # If logo file doesn't exist, show organization name in styled header
-                    org_header_style = ParagraphStyle(
-                        'OrgHeader',
-                        parent=styles['Normal'],
-                        fontSize=12,
-                        textColor=colors.Color(*org_color),
-                        alignment=TA_CENTER,
-                        fontName='Helvetica-Bold',
-                        spaceAfter=15
-                    )
-                    story.append(Paragraph(org.name, org_header_style))
-            except Exception:
-                # If there's any issue with logo, show organization name
-                org_header_style = ParagraphStyle(
-                    'OrgHeader',
-                    parent=styles['Normal'],
-                    fontSize=12,
-                    textColor=colors.Color(*org_color),
-                    alignment=TA_CENTER,
-                    fontName='Helvetica-Bold',
-                    spaceAfter=15
-                )
-                story.append(Paragraph(org.name, org_header_style))
-        else:
-            # No logo configured, show organization name in styled header
-            org_header_style = ParagraphStyle(
-                'OrgHeader',
-                parent=styles['Normal'],
-                fontSize=12,
-                textColor=colors.Color(*org_color),
-                alignment=TA_CENTER,
-                fontName='Helvetica-Bold',
-                spaceAfter=15
+        logo = get_org_logo(org)
+        if logo:
+            # Create smaller, more elegant logo with colored background
+            logo_with_bg = LogoWithBackground(
+                logo=logo,
+                width=1.8*inch,
+                height=0.9*inch,
+                bg_color=org_color,
+                corner_radius=12
             )
-            story.append(Paragraph(org.name, org_header_style))
+            story.append(logo_with_bg)
+            story.append(Spacer(1, 15))
+        else:
+            story.append(Paragraph(org.name, styles['org_header']))
     
     # Title
     story.append(Paragraph(title_text, title_style))
@@ -338,3 +335,65 @@ def generate_selected_application_pdf(bewerber, selected_question_ids):
     title_text = f"Ausgewählte Antworten von {bewerber.user.first_name} {bewerber.user.last_name}"
     
     return generate_application_pdf(bewerber, answers, title_text)
+
+
+def application_pdf_filename(bewerber):
+    filename = f"bewerbung_{bewerber.user.first_name}_{bewerber.user.last_name}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
+    return filename.replace(' ', '_')
+
+
+def _application_pdf_fingerprint(bewerber, answers, questions):
+    from Global.pdf_jobs import make_pdf_fingerprint
+
+    user = bewerber.user
+    org = bewerber.org
+    return make_pdf_fingerprint(
+        'application', bewerber.id,
+        user.first_name, user.last_name, user.email,
+        answers['count'], answers['last_id'], answers['updated'], questions,
+        org.name, org.farbe, org.logo,
+    )
+
+
+def application_pdf_fingerprint(bewerber):
+    """Fingerprint of everything shown in the full application PDF (see Global.pdf_jobs)."""
+    from django.db.models import Count, Max
+    from BW.models import ApplicationAnswer, ApplicationQuestion
+
+    answers = ApplicationAnswer.objects.filter(user=bewerber.user).aggregate(
+        count=Count('id'), last_id=Max('id'), updated=Max('updated_at')
+    )
+    questions = list(
+        ApplicationQuestion.objects.filter(org=bewerber.org).values_list('id', 'order', 'question', 'description')
+    )
+    return _application_pdf_fingerprint(bewerber, answers, questions)
+
+
+def application_pdf_fingerprints(bewerber):
+    """
+    ``application_pdf_fingerprint`` of several applicants, by id. The answers
+    are aggregated per user in one query and the questions loaded once.
+    """
+    from django.db.models import Count, Max
+    from BW.models import ApplicationAnswer, ApplicationQuestion
+
+    if not bewerber:
+        return {}
+    answers = {
+        row['user_id']: row
+        for row in ApplicationAnswer.objects.filter(user_id__in=[b.user_id for b in bewerber])
+        .values('user_id')
+        .annotate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+        .order_by()
+    }
+    questions = {}
+    for org_id, *question in ApplicationQuestion.objects.filter(
+        org_id__in={b.org_id for b in bewerber}
+    ).values_list('org_id', 'id', 'order', 'question', 'description'):
+        questions.setdefault(org_id, []).append(tuple(question))
+    no_answers = {'count': 0, 'last_id': None, 'updated': None}
+    return {
+        b.id: _application_pdf_fingerprint(b, answers.get(b.user_id, no_answers), questions.get(b.org_id, []))
+        for b in bewerber
+    }
@@ -224,4 +224,61 @@ def send_ampel_email_task(ampel_id):
         return False
     except Exception as e:
         logging.error(f"Error sending ampel email: {e}")
-        return False
\ No newline at end of file
+        return False
+
+@shared_task(bind=True, ignore_result=False)
+def import_objects_from_excel_task(self, model_name, org_id, rows, person_cluster_id=None, user_id=None):
+    """Create the prepared rows of an Excel import; reports progress per chunk."""
+    from django.contrib.auth.models import User
+    from ORG.excel_import import get_import_person_cluster, import_rows
+    from ORG.models import Organisation
+    from ORG.views import allowed_models_to_edit
+
+    model = allowed_models_to_edit[model_name]
+    org = Organisation.objects.get(id=org_id)
+    person_cluster = get_import_person_cluster(org, person_cluster_id)
+    user = User.objects.filter(id=user_id).first() if user_id else None
+
+    def progress(done, total):
+        self.update_state(state='PROGRESS', meta={'org_id': org_id, 'done': done, 'total': total})
+
+    created = import_rows(model, org, rows, person_cluster=person_cluster, user=user, progress=progress)
+    return {'org_id': org_id, 'done': created, 'total': len(rows)}
+
+
+@shared_task
+def export_applications_task(org_id, user_id, person_cluster_id=None, seminar_filter=None, file_format='xlsx'):
+    """Write the "all applications" export to disk and email the requesting user a download link."""
+    from django.contrib.auth.models import User
+    from Global.models import PersonCluster
+    from Global.table_export import save_export_file, send_export_ready_email
+    from ORG.excel_utils import get_application_export, get_application_export_queryset
+    from ORG.models import Organisation
+
+    org = Organisation.objects.get(id=org_id)
+    user = User.objects.get(id=user_id)
+    person_cluster = PersonCluster.objects.filter(org=org, id=person_cluster_id).first() if person_cluster_id else None
+
+    bewerber = get_application_export_queryset(org, person_cluster, seminar_filter)
+    headers, rows = get_application_export(bewerber)
+    stored_name = save_export_file(headers, rows, 'bewerbung_all_excel', file_format=file_format)
+    return bool(send_export_ready_email(user, stored_name, 'Bewerbungen'))
+
+
+@shared_task
+def export_application_pdfs_task(bewerber_ids, user_id, merged=False):
+    """
+    Store the application PDFs of ``bewerber_ids`` as ZIP or merged PDF and
+    email the requesting user a download link. Runs as the callback of
+    ``ORG.pdf_batch.schedule_application_pdf_bundle`` once the PDFs are rendered.
+    """
+    from django.contrib.auth.models import User
+    from BW.models import Bewerber
+    from Global.table_export import send_export_ready_email
+    from ORG.pdf_batch import application_pdfs, render_missing_pdfs, save_application_pdfs
+
+    user = User.objects.get(id=user_id)
+    # Applications changed since they were rendered are rendered again here
+    documents = render_missing_pdfs(application_pdfs(Bewerber._base_manager.filter(id__in=bewerber_ids)))
+    stored_name = save_application_pdfs(documents, merged=merged)
+    return bool(send_export_ready_email(user, stored_name, 'Bewerbungen (PDF)'))
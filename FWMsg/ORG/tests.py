@@ -7,7 +7,7 @@ from FW.models import Freiwilliger
 from .models import Organisation
 from Global.models import (
     Aufgabe2, Bilder2, BilderGallery2, UserAufgaben, PersonCluster, CustomUser,
-    UserAttribute, Attribute, Ampel2, AmpelConfiguration
+    UserAttribute, Attribute, Ampel2, AmpelConfiguration, Einsatzland2, Einsatzstelle2
 )
 from BW.models import Bewerber
 from ORG.forms import AddBewerberApplicationPdfForm
@@ -16,8 +16,9 @@ from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import SimpleUploadedFile
 import threading
+from unittest.mock import Mock, patch
 import concurrent.futures
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
 from django.contrib.auth.models import User
 from Global.models import CustomUser, PersonCluster
 from ORG.models import Organisation
@@ -2595,11 +2596,15 @@ class GetCascadeInfoTestCase(TestCase):
             bewertung=4,
             org=self.org
         )
+        self.einheit2 = Einheit.objects.create(
+            name="Test Unit 2",
+            org=self.org
+        )
         self.bewertung2 = Bewertung.objects.create(
             bewerter=self.admin_user,
             bewerber=self.bewerber,
             frage=self.frage,
-            einheit=self.einheit,
+            einheit=self.einheit2,
             bewertung=5,
             org=self.org
         )
@@ -2852,3 +2857,453 @@ class GetOwnSigninUrlTests(TestCase):
         self.assertEqual(response.status_code, 400)
         data = json.loads(response.content)
         self.assertFalse(data['success'])
+
+
+class ExcelImportTests(TestCase):
+    def setUp(self):
+        self.org = Organisation.objects.create(name='Test Org', email='test@test.com')
+        self.person_cluster_org = PersonCluster.objects.create(org=self.org, name='Organisation', view='O')
+        self.admin_user = get_user_model().objects.create_user(username='orgadmin', password='adminpass123')
+        CustomUser.objects.create(org=self.org, user=self.admin_user, person_cluster=self.person_cluster_org)
+        self.land = Einsatzland2.objects.create(org=self.org, name='Kenia', code='KE')
+        self.client.login(username='orgadmin', password='adminpass123')
+
+    def _excel_upload(self, df):
+        import pandas as pd
+        buffer = BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False)
+        return SimpleUploadedFile(
+            'import.xlsx',
+            buffer.getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    def test_prepare_import_maps_coerces_and_reports_errors(self):
+        import pandas as pd
+        from ORG.excel_import import prepare_import
+
+        df = pd.DataFrame({
+            'name': ['Nairobi', 'Mombasa', ''],
+            'Einsatzland': ['kenia', 'Atlantis', str(self.land.id)],
+            'Unbekannt': [1, 2, 3],
+        })
+        rows, report = prepare_import(df, Einsatzstelle2, self.org)
+
+        self.assertEqual(report['total'], 3)
+        self.assertEqual(report['valid'], 1)
+        self.assertEqual(report['ignored_columns'], ['Unbekannt'])
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4])
+        self.assertEqual(rows[0]['name'], 'Nairobi')
+        self.assertEqual(rows[0]['land_id'], self.land.id)
+
+    def test_prepare_import_parses_dates(self):
+        import pandas as pd
+        from ORG.excel_import import prepare_import
+
+        df = pd.DataFrame({'start_geplant': ['01.08.2025', 'kein Datum']})
+        rows, report = prepare_import(df, Freiwilliger, self.org)
+
+        self.assertEqual(rows, [{'start_geplant': '2025-08-01'}])
+        self.assertEqual(report['errors'][0]['row'], 3)
+
+    def test_import_rows_bulk_creates_with_history(self):
+        from ORG.excel_import import import_rows
+
+        rows = [{'name': f'Stelle {i}', 'land_id': self.land.id} for i in range(5)]
+        progress = []
+        created = import_rows(
+            Einsatzstelle2, self.org, rows,
+            user=self.admin_user, progress=lambda done, total: progress.append((done, total)),
+        )
+
+        self.assertEqual(created, 5)
+        self.assertEqual(Einsatzstelle2.objects.filter(org=self.org, land=self.land).count(), 5)
+        self.assertEqual(Einsatzstelle2.history.filter(org=self.org).count(), 5)
+        self.assertEqual(progress[-1], (5, 5))
+
+    def test_prepare_import_reports_missing_required_foreign_keys(self):
+        import pandas as pd
+        from ORG.excel_import import prepare_import
+
+        rows, report = prepare_import(pd.DataFrame({'erledigt': ['ja', 'nein']}), UserAufgaben, self.org)
+
+        self.assertEqual(rows, [])
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertEqual([message.split(':')[0] for message in report['errors'][0]['messages']], ['user', 'aufgabe'])
+
+    def test_import_rows_sends_signals_without_extra_history(self):
+        from django.db.models.signals import m2m_changed, post_save
+        from ORG.excel_import import import_rows
+
+        saved, added = Mock(), Mock()
+        post_save.connect(saved, sender=Aufgabe2, weak=False)
+        m2m_changed.connect(added, sender=Aufgabe2.person_cluster.through, weak=False)
+        self.addCleanup(post_save.disconnect, saved, sender=Aufgabe2)
+        self.addCleanup(m2m_changed.disconnect, added, sender=Aufgabe2.person_cluster.through)
+
+        rows = [{'name': f'Aufgabe {i}'} for i in range(3)]
+        import_rows(Aufgabe2, self.org, rows, person_cluster=self.person_cluster_org, user=self.admin_user)
+
+        self.assertEqual(saved.call_count, 3)
+        self.assertTrue(all(call.kwargs['created'] for call in saved.call_args_list))
+        self.assertEqual(
+            [call.kwargs['action'] for call in added.call_args_list], ['pre_add', 'post_add'] * 3
+        )
+        self.assertEqual(Aufgabe2.history.filter(org=self.org).count(), 3)
+        self.assertEqual(Aufgabe2.objects.filter(org=self.org, person_cluster=self.person_cluster_org).count(), 3)
+
+    def test_dry_run_does_not_create_objects(self):
+        import pandas as pd
+        upload = self._excel_upload(pd.DataFrame({'name': ['Nairobi'], 'land': ['Kenia']}))
+
+        with patch('ORG.views.import_objects_from_excel_task.delay') as delay:
+            response = self.client.post(
+                reverse('add_objects_from_excel', args=['einsatzstelle']),
+                {'excel_file': upload, 'dry_run': '1'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report']['valid'], 1)
+        delay.assert_not_called()
+        self.assertFalse(Einsatzstelle2.objects.filter(org=self.org).exists())
+
+    def test_import_is_queued_as_background_task(self):
+        import pandas as pd
+        upload = self._excel_upload(pd.DataFrame({'name': ['Nairobi', 'Mombasa'], 'land': ['Kenia', 'Kenia']}))
+
+        with patch('ORG.views.import_objects_from_excel_task.delay') as delay:
+            delay.return_value.id = 'task-id'
+            response = self.client.post(
+                reverse('add_objects_from_excel', args=['einsatzstelle']),
+                {'excel_file': upload},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['task_id'], 'task-id')
+        args = delay.call_args.args
+        self.assertEqual(args[0], 'einsatzstelle')
+        self.assertEqual(args[1], self.org.id)
+        self.assertEqual([row['name'] for row in args[2]], ['Nairobi', 'Mombasa'])
+
+    def test_import_task_creates_rows(self):
+        from ORG.tasks import import_objects_from_excel_task
+
+        rows = [{'name': 'Nairobi', 'land_id': self.land.id}]
+        result = import_objects_from_excel_task.apply(
+            args=['einsatzstelle', self.org.id, rows],
+            kwargs={'user_id': self.admin_user.id},
+        )
+
+        self.assertEqual(result.get(), {'org_id': self.org.id, 'done': 1, 'total': 1})
+        self.assertTrue(Einsatzstelle2.objects.filter(org=self.org, name='Nairobi').exists())
+
+
+class ApplicationExcelExportTests(TestCase):
+    def setUp(self):
+        self.org = Organisation.objects.create(name='Test Org', email='test@test.com')
+        self.person_cluster_org = PersonCluster.objects.create(org=self.org, name='Organisation', view='O')
+        self.person_cluster_bw = PersonCluster.objects.create(org=self.org, name='Bewerber', view='B')
+        self.admin_user = get_user_model().objects.create_user(
+            username='orgadmin', password='adminpass123', email='admin@test.com'
+        )
+        CustomUser.objects.create(org=self.org, user=self.admin_user, person_cluster=self.person_cluster_org)
+
+        self.birthday = Attribute.objects.create(org=self.org, name='Geburtstag', type='D')
+        self.age = Attribute.objects.create(org=self.org, name='Alter', type='N')
+        for i, (first_name, birthday) in enumerate([('Anna', '2001-05-04'), ('Ben', None)]):
+            user = get_user_model().objects.create_user(
+                username=f'bewerber{i}', first_name=first_name, last_name='Test', email=f'b{i}@test.com'
+            )
+            CustomUser.objects.create(org=self.org, user=user, person_cluster=self.person_cluster_bw)
+            if birthday:
+                UserAttribute.objects.create(org=self.org, user=user, attribute=self.birthday, value=birthday)
+            UserAttribute.objects.create(org=self.org, user=user, attribute=self.age, value=str(20 + i))
+
+        self.client.login(username='orgadmin', password='adminpass123')
+
+    def test_xlsx_export_streams_converted_attributes(self):
+        import pandas as pd
+
+        response = self.client.get(reverse('application_download_all_excel'))
+
+        self.assertEqual(response.status_code, 200)
+        df = pd.read_excel(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(list(df.columns), [
+            'Vorname', 'Nachname', 'E-Mail', 'Zuteilung Stelle', 'Zuteilung Land',
+            'Endbewertung', 'Note', 'Alter', 'Geburtstag',
+        ])
+        self.assertEqual(list(df['Vorname']), ['Anna', 'Ben'])
+        self.assertEqual(list(df['Alter']), [20, 21])
+        self.assertEqual(df['Geburtstag'].iloc[0], '04.05.2001')
+        self.assertTrue(pd.isna(df['Geburtstag'].iloc[1]))
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('application_download_all_excel') + '?format=csv')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('Anna;Test;b0@test.com'))
+
+    def test_large_export_runs_in_background(self):
+        with patch('ORG.views.APPLICATION_EXPORT_BACKGROUND_THRESHOLD', 1), \
+                patch('ORG.views.export_applications_task.delay') as delay:
+            response = self.client.get(reverse('application_download_all_excel'))
+
+        self.assertEqual(response.status_code, 302)
+        delay.assert_called_once()
+        self.assertEqual(delay.call_args.args, (self.org.id, self.admin_user.id))
+
+    def test_background_export_emails_download_link(self):
+        import tempfile
+        from django.core import mail
+        from ORG.tasks import export_applications_task
+
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            mail.outbox = []
+            self.assertTrue(export_applications_task.apply(args=[self.org.id, self.admin_user.id]).get())
+
+            self.assertEqual(len(mail.outbox), 1)
+            self.assertEqual(mail.outbox[0].to, ['admin@test.com'])
+            link = mail.outbox[0].alternatives[0][0].split('/exports/')[1].split('/')[0]
+            response = self.client.get(reverse('download_export', args=[link]))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+            other = get_user_model().objects.create_user(username='other', password='otherpass123')
+            self.client.force_login(other)
+            response = self.client.get(reverse('download_export', args=[link]))
+            self.assertEqual(response.status_code, 404)
+
+    def test_export_requires_org_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('application_download_all_excel'))
+        self.assertEqual(response.status_code, 302)
+
+        bewerber = get_user_model().objects.get(username='bewerber0')
+        self.client.force_login(bewerber)
+        response = self.client.get(reverse('application_download_all_excel'))
+        self.assertNotEqual(response.status_code, 200)
+
+    def test_expired_exports_are_deleted(self):
+        import os
+        import tempfile
+        import time
+        from Global.table_export import EXPORT_LINK_MAX_AGE, get_export_dir, save_export_file
+        from Global.tasks import cleanup_exports_task
+
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            expired = save_export_file(['A'], [[1]], 'alt')
+            current = save_export_file(['A'], [[1]], 'neu')
+            old = time.time() - EXPORT_LINK_MAX_AGE - 60
+            os.utime(os.path.join(get_export_dir(), expired), (old, old))
+
+            self.assertEqual(cleanup_exports_task.apply().get(), {'deleted': 1})
+            self.assertEqual(os.listdir(get_export_dir()), [current])
+
+
+class BulkApplicationPdfTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from BW.models import ApplicationAnswer, ApplicationQuestion
+
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = self.settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.org = Organisation.objects.create(name='Test Org', email='test@test.com')
+        person_cluster_org = PersonCluster.objects.create(org=self.org, name='Organisation', view='O')
+        person_cluster_bw = PersonCluster.objects.create(org=self.org, name='Bewerber', view='B')
+        self.admin_user = get_user_model().objects.create_user(
+            username='orgadmin', password='adminpass123', email='admin@test.com'
+        )
+        CustomUser.objects.create(org=self.org, user=self.admin_user, person_cluster=person_cluster_org)
+
+        question = ApplicationQuestion.objects.create(org=self.org, question='Warum?')
+        self.bewerber = []
+        for i, name in enumerate(['Meier', 'Albrecht', 'Meier']):
+            user = get_user_model().objects.create_user(username=f'bewerber{i}', first_name='Anna', last_name=name)
+            CustomUser.objects.create(org=self.org, user=user, person_cluster=person_cluster_bw)
+            ApplicationAnswer.objects.create(org=self.org, user=user, question=question, answer=f'Antwort {i}')
+            self.bewerber.append(Bewerber.objects.get(user=user))
+
+        self.client.login(username='orgadmin', password='adminpass123')
+
+    def _download_emailed_export(self, url):
+        from django.core import mail
+
+        mail.outbox = []
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 1)
+        link = mail.outbox[0].alternatives[0][0].split('/exports/')[1].split('/')[0]
+        response = self.client.get(reverse('download_export', args=[link]))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_zip_contains_one_pdf_per_applicant(self):
+        import zipfile
+
+        with patch('ORG.views.schedule_application_pdf_bundle') as schedule:
+            response = self.client.get(reverse('application_download_all_pdf'))
+        self.assertEqual(response.status_code, 302)
+        schedule.assert_called_once()
+
+        archive = zipfile.ZipFile(BytesIO(self._download_emailed_export(reverse('application_download_all_pdf'))))
+        names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        self.assertEqual(len(set(names)), 3)
+        for name in names:
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+
+        # Rendered now, so the next download is streamed right away
+        response = self.client.get(reverse('application_download_all_pdf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(len(zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))).namelist()), 3)
+
+    def test_uploaded_and_cached_pdfs_are_not_rendered_again(self):
+        from django.core.files.base import ContentFile
+        from ORG.pdf_batch import application_pdfs, render_missing_pdfs
+
+        uploaded = self.bewerber[0]
+        uploaded.application_pdf.save('upload.pdf', ContentFile(b'%PDF-uploaded'))
+        queryset = Bewerber.objects.filter(org=self.org)
+
+        with patch('ORG.pdf_utils.generate_full_application_pdf', return_value=b'%PDF-rendered') as render:
+            documents = application_pdfs(queryset)
+            self.assertEqual([path is None for _, path in documents].count(True), 2)
+            first = dict(render_missing_pdfs(documents))
+            second = dict(application_pdfs(queryset))
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(first, second)
+        with open(first[uploaded], 'rb') as file:
+            self.assertEqual(file.read(), b'%PDF-uploaded')
+
+    def test_missing_pdfs_are_rendered_by_one_task_each(self):
+        from django.core.files.base import ContentFile
+        from ORG.pdf_batch import application_pdf_render_tasks, application_pdfs
+
+        self.bewerber[0].application_pdf.save('upload.pdf', ContentFile(b'%PDF-uploaded'))
+        render_tasks = application_pdf_render_tasks(application_pdfs(Bewerber.objects.filter(org=self.org)), self.admin_user.id)
+
+        self.assertEqual(
+            sorted(task.args[1] for task in render_tasks.tasks),
+            sorted(b.id for b in self.bewerber[1:]),
+        )
+        self.assertEqual({task.task for task in render_tasks.tasks}, {'Global.tasks.render_pdf_task'})
+
+    def test_fingerprints_do_not_query_per_applicant(self):
+        from ORG.pdf_batch import application_pdfs
+        from ORG.pdf_utils import application_pdf_fingerprint, application_pdf_fingerprints
+
+        queryset = Bewerber.objects.filter(org=self.org)
+        with self.assertNumQueries(3):
+            application_pdfs(queryset)
+        applicants = list(queryset.select_related('user', 'org'))
+        self.assertEqual(
+            application_pdf_fingerprints(applicants),
+            {b.id: application_pdf_fingerprint(b) for b in applicants},
+        )
+
+    def test_merged_pdf_has_a_bookmark_per_applicant(self):
+        from PyPDF2 import PdfReader
+
+        url = reverse('application_download_all_pdf') + '?format=merged'
+        reader = PdfReader(BytesIO(self._download_emailed_export(url)))
+        self.assertEqual([item.title for item in reader.outline], ['Anna Albrecht', 'Anna Meier', 'Anna Meier'])
+        self.assertGreaterEqual(len(reader.pages), 3)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(PdfReader(BytesIO(response.content)).outline), 3)
+
+
+class DashboardWidgetTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+        self.org = Organisation.objects.create(name='Test Org', email='test@test.com')
+        person_cluster_org = PersonCluster.objects.create(org=self.org, name='Organisation', view='O', bilder=True)
+        person_cluster_fw = PersonCluster.objects.create(org=self.org, name='Freiwillige', view='F')
+        self.admin_user = get_user_model().objects.create_user(username='orgadmin', password='adminpass123')
+        CustomUser.objects.create(org=self.org, user=self.admin_user, person_cluster=person_cluster_org)
+        self.fw_user = get_user_model().objects.create_user(username='fw', first_name='Frida', last_name='Frei')
+        CustomUser.objects.create(org=self.org, user=self.fw_user, person_cluster=person_cluster_fw)
+
+        self.aufgabe = Aufgabe2.objects.create(org=self.org, name='Visum beantragen')
+        self.task = UserAufgaben.objects.create(
+            org=self.org, user=self.fw_user, aufgabe=self.aufgabe, pending=True, erledigt=False
+        )
+        self.client.login(username='orgadmin', password='adminpass123')
+
+    def test_widgets_are_served_from_cache(self):
+        from ORG.dashboard_widgets import get_dashboard_widgets
+
+        names = ['pending_tasks', 'open_tasks', 'my_open_tasks', 'recent_ampel_entries']
+        values, timings = get_dashboard_widgets(names, self.org, self.admin_user)
+        self.assertEqual(values['pending_tasks'], [self.task])
+        self.assertFalse(any(timing['cached'] for timing in timings))
+
+        with self.assertNumQueries(0):
+            cached, timings = get_dashboard_widgets(names, self.org, self.admin_user)
+            self.assertEqual(cached['pending_tasks'][0].aufgabe.name, 'Visum beantragen')
+            self.assertEqual(cached['pending_tasks'][0].file_downloaded_of.count(), 0)
+        self.assertTrue(all(timing['cached'] for timing in timings))
+
+    def test_saving_a_dependency_invalidates_the_widget(self):
+        from ORG.dashboard_widgets import get_dashboard_widgets
+
+        get_dashboard_widgets(['pending_tasks', 'sticky_notes'], self.org, self.admin_user)
+        self.task.pending = False
+        self.task.save()
+
+        values, timings = get_dashboard_widgets(['pending_tasks', 'sticky_notes'], self.org, self.admin_user)
+        self.assertEqual(values['pending_tasks'], [])
+        self.assertEqual([timing['cached'] for timing in timings], [False, True])
+
+    def test_user_widgets_are_cached_per_user(self):
+        from ORG.dashboard_widgets import get_dashboard_widgets
+
+        self.task.pending = False
+        self.task.save()
+        admin_values, _ = get_dashboard_widgets(['my_open_tasks'], self.org, self.admin_user)
+        fw_values, _ = get_dashboard_widgets(['my_open_tasks'], self.org, self.fw_user)
+
+        self.assertEqual(admin_values['my_open_tasks'], [])
+        self.assertEqual(fw_values['my_open_tasks'], [self.task])
+
+    def test_home_pages_render_widgets(self):
+        for url_name in ('org_home', 'org_home_2'):
+            response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['pending_tasks'], [self.task])
+            self.assertNotIn('gallery_images', response.context)
+            self.assertContains(response, 'data-dashboard-widget=')
+            self.assertNotContains(response, 'id="dashboardWidgetTimings"')
+
+    def test_lazy_gallery_widget(self):
+        bild = Bilder2.objects.create(org=self.org, user=self.fw_user, titel='Ausflug', beschreibung='Am See')
+
+        response = self.client.get(reverse('dashboard_widget', args=['gallery_images_compact']))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn('Am See', data['html'])
+        self.assertEqual(data['timing']['name'], 'gallery_images_compact')
+        self.assertEqual(self.client.get(reverse('dashboard_widget', args=['pending_tasks'])).status_code, 404)
+
+    def test_staff_see_widget_timings(self):
+        self.admin_user.is_staff = True
+        self.admin_user.save()
+
+        response = self.client.get(reverse('org_home'))
+
+        self.assertContains(response, 'id="dashboardWidgetTimings"')
+        self.assertContains(response, 'data-lazy-widget="gallery_images_compact"')
@@ -4,9 +4,11 @@ from django.urls import path
 urlpatterns = [
     path('old/', views.home, name='org_home_2'),
     path('', views.home_2, name='org_home'),
+    path('dashboard-widget/<str:name>/', views.dashboard_widget, name='dashboard_widget'),
 
     path('add/<str:model_name>/', views.add_object, name='add_object'),
     path('add/<str:model_name>/excel/', views.add_objects_from_excel, name='add_objects_from_excel'),
+    path('excel-import-status/<str:task_id>/', views.excel_import_status, name='excel_import_status'),
     path('add_aufgabe/', views.add_aufgabe, name='add_aufgabe'),
     path('edit_aufgabe/<int:id>', views.add_aufgabe, name='edit_aufgabe'),
     path('edit/<str:model_name>/<int:id>', views.edit_object, name='edit_object'),
@@ -44,6 +46,7 @@ urlpatterns = [
     path('bewerbung-answer-download/<int:bewerber_id>', views.application_answer_download, name='application_answer_download'),
     path('bewerbung-answer-download-fields/<int:bewerber_id>', views.application_answer_download_fields, name='application_answer_download_fields'),
     path('bewerbung-download-all-excel/', views.application_download_all_excel, name='application_download_all_excel'),
+    path('bewerbung-download-all-pdf/', views.application_download_all_pdf, name='application_download_all_pdf'),
     
     path('download-aufgabe/<int:id>', views.download_aufgabe, name='download_aufgabe'),
     path('statistik/', views.statistik, name='statistik'),
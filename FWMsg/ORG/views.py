@@ -8,7 +8,7 @@ import json
 
 from django.db.models import ForeignKey
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound, HttpResponseRedirect, JsonResponse
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -37,10 +37,22 @@ from FW.models import Freiwilliger
 from django.contrib.auth.models import User
 
 import ORG.forms as ORGforms
+from celery.result import AsyncResult
 from FWMsg.decorators import required_role
 from django.views.decorators.http import require_http_methods
+from .dashboard_widgets import DASHBOARD_WIDGETS, get_dashboard_context, get_dashboard_widgets
+from .excel_import import get_import_person_cluster, prepare_import
+from .excel_utils import (
+    APPLICATION_EXPORT_BACKGROUND_THRESHOLD,
+    get_application_export,
+    get_application_export_queryset,
+)
+from .tasks import export_applications_task, import_objects_from_excel_task
+from Global.table_export import table_response
+from Global.pdf_jobs import pdf_job_response
+from .pdf_batch import application_pdfs, iter_application_pdf_zip, merge_application_pdfs, schedule_application_pdf_bundle
 from .pdf_utils import (
-    generate_full_application_pdf, 
+    application_pdf_filename,
     generate_selected_application_pdf, 
     create_pdf_response
 )
@@ -173,148 +185,45 @@ allowed_models_to_edit = {
 @login_required
 @required_role('O')
 def home(request):
-    from Global.views import get_bilder, get_posts
-
-    # Get all gallery images and group by bilder
-    gallery_images = get_bilder(request.user.org, limit=6)
-
-    # Get pending tasks
-    now = timezone.now().date()
-    pending_tasks = UserAufgaben.objects.filter(
-        org=request.user.org,
-        erledigt=False,
-        pending=True,
-    ).order_by('-erledigt_am', 'faellig')  # Order by deadline
-
-    open_tasks = UserAufgaben.objects.filter(
-        org=request.user.org,
-        erledigt=False,
-        pending=False,
-        faellig__lte=now
-    ).order_by('faellig')
-
-    my_open_tasks = UserAufgaben.objects.filter(
-        org=request.user.org,
-        user=request.user,
-        erledigt=False,
-        pending=False
-    ).order_by('faellig')
-
-    posts = get_posts(request.user.org, limit=4)
-
-    # Get all pinned notes across all Einsatzstellen
-    pinned_notizen = EinsatzstelleNotiz.objects.filter(
-        org=request.user.org,
-        pinned=True
-    ).order_by('-date')
-    
-    sticky_notes = StickyNote.objects.filter(
-        org=request.user.org,
-        user=request.user,
-        pinned=True
-    ).order_by('-priority', '-date')
-
-    # Get recent ampel entries
-    recent_ampel_entries = Ampel2.objects.filter(
-        org=request.user.org,
-        date__gte=timezone.now() - timezone.timedelta(days=5)
-    ).select_related('user').order_by('-date')[:10]
-
-    context = {
-        'gallery_images': gallery_images,
-        'pending_tasks': pending_tasks,
-        'open_tasks': open_tasks,
-        'my_open_tasks': my_open_tasks,
-        'posts': posts,
-        'pinned_notizen': pinned_notizen,
-        'sticky_notes': sticky_notes,
-        'recent_ampel_entries': recent_ampel_entries,
+    context = get_dashboard_context(request, [
+        'gallery_images', 'pending_tasks', 'open_tasks', 'my_open_tasks', 'posts',
+        'pinned_notizen', 'sticky_notes', 'recent_ampel_entries',
+    ])
+    context.update({
         'large_container': True,
         'today': date.today()
-    }   
-    
+    })
     return render(request, 'homeOrg.html', context=context)
 
 
 @login_required
 @required_role('O')
 def home_2(request):
-    from Global.views import get_bilder, get_posts
-
-    # Get all gallery images and group by bilder
-    gallery_images = get_bilder(request.user.org, limit=4)
-
-    # Get pending tasks
-    now = timezone.now().date()
-    pending_tasks = UserAufgaben.objects.filter(
-        org=request.user.org,
-        erledigt=False,
-        pending=True,
-    ).order_by('-erledigt_am', 'faellig')  # Order by deadline
-
-    open_tasks = UserAufgaben.objects.filter(
-        org=request.user.org,
-        erledigt=False,
-        pending=False,
-        faellig__lte=now
-    ).order_by('faellig')
-
-    my_open_tasks = UserAufgaben.objects.filter(
-        org=request.user.org,
-        user=request.user,
-        erledigt=False,
-        pending=False
-    ).order_by('faellig')
-
-    posts = get_posts(request.user.org, limit=4)
-
-    # Get all pinned notes across all Einsatzstellen
-    pinned_notizen = EinsatzstelleNotiz.objects.filter(
-        org=request.user.org,
-        pinned=True
-    ).order_by('-date')
-    
-    sticky_notes = StickyNote.objects.filter(
-        org=request.user.org,
-        user=request.user,
-        pinned=True
-    ).order_by('-priority', '-date')
-
-    # Get recent ampel entries
-    recent_ampel_entries = Ampel2.objects.filter(
-        org=request.user.org,
-        date__gte=timezone.now() - timezone.timedelta(days=5)
-    ).select_related('user').order_by('-date')[:10]
-
-    # Get pending change requests
-    pending_change_requests = ChangeRequest.objects.filter(
-        org=request.user.org,
-        status='pending'
-    ).select_related('requested_by').order_by('-created_at')
-
-    from Home.models import OwnSigninUser
-    pending_own_signin_users = OwnSigninUser.objects.filter(
-        org=request.user.org,
-    ).select_related('person_cluster', 'land').order_by('-created_at')
-
-    context = {
-        'gallery_images': gallery_images,
-        'pending_tasks': pending_tasks,
-        'open_tasks': open_tasks,
-        'my_open_tasks': my_open_tasks,
-        'posts': posts,
-        'pinned_notizen': pinned_notizen,
-        'sticky_notes': sticky_notes,
-        'recent_ampel_entries': recent_ampel_entries,
-        'pending_change_requests': pending_change_requests,
-        'pending_own_signin_users': pending_own_signin_users,
+    context = get_dashboard_context(request, [
+        'gallery_images_compact', 'pending_tasks', 'open_tasks', 'my_open_tasks', 'posts',
+        'pinned_notizen', 'sticky_notes', 'recent_ampel_entries',
+        'pending_change_requests', 'pending_own_signin_users',
+    ])
+    context.update({
         'large_container': True,
         'today': date.today()
-    }
-    
+    })
     return render(request, 'homeOrg_2.html', context=context)
 
 
+@login_required
+@required_role('O')
+@require_http_methods(["GET"])
+def dashboard_widget(request, name):
+    """Render a lazy dashboard widget; returns the HTML and the timing for the debug panel."""
+    widget = DASHBOARD_WIDGETS.get(name)
+    if not widget or not widget.get('lazy'):
+        return HttpResponseNotFound()
+    values, timings = get_dashboard_widgets([name], request.user.org, request.user)
+    html = render_to_string(widget['template'], {'value': values[name]}, request=request)
+    return JsonResponse({'html': html, 'timing': timings[0]})
+
+
 @staff_member_required
 def nginx_statistic(request):
     try:
@@ -442,42 +351,61 @@ def add_aufgabe(request, id=None):
 @login_required
 @required_role('O')
 def add_objects_from_excel(request, model_name):
+    model, response = _check_model_exists(model_name)
+    if response:
+        return response
+
+    context = {'model_name': model_name, 'verbose_name': model._meta.verbose_name_plural}
+
     if request.method == 'POST':
-        excel_file = request.FILES['excel_file']
-        df = pd.read_excel(excel_file)
-        model, response = _check_model_exists(model_name)
-        if response:
-            return response
+        excel_file = request.FILES.get('excel_file')
+        if not excel_file:
+            messages.error(request, _('Bitte wähle eine Excel-Datei aus.'))
+            return render(request, 'add_objects_from_excel.html', context)
 
-        personen_cluster_id = request.COOKIES.get('selectedPersonCluster')
-        personen_cluster = PersonCluster.selectable_for_org(
+        try:
+            df = pd.read_excel(excel_file)
+        except Exception as e:
+            messages.error(request, _('Die Datei konnte nicht gelesen werden: %(error)s') % {'error': e})
+            return render(request, 'add_objects_from_excel.html', context)
+
+        personen_cluster = get_import_person_cluster(
             request.user.org,
-            id=personen_cluster_id,
-        ).first()
+            request.COOKIES.get('selectedPersonCluster'),
+        )
+        rows, report = prepare_import(df, model, request.user.org, person_cluster=personen_cluster)
+        context['report'] = report
+
+        if request.POST.get('dry_run') or not rows:
+            return render(request, 'add_objects_from_excel.html', context)
+
+        task = import_objects_from_excel_task.delay(
+            model_name,
+            request.user.org.id,
+            rows,
+            person_cluster_id=personen_cluster.id if personen_cluster else None,
+            user_id=request.user.id,
+        )
+        context['task_id'] = task.id
+        return render(request, 'add_objects_from_excel.html', context)
 
-        for index, row in df.iterrows():
-            required_fields = []
-            for field in model._meta.fields:
-                if field.name in row:
-                    required_fields.append(field.name)
-            print(required_fields)
-            try:
-                obj = model.objects.create(
-                    org=request.user.org,
-                    **{field: row[field] for field in required_fields}
-                )
-                if 'personen_cluster' in model._meta.fields and personen_cluster:
-                    obj.personen_cluster = personen_cluster
-                for field in model._meta.fields:
-                    if field.name in row:
-                        setattr(obj, field.name, row[field.name])
-                obj.save()
-            except Exception as e:
-                print(e)
-                continue
+    return render(request, 'add_objects_from_excel.html', context)
 
-        return redirect('list_object', model_name=model_name)
-    return render(request, 'add_objects_from_excel.html')
+
+@login_required
+@required_role('O')
+@require_http_methods(["GET"])
+def excel_import_status(request, task_id):
+    """Progress of a background Excel import as JSON ({state, done, total})."""
+    result = AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+    if info.get('org_id') != request.user.org.id:
+        return JsonResponse({'state': 'PENDING', 'done': 0, 'total': None})
+    return JsonResponse({
+        'state': result.state,
+        'done': info.get('done', 0),
+        'total': info.get('total'),
+    })
 
 
 @login_required
@@ -1802,17 +1730,11 @@ def application_answer_download(request, bewerber_id):
         if not bewerber.interview_persons.filter(id=request.user.id).exists():
             return render(request, '403.html', {'error_message': 'Du bist nicht berechtigt, diese Datei herunterzuladen. Du bist nicht als Interviewperson für diesen Bewerber:in zuständig.'}, status=403)
     
-    # Create filename
-    filename = f"bewerbung_{bewerber.user.first_name}_{bewerber.user.last_name}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
-    filename = filename.replace(' ', '_')
-    
     if bewerber.application_pdf:
-        pdf_content = bewerber.application_pdf.read()
-    else:
-        pdf_content = generate_full_application_pdf(bewerber)
-    
-    return create_pdf_response(pdf_content, filename)
+        return create_pdf_response(bewerber.application_pdf.read(), application_pdf_filename(bewerber))
+
+    # Rendered in the background and cached until the answers change
+    return pdf_job_response(request, 'application', bewerber)
 
 @login_required
 @required_role('O')
@@ -1836,96 +1758,55 @@ def application_answer_download_fields(request, bewerber_id):
     return create_pdf_response(pdf_content, filename)
 
 
+@login_required
+@required_role('O')
 def application_download_all_excel(request):
-    
     current_person_cluster = _get_active_person_cluster(request)
-    if current_person_cluster:
-        bewerber = Bewerber.objects.filter(org=request.user.org, user__customuser__person_cluster=current_person_cluster)
-    else:
-        bewerber = Bewerber.objects.filter(org=request.user.org)
-    
     seminar_filter = request.COOKIES.get('selectedSeminarFilter')
-    if seminar_filter == 'yes':
-        bewerber = bewerber.filter(seminar_bewerber__isnull=False)
-    elif seminar_filter == 'no':
-        bewerber = bewerber.filter(seminar_bewerber__isnull=True)
-    
-    user_ids = bewerber.values_list('user_id', flat=True)
-    
-    # Create base DataFrame with bewerber data (including user_id for merging)
-    df = pd.DataFrame(bewerber.values(
-        'id', 'user_id', 'user__first_name', 'user__last_name', 'user__email', 'zuteilung__name', 'zuteilung__land__name', 'endbewertung', 'note'
-    ))
-    
-    # Get user attributes with their types and pivot them to create columns for each attribute
-    user_attributes = UserAttribute.objects.filter(user_id__in=user_ids).values(
-        'user_id', 'attribute__name', 'attribute__type', 'value'
-    )
-    
-    if user_attributes.exists():
-        # Create a DataFrame from user attributes
-        attr_df = pd.DataFrame(user_attributes)
-        
-        # Store attribute types for later formatting
-        attribute_types = attr_df[['attribute__name', 'attribute__type']].drop_duplicates().set_index('attribute__name')['attribute__type'].to_dict()
-        
-        # Pivot the attributes so each attribute name becomes a column
-        attr_pivot = attr_df.pivot_table(
-            index='user_id',
-            columns='attribute__name',
-            values='value',
-            aggfunc='first'  # In case there are duplicates, take the first value
-        ).reset_index()
-        
-        # Merge with the main DataFrame on user_id
-        df = df.merge(attr_pivot, on='user_id', how='left')
-        
-        # Format attribute columns based on their type
-        for attr_name, attr_type in attribute_types.items():
-            if attr_name in df.columns:
-                if attr_type == 'N':  # Number (Zahl)
-                    df[attr_name] = pd.to_numeric(df[attr_name], errors='coerce')
-                elif attr_type == 'D':  # Date (Datum)
-                    # Convert to datetime first, then format as German date string (dd.mm.yyyy)
-                    df[attr_name] = pd.to_datetime(df[attr_name], errors='coerce')
-                    df[attr_name] = df[attr_name].apply(lambda x: x.strftime('%d.%m.%Y') if pd.notna(x) else None)
-                elif attr_type == 'B':  # Boolean (Wahrheitswert)
-                    # Convert string values to boolean
-                    df[attr_name] = df[attr_name].map(lambda x: True if str(x).lower() in ['true', '1', 'ja', 'yes'] else (False if str(x).lower() in ['false', '0', 'nein', 'no'] else None) if pd.notna(x) else None)
-                # For 'T' (Text), 'L' (Long Text), 'E' (Email), 'P' (Phone), 'C' (Choice) - keep as string (no conversion needed)
-    
-    # Remove user_id from the final output (it was only needed for merging)
-    if 'user_id' in df.columns:
-        df = df.drop(columns=['user_id'])
-    if 'id' in df.columns:
-        df = df.drop(columns=['id'])
-    
-    # Rename columns to German headers
-    column_rename_mapping = {
-        'id': 'ID',
-        'user__first_name': 'Vorname',
-        'user__last_name': 'Nachname',
-        'user__email': 'E-Mail',
-        'status': 'Status',
-        'status_comment': 'Status Kommentar',
-        'abgeschlossen': 'Abgeschlossen',
-        'gegenstand': 'Gegenstand',
-        'endbewertung': 'Endbewertung',
-        'note': 'Note',
-        'zuteilung__name': 'Zuteilung Stelle',
-        'zuteilung__land__name': 'Zuteilung Land'
-    }
-    df = df.rename(columns=column_rename_mapping)
-    
-    # create excel file and return response
-    import io
-    excel_buffer = io.BytesIO()
-    df.to_excel(excel_buffer, index=False)
-    excel_buffer.seek(0)
-    response = HttpResponse(excel_buffer.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="bewerbung_all_excel.xlsx"'
+    file_format = 'csv' if request.GET.get('format') == 'csv' else 'xlsx'
+
+    bewerber = get_application_export_queryset(request.user.org, current_person_cluster, seminar_filter)
+
+    if bewerber.count() > APPLICATION_EXPORT_BACKGROUND_THRESHOLD:
+        export_applications_task.delay(
+            request.user.org.id,
+            request.user.id,
+            person_cluster_id=current_person_cluster.id if current_person_cluster else None,
+            seminar_filter=seminar_filter,
+            file_format=file_format,
+        )
+        messages.success(request, _('Der Export wird erstellt. Du erhältst eine E-Mail mit dem Download-Link, sobald er fertig ist.'))
+        return redirect(request.META.get('HTTP_REFERER') or 'application_list')
+
+    headers, rows = get_application_export(bewerber)
+    return table_response(headers, rows, 'bewerbung_all_excel', file_format=file_format)
+
+
+@login_required
+@required_role('O')
+def application_download_all_pdf(request):
+    """
+    Application PDFs of the filtered applicants as a ZIP or, with ?format=merged,
+    as one PDF. If any PDF still has to be rendered, the bundle is created in
+    the background and emailed as a download link.
+    """
+    current_person_cluster = _get_active_person_cluster(request)
+    seminar_filter = request.COOKIES.get('selectedSeminarFilter')
+    merged = request.GET.get('format') == 'merged'
+    bewerber = get_application_export_queryset(request.user.org, current_person_cluster, seminar_filter)
+    documents = application_pdfs(bewerber)
+
+    if any(path is None for _, path in documents):
+        schedule_application_pdf_bundle(documents, request.user.id, merged=merged)
+        messages.success(request, _('Die PDFs werden erstellt. Du erhältst eine E-Mail mit dem Download-Link, sobald sie fertig sind.'))
+        return redirect(request.META.get('HTTP_REFERER') or 'application_list')
+
+    if merged:
+        return create_pdf_response(merge_application_pdfs(documents), 'bewerbungen.pdf')
+
+    response = StreamingHttpResponse(iter_application_pdf_zip(documents), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="bewerbungen.zip"'
     return response
-    
 
 
 @login_required
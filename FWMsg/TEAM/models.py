@@ -1,5 +1,5 @@
 from django.db import models
-from simple_history.models import HistoricalRecords
+from Global.history import HistoricalRecords
 from django.dispatch import receiver
 import random
 import string
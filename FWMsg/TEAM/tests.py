@@ -138,6 +138,28 @@ class TeamViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'teamHome.html')
 
+    def test_home_view_country_statistics(self):
+        """Volunteers and placements are counted per assigned country"""
+        from Global.models import Ampel2
+
+        other_land = Einsatzland2.objects.create(org=self.org, name='Other Country', code='XY')
+        Einsatzstelle2.objects.create(org=self.org, name='Other Placement', land=other_land)
+        Einsatzstelle2.objects.create(org=self.org, name='Second Placement', land=self.land)
+        self.team.land.add(other_land)
+        Ampel2.objects.create(org=self.org, user=self.volunteer_user, status='G', comment='Alles gut')
+
+        response = self.client.get(reverse('team_home'))
+
+        self.assertEqual(response.status_code, 200)
+        stats = {stat['country'].name: stat for stat in response.context['country_stats']}
+        self.assertEqual(stats['Test Country']['freiwillige_count'], 1)
+        self.assertEqual(stats['Test Country']['einsatzstellen_count'], 2)
+        self.assertEqual(stats['Other Country']['freiwillige_count'], 0)
+        self.assertEqual(stats['Other Country']['einsatzstellen_count'], 1)
+        self.assertEqual(response.context['freiwillige_count'], 1)
+        self.assertEqual(response.context['einsatzstellen_count'], 3)
+        self.assertEqual([entry.comment for entry in response.context['recent_ampel_entries']], ['Alles gut'])
+
     def test_contacts_view(self):
         """Test the contacts view"""
         self.client.login(user=self.user)
@@ -1,7 +1,8 @@
 from datetime import timedelta
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
@@ -9,14 +10,44 @@ from django.utils import timezone
 from FW.models import Freiwilliger
 from FWMsg.decorators import required_role
 from Global.models import (
-    Ampel2, Bilder2, Einsatzland2, Einsatzstelle2, PersonCluster,
+    Ampel2, Bilder2, BilderGallery2, Einsatzland2, Einsatzstelle2, PersonCluster,
     Post2, UserAufgaben, UserAttribute
 )
+from Global.posts_feed import annotate_posts, mark_unread
 from TEAM.models import Team
 
 # Base template for team views
 base_template = 'baseTeam.html'
 
+
+def _count_per_country(queryset, country_field):
+    """Subquery counting the rows of ``queryset`` that belong to the outer country."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{country_field: OuterRef('pk')}).order_by().values(country_field).annotate(
+                n=Count('id')
+            ).values('n')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def get_country_stats(team_member):
+    """
+    Assigned countries of a team member, each annotated with
+    ``freiwillige_count`` and ``einsatzstellen_count``, in one query.
+    """
+    return list(team_member.land.annotate(
+        freiwillige_count=_count_per_country(
+            Freiwilliger.objects.filter(org=team_member.org), 'einsatzland2'
+        ),
+        einsatzstellen_count=_count_per_country(
+            Einsatzstelle2.objects.filter(org=team_member.org), 'land'
+        ),
+    ).order_by('name'))
+
+
 # Create your views here.
 @login_required
 @required_role('T')
@@ -30,60 +61,54 @@ def home(request):
     einsatzstellen_count = 0
     country_stats = []
     recent_ampel_entries = []
-    gallery_images = []
-    posts = []
     
     if team_member:
-        assigned_countries = team_member.land.all()
+        assigned_countries = get_country_stats(team_member)
         
-        if assigned_countries.exists():
-            # Get volunteers for assigned countries
-            freiwillige = _get_Freiwillige(request)
-            freiwillige_count = freiwillige.count()
-            freiwillige_users = [fw.user for fw in freiwillige]
+        if assigned_countries:
+            # Totals add up exactly, every volunteer and placement has one country
+            freiwillige_count = sum(country.freiwillige_count for country in assigned_countries)
+            einsatzstellen_count = sum(country.einsatzstellen_count for country in assigned_countries)
+            country_stats = [
+                {
+                    'country': country,
+                    'freiwillige_count': country.freiwillige_count,
+                    'einsatzstellen_count': country.einsatzstellen_count,
+                }
+                for country in assigned_countries
+            ]
             
-            # Count placement locations
-            einsatzstellen_count = Einsatzstelle2.objects.filter(
+            # Get recent ampel entries (last 7 days) of the volunteers in these countries
+            freiwillige_users = Freiwilliger.objects.filter(
                 org=team_member.org,
-                land__in=assigned_countries
-            ).count()
-            
-            # Get recent ampel entries (last 7 days)
+                einsatzland2__in=assigned_countries,
+            ).values('user')
             recent_ampel_entries = Ampel2.objects.filter(
                 org=team_member.org,
                 user__in=freiwillige_users,
                 date__gte=timezone.now() - timedelta(days=7)
             ).select_related('user').order_by('-date')[:10]
-            
-            # Generate country statistics
-            for country in assigned_countries:
-                country_freiwillige = Freiwilliger.objects.filter(einsatzland2=country)
-                country_einsatzstellen = Einsatzstelle2.objects.filter(land=country)
-                
-                country_stats.append({
-                    'country': country,
-                    'freiwillige_count': country_freiwillige.count(),
-                    'einsatzstellen_count': country_einsatzstellen.count(),
-                })
     
-    # Get recent images from volunteers
+    # Get recent images from volunteers; the ordered prefetch also answers
+    # ``.first`` in the image templates
     recent_bilder = Bilder2.objects.filter(
         org=request.user.org
-    ).select_related('user').order_by('-date_created')[:4]
-    
-    # Group images by gallery
-    for bild in recent_bilder:
-        bilder_gallery = bild.bildergallery2_set.all()
-        if bilder_gallery.exists():
-            gallery_images.append({
-                bild: list(bilder_gallery)
-            })
+    ).select_related('user', 'user__customuser').prefetch_related(
+        Prefetch('bildergallery2_set', queryset=BilderGallery2.objects.order_by('id')),
+        'comments__user',
+        'reactions__user',
+    ).order_by('-date_created')[:4]
+    gallery_images = [
+        {bild: bild.bildergallery2_set.all()}
+        for bild in recent_bilder
+        if bild.bildergallery2_set.all()
+    ]
 
     # Get recent posts from volunteers
-    posts = Post2.objects.filter(
+    posts = mark_unread(list(annotate_posts(Post2.objects.filter(
         org=request.user.org,
         person_cluster=request.user.person_cluster
-    ).select_related('user').order_by('-date')[:3]
+    ), request.user).order_by('-date')[:3]), request.user)
     
     # Get user's personal tasks
     my_open_tasks = UserAufgaben.objects.filter(
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
 
-from .models import ChatDirect, ChatGroup, ChatMessageDirect, ChatMessageGroup
+from .models import ChatDirect, ChatGroup, ChatMessageDirect, ChatMessageGroup, ChatNotificationStats
 
 
 class ReadFilter(SimpleListFilter):
@@ -91,3 +91,23 @@ class ChatMessageGroupAdmin(admin.ModelAdmin):
     def read_by_count(self, obj):
         return obj.read_by.count()
     read_by_count.short_description = 'Gelesen von'
+
+
+@admin.register(ChatNotificationStats)
+class ChatNotificationStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'date', 'messages', 'tasks_scheduled', 'tasks_saved',
+        'recipient_messages', 'digests_sent', 'notifications_saved', 'emails_sent', 'recipients_skipped',
+    )
+    readonly_fields = list_display
+
+    def tasks_saved(self, obj):
+        return obj.tasks_saved
+    tasks_saved.short_description = 'Eingesparte Tasks'
+
+    def notifications_saved(self, obj):
+        return obj.notifications_saved
+    notifications_saved.short_description = 'Eingesparte Benachrichtigungen'
+
+    def has_add_permission(self, request):
+        return False
@@ -1,5 +1,7 @@
 """Access control for Ampel2 data in chat (org/team replies to volunteers)."""
 
+from django.db.models import Q
+
 from Global.models import Ampel2
 
 
@@ -55,3 +57,15 @@ def resolve_ampel_for_direct_reply(user, ampel_id, chat):
     if user_can_reply_to_ampel_in_direct_chat(user, ampel, chat):
         return ampel
     return None
+
+
+def ampel_viewer_ids(chat, ampel):
+    """Ids of the chat members allowed to see ``ampel`` (see ``user_can_view_ampel``), in one query."""
+    if ampel is None:
+        return []
+    return list(
+        chat.users.filter(
+            Q(pk=ampel.user_id)
+            | Q(customuser__org_id=ampel.org_id, customuser__person_cluster__view__in=("O", "T"))
+        ).values_list("id", flat=True)
+    )
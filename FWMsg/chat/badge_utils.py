@@ -1,5 +1,6 @@
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.db.models import Count, Exists, F, OuterRef, Q
 
 from .models import ChatMessageDirect, ChatMessageGroup
 
@@ -20,6 +21,46 @@ def get_unread_chat_message_count(user):
     return direct + group
 
 
+def get_unread_chat_message_counts(user_ids):
+    """
+    ``get_unread_chat_message_count`` for many users at once, in two queries.
+    The users may belong to different organisations, so the org scoping of the
+    current request is bypassed.
+    """
+    user_ids = list(user_ids)
+    counts = dict.fromkeys(user_ids, 0)
+    if not user_ids:
+        return counts
+    direct = (
+        ChatMessageDirect._base_manager.filter(chat__users__in=user_ids, read=False)
+        .values('chat__users')
+        .annotate(n=Count('id', filter=~Q(user_id=F('chat__users'))))
+    )
+    group_read = ChatMessageGroup.read_by.through.objects.filter(
+        chatmessagegroup_id=OuterRef('id'), user_id=OuterRef('chat__users')
+    )
+    group = (
+        ChatMessageGroup._base_manager.filter(chat__users__in=user_ids)
+        .values('chat__users')
+        .annotate(n=Count('id', filter=Q(~Exists(group_read)) & ~Q(user_id=F('chat__users'))))
+    )
+    for row in [*direct, *group]:
+        counts[row['chat__users']] += row['n']
+    return counts
+
+
+def broadcast_unread_badges(user_ids):
+    """``broadcast_unread_badge_for_user`` for many users, counting their unread messages in bulk."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for user_id, n in get_unread_chat_message_counts(user_ids).items():
+        async_to_sync(layer.group_send)(
+            f"chat_user_{user_id}",
+            {"type": "unread.badge", "number_of_unread_messages": n},
+        )
+
+
 def broadcast_unread_badge_for_user(user):
     """Push current unread count to all badge WebSocket connections for this user."""
     n = get_unread_chat_message_count(user)
@@ -37,7 +78,7 @@ def broadcast_chat_message_to_room(chat_type, identifier, msg_dict):
 
     chat_type: \"direct\" or \"group\"
     identifier: full chat identifier string (same truncation as ChatConsumer.room_group)
-    msg_dict: keys id, message, user, user_id, created_at, image_url (opaque ``serve_chat_image`` URL).
+    msg_dict: keys id, message, user, user_id, created_at, image_url and thumbnail_url (opaque ``serve_chat_image`` URLs).
     """
     layer = get_channel_layer()
     if layer is None:
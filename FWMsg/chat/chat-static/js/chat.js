@@ -96,7 +96,7 @@ function setupChatImageLightbox(chatWindow) {
         const t = e.target;
         if (t && t.tagName === 'IMG' && t.classList.contains('chat-bubble-image')) {
             e.preventDefault();
-            api.openLightbox(t.currentSrc || t.src);
+            api.openLightbox(t.dataset.fullSrc || t.currentSrc || t.src);
         }
     });
 
@@ -105,7 +105,7 @@ function setupChatImageLightbox(chatWindow) {
         const t = e.target;
         if (t && t.tagName === 'IMG' && t.classList.contains('chat-bubble-image')) {
             e.preventDefault();
-            api.openLightbox(t.currentSrc || t.src);
+            api.openLightbox(t.dataset.fullSrc || t.currentSrc || t.src);
         }
     });
 }
@@ -726,7 +726,7 @@ function initChat(chatId, chatType, currentUserId, wsUrl, fallbackSendUrl, fallb
             </div>`;
         }
         if (msg.image_url) {
-            html += `<img src="${escapeHtml(msg.image_url)}" alt="" class="chat-bubble-image" role="button" tabindex="0" aria-label="Bild vergrößern">`;
+            html += `<img src="${escapeHtml(msg.thumbnail_url || msg.image_url)}" data-full-src="${escapeHtml(msg.image_url)}" alt="" class="chat-bubble-image" role="button" tabindex="0" aria-label="Bild vergrößern">`;
         }
         if (msg.message) {
             html += `<p>${formatMessageBody(msg.message)}</p>`;
@@ -3,18 +3,11 @@ import json
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-from .ampel_access import (
-    _user_org_id,
-    resolve_ampel_for_direct_reply,
-    user_can_view_ampel_by_owner,
-)
-from .badge_utils import (
-    broadcast_chat_read_to_room,
-    broadcast_unread_badge_for_user,
-    get_unread_chat_message_count,
-)
+from .ampel_access import ampel_viewer_ids, resolve_ampel_for_direct_reply
+from .badge_utils import broadcast_unread_badges, get_unread_chat_message_count
 from .models import ChatDirect, ChatGroup, ChatMessageDirect, ChatMessageGroup
-from .tasks import notify_users_about_new_direct_chat_message, notify_users_about_new_group_chat_message
+from .notifications import schedule_chat_notification
+from .read_marks import mark_read
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -107,17 +100,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def chat_message(self, event):
         """Forward a group-sent message to this WebSocket client.
 
-        If this client is a receiver (not the original sender), mark the
-        message as read for them so unread counts stay accurate.
+        If this client is a receiver (not the original sender), the message
+        is marked as read for them with the next batch of read marks. Who may
+        see an attached Ampel was determined by the sender, so no query is
+        needed per receiver.
         """
-        is_receiver = event["user_id"] != self.user.id
-        if is_receiver:
-            became_read = await self.mark_message_read(event["id"])
-            await database_sync_to_async(broadcast_unread_badge_for_user)(self.user)
-            if became_read and self.chat_type == "direct":
-                await database_sync_to_async(broadcast_chat_read_to_room)(
-                    "direct", self.identifier, event["id"], True
-                )
+        if event["user_id"] != self.user.id:
+            mark_read(self.chat_type, self.identifier, event["id"], self.user.id)
 
         payload = {
             "id":         event["id"],
@@ -126,12 +115,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             "user_id":    event["user_id"],
             "created_at": event["created_at"],
             "image_url":  event.get("image_url"),
+            "thumbnail_url": event.get("thumbnail_url"),
         }
-        if event.get("ampel") and user_can_view_ampel_by_owner(
-            self.user,
-            event.get("ampel_user_id"),
-            _user_org_id(self.user),
-        ):
+        if event.get("ampel") and self.user.id in event.get("ampel_viewers", ()):
             payload["ampel"] = event["ampel"]
         if event["user_id"] == self.user.id:
             payload["can_edit"] = event.get("can_edit", True)
@@ -166,24 +152,6 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # ── database helpers (sync → async) ─────────────────────────────────────
 
-    @database_sync_to_async
-    def mark_message_read(self, message_id):
-        """Mark a single message as read for the current user (receiver).
-
-        Returns True if a direct message transitioned from unread to read.
-        """
-        if self.chat_type == "direct":
-            updated = ChatMessageDirect.objects.filter(
-                id=message_id, chat_id=self.chat_pk, read=False
-            ).update(read=True)
-            return updated > 0
-        try:
-            msg = ChatMessageGroup.objects.get(id=message_id, chat_id=self.chat_pk)
-            msg.read_by.add(self.user)
-        except ChatMessageGroup.DoesNotExist:
-            pass
-        return False
-
     @database_sync_to_async
     def resolve_chat_membership(self):
         """Return (canonical_identifier, chat_pk) if the user may join this room; else None."""
@@ -263,7 +231,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             if answer_to_ampel:
                 create_kw["answer_to_ampel"] = answer_to_ampel
             msg = ChatMessageDirect.objects.create(**create_kw)
-            notify_users_about_new_direct_chat_message.s(msg.id, self.user.id).apply_async(countdown=10)
+            schedule_chat_notification(msg)
         else:
             chat = ChatGroup.objects.get(pk=self.chat_pk, org=org)
             msg = ChatMessageGroup.objects.create(
@@ -271,10 +239,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
             # Mark the message as read by the sender immediately.
             msg.mark_as_read_by(self.user)
-            notify_users_about_new_group_chat_message.s(msg.id, self.user.id).apply_async(countdown=10)
+            schedule_chat_notification(msg)
 
-        for recipient in chat.users.exclude(pk=self.user.pk):
-            broadcast_unread_badge_for_user(recipient)
+        broadcast_unread_badges(chat.users.exclude(pk=self.user.pk).values_list("pk", flat=True))
 
         image_url = msg.get_image_public_url()
 
@@ -287,12 +254,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             "user_id": self.user.id,
             "created_at": msg.created_at.strftime("%d.%m.%Y %H:%M"),
             "image_url": image_url,
+            "thumbnail_url": msg.get_image_thumbnail_url(),
             "can_edit": msg.can_be_edited(),
         }
         if self.chat_type == "direct":
             payload["is_read"] = False
         if answer_to_ampel:
-            payload["ampel_user_id"] = answer_to_ampel.user_id
+            payload["ampel_viewers"] = ampel_viewer_ids(chat, answer_to_ampel)
             payload["ampel"] = {
                 "status": answer_to_ampel.status,
                 "comment": answer_to_ampel.comment or "",
@@ -0,0 +1,100 @@
+"""
+Ingest step for chat images.
+
+After a message with an image is committed, ``process_chat_image_task``
+rewrites the original without EXIF/XMP metadata (applying the EXIF
+orientation first) and stores two compressed JPEG variants next to it:
+
+* ``image_display`` – at most ``DISPLAY_SIZE``, opened in the lightbox
+* ``image_thumbnail`` – at most ``THUMBNAIL_SIZE``, shown in the message list
+
+``serve_chat_image`` serves them by ``?size=`` and falls back to the next
+larger version while a variant does not exist yet.
+"""
+
+import io
+import logging
+
+from PIL import Image, ImageOps
+
+from Global.models import calculate_small_image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 75
+DISPLAY_SIZE = (1600, 1600)
+DISPLAY_QUALITY = 82
+
+# Requested size -> image fields to try, best match first
+IMAGE_VARIANTS = {
+    'thumb': ('image_thumbnail', 'image_display', 'image'),
+    'display': ('image_display', 'image'),
+    'original': ('image',),
+}
+DEFAULT_IMAGE_VARIANT = 'display'
+
+_EXIF_ORIENTATION = 0x0112
+
+
+def strip_image_metadata(image_file):
+    """
+    Return the bytes of ``image_file`` without EXIF/XMP metadata, or None when
+    the image is kept as it is (animated GIFs and unknown formats).
+    """
+    img = Image.open(image_file)
+    fmt = img.format
+    if fmt not in ('JPEG', 'PNG', 'WEBP'):
+        return None
+
+    params = {}
+    if img.info.get('icc_profile'):
+        params['icc_profile'] = img.info['icc_profile']
+    if fmt == 'JPEG':
+        if img.getexif().get(_EXIF_ORIENTATION, 1) == 1:
+            # Re-use the quantisation tables: no visible generation loss
+            params.update(quality='keep', subsampling='keep')
+        else:
+            img = ImageOps.exif_transpose(img)
+            params.update(quality=92, optimize=True)
+    else:
+        img = ImageOps.exif_transpose(img)
+        if fmt == 'WEBP':
+            params.update(quality=90)
+
+    out = io.BytesIO()
+    img.save(out, format=fmt, **params)
+    return out.getvalue()
+
+
+def process_chat_image(message):
+    """
+    Strip the metadata of ``message.image`` and create its display and thumbnail
+    versions. Does nothing when the message has no image or was processed already.
+    """
+    if not message.image or message.image_thumbnail:
+        return False
+
+    storage = message.image.storage
+    try:
+        with storage.open(message.image.name, 'rb') as original:
+            stripped = strip_image_metadata(original)
+            original.seek(0)
+            display = calculate_small_image(original, DISPLAY_SIZE, DISPLAY_QUALITY)
+            original.seek(0)
+            thumbnail = calculate_small_image(original, THUMBNAIL_SIZE, THUMBNAIL_QUALITY)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning('Could not process chat image %s: %s', message.image.name, e)
+        return False
+
+    if stripped is not None:
+        with storage.open(message.image.name, 'wb') as original:
+            original.write(stripped)
+    message.image_display.save('display.jpg', display, save=False)
+    message.image_thumbnail.save('thumb.jpg', thumbnail, save=False)
+    # No save(): neither history nor the search index care about the variants
+    type(message)._base_manager.filter(pk=message.pk).update(
+        image_display=message.image_display.name,
+        image_thumbnail=message.image_thumbnail.name,
+    )
+    return True
@@ -0,0 +1,408 @@
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import threading
+import time
+from importlib import import_module
+from unittest.mock import patch
+
+import channels
+import django
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from chat.models import ChatDirect, ChatGroup
+from Global.models import CustomUser, PersonCluster
+from ORG.models import Organisation
+
+# Lower is better for all compared metrics
+COMPARED_METRICS = [
+    ('connect_ms', 'p50'),
+    ('connect_ms', 'p95'),
+    ('broadcast_latency_ms', 'p50'),
+    ('broadcast_latency_ms', 'p95'),
+    ('broadcast_latency_ms', 'p99'),
+    ('db_queries_per_message', None),
+    ('memory_per_connection_kb', None),
+]
+
+
+def _distribution(values):
+    """Summary of durations in seconds, in milliseconds."""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(len(values) - 1, max(0, round(len(values) * p / 100) - 1))]
+
+    return {
+        'count': len(values),
+        'mean': round(statistics.mean(values) * 1000, 2),
+        'p50': round(percentile(50) * 1000, 2),
+        'p95': round(percentile(95) * 1000, 2),
+        'p99': round(percentile(99) * 1000, 2),
+        'max': round(values[-1] * 1000, 2),
+    }
+
+
+def _rss_bytes():
+    """Resident set size of the process, None where ``/proc`` is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class QueryCounter:
+    """
+    Counts database queries. Connections are per thread: ``install_all`` has
+    to run in every thread that queries, e.g. through ``database_sync_to_async``
+    for the consumers' thread; connections opened later are included anyway.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install_all(self):
+        for conn in connections.all():
+            self.install(conn)
+
+    def uninstall_all(self):
+        for conn in connections.all():
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+    def __enter__(self):
+        self.install_all()
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        self.uninstall_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the chat WebSocket consumers: connect N rooms with M clients each, send '
+        'messages and report connect times, broadcast latency, database queries per message '
+        'and memory per connection. Runs against a throwaway test database by default.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10)
+        parser.add_argument('--clients', type=int, default=10, help='Clients per room')
+        parser.add_argument('--messages', type=int, default=10, help='Messages sent per room')
+        parser.add_argument('--chat-type', choices=['group', 'direct'], default='group',
+                            help='Direct chats always have two clients')
+        parser.add_argument('--badges', action='store_true',
+                            help='Every client also keeps an unread badge connection open')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between two messages of a room')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--channel-layer', choices=['memory', 'redis'], default='memory')
+        parser.add_argument('--redis-url', default='redis://127.0.0.1:6379/15')
+        parser.add_argument('--use-existing-database', action='store_true',
+                            help='Use the configured database; the benchmark data is deleted afterwards')
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+        parser.add_argument('--compare', help='Report of an earlier run to compare with')
+        parser.add_argument('--tolerance', type=float, default=10,
+                            help='Percent a compared metric may get worse before it counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['chat_type'] == 'direct':
+            options['clients'] = 2
+        if options['rooms'] < 1 or options['clients'] < 2 or options['messages'] < 1:
+            raise CommandError('At least one room, two clients and one message are needed')
+
+        old_database_name = None
+        if not options['use_existing_database']:
+            old_database_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CHANNEL_LAYERS=self._channel_layers(options)):
+                report = self._run(options)
+        finally:
+            if old_database_name is not None:
+                connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        self._print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as f:
+                regressions = self._compare(json.load(f), report, options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} metrics regressed')
+
+    def _channel_layers(self, options):
+        if options['channel_layer'] == 'redis':
+            return {'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {'hosts': [options['redis_url']], 'capacity': 10_000},
+            }}
+        return {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 10_000}}}
+
+    # Benchmark data
+
+    def _create_data(self, options):
+        # Without signals: the benchmark needs no organisation account, registration emails or images
+        org, = Organisation.objects.bulk_create([Organisation(name='Chat Benchmark', email='benchmark@example.com')])
+        cluster = PersonCluster.objects.create(org=org, name='Benchmark', view='F')
+        run = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        users = User.objects.bulk_create([
+            User(username=f'chatbench_{run}_{i}')
+            for i in range(options['rooms'] * options['clients'])
+        ])
+        CustomUser.objects.bulk_create([
+            CustomUser(user=user, org=org, person_cluster=cluster) for user in users
+        ])
+
+        rooms = []
+        for r in range(options['rooms']):
+            members = users[r * options['clients']:(r + 1) * options['clients']]
+            if options['chat_type'] == 'direct':
+                chat = ChatDirect.objects.create(org=org, identifier=f'chatbench{run}d{r}')
+            else:
+                chat = ChatGroup.objects.create(org=org, name=f'Benchmark {r}', identifier=f'chatbench{run}g{r}')
+            chat.users.set(members)
+            rooms.append((chat.identifier, [(user, self._session_cookie(user)) for user in members]))
+        return org, users, rooms
+
+    def _session_cookie(self, user):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={session.session_key}'.encode())]
+
+    def _delete_data(self, org, users):
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        org.delete()
+
+    # Benchmark
+
+    def _run(self, options):
+        org, users, rooms = self._create_data(options)
+        try:
+            # Digest tasks would go to the Celery broker, which is not part of the benchmark
+            with patch('chat.notifications.send_chat_digests_task') as digest_task, QueryCounter() as queries:
+                results = asyncio.run(self._benchmark(rooms, options, queries))
+            results['digest_tasks_scheduled'] = digest_task.s.call_count
+        finally:
+            self._delete_data(org, users)
+
+        return {
+            'benchmark': 'chat_websockets',
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'channels': channels.__version__,
+                'database': connection.vendor,
+                'channel_layer': options['channel_layer'],
+            },
+            'config': {
+                key: options[key]
+                for key in ('rooms', 'clients', 'messages', 'chat_type', 'badges', 'interval')
+            },
+            'results': results,
+        }
+
+    async def _connect(self, application, path, headers, durations, failures):
+        communicator = WebsocketCommunicator(application, path, headers=headers)
+        start = time.perf_counter()
+        try:
+            connected, _ = await communicator.connect()
+        except asyncio.TimeoutError:
+            connected = False
+        if not connected:
+            failures.append(path)
+            return None
+        durations.append(time.perf_counter() - start)
+        return communicator
+
+    async def _benchmark(self, rooms, options, queries):
+        from FWMsg.asgi import application
+
+        timeout = options['timeout']
+        await database_sync_to_async(queries.install_all)()
+        connect_durations, failures = [], []
+        gc.collect()
+        rss_before = _rss_bytes()
+
+        # Connect all clients of all rooms concurrently
+        connect_start = time.perf_counter()
+        room_clients = []
+        badge_clients = []
+        for identifier, members in rooms:
+            path = f"/ws/chat/{options['chat_type']}/{identifier}/"
+            room_clients.append(await asyncio.gather(*[
+                self._connect(application, path, headers, connect_durations, failures)
+                for _, headers in members
+            ]))
+            if options['badges']:
+                badge_clients += await asyncio.gather(*[
+                    self._connect(application, '/ws/chat/badge/', headers, connect_durations, failures)
+                    for _, headers in members
+                ])
+        connect_wall = time.perf_counter() - connect_start
+        badge_clients = [c for c in badge_clients if c is not None]
+        for badge in badge_clients:
+            await badge.receive_json_from(timeout)  # unread count sent on connect
+
+        gc.collect()
+        rss_after = _rss_bytes()
+        connections_open = len(connect_durations)
+
+        # Every room: the first client sends, all others receive
+        sent_at = {}
+        latencies = []
+        lost = 0
+
+        async def receive(communicator, expected):
+            nonlocal lost
+            remaining = set(expected)
+            while remaining:
+                try:
+                    event = await communicator.receive_json_from(timeout)
+                except asyncio.TimeoutError:
+                    lost += len(remaining)
+                    return
+                text = event.get('message')
+                if text in remaining and 'action' not in event:
+                    latencies.append(time.perf_counter() - sent_at[text])
+                    remaining.discard(text)
+
+        async def send(communicator, texts):
+            for text in texts:
+                sent_at[text] = time.perf_counter()
+                await communicator.send_json_to({'message': text})
+                if options['interval']:
+                    await asyncio.sleep(options['interval'])
+
+        jobs = []
+        messages_sent = 0
+        for r, clients in enumerate(room_clients):
+            clients = [c for c in clients if c is not None]
+            if len(clients) < 2:
+                continue
+            messages_sent += options['messages']
+            texts = [f'benchmark room {r} message {i}' for i in range(options['messages'])]
+            jobs.append(send(clients[0], texts))
+            # The sender gets its own messages back as well
+            jobs += [receive(client, texts) for client in clients]
+
+        queries_before = queries.count
+        message_start = time.perf_counter()
+        await asyncio.gather(*jobs)
+        message_wall = time.perf_counter() - message_start
+        message_queries = queries.count - queries_before
+
+        badge_updates = 0
+        for badge in badge_clients:
+            while not await badge.receive_nothing(0.01):
+                await badge.receive_from()
+                badge_updates += 1
+
+        for communicator in [c for clients in room_clients for c in clients if c is not None] + badge_clients:
+            await communicator.disconnect()
+
+        await database_sync_to_async(queries.uninstall_all)()
+
+        memory = None
+        if rss_before is not None and rss_after is not None and connections_open:
+            memory = round((rss_after - rss_before) / connections_open / 1024, 1)
+        return {
+            'connections': connections_open,
+            'connect_failures': len(failures),
+            'connect_wall_s': round(connect_wall, 3),
+            'connect_ms': _distribution(connect_durations),
+            'messages_sent': messages_sent,
+            'deliveries': len(latencies),
+            'deliveries_lost': lost,
+            'message_wall_s': round(message_wall, 3),
+            'deliveries_per_s': round(len(latencies) / message_wall, 1) if message_wall else None,
+            'broadcast_latency_ms': _distribution(latencies),
+            'db_queries': message_queries,
+            'db_queries_per_message': round(message_queries / messages_sent, 2) if messages_sent else None,
+            'badge_updates': badge_updates,
+            'memory_per_connection_kb': memory,
+        }
+
+    # Report
+
+    def _print_report(self, report):
+        config, results = report['config'], report['results']
+        self.stdout.write(
+            f"{config['rooms']} {config['chat_type']} rooms × {config['clients']} clients, "
+            f"{config['messages']} messages per room ({report['environment']['channel_layer']} channel layer, "
+            f"{report['environment']['database']})"
+        )
+        connect = results['connect_ms'] or {}
+        self.stdout.write(
+            f"connect: {results['connections']} connections ({results['connect_failures']} failed) "
+            f"in {results['connect_wall_s']}s - p50 {connect.get('p50')}ms, p95 {connect.get('p95')}ms"
+        )
+        latency = results['broadcast_latency_ms'] or {}
+        self.stdout.write(
+            f"broadcast: {results['deliveries']} deliveries ({results['deliveries_lost']} lost) "
+            f"in {results['message_wall_s']}s, {results['deliveries_per_s']}/s - "
+            f"p50 {latency.get('p50')}ms, p95 {latency.get('p95')}ms, p99 {latency.get('p99')}ms, "
+            f"max {latency.get('max')}ms"
+        )
+        self.stdout.write(
+            f"{results['db_queries_per_message']} queries per message, "
+            f"{results['memory_per_connection_kb']} KB per connection, "
+            f"{results['badge_updates']} badge updates, {results['digest_tasks_scheduled']} digest tasks"
+        )
+
+    def _compare(self, baseline, report, tolerance):
+        """Print the changes against ``baseline``; returns the number of regressions."""
+        if baseline.get('config') != report['config']:
+            self.stdout.write(self.style.WARNING('The baseline was measured with a different configuration'))
+        regressions = 0
+        for metric, key in COMPARED_METRICS:
+            old = baseline['results'].get(metric)
+            new = report['results'].get(metric)
+            if key is not None:
+                old = old.get(key) if old else None
+                new = new.get(key) if new else None
+            if old is None or new is None:
+                continue
+            name = f'{metric}.{key}' if key else metric
+            change = (new - old) / old * 100 if old else 0
+            line = f'{name}: {old} -> {new} ({change:+.1f}%)'
+            if change > tolerance:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'{line} REGRESSION'))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.6 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_fix_is_edited_nulls'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatNotificationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('messages', models.PositiveIntegerField(default=0, verbose_name='Nachrichten')),
+                ('recipient_messages', models.PositiveIntegerField(default=0, verbose_name='Nachrichten × Empfänger')),
+                ('tasks_scheduled', models.PositiveIntegerField(default=0, verbose_name='Geplante Tasks')),
+                ('digests_sent', models.PositiveIntegerField(default=0, verbose_name='Gesendete Zusammenfassungen')),
+                ('emails_sent', models.PositiveIntegerField(default=0, verbose_name='Gesendete E-Mails')),
+                ('recipients_skipped', models.PositiveIntegerField(default=0, verbose_name='Übersprungen (bereits gelesen)')),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChatNotificationWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pending_since', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('notified_until', models.PositiveBigIntegerField(default=0)),
+                ('chat_direct', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='chat.chatdirect')),
+                ('chat_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='chat.chatgroup')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_notification_windows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'chat_direct'), name='unique_chat_notification_window_direct'), models.UniqueConstraint(fields=('user', 'chat_group'), name='unique_chat_notification_window_group')],
+            },
+        ),
+    ]
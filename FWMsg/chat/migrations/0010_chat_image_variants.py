@@ -0,0 +1,54 @@
+# Generated by Django 6.0.6 on 2026-10-19 19:15
+
+import chat.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_chat_notification_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessagedirect',
+            name='image_display',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=chat.models.chat_message_image_variant_upload_to),
+        ),
+        migrations.AddField(
+            model_name='chatmessagedirect',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=chat.models.chat_message_image_variant_upload_to),
+        ),
+        migrations.AddField(
+            model_name='chatmessagegroup',
+            name='image_display',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=chat.models.chat_message_image_variant_upload_to),
+        ),
+        migrations.AddField(
+            model_name='chatmessagegroup',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=chat.models.chat_message_image_variant_upload_to),
+        ),
+        migrations.AddField(
+            model_name='historicalchatmessagedirect',
+            name='image_display',
+            field=models.TextField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalchatmessagedirect',
+            name='image_thumbnail',
+            field=models.TextField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalchatmessagegroup',
+            name='image_display',
+            field=models.TextField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalchatmessagegroup',
+            name='image_thumbnail',
+            field=models.TextField(blank=True, editable=False, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.6 on 2026-10-19 20:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_chat_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='historicalchatmessagedirect',
+            name='image_display',
+        ),
+        migrations.RemoveField(
+            model_name='historicalchatmessagedirect',
+            name='image_thumbnail',
+        ),
+        migrations.RemoveField(
+            model_name='historicalchatmessagedirect',
+            name='read',
+        ),
+        migrations.RemoveField(
+            model_name='historicalchatmessagegroup',
+            name='image_display',
+        ),
+        migrations.RemoveField(
+            model_name='historicalchatmessagegroup',
+            name='image_thumbnail',
+        ),
+    ]
@@ -2,11 +2,13 @@ import uuid
 from datetime import timedelta
 from pathlib import Path
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils import timezone
 from Global.models import OrgModel
-from simple_history.models import HistoricalRecords
+from Global.history import HistoricalRecords
 from Global.models import get_random_hash
 from Global.models import Ampel2
 _CHAT_IMAGE_EXTS = frozenset({".jpg", ".jpeg", ".png", ".gif", ".webp"})
@@ -23,6 +25,11 @@ def chat_message_image_upload_to(instance, filename):
     return f"chat_images/{instance.image_identifier}{ext}"
 
 
+def chat_message_image_variant_upload_to(instance, filename):
+    """Store variants next to the original as ``chat_images/<uuid>_<variant>.jpg``."""
+    return f"chat_images/{instance.image_identifier}_{Path(filename).stem}.jpg"
+
+
 def _sync_chat_message_image_identifier(instance):
     if not instance.image:
         instance.image_identifier = None
@@ -39,7 +46,8 @@ def _normalize_chat_message_text(text):
 class ChatMessageImageUrlMixin:
     """Opaque image URLs (UUID); never expose storage paths to clients."""
 
-    def get_image_public_url(self):
+    def get_image_public_url(self, size=None):
+        """URL of the display version, or of ``size`` (``thumb``/``original``)."""
         from django.urls import reverse
 
         if (
@@ -48,10 +56,14 @@ class ChatMessageImageUrlMixin:
             or not getattr(self, "image_identifier", None)
         ):
             return None
-        return reverse(
+        url = reverse(
             "serve_chat_image",
             kwargs={"image_identifier": self.image_identifier},
         )
+        return f"{url}?size={size}" if size else url
+
+    def get_image_thumbnail_url(self):
+        return self.get_image_public_url(size="thumb")
 
     def can_be_edited(self):
         """Return True if the message is still within the edit time window."""
@@ -132,13 +144,19 @@ class ChatMessageDirect(ChatMessageImageUrlMixin, OrgModel):
     image_identifier = models.UUIDField(
         null=True, blank=True, editable=False, db_index=True
     )
+    image_display = models.ImageField(
+        upload_to=chat_message_image_variant_upload_to, blank=True, null=True, editable=False
+    )
+    image_thumbnail = models.ImageField(
+        upload_to=chat_message_image_variant_upload_to, blank=True, null=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     read = models.BooleanField(default=False)
     is_edited = models.BooleanField(default=False, db_default=False)
     answer_to_ampel = models.ForeignKey(Ampel2, on_delete=models.SET_NULL, null=True, blank=True)
     
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['read', 'image_display', 'image_thumbnail'])
 
     def save(self, *args, **kwargs):
         _sync_chat_message_image_identifier(self)
@@ -147,7 +165,7 @@ class ChatMessageDirect(ChatMessageImageUrlMixin, OrgModel):
 
     def mark_as_read(self):
         self.read = True
-        self.save()
+        self.save(update_fields=['read', 'updated_at'])
 
     def __str__(self):
         return self.message
@@ -163,12 +181,18 @@ class ChatMessageGroup(ChatMessageImageUrlMixin, OrgModel):
     image_identifier = models.UUIDField(
         null=True, blank=True, editable=False, db_index=True
     )
+    image_display = models.ImageField(
+        upload_to=chat_message_image_variant_upload_to, blank=True, null=True, editable=False
+    )
+    image_thumbnail = models.ImageField(
+        upload_to=chat_message_image_variant_upload_to, blank=True, null=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_edited = models.BooleanField(default=False, db_default=False)
     read_by = models.ManyToManyField(User, related_name='chat_message_group_read_by')
     
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['image_display', 'image_thumbnail'])
 
     def save(self, *args, **kwargs):
         _sync_chat_message_image_identifier(self)
@@ -177,7 +201,82 @@ class ChatMessageGroup(ChatMessageImageUrlMixin, OrgModel):
 
     def mark_as_read_by(self, user):
         self.read_by.add(user)
-        self.save()
+        self.save(update_fields=['updated_at'])
         
     def __str__(self):
-        return self.message
\ No newline at end of file
+        return self.message
+
+@receiver(post_save, sender=ChatMessageDirect)
+@receiver(post_save, sender=ChatMessageGroup)
+def update_search_index_receiver(sender, instance, update_fields=None, **kwargs):
+    from Global.search import changes_index, index_object
+    # Read marks and edit stamps do not change the indexed text
+    if changes_index(instance, update_fields):
+        index_object(instance)
+
+
+@receiver(post_save, sender=ChatMessageDirect)
+@receiver(post_save, sender=ChatMessageGroup)
+def process_chat_image_receiver(sender, instance, created, **kwargs):
+    """Create the thumbnail and display versions of a new image off the request."""
+    if not created or not instance.image:
+        return
+    from .tasks import process_chat_image_task
+    kind = 'direct' if sender is ChatMessageDirect else 'group'
+    transaction.on_commit(lambda: process_chat_image_task.delay(kind, instance.pk))
+
+
+@receiver(post_delete, sender=ChatMessageDirect)
+@receiver(post_delete, sender=ChatMessageGroup)
+def remove_from_search_index_receiver(sender, instance, **kwargs):
+    from Global.search import unindex_object
+    unindex_object(instance)
+
+
+class ChatNotificationWindow(models.Model):
+    """
+    Notification state of one member of a chat. While a window is pending,
+    new messages of the chat are collected and later sent to the member as one
+    digest (see ``chat.notifications``).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_notification_windows')
+    chat_direct = models.ForeignKey(ChatDirect, on_delete=models.CASCADE, null=True, blank=True)
+    chat_group = models.ForeignKey(ChatGroup, on_delete=models.CASCADE, null=True, blank=True)
+    pending_since = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Id of the last message the member was notified about or had already read
+    notified_until = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chat_direct'], name='unique_chat_notification_window_direct'),
+            models.UniqueConstraint(fields=['user', 'chat_group'], name='unique_chat_notification_window_group'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.chat_direct or self.chat_group}'
+
+
+class ChatNotificationStats(models.Model):
+    """Daily counters of the chat notification digests."""
+    date = models.DateField(unique=True)
+    messages = models.PositiveIntegerField(default=0, verbose_name='Nachrichten')
+    # Notifications one message at a time would have sent: messages × recipients
+    recipient_messages = models.PositiveIntegerField(default=0, verbose_name='Nachrichten × Empfänger')
+    tasks_scheduled = models.PositiveIntegerField(default=0, verbose_name='Geplante Tasks')
+    digests_sent = models.PositiveIntegerField(default=0, verbose_name='Gesendete Zusammenfassungen')
+    emails_sent = models.PositiveIntegerField(default=0, verbose_name='Gesendete E-Mails')
+    recipients_skipped = models.PositiveIntegerField(default=0, verbose_name='Übersprungen (bereits gelesen)')
+
+    class Meta:
+        ordering = ['-date']
+
+    @property
+    def tasks_saved(self):
+        return self.messages - self.tasks_scheduled
+
+    @property
+    def notifications_saved(self):
+        return self.recipient_messages - self.digests_sent
+
+    def __str__(self):
+        return str(self.date)
@@ -0,0 +1,256 @@
+"""
+Coalesced notifications about new chat messages.
+
+Every member of a chat has a ``ChatNotificationWindow``. The first message
+after a quiet period opens the windows of the recipients and schedules one
+``send_chat_digests_task`` per chat, ``CHAT_NOTIFICATION_DELAY`` seconds later;
+messages arriving in the meantime only join the pending windows. The task
+then sends every recipient a single email and push listing the messages they
+have not read yet, and skips recipients who read the chat in the meantime.
+
+``ChatNotificationStats`` counts per day how many tasks and notifications
+this saves compared to notifying about every message on its own. The counters
+are added up in the cache and written to the table by the digest task and
+``flush_chat_notification_stats_task``, so sending a message does not update
+the same row as every other message of the day.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from Global.push_notification import send_push_notification_to_user
+from Global.send_email import (
+    format_chat_digest_email,
+    format_chat_new_message_email,
+    send_email_with_archive,
+    user_display_name,
+)
+
+from .models import (
+    ChatDirect,
+    ChatGroup,
+    ChatMessageDirect,
+    ChatMessageGroup,
+    ChatNotificationStats,
+    ChatNotificationWindow,
+)
+from .tasks import _chat_email_context, _chat_push_body, _message_has_image, send_chat_digests_task
+
+CHAT_NOTIFICATION_DELAY = getattr(settings, 'CHAT_NOTIFICATION_DELAY', 60)
+RECIPIENT_BATCH_SIZE = 100
+DIGEST_MAX_MESSAGES = 10
+
+STATS_FIELDS = (
+    'messages', 'recipient_messages', 'tasks_scheduled', 'digests_sent', 'emails_sent', 'recipients_skipped',
+)
+STATS_CACHE_TIMEOUT = 2 * 24 * 60 * 60  # seconds, yesterday's counters are flushed after midnight
+
+CHAT_KINDS = {
+    'direct': (ChatDirect, ChatMessageDirect, 'chat_direct'),
+    'group': (ChatGroup, ChatMessageGroup, 'chat_group'),
+}
+
+
+def _kind_of(message):
+    return 'direct' if isinstance(message, ChatMessageDirect) else 'group'
+
+
+def _stats_key(date, name):
+    return f'chat_notification_stats:{date.isoformat()}:{name}'
+
+
+def count(**counters):
+    """Add to today's counters in the cache, see ``flush_counts``."""
+    today = timezone.localdate()
+    for name, value in counters.items():
+        if not value:
+            continue
+        key = _stats_key(today, name)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            # First count of the day, unless another process was faster
+            if not cache.add(key, value, STATS_CACHE_TIMEOUT):
+                cache.incr(key, value)
+
+
+def flush_counts():
+    """Move the counters of yesterday and today from the cache to ``ChatNotificationStats``."""
+    today = timezone.localdate()
+    for date in (today - timedelta(days=1), today):
+        keys = {name: _stats_key(date, name) for name in STATS_FIELDS}
+        values = cache.get_many(keys.values())
+        counters = {}
+        for name, key in keys.items():
+            value = values.get(key)
+            if not value:
+                continue
+            try:
+                # Counts added since get_many stay for the next flush
+                cache.decr(key, value)
+            except ValueError:
+                continue
+            counters[name] = value
+        if counters:
+            stats, _ = ChatNotificationStats.objects.get_or_create(date=date)
+            ChatNotificationStats.objects.filter(pk=stats.pk).update(
+                **{name: F(name) + value for name, value in counters.items()}
+            )
+
+
+def schedule_chat_notification(message):
+    """
+    Notify the other members of ``message``'s chat about it, together with the
+    other messages of the chat sent within ``CHAT_NOTIFICATION_DELAY``.
+    """
+    kind = _kind_of(message)
+    chat_field = CHAT_KINDS[kind][2]
+    recipient_ids = list(message.chat.users.exclude(pk=message.user_id).values_list('id', flat=True))
+    if not recipient_ids:
+        return
+
+    # Members notified for the first time only hear about messages from now on
+    ChatNotificationWindow.objects.bulk_create(
+        [
+            ChatNotificationWindow(user_id=user_id, notified_until=message.id - 1, **{f'{chat_field}_id': message.chat_id})
+            for user_id in recipient_ids
+        ],
+        ignore_conflicts=True,
+    )
+    opened = ChatNotificationWindow.objects.filter(
+        user_id__in=recipient_ids, pending_since__isnull=True, **{f'{chat_field}_id': message.chat_id}
+    ).update(pending_since=timezone.now())
+
+    if opened:
+        send_chat_digests_task.s(kind, message.chat_id).apply_async(countdown=CHAT_NOTIFICATION_DELAY)
+    count(messages=1, recipient_messages=len(recipient_ids), tasks_scheduled=1 if opened else 0)
+
+
+def _unread_messages(kind, window, chat_messages, read_by):
+    if kind == 'direct':
+        is_unread = lambda m: not m.read
+    else:
+        is_unread = lambda m: (m.id, window.user_id) not in read_by
+    return [
+        m for m in chat_messages
+        if m.id > window.notified_until and m.user_id != window.user_id and is_unread(m)
+    ]
+
+
+def _send_digest(kind, chat, recipient, unread):
+    """One email and push about ``unread`` messages; returns whether an email was sent."""
+    chat_url = reverse(CHAT_KINDS[kind][2], args=[chat.get_identifier()])
+    group_name = chat.name if kind == 'group' else None
+    senders = list(dict.fromkeys(m.user for m in unread))
+    last = unread[-1]
+    email_context = _chat_email_context(
+        org=chat.org,
+        recipient_user=recipient,
+        sender_user=last.user,
+        action_url=f'{settings.DOMAIN_HOST}{chat_url}',
+    )
+
+    if len(unread) == 1:
+        subject = f'Neue Nachricht in Gruppe {chat.name}' if group_name else f'Neue Nachricht von {str(last.user)}'
+        push_content = _chat_push_body(last.user, last)
+        email_html = format_chat_new_message_email(
+            message_text=last.message,
+            has_image=_message_has_image(last),
+            group_name=group_name,
+            **email_context,
+        )
+    else:
+        sender_names = ', '.join(str(user) for user in senders)
+        if group_name:
+            subject = f'{len(unread)} neue Nachrichten in Gruppe {chat.name}'
+        else:
+            subject = f'{len(unread)} neue Nachrichten von {sender_names}'
+        push_content = f'💬 {len(unread)} neue Nachrichten von {sender_names}'
+        shown = unread[-DIGEST_MAX_MESSAGES:]
+        email_context.pop('sender_name')
+        email_html = format_chat_digest_email(
+            chat_messages=[
+                {
+                    'sender_name': user_display_name(m.user),
+                    'message_text': (m.message or '').strip(),
+                    'has_image': _message_has_image(m),
+                }
+                for m in shown
+            ],
+            more_count=len(unread) - len(shown),
+            group_name=group_name,
+            **email_context,
+        )
+
+    email_sent = False
+    if recipient.customuser.mail_notifications:
+        send_email_with_archive(
+            subject=subject,
+            message='',
+            from_email=settings.SERVER_EMAIL,
+            recipient_list=[recipient.email],
+            html_message=email_html,
+            reply_to_list=[senders[0].email] if len(senders) == 1 else None,
+        )
+        email_sent = True
+
+    send_push_notification_to_user(recipient, subject, push_content, url=chat_url)
+    return email_sent
+
+
+def send_chat_digests(kind, chat_id):
+    """
+    Send the pending digests of a chat; returns the number of digests sent.
+    Recipients are processed ``RECIPIENT_BATCH_SIZE`` at a time.
+    """
+    chat_model, message_model, chat_field = CHAT_KINDS[kind]
+    windows = ChatNotificationWindow.objects.filter(pending_since__isnull=False, **{f'{chat_field}_id': chat_id})
+    window_ids = list(windows.values_list('id', flat=True))
+    if not window_ids:
+        return 0
+    # Close the windows first: messages arriving from now on open new ones
+    ChatNotificationWindow.objects.filter(id__in=window_ids).update(pending_since=None)
+
+    chat = chat_model._base_manager.select_related('org').filter(id=chat_id).first()
+    if chat is None:
+        return 0
+
+    sent = skipped = emails = 0
+    for start in range(0, len(window_ids), RECIPIENT_BATCH_SIZE):
+        batch = list(
+            ChatNotificationWindow.objects.filter(id__in=window_ids[start:start + RECIPIENT_BATCH_SIZE])
+            .select_related('user__customuser')
+        )
+        since = min(window.notified_until for window in batch)
+        chat_messages = list(
+            message_model._base_manager.filter(chat_id=chat_id, id__gt=since).select_related('user').order_by('id')
+        )
+        if not chat_messages:
+            continue
+        read_by = set()
+        if kind == 'group':
+            read_by = set(
+                ChatMessageGroup.read_by.through.objects.filter(
+                    chatmessagegroup_id__in=[m.id for m in chat_messages],
+                    user_id__in=[window.user_id for window in batch],
+                ).values_list('chatmessagegroup_id', 'user_id')
+            )
+
+        for window in batch:
+            unread = _unread_messages(kind, window, chat_messages, read_by)
+            window.notified_until = chat_messages[-1].id
+            if not unread or not hasattr(window.user, 'customuser'):
+                skipped += 1
+                continue
+            emails += _send_digest(kind, chat, window.user, unread)
+            sent += 1
+        ChatNotificationWindow.objects.bulk_update(batch, ['notified_until'])
+
+    count(digests_sent=sent, emails_sent=emails, recipients_skipped=skipped)
+    flush_counts()
+    return sent
@@ -0,0 +1,92 @@
+"""
+Read marks of messages delivered to connected chat clients.
+
+Every consumer receiving a message used to mark it as read and count the
+reader's unread messages on its own, i.e. a few queries per member and
+message. Instead the consumers only note the read mark here, and once per
+``READ_MARK_TICK`` all marks noted in the process are written together: one
+UPDATE for direct messages, one insert into ``read_by`` for group messages
+and one bulk unread count for the badges of all readers.
+
+The marks of one tick come from consumers of any organisation. The flush
+therefore runs in an empty context, not in the request context of the
+consumer that happened to add the first mark, and queries through
+``_base_manager`` instead of the org-scoped ``objects``.
+"""
+
+import asyncio
+import contextvars
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+
+from .badge_utils import broadcast_chat_read_to_room, broadcast_unread_badges
+from .models import ChatMessageDirect, ChatMessageGroup
+
+logger = logging.getLogger(__name__)
+
+READ_MARK_TICK = 0.05
+
+
+def write_read_marks(direct_marks, group_marks):
+    """
+    Store read marks; ``direct_marks`` maps message ids to ``(chat identifier,
+    reader id)``, ``group_marks`` is a set of ``(message id, reader id)``.
+    """
+    if direct_marks:
+        newly_read = list(
+            ChatMessageDirect._base_manager.filter(id__in=list(direct_marks), read=False).values_list('id', flat=True)
+        )
+        if newly_read:
+            ChatMessageDirect._base_manager.filter(id__in=newly_read).update(read=True)
+        for message_id in newly_read:
+            broadcast_chat_read_to_room("direct", direct_marks[message_id][0], message_id, True)
+    if group_marks:
+        ReadBy = ChatMessageGroup.read_by.through
+        ReadBy.objects.bulk_create(
+            [ReadBy(chatmessagegroup_id=message_id, user_id=user_id) for message_id, user_id in group_marks],
+            ignore_conflicts=True,
+        )
+    readers = {user_id for _, user_id in direct_marks.values()} | {user_id for _, user_id in group_marks}
+    broadcast_unread_badges(readers)
+
+
+class ReadMarkBatcher:
+    """Collects the read marks of one event loop and writes them once per tick."""
+
+    def __init__(self):
+        self.direct_marks = {}
+        self.group_marks = set()
+        self._task = None
+
+    def add(self, chat_type, identifier, message_id, user_id):
+        if chat_type == "direct":
+            self.direct_marks[message_id] = (identifier, user_id)
+        else:
+            self.group_marks.add((message_id, user_id))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(
+                self._flush_after_tick(), context=contextvars.Context()
+            )
+
+    async def _flush_after_tick(self):
+        await asyncio.sleep(READ_MARK_TICK)
+        direct_marks, group_marks = self.direct_marks, self.group_marks
+        self.direct_marks, self.group_marks, self._task = {}, set(), None
+        try:
+            await database_sync_to_async(write_read_marks)(direct_marks, group_marks)
+        except Exception:
+            logger.exception("Could not store %d chat read marks", len(direct_marks) + len(group_marks))
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+def mark_read(chat_type, identifier, message_id, user_id):
+    """Mark a message as read by ``user_id`` within the next tick; call from the event loop."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = ReadMarkBatcher()
+    batcher.add(chat_type, identifier, message_id, user_id)
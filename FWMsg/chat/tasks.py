@@ -1,4 +1,5 @@
 from celery import shared_task
+from chat.images import process_chat_image
 from chat.models import ChatGroup, ChatMessageDirect, ChatMessageGroup
 from django.contrib.auth.models import User
 from django.conf import settings
@@ -86,84 +87,43 @@ def notify_users_about_new_group_chat(group_chat_id, sender_user_id):
 
 
 @shared_task
-def notify_users_about_new_direct_chat_message(direct_message_id, sender_user_id):
-    direct_message = ChatMessageDirect.objects.select_related('org', 'chat').get(id=direct_message_id)
-    direct_chat = direct_message.chat
-    sender_user = User.objects.get(id=sender_user_id)
-    org = direct_message.org
-
-    for recipient_user in direct_chat.users.exclude(pk=sender_user.pk):
+def send_chat_digests_task(kind, chat_id):
+    from chat.notifications import send_chat_digests
+    return send_chat_digests(kind, chat_id)
 
-        if direct_message.read:
-            continue
-
-        subject = f'Neue Nachricht von {str(sender_user)}'
-        chat_url = f'{settings.DOMAIN_HOST}{reverse("chat_direct", args=[direct_chat.get_identifier()])}'
-        email_html = format_chat_new_message_email(
-            message_text=direct_message.message,
-            has_image=_message_has_image(direct_message),
-            group_name=None,
-            **_chat_email_context(
-                org=org,
-                recipient_user=recipient_user,
-                sender_user=sender_user,
-                action_url=chat_url,
-            ),
-        )
-        push_content = _chat_push_body(sender_user, direct_message)
 
-        if recipient_user.customuser.mail_notifications:
-            send_email_with_archive(
-                subject=subject,
-                message='',
-                from_email=settings.SERVER_EMAIL,
-                recipient_list=[recipient_user.email],
-                html_message=email_html,
-                reply_to_list=[sender_user.email],
-            )
+@shared_task
+def flush_chat_notification_stats_task():
+    """Write the chat notification counters collected in the cache to ChatNotificationStats."""
+    from chat.notifications import flush_counts
+    flush_counts()
 
-        send_push_notification_to_user(recipient_user, subject, push_content, url=reverse('chat_direct', args=[direct_chat.get_identifier()]))
 
+# Notifications are sent as digests by ``send_chat_digests_task`` now; these
+# only hand over messages of tasks queued before to the digests.
+@shared_task
+def notify_users_about_new_direct_chat_message(direct_message_id, sender_user_id):
+    from chat.notifications import schedule_chat_notification
+    direct_message = ChatMessageDirect.objects.filter(id=direct_message_id).select_related('chat').first()
+    if direct_message:
+        schedule_chat_notification(direct_message)
     return True
 
 
 @shared_task
 def notify_users_about_new_group_chat_message(group_message_id, sender_user_id):
-    group_message = ChatMessageGroup.objects.select_related('org', 'chat').get(id=group_message_id)
-    sender_user = User.objects.get(id=sender_user_id)
-    group_chat = group_message.chat
-    org = group_message.org
-
-    for recipient_user in group_chat.users.exclude(pk=sender_user.pk):
-
-        if recipient_user in group_message.read_by.all():
-            continue
-
-        subject = f'Neue Nachricht in Gruppe {group_chat.name}'
-        chat_url = f'{settings.DOMAIN_HOST}{reverse("chat_group", args=[group_chat.get_identifier()])}'
-        email_html = format_chat_new_message_email(
-            message_text=group_message.message,
-            has_image=_message_has_image(group_message),
-            group_name=group_chat.name,
-            **_chat_email_context(
-                org=org,
-                recipient_user=recipient_user,
-                sender_user=sender_user,
-                action_url=chat_url,
-            ),
-        )
-        push_content = _chat_push_body(sender_user, group_message)
-
-        if recipient_user.customuser.mail_notifications:
-            send_email_with_archive(
-                subject=subject,
-                message='',
-                from_email=settings.SERVER_EMAIL,
-                recipient_list=[recipient_user.email],
-                html_message=email_html,
-                reply_to_list=[sender_user.email],
-            )
+    from chat.notifications import schedule_chat_notification
+    group_message = ChatMessageGroup.objects.filter(id=group_message_id).select_related('chat').first()
+    if group_message:
+        schedule_chat_notification(group_message)
+    return True
 
-        send_push_notification_to_user(recipient_user, subject, push_content, url=reverse('chat_group', args=[group_chat.get_identifier()]))
 
-    return True
+@shared_task
+def process_chat_image_task(kind, message_id):
+    """Strip metadata from a chat image and create its thumbnail and display versions."""
+    model = ChatMessageDirect if kind == 'direct' else ChatMessageGroup
+    message = model._base_manager.filter(id=message_id).first()
+    if message is None:
+        return False
+    return process_chat_image(message)
@@ -12,15 +12,22 @@ Coverage:
 """
 
 import asyncio
+import io
 import json
+import tempfile
 from datetime import timedelta
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
 from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
@@ -74,8 +81,7 @@ def make_group_chat(org, name, *users):
 
 # Patch target for all Celery task calls dispatched inside views
 _TASK_PATCH_TARGETS = [
-    "chat.views.notify_users_about_new_direct_chat_message",
-    "chat.views.notify_users_about_new_group_chat_message",
+    "chat.views.schedule_chat_notification",
     "chat.views.notify_users_about_new_group_chat",
 ]
 
@@ -1185,7 +1191,7 @@ class ChatDirectWebSocketReadReceiptTest(TransactionTestCase):
         cookie = f"{settings.SESSION_COOKIE_NAME}={c.value}".encode()
         return [(b"cookie", cookie)]
 
-    @patch("chat.consumers.notify_users_about_new_direct_chat_message")
+    @patch("chat.consumers.schedule_chat_notification")
     def test_recipient_read_notifies_sender(self, _mock_notify):
         ws_url = f"/ws/chat/direct/{self.ident}/"
         alice_headers = self._chat_ws_headers(self.alice)
@@ -1300,3 +1306,304 @@ class ChatEmailTemplateTests(TestCase):
         self.assertIn('You were invited by Alice Sender to a new group chat', html)
         self.assertIn('Gruppenchat ansehen', html)
         self.assertIn('View group chat', html)
+
+
+# ===========================================================================
+# Notification digests
+# ===========================================================================
+
+@patch("chat.notifications.send_push_notification_to_user")
+@patch("chat.notifications.send_email_with_archive")
+@patch("chat.notifications.send_chat_digests_task")
+class ChatNotificationDigestTest(ChatBaseTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _send(self, model, chat, user, text):
+        from .notifications import schedule_chat_notification
+        msg = model.objects.create(org=self.org, chat=chat, user=user, message=text)
+        if model is ChatMessageGroup:
+            msg.mark_as_read_by(user)
+        schedule_chat_notification(msg)
+        return msg
+
+    def _stats(self):
+        from .models import ChatNotificationStats
+        return ChatNotificationStats.objects.get(date=timezone.localdate())
+
+    def test_burst_is_sent_as_one_digest(self, mock_task, mock_email, mock_push):
+        from .notifications import send_chat_digests
+        chat = make_direct_chat(self.org, self.alice, self.bob)
+        for i in range(3):
+            self._send(ChatMessageDirect, chat, self.alice, f"Nachricht {i}")
+
+        mock_task.s.assert_called_once_with("direct", chat.id)
+        self.assertEqual(send_chat_digests("direct", chat.id), 1)
+
+        mock_email.assert_called_once()
+        self.assertEqual(mock_email.call_args.kwargs["subject"], "3 neue Nachrichten von alice")
+        for i in range(3):
+            self.assertIn(f"Nachricht {i}", mock_email.call_args.kwargs["html_message"])
+        mock_push.assert_called_once()
+
+        stats = self._stats()
+        self.assertEqual((stats.messages, stats.tasks_scheduled, stats.tasks_saved), (3, 1, 2))
+        self.assertEqual((stats.digests_sent, stats.notifications_saved), (1, 2))
+
+    def test_messages_are_counted_in_the_cache(self, mock_task, mock_email, mock_push):
+        from .models import ChatNotificationStats
+        from .tasks import flush_chat_notification_stats_task
+        group = make_group_chat(self.org, "Team", self.alice, self.bob, self.carol)
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(2):
+                self._send(ChatMessageGroup, group, self.alice, f"Hallo {i}")
+        stats_table = ChatNotificationStats._meta.db_table
+        self.assertFalse([q for q in queries.captured_queries if stats_table in q["sql"]])
+        self.assertFalse(ChatNotificationStats.objects.exists())
+
+        flush_chat_notification_stats_task.apply()
+        stats = self._stats()
+        self.assertEqual((stats.messages, stats.recipient_messages, stats.tasks_scheduled), (2, 4, 1))
+        flush_chat_notification_stats_task.apply()
+        self.assertEqual(self._stats().messages, 2)
+
+    def test_recipients_who_read_the_chat_are_skipped(self, mock_task, mock_email, mock_push):
+        from .notifications import send_chat_digests
+        group = make_group_chat(self.org, "Team", self.alice, self.bob, self.carol)
+        messages = [self._send(ChatMessageGroup, group, self.alice, f"Hallo {i}") for i in range(2)]
+        for msg in messages:
+            msg.mark_as_read_by(self.bob)
+
+        self.assertEqual(send_chat_digests("group", group.id), 1)
+        self.assertEqual(mock_push.call_args.args[0], self.carol)
+        self.assertEqual(mock_email.call_args.kwargs["subject"], "2 neue Nachrichten in Gruppe Team")
+        self.assertEqual(self._stats().recipients_skipped, 1)
+
+    def test_next_window_only_contains_new_messages(self, mock_task, mock_email, mock_push):
+        from .notifications import send_chat_digests
+        chat = make_direct_chat(self.org, self.alice, self.bob)
+        self._send(ChatMessageDirect, chat, self.alice, "Erste")
+        self._send(ChatMessageDirect, chat, self.alice, "Zweite")
+        send_chat_digests("direct", chat.id)
+        self.assertEqual(send_chat_digests("direct", chat.id), 0)
+
+        self._send(ChatMessageDirect, chat, self.alice, "Dritte")
+        self.assertEqual(mock_task.s.call_count, 2)
+        send_chat_digests("direct", chat.id)
+        self.assertEqual(mock_email.call_count, 2)
+        self.assertEqual(mock_email.call_args.kwargs["subject"], "Neue Nachricht von alice")
+        self.assertIn("Dritte", mock_email.call_args.kwargs["html_message"])
+        self.assertNotIn("Zweite", mock_email.call_args.kwargs["html_message"])
+
+
+class ChatFanOutTest(ChatBaseTest):
+    """Read marks and badge counts are handled in bulk instead of per receiver."""
+
+    def test_bulk_unread_counts_match_single_counts(self):
+        from .badge_utils import get_unread_chat_message_count, get_unread_chat_message_counts
+        direct = make_direct_chat(self.org, self.alice, self.bob)
+        group = make_group_chat(self.org, "Team", self.alice, self.bob, self.carol)
+        ChatMessageDirect.objects.create(org=self.org, chat=direct, user=self.alice, message="1")
+        ChatMessageDirect.objects.create(org=self.org, chat=direct, user=self.bob, message="2", read=True)
+        read = ChatMessageGroup.objects.create(org=self.org, chat=group, user=self.alice, message="3")
+        read.read_by.add(self.bob)
+        ChatMessageGroup.objects.create(org=self.org, chat=group, user=self.carol, message="4")
+
+        users = [self.alice, self.bob, self.carol, self.dave]
+        with self.assertNumQueries(2):
+            counts = get_unread_chat_message_counts([user.pk for user in users])
+        self.assertEqual(counts, {user.pk: get_unread_chat_message_count(user) for user in users})
+        self.assertEqual(counts[self.bob.pk], 2)
+
+    def test_read_marks_are_written_in_bulk(self):
+        from .read_marks import write_read_marks
+        direct = make_direct_chat(self.org, self.alice, self.bob)
+        group = make_group_chat(self.org, "Team", self.alice, self.bob, self.carol)
+        direct_messages = [
+            ChatMessageDirect.objects.create(org=self.org, chat=direct, user=self.alice, message=str(i))
+            for i in range(3)
+        ]
+        group_messages = [
+            ChatMessageGroup.objects.create(org=self.org, chat=group, user=self.alice, message=str(i))
+            for i in range(3)
+        ]
+
+        direct_marks = {msg.id: (direct.get_identifier(), self.bob.pk) for msg in direct_messages}
+        group_marks = {(msg.id, user.pk) for msg in group_messages for user in (self.bob, self.carol)}
+        with self.assertNumQueries(5):
+            write_read_marks(direct_marks, group_marks)
+
+        self.assertFalse(ChatMessageDirect.objects.filter(chat=direct, read=False).exists())
+        for msg in group_messages:
+            self.assertCountEqual(msg.read_by.all(), [self.bob, self.carol])
+
+    def test_read_marks_of_several_orgs_in_one_tick(self):
+        from types import SimpleNamespace
+        from FWMsg.middleware import get_current_request, request_context
+        from . import read_marks
+        from .badge_utils import get_unread_chat_message_counts
+        erin = make_user(self.other_org, "erin", self.other_cluster)
+        own_chat = make_direct_chat(self.org, self.alice, self.bob)
+        other_chat = make_direct_chat(self.other_org, self.dave, erin)
+        own = ChatMessageDirect.objects.create(org=self.org, chat=own_chat, user=self.alice, message="1")
+        other = ChatMessageDirect.objects.create(org=self.other_org, chat=other_chat, user=self.dave, message="2")
+        direct_marks = {
+            own.id: (own_chat.get_identifier(), self.bob.pk),
+            other.id: (other_chat.get_identifier(), erin.pk),
+        }
+
+        flushed_in = []
+        with patch.object(read_marks, "write_read_marks", lambda *marks: flushed_in.append(get_current_request())):
+            async def add_marks():
+                for message_id, (identifier, user_id) in direct_marks.items():
+                    read_marks.mark_read("direct", identifier, message_id, user_id)
+                await asyncio.sleep(read_marks.READ_MARK_TICK * 4)
+
+            with request_context(SimpleNamespace(user=self.bob)):
+                asyncio.run(add_marks())
+        self.assertEqual(flushed_in, [None])
+
+        with request_context(SimpleNamespace(user=self.bob)), \
+                patch("chat.badge_utils.get_channel_layer", return_value=None):
+            read_marks.write_read_marks(direct_marks, set())
+            counts = get_unread_chat_message_counts([self.alice.pk, self.dave.pk])
+        self.assertEqual(ChatMessageDirect._base_manager.filter(id__in=[own.id, other.id], read=True).count(), 2)
+        self.assertEqual(counts, {self.alice.pk: 0, self.dave.pk: 0})
+        ChatMessageDirect._base_manager.filter(id=other.id).update(read=False)
+        with request_context(SimpleNamespace(user=self.bob)):
+            self.assertEqual(get_unread_chat_message_counts([erin.pk])[erin.pk], 1)
+
+    def test_ampel_viewers_are_staff_and_owner(self):
+        from Global.models import Ampel2
+        from .ampel_access import ampel_viewer_ids
+        volunteer_cluster = make_cluster(self.org, view="F")
+        volunteer = make_user(self.org, "volunteer", volunteer_cluster)
+        other_volunteer = make_user(self.org, "volunteer2", volunteer_cluster)
+        group = make_group_chat(self.org, "Team", self.alice, volunteer, other_volunteer)
+        ampel = Ampel2.objects.create(org=self.org, user=volunteer, status="G")
+
+        self.assertCountEqual(ampel_viewer_ids(group, ampel), [self.alice.pk, volunteer.pk])
+
+
+# ===========================================================================
+# Image variants
+# ===========================================================================
+
+class ChatImageVariantTest(ChatBaseTest):
+    """Uploaded images get a display and a thumbnail version without metadata."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.TemporaryDirectory()
+        media_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.addCleanup(self.media_root.cleanup)
+        self.chat = make_direct_chat(self.org, self.alice, self.bob)
+
+    def _photo(self):
+        from PIL import Image
+        img = Image.new("RGB", (2400, 1200), (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90° clockwise
+        exif[0x010F] = "PhoneMaker"
+        out = io.BytesIO()
+        img.save(out, format="JPEG", exif=exif)
+        return SimpleUploadedFile("photo.jpg", out.getvalue(), content_type="image/jpeg")
+
+    def _send_photo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            msg = ChatMessageDirect.objects.create(
+                org=self.org, chat=self.chat, user=self.alice, message="", image=self._photo()
+            )
+        msg.refresh_from_db()
+        return msg
+
+    def test_variants_are_created_and_metadata_stripped(self):
+        from PIL import Image
+        msg = self._send_photo()
+
+        self.assertTrue(msg.image_thumbnail.name.endswith(f"{msg.image_identifier}_thumb.jpg"))
+        self.assertTrue(msg.image_display.name.endswith(f"{msg.image_identifier}_display.jpg"))
+        with Image.open(msg.image.path) as original:
+            self.assertEqual(original.size, (1200, 2400))
+            self.assertNotIn(0x010F, original.getexif())
+        with Image.open(msg.image_display.path) as display:
+            self.assertEqual(display.size, (800, 1600))
+        with Image.open(msg.image_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (160, 320))
+            self.assertEqual(len(thumbnail.getexif()), 0)
+
+    def test_serve_variants_with_etag(self):
+        msg = self._send_photo()
+        self.login(self.bob)
+        url = msg.get_image_public_url()
+
+        response = self.client.get(msg.get_image_thumbnail_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, max-age=31536000, immutable")
+        self.assertEqual(b"".join(response.streaming_content), Path(msg.image_thumbnail.path).read_bytes())
+
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(etag, f'"{msg.image_identifier}-image_display"')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(f"{url}?size=original")["ETag"], f'"{msg.image_identifier}-image"')
+        self.assertEqual(self.client.get(f"{url}?size=huge").status_code, 400)
+
+        self.login(self.carol)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_missing_variant_falls_back_to_original_without_caching(self):
+        from .images import process_chat_image
+        msg = ChatMessageDirect.objects.create(
+            org=self.org, chat=self.chat, user=self.alice, message="", image=self._photo()
+        )
+        self.login(self.bob)
+        response = self.client.get(msg.get_image_thumbnail_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{msg.image_identifier}-image-unprocessed"')
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+        # Not even the original is cached before its metadata is stripped
+        response = self.client.get(f"{msg.get_image_public_url()}?size=original")
+        self.assertEqual(response["ETag"], f'"{msg.image_identifier}-image-unprocessed"')
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        process_chat_image(msg)
+        response = self.client.get(
+            f"{msg.get_image_public_url()}?size=original",
+            HTTP_IF_NONE_MATCH=f'"{msg.image_identifier}-image-unprocessed"',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{msg.image_identifier}-image"')
+        self.assertEqual(response["Cache-Control"], "private, max-age=31536000, immutable")
+        self.assertEqual(_chat_message_payload(msg, self.alice)["thumbnail_url"], msg.get_image_thumbnail_url())
+
+
+class ChatWebSocketBenchmarkCommandTest(TransactionTestCase):
+    def test_benchmark_writes_report(self):
+        import json
+        import tempfile
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = f"{tmp}/report.json"
+            call_command(
+                "benchmark_chat_websockets", rooms=2, clients=3, messages=2, badges=True,
+                use_existing_database=True, output=output, stdout=StringIO(),
+            )
+            with open(output) as f:
+                report = json.load(f)
+
+        results = report["results"]
+        self.assertEqual(results["connections"], 12)
+        self.assertEqual(results["messages_sent"], 4)
+        # Every message reaches all three clients of its room, the sender included
+        self.assertEqual(results["deliveries"], 12)
+        self.assertEqual(results["deliveries_lost"], 0)
+        self.assertGreater(results["db_queries_per_message"], 0)
+        self.assertFalse(User.objects.filter(username__startswith="chatbench_").exists())
+        self.assertFalse(ChatGroup.objects.exists())
@@ -4,7 +4,13 @@ from pathlib import Path
 
 from django.contrib import messages as django_messages
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse, HttpResponseNotFound, JsonResponse
+from django.http import (
+    FileResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotFound,
+    HttpResponseNotModified,
+    JsonResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
@@ -14,6 +20,7 @@ from Global.models import Ampel2
 from Global.views import check_organization_context
 
 from .ampel_access import (
+    ampel_viewer_ids,
     resolve_ampel,
     resolve_ampel_for_direct_reply,
     user_can_reply_to_ampel_in_direct_chat,
@@ -26,11 +33,14 @@ from .badge_utils import (
     broadcast_chat_message_to_room,
     broadcast_direct_message_read_if_needed,
     broadcast_unread_badge_for_user,
+    broadcast_unread_badges,
     get_unread_chat_message_count,
 )
 from .forms import ChatDirectForm, ChatGroupForm, SendDirectMessageForm, SendGroupMessageForm
+from .images import DEFAULT_IMAGE_VARIANT, IMAGE_VARIANTS
 from .models import ChatDirect, ChatGroup, ChatMessageDirect, ChatMessageGroup
-from .tasks import notify_users_about_new_direct_chat_message, notify_users_about_new_group_chat_message, notify_users_about_new_group_chat
+from .notifications import schedule_chat_notification
+from .tasks import notify_users_about_new_group_chat
 from django.utils.translation import gettext_lazy as _
 
 def _ampel_payload(ampel):
@@ -52,6 +62,7 @@ def _chat_message_payload(msg, user, viewer=None):
         "message": msg.message,
         "created_at": msg.created_at.strftime("%d.%m.%Y %H:%M"),
         "image_url": image_url,
+        "thumbnail_url": msg.get_image_thumbnail_url(),
         "is_edited": msg.is_edited,
     }
     if viewer is not None and viewer.is_authenticated and msg.user_id == viewer.id:
@@ -77,7 +88,18 @@ def serve_chat_image(request, image_identifier):
 
     Uses DB lookup + stored ``ImageField.path`` — no user-controlled path segments,
     so path traversal is not possible via the URL.
+
+    ``?size=thumb|display|original`` selects the version (default ``display``);
+    versions not created yet fall back to the next larger one. Once the image
+    is processed the file behind an identifier and version never changes, so
+    responses carry a long-lived ETag and are revalidated with
+    ``If-None-Match`` only. Until then the original still has its metadata
+    and orientation and is served with a different ETag and ``no-cache``.
     """
+    size = request.GET.get("size", DEFAULT_IMAGE_VARIANT)
+    if size not in IMAGE_VARIANTS:
+        return HttpResponseBadRequest()
+
     org = request.user.org
     msg = (
         ChatMessageDirect.objects.filter(
@@ -97,8 +119,26 @@ def serve_chat_image(request, image_identifier):
     if msg is None or not msg.image:
         return HttpResponseNotFound()
 
+    field = next(name for name in IMAGE_VARIANTS[size] if getattr(msg, name))
+    # process_chat_image sets the thumbnail last, after rewriting the original
+    processed = bool(msg.image_thumbnail)
+    etag = f'"{image_identifier}-{field}"' if processed else f'"{image_identifier}-{field}-unprocessed"'
+    # A fallback is replaced by the variant later, an unprocessed original is
+    # rewritten in place: revalidate every time
+    cache_control = (
+        "private, max-age=31536000, immutable"
+        if processed and field == IMAGE_VARIANTS[size][0]
+        else "private, no-cache"
+    )
+
+    if etag in request.headers.get("If-None-Match", ""):
+        not_modified = HttpResponseNotModified()
+        not_modified["ETag"] = etag
+        not_modified["Cache-Control"] = cache_control
+        return not_modified
+
     try:
-        full_path = Path(msg.image.path)
+        full_path = Path(getattr(msg, field).path)
     except (ValueError, AttributeError):
         return HttpResponseNotFound()
 
@@ -108,7 +148,10 @@ def serve_chat_image(request, image_identifier):
     content_type = (
         mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
     )
-    return FileResponse(full_path.open("rb"), content_type=content_type)
+    response = FileResponse(full_path.open("rb"), content_type=content_type)
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
 
 
 @login_required
@@ -182,9 +225,8 @@ def chat_direct(request, identifier):
                 image=form.cleaned_data.get("image") or None,
             )
 
-            notify_users_about_new_direct_chat_message.s(msg.id, request.user.id).apply_async(countdown=10)
-            for recipient in chat.users.exclude(pk=request.user.pk):
-                broadcast_unread_badge_for_user(recipient)
+            schedule_chat_notification(msg)
+            broadcast_unread_badges(chat.users.exclude(pk=request.user.pk).values_list("pk", flat=True))
 
             return redirect(reverse('chat_direct', args=[chat.get_identifier()]))
     else:
@@ -237,9 +279,8 @@ def chat_group(request, identifier):
             )
             msg.mark_as_read_by(request.user)
 
-            notify_users_about_new_group_chat_message.s(msg.id, request.user.id).apply_async(countdown=10)
-            for recipient in chat.users.exclude(pk=request.user.pk):
-                broadcast_unread_badge_for_user(recipient)
+            schedule_chat_notification(msg)
+            broadcast_unread_badges(chat.users.exclude(pk=request.user.pk).values_list("pk", flat=True))
 
             return redirect(reverse('chat_group', args=[chat.get_identifier()]))
     else:
@@ -513,16 +554,14 @@ def send_message_direct(request, identifier):
         create_kw["answer_to_ampel"] = answer_to_ampel
     msg = ChatMessageDirect.objects.create(**create_kw)
 
-    notify_users_about_new_direct_chat_message.s(msg.id, request.user.id).apply_async(countdown=10)
-    for recipient in chat.users.exclude(pk=request.user.pk):
-        broadcast_unread_badge_for_user(recipient)
+    schedule_chat_notification(msg)
+    broadcast_unread_badges(chat.users.exclude(pk=request.user.pk).values_list("pk", flat=True))
 
     payload = _chat_message_payload(msg, request.user, viewer=request.user)
-    broadcast_chat_message_to_room(
-        "direct",
-        chat.get_identifier(),
-        _chat_message_payload(msg, request.user, viewer=request.user),
-    )
+    room_payload = _chat_message_payload(msg, request.user, viewer=request.user)
+    if answer_to_ampel:
+        room_payload["ampel_viewers"] = ampel_viewer_ids(chat, answer_to_ampel)
+    broadcast_chat_message_to_room("direct", chat.get_identifier(), room_payload)
     return JsonResponse(payload)
 
 
@@ -561,9 +600,8 @@ def send_message_group(request, identifier):
     msg = ChatMessageGroup.objects.create(**create_kw)
     msg.mark_as_read_by(request.user)
 
-    notify_users_about_new_group_chat_message.s(msg.id, request.user.id).apply_async(countdown=10)
-    for recipient in chat.users.exclude(pk=request.user.pk):
-        broadcast_unread_badge_for_user(recipient)
+    schedule_chat_notification(msg)
+    broadcast_unread_badges(chat.users.exclude(pk=request.user.pk).values_list("pk", flat=True))
 
     payload = _chat_message_payload(msg, request.user)
     broadcast_chat_message_to_room("group", chat.get_identifier(), payload)
@@ -0,0 +1,115 @@
+"""
+Data of the placement board (``seminar.views.assign``).
+
+The board is built from three queries – countries, placements and the
+seminar's applicants – and grouped in memory. ``board_as_json`` serialises it
+for the drag-and-drop page, which renders the board in the browser and sends
+changes to ``assign_update`` instead of reloading the page.
+"""
+
+from django.db.models import Case, IntegerField, When
+from django.templatetags.static import static
+from django.urls import reverse
+
+from BW.models import Bewerber
+from Global.models import Einsatzland2 as Einsatzland, Einsatzstelle2 as Einsatzstelle
+
+WISHES = ('first', 'second', 'third', 'no')
+
+
+def applicants_queryset(org):
+    """Applicants of the seminar, suitable first, then conditionally suitable, unsuitable and unrated, each by grade."""
+    related = ['user', 'user__customuser', 'zuteilung']
+    for wish in WISHES:
+        related += [f'{wish}_wish_einsatzland', f'{wish}_wish_einsatzstelle', f'{wish}_wish_einsatzstelle__land']
+    return (
+        Bewerber.objects
+        .filter(org=org, seminar_bewerber__isnull=False)
+        .select_related(*related)
+        .annotate(
+            custom_order=Case(
+                When(endbewertung__startswith='G', then=0),
+                When(endbewertung__startswith='B', then=1),
+                When(endbewertung__startswith='N', then=2),
+                default=3,
+                output_field=IntegerField(),
+            )
+        )
+        .order_by('custom_order', 'note', 'id')
+        .distinct()
+    )
+
+
+def get_board(org):
+    """
+    Return ``(laender, applicants)``: the countries as dicts with ``land``,
+    ``stellen`` (pairs of placement and its assigned applicants), ``belegt``
+    and ``max``, and all applicants in board order.
+    """
+    applicants = list(applicants_queryset(org))
+    assigned = {}
+    for bewerber in applicants:
+        if bewerber.zuteilung_id:
+            assigned.setdefault(bewerber.zuteilung_id, []).append(bewerber)
+
+    stellen = {}
+    for stelle in Einsatzstelle.objects.filter(org=org).order_by('name'):
+        stellen.setdefault(stelle.land_id, []).append((stelle, assigned.get(stelle.id, [])))
+
+    laender = []
+    for land in Einsatzland.objects.filter(org=org).order_by('name'):
+        land_stellen = stellen.get(land.id, [])
+        laender.append({
+            'land': land,
+            'stellen': land_stellen,
+            'belegt': sum(len(bewerber) for _, bewerber in land_stellen),
+            'max': sum(stelle.max_freiwillige or 0 for stelle, _ in land_stellen),
+        })
+    return laender, applicants
+
+
+def _wish_label(bewerber, wish):
+    stelle = getattr(bewerber, f'{wish}_wish_einsatzstelle')
+    land = getattr(bewerber, f'{wish}_wish_einsatzland')
+    return str(stelle or land or getattr(bewerber, f'{wish}_wish') or '')
+
+
+def applicant_as_json(bewerber):
+    custom_user = getattr(bewerber.user, 'customuser', None)
+    return {
+        'id': bewerber.id,
+        'first_name': bewerber.user.first_name,
+        'last_name': bewerber.user.last_name,
+        'avatar': reverse('serve_profil_picture', args=[custom_user.get_identifier()]) if custom_user else None,
+        'info_url': reverse('evaluate_all') + f'?fid={bewerber.id}',
+        'endbewertung': bewerber.endbewertung or '',
+        'note': round(bewerber.note, 1) if bewerber.note is not None else None,
+        'zuteilung': bewerber.zuteilung_id,
+        'wishes': {
+            wish: {
+                'label': _wish_label(bewerber, wish),
+                'land': getattr(bewerber, f'{wish}_wish_einsatzland_id'),
+                'stelle': getattr(bewerber, f'{wish}_wish_einsatzstelle_id'),
+            }
+            for wish in WISHES
+        },
+    }
+
+
+def board_as_json(laender, applicants):
+    return {
+        'laender': [
+            {
+                'id': land['land'].id,
+                'name': land['land'].name,
+                'code': (land['land'].code or '').lower(),
+                'stellen': [
+                    {'id': stelle.id, 'name': stelle.name, 'max': stelle.max_freiwillige or 0}
+                    for stelle, _ in land['stellen']
+                ],
+            }
+            for land in laender
+        ],
+        'applicants': [applicant_as_json(bewerber) for bewerber in applicants],
+        'default_avatar': static('img/default_img.png'),
+    }
@@ -0,0 +1,238 @@
+"""
+Automatic assignment of seminar applicants to placements (Einsatzstellen).
+
+The applicants still waiting for a placement and the capacity and current
+occupancy of all placements are loaded with one query each; planning then
+runs entirely in memory and the result is written with a single
+``bulk_update``. Two strategies are available:
+
+``greedy``
+    Applicants rated suitable (G) before conditionally suitable (B), each group
+    by grade, get the first of their three wishes that still has room.
+``optimal``
+    A min-cost assignment over the first, second and third wishes: as many
+    applicants as possible are placed, preferring suitable applicants, better
+    wishes and better grades (see the ``*_COST`` constants).
+"""
+
+import heapq
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, When
+
+from BW.models import Bewerber
+from Global.models import Einsatzstelle2 as Einsatzstelle
+
+WISH_FIELDS = ('first_wish_einsatzstelle', 'second_wish_einsatzstelle', 'third_wish_einsatzstelle')
+
+# Weights of the optimal strategy; placing an applicant always outweighs the rest
+ASSIGNMENT_COST = -10000
+CONDITIONALLY_SUITABLE_COST = 1000
+WISH_RANK_COST = 100
+GRADE_COST = 10
+
+STRATEGIES = ('greedy', 'optimal')
+
+
+@dataclass
+class PlannedAssignment:
+    bewerber: Bewerber
+    stelle: Einsatzstelle
+    wish: int  # 1, 2 or 3
+
+
+@dataclass
+class AssignmentPlan:
+    strategy: str
+    assignments: list = field(default_factory=list)
+    unassigned: list = field(default_factory=list)
+    free_places: dict = field(default_factory=dict)  # Einsatzstelle id -> free places after the plan
+
+    def wish_counts(self):
+        counts = {1: 0, 2: 0, 3: 0}
+        for assignment in self.assignments:
+            counts[assignment.wish] += 1
+        return counts
+
+
+def get_candidates(org):
+    """Unassigned seminar applicants rated G or B, suitable ones first, each group by grade."""
+    return list(
+        Bewerber.objects.filter(
+            org=org, zuteilung=None, seminar_bewerber__isnull=False,
+        ).filter(
+            Q(endbewertung__startswith='G') | Q(endbewertung__startswith='B')
+        ).select_related(
+            'user', *WISH_FIELDS,
+        ).annotate(
+            custom_order=Case(
+                When(endbewertung__startswith='G', then=0),
+                default=1,
+                output_field=IntegerField(),
+            )
+        ).order_by('custom_order', 'note', 'id').distinct()
+    )
+
+
+def get_free_places(org):
+    """Free places per Einsatzstelle id, counting applicants of the seminar already assigned."""
+    stellen = Einsatzstelle.objects.filter(org=org, max_freiwillige__isnull=False).annotate(
+        belegt=Count('zuteilung', filter=Q(zuteilung__seminar_bewerber__isnull=False), distinct=True)
+    )
+    return {stelle.id: max(stelle.max_freiwillige - stelle.belegt, 0) for stelle in stellen}
+
+
+def _wishes(bewerber):
+    """``(wish number, Einsatzstelle)`` of the distinct placements an applicant wished for."""
+    wishes, seen = [], set()
+    for number, wish_field in enumerate(WISH_FIELDS, start=1):
+        stelle = getattr(bewerber, wish_field)
+        if stelle and stelle.id not in seen:
+            seen.add(stelle.id)
+            wishes.append((number, stelle))
+    return wishes
+
+
+def plan_greedy(candidates, free_places):
+    plan = AssignmentPlan('greedy', free_places=dict(free_places))
+    for bewerber in candidates:
+        for number, stelle in _wishes(bewerber):
+            if plan.free_places.get(stelle.id, 0) > 0:
+                plan.free_places[stelle.id] -= 1
+                plan.assignments.append(PlannedAssignment(bewerber, stelle, number))
+                break
+        else:
+            plan.unassigned.append(bewerber)
+    return plan
+
+
+def _assignment_cost(bewerber, wish):
+    cost = ASSIGNMENT_COST + (wish - 1) * WISH_RANK_COST
+    if not (bewerber.endbewertung or '').upper().startswith('G'):
+        cost += CONDITIONALLY_SUITABLE_COST
+    if bewerber.note is not None:
+        cost += bewerber.note * GRADE_COST
+    return cost
+
+
+class _FlowGraph:
+    """Residual graph for a min-cost flow with unit capacities on applicant edges."""
+
+    def __init__(self, size):
+        self.edges = [[] for _ in range(size)]  # node -> [target, capacity, cost, reverse index]
+
+    def add_edge(self, source, target, capacity, cost):
+        self.edges[source].append([target, capacity, cost, len(self.edges[target])])
+        self.edges[target].append([source, 0, -cost, len(self.edges[source]) - 1])
+
+    def _shortest_paths(self, source, potential):
+        distance = [None] * len(self.edges)
+        previous = [None] * len(self.edges)
+        distance[source] = 0
+        queue = [(0, source)]
+        while queue:
+            dist, node = heapq.heappop(queue)
+            if dist > distance[node]:
+                continue
+            for index, (target, capacity, cost, _) in enumerate(self.edges[node]):
+                if capacity <= 0:
+                    continue
+                candidate = dist + cost + potential[node] - potential[target]
+                if distance[target] is None or candidate < distance[target]:
+                    distance[target] = candidate
+                    previous[target] = (node, index)
+                    heapq.heappush(queue, (candidate, target))
+        return distance, previous
+
+    def min_cost_flow(self, source, sink, potential):
+        """
+        Augment along cheapest paths while they lower the total cost.
+
+        ``potential`` must make all reduced costs of the initial graph
+        non-negative, which allows Dijkstra on reduced costs (Johnson).
+        """
+        while True:
+            distance, previous = self._shortest_paths(source, potential)
+            if distance[sink] is None or distance[sink] + potential[sink] - potential[source] >= 0:
+                return
+            for node, dist in enumerate(distance):
+                if dist is not None:
+                    potential[node] += dist
+            node = sink
+            while node != source:
+                parent, index = previous[node]
+                edge = self.edges[parent][index]
+                edge[1] -= 1
+                self.edges[node][edge[3]][1] += 1
+                node = parent
+
+
+def plan_optimal(candidates, free_places):
+    """
+    Min-cost flow from the applicants over their wishes to the placements.
+
+    Nodes are the source, one per applicant, one per wished placement with
+    free places and the sink; every applicant edge carries its
+    ``_assignment_cost``, which is negative, so augmenting stops once nobody
+    else can be placed.
+    """
+    plan = AssignmentPlan('optimal', free_places=dict(free_places))
+    stellen = {}
+    for bewerber in candidates:
+        for _, stelle in _wishes(bewerber):
+            if free_places.get(stelle.id, 0) > 0:
+                stellen.setdefault(stelle.id, stelle)
+    stelle_ids = list(stellen)
+    source, sink = 0, 1 + len(candidates) + len(stelle_ids)
+    stelle_nodes = {stelle_id: 1 + len(candidates) + i for i, stelle_id in enumerate(stelle_ids)}
+
+    graph = _FlowGraph(sink + 1)
+    # The initial graph is layered, so the cheapest cost per node is known up front
+    potential = [0] * (sink + 1)
+    for stelle_id, node in stelle_nodes.items():
+        graph.add_edge(node, sink, free_places[stelle_id], 0)
+    wish_edges = {}
+    for i, bewerber in enumerate(candidates, start=1):
+        graph.add_edge(source, i, 1, 0)
+        for number, stelle in _wishes(bewerber):
+            if stelle.id in stelle_nodes:
+                cost = _assignment_cost(bewerber, number)
+                wish_edges[(i, len(graph.edges[i]))] = number
+                graph.add_edge(i, stelle_nodes[stelle.id], 1, cost)
+                node = stelle_nodes[stelle.id]
+                potential[node] = min(potential[node], cost)
+    potential[sink] = min(potential[node] for node in stelle_nodes.values()) if stelle_nodes else 0
+
+    graph.min_cost_flow(source, sink, potential)
+
+    nodes_to_stelle = {node: stellen[stelle_id] for stelle_id, node in stelle_nodes.items()}
+    for i, bewerber in enumerate(candidates, start=1):
+        for index, (target, capacity, _, _) in enumerate(graph.edges[i]):
+            if (i, index) in wish_edges and capacity == 0:
+                stelle = nodes_to_stelle[target]
+                plan.free_places[stelle.id] -= 1
+                plan.assignments.append(PlannedAssignment(bewerber, stelle, wish_edges[(i, index)]))
+                break
+        else:
+            plan.unassigned.append(bewerber)
+    return plan
+
+
+def plan_assignments(org, strategy='greedy'):
+    """Plan the assignment of all unassigned applicants of ``org`` without saving it."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy {strategy}')
+    planner = plan_optimal if strategy == 'optimal' else plan_greedy
+    return planner(get_candidates(org), get_free_places(org))
+
+
+def apply_plan(plan):
+    """Save the planned placements with one ``bulk_update``; returns the number of assigned applicants."""
+    changed = []
+    for assignment in plan.assignments:
+        assignment.bewerber.zuteilung = assignment.stelle
+        changed.append(assignment.bewerber)
+    with transaction.atomic():
+        Bewerber.objects.bulk_update(changed, ['zuteilung'])
+    return len(changed)
@@ -0,0 +1,231 @@
+"""
+Storage of the ratings and comments given during a seminar.
+
+Raters collect their answers in the browser (``evaluation_queue.js`` keeps a
+queue in localStorage while offline) and send them in batches. A batch is
+validated with one query per referenced model and written in one transaction:
+ratings are upserted with a single ``bulk_create(update_conflicts=True)`` on
+the unique (rater, applicant, question, unit) constraint, comments with one
+``bulk_create`` and one ``bulk_update``. Their key contains the nullable
+category, which cannot serve as conflict target.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from BW.models import Bewerber
+
+from .models import Bewertung, Einheit, Frage, Fragekategorie, Kommentar
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rating_key(rating):
+    return rating['bewerber'], rating['einheit'], rating['frage']
+
+
+def _comment_key(comment):
+    return comment['bewerber'], comment['einheit'], comment['kategorie']
+
+
+def _normalize(bewerter, ratings, comments):
+    """Drop entries referring to unknown objects or out-of-range values; the last entry per key wins."""
+    org = bewerter.org
+    ratings = [
+        {
+            'bewerber': _to_int(r.get('bewerber')),
+            'einheit': _to_int(r.get('einheit')),
+            'frage': _to_int(r.get('frage')),
+            'bewertung': None if r.get('bewertung') in (None, '') else _to_int(r.get('bewertung')),
+            'delete': r.get('bewertung') in (None, ''),
+        }
+        for r in ratings
+    ]
+    comments = [
+        {
+            'bewerber': _to_int(c.get('bewerber')),
+            'einheit': _to_int(c.get('einheit')),
+            'kategorie': _to_int(c.get('kategorie')),
+            'has_kategorie': c.get('kategorie') not in (None, '', 'ohne'),
+            'text': strip_tags(str(c.get('text') or '')).strip(),
+            'show_name': bool(c.get('show_name', True)),
+        }
+        for c in comments
+    ]
+
+    entries = ratings + comments
+    bewerber_ids = set(Bewerber.objects.filter(
+        org=org, seminar_bewerber__isnull=False, id__in={e['bewerber'] for e in entries},
+    ).values_list('id', flat=True))
+    einheit_ids = set(Einheit.objects.filter(
+        org=org, id__in={e['einheit'] for e in entries},
+    ).values_list('id', flat=True))
+    fragen = {
+        frage.id: frage for frage in Frage.objects.filter(org=org, id__in={r['frage'] for r in ratings})
+    } if ratings else {}
+    kategorie_ids = set(Fragekategorie.objects.filter(
+        org=org, id__in={c['kategorie'] for c in comments if c['has_kategorie']},
+    ).values_list('id', flat=True)) if comments else set()
+
+    valid_ratings, valid_comments = {}, {}
+    rejected = 0
+    for rating in ratings:
+        frage = fragen.get(rating['frage'])
+        valid = (
+            rating['bewerber'] in bewerber_ids and rating['einheit'] in einheit_ids and frage
+            and (rating['delete'] or (
+                rating['bewertung'] is not None and frage.min <= rating['bewertung'] <= frage.max
+            ))
+        )
+        if valid:
+            valid_ratings[_rating_key(rating)] = rating
+        else:
+            rejected += 1
+    for comment in comments:
+        if comment['has_kategorie']:
+            valid_kategorie = comment['kategorie'] in kategorie_ids
+        else:
+            comment['kategorie'] = None
+            valid_kategorie = True
+        if valid_kategorie and comment['bewerber'] in bewerber_ids and comment['einheit'] in einheit_ids:
+            valid_comments[_comment_key(comment)] = comment
+        else:
+            rejected += 1
+    return list(valid_ratings.values()), list(valid_comments.values()), rejected
+
+
+def _key_filter(keys, fields):
+    condition = Q()
+    for key in keys:
+        condition |= Q(**dict(zip(fields, key)))
+    return condition
+
+
+def _save_ratings(bewerter, ratings, result):
+    upserts = [r for r in ratings if not r['delete']]
+    deletes = [_rating_key(r) for r in ratings if r['delete']]
+
+    if upserts:
+        existing = set(Bewertung.objects.filter(
+            bewerter=bewerter,
+            bewerber_id__in={r['bewerber'] for r in upserts},
+            einheit_id__in={r['einheit'] for r in upserts},
+        ).values_list('bewerber_id', 'einheit_id', 'frage_id'))
+        Bewertung.objects.bulk_create(
+            [
+                Bewertung(
+                    org=bewerter.org,
+                    bewerter=bewerter,
+                    bewerber_id=r['bewerber'],
+                    einheit_id=r['einheit'],
+                    frage_id=r['frage'],
+                    bewertung=r['bewertung'],
+                )
+                for r in upserts
+            ],
+            update_conflicts=True,
+            unique_fields=['bewerter', 'bewerber', 'frage', 'einheit'],
+            update_fields=['bewertung', 'last_modified'],
+        )
+        updated = sum(1 for r in upserts if _rating_key(r) in existing)
+        result['updated'] += updated
+        result['inserted'] += len(upserts) - updated
+
+    if deletes:
+        deleted, _ = Bewertung.objects.filter(bewerter=bewerter).filter(
+            _key_filter(deletes, ('bewerber_id', 'einheit_id', 'frage_id'))
+        ).delete()
+        result['deleted'] += deleted
+
+
+def _save_comments(bewerter, comments, result):
+    if not comments:
+        return
+    existing = {
+        (k.bewerber_id, k.einheit_id, k.kategorie_id): k
+        for k in Kommentar.objects.filter(bewerter=bewerter).filter(
+            _key_filter([_comment_key(c) for c in comments], ('bewerber_id', 'einheit_id', 'kategorie_id'))
+        )
+    }
+    now = timezone.now()
+    created, changed, deletes = [], [], []
+    for comment in comments:
+        kommentar = existing.get(_comment_key(comment))
+        if not comment['text']:
+            if kommentar:
+                deletes.append(kommentar.id)
+        elif kommentar:
+            kommentar.text = comment['text']
+            kommentar.show_name_at_presentation = comment['show_name']
+            kommentar.last_modified = now
+            changed.append(kommentar)
+        else:
+            created.append(Kommentar(
+                org=bewerter.org,
+                bewerter=bewerter,
+                bewerber_id=comment['bewerber'],
+                einheit_id=comment['einheit'],
+                kategorie_id=comment['kategorie'],
+                text=comment['text'],
+                show_name_at_presentation=comment['show_name'],
+            ))
+
+    Kommentar.objects.bulk_create(created)
+    # bulk_update skips auto_now, hence last_modified is set explicitly
+    Kommentar.objects.bulk_update(changed, ['text', 'show_name_at_presentation', 'last_modified'])
+    if deletes:
+        Kommentar.objects.filter(id__in=deletes).delete()
+    result['inserted'] += len(created)
+    result['updated'] += len(changed)
+    result['deleted'] += len(deletes)
+
+
+def save_evaluations(bewerter, ratings=(), comments=()):
+    """
+    Store a batch of ratings and comments of ``bewerter``.
+
+    ``ratings`` are dicts with ``bewerber``, ``einheit``, ``frage`` and
+    ``bewertung`` (None removes the rating); ``comments`` are dicts with
+    ``bewerber``, ``einheit``, ``kategorie`` (None for the general comment),
+    ``text`` (empty removes the comment) and ``show_name``. Returns the
+    number of ``inserted``, ``updated``, ``deleted`` and ``rejected`` entries.
+    """
+    ratings, comments, rejected = _normalize(bewerter, list(ratings), list(comments))
+    result = {'inserted': 0, 'updated': 0, 'deleted': 0, 'rejected': rejected}
+    with transaction.atomic():
+        _save_ratings(bewerter, ratings, result)
+        _save_comments(bewerter, comments, result)
+    return result
+
+
+def parse_rating_name(name):
+    """Split a rating field name ``f<bewerber>q<frage>r<einheit>u<bewerter>`` into its ids."""
+    bewerber, rest = name[1:].split('q', 1)
+    frage, rest = rest.split('r', 1)
+    einheit, bewerter = rest.split('u', 1)
+    return {'bewerber': bewerber, 'frage': frage, 'einheit': einheit, 'bewerter': bewerter}
+
+
+def parse_comment_name(name):
+    """
+    Split a comment field name ``comment<bewerber>r<einheit>u<bewerter>[c<kategorie>]n<0|1>``
+    into its ids and the flag whether the name is shown at the presentation.
+    """
+    bewerber, rest = name[len('comment'):].split('r', 1)
+    einheit, rest = rest.split('u', 1)
+    rest, show_name = rest.rsplit('n', 1)
+    bewerter, _, kategorie = rest.partition('c')
+    return {
+        'bewerber': bewerber,
+        'einheit': einheit,
+        'bewerter': bewerter,
+        'kategorie': kategorie or None,
+        'show_name': show_name == '1',
+    }
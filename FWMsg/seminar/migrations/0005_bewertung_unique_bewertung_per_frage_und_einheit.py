@@ -0,0 +1,38 @@
+# Generated by Django 6.0.6 on 2026-10-19 16:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_bewertungen(apps, schema_editor):
+    # Keep the most recently modified rating of each rater, applicant, question and unit
+    Bewertung = apps.get_model('seminar', 'Bewertung')
+    seen = set()
+    duplicates = []
+    for bewertung in Bewertung.objects.order_by('-last_modified', '-id').values_list(
+        'id', 'bewerter_id', 'bewerber_id', 'frage_id', 'einheit_id'
+    ):
+        key = bewertung[1:]
+        if key in seen:
+            duplicates.append(bewertung[0])
+        else:
+            seen.add(key)
+    Bewertung.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BW', '0012_applicationanswer_updated_at'),
+        ('ORG', '0003_historicalorganisation_uuid'),
+        ('seminar', '0004_seminar_bewerber_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_bewertungen, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bewertung',
+            constraint=models.UniqueConstraint(fields=('bewerter', 'bewerber', 'frage', 'einheit'), name='unique_bewertung_per_frage_und_einheit'),
+        ),
+    ]
@@ -90,6 +90,12 @@ class Bewertung(OrgModel):
     class Meta:
         verbose_name = _('Bewertung')
         verbose_name_plural = _('Bewertungen')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bewerter', 'bewerber', 'frage', 'einheit'],
+                name='unique_bewertung_per_frage_und_einheit',
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -0,0 +1,347 @@
+// Placement board of the seminar. The board is rendered from the JSON state
+// provided by the server; assignments are changed by drag-and-drop or by
+// selecting a volunteer and a position, and saved with a small AJAX request.
+const AssignBoard = {
+    state: null,
+    dataUrl: null,
+    updateUrl: null,
+    csrfToken: null,
+    selectedVolunteer: null,
+    selectedPosition: null,
+
+    init({board, dataUrl, updateUrl, csrfToken, scrollTo}) {
+        this.state = board;
+        this.dataUrl = dataUrl;
+        this.updateUrl = updateUrl;
+        this.csrfToken = csrfToken;
+        this.render();
+        this.bindDropZone(document.getElementById('unassignedList'));
+
+        if (scrollTo) {
+            const section = document.querySelector(`.position-section[data-position-id="${scrollTo}"]`);
+            if (section) section.scrollIntoView({behavior: 'smooth'});
+        }
+
+        document.addEventListener('keydown', (e) => {
+            if (e.key === 'Escape') {
+                this.clearSelection();
+            }
+        });
+    },
+
+    // Escapes text for element content and quoted attribute values alike
+    escape(value) {
+        const entities = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+        return String(value == null ? '' : value).replace(/[&<>"']/g, c => entities[c]);
+    },
+
+    applicantsAt(stelleId) {
+        return this.state.applicants.filter(a => a.zuteilung === stelleId);
+    },
+
+    stelleName(stelleId) {
+        for (const land of this.state.laender) {
+            const stelle = land.stellen.find(s => s.id === stelleId);
+            if (stelle) return stelle.name;
+        }
+        return '';
+    },
+
+    avatar(applicant, cssClass) {
+        const fallback = this.escape(this.state.default_avatar);
+        return `<img src="${this.escape(applicant.avatar) || fallback}" class="${cssClass}"
+                     alt="${this.escape(applicant.first_name)}" data-fallback="${fallback}"
+                     onerror="this.onerror = null; this.src = this.dataset.fallback">`;
+    },
+
+    badge(applicant) {
+        return applicant.endbewertung
+            ? `<div class="evaluation-badge evaluation-${this.escape(applicant.endbewertung)}"></div>`
+            : '';
+    },
+
+    render() {
+        this.renderCountries();
+        this.renderVolunteers();
+    },
+
+    renderCountries() {
+        const container = document.getElementById('assignCountries');
+        container.innerHTML = this.state.laender.map(land => {
+            const belegt = land.stellen.reduce((sum, s) => sum + this.applicantsAt(s.id).length, 0);
+            const max = land.stellen.reduce((sum, s) => sum + s.max, 0);
+            return `
+                <div class="country-section p-3 mb-4 bg-white rounded-4" id="${land.id}">
+                    <div class="d-flex justify-content-between align-items-center mb-3">
+                        <h5 class="mb-0">
+                            <span class="fi fi-${this.escape(land.code)} me-2"></span>
+                            ${this.escape(land.name)}
+                        </h5>
+                        <span class="badge bg-info position-counter">${belegt}/${max}</span>
+                    </div>
+                    ${land.stellen.map(stelle => this.renderPosition(stelle)).join('')}
+                </div>`;
+        }).join('');
+
+        container.querySelectorAll('.position-section').forEach(section => this.bindDropZone(section));
+        container.querySelectorAll('.position-slot').forEach(slot => {
+            slot.addEventListener('click', () => this.selectPosition(Number(slot.dataset.positionId), slot));
+        });
+        container.querySelectorAll('.remove-btn').forEach(button => {
+            button.addEventListener('click', () => this.assign(Number(button.dataset.volunteerId), null));
+        });
+        container.querySelectorAll('.assigned-volunteer').forEach(card => this.bindDraggable(card));
+
+        const quickAccess = document.getElementById('assignQuickAccess');
+        quickAccess.querySelectorAll('a').forEach(link => link.remove());
+        quickAccess.insertAdjacentHTML('beforeend', this.state.laender.map(land => `
+            <a href="#${land.id}" class="border rounded p-1" data-einsatzland="${land.id}">
+                <span class="fi fi-${this.escape(land.code)} me-2"></span>${this.escape(land.code.toUpperCase())}
+            </a>`).join(''));
+    },
+
+    renderPosition(stelle) {
+        const assigned = this.applicantsAt(stelle.id);
+        let badgeClass = 'bg-secondary';
+        if (stelle.max === assigned.length) badgeClass = 'bg-success';
+        else if (stelle.max < assigned.length) badgeClass = 'bg-danger';
+
+        // One slot per free place, or a single one to overfill a full position
+        const slots = Math.max(stelle.max - assigned.length, 1);
+        const slot = `
+            <div class="col-md-4 col-lg-3">
+                <div class="position-slot d-flex align-items-center justify-content-center" data-position-id="${stelle.id}">
+                    <div class="text-center text-muted">
+                        <i class="bi bi-plus-circle fs-2"></i>
+                        <div class="small">Freiwillige:r zuweisen</div>
+                    </div>
+                </div>
+            </div>`;
+
+        return `
+            <div class="position-section mb-4 p-3 rounded" data-position-id="${stelle.id}">
+                <div class="d-flex justify-content-between align-items-center mb-3">
+                    <h6 class="mb-0">${this.escape(stelle.name)}</h6>
+                    <span class="badge ${badgeClass}">${assigned.length}/${stelle.max}</span>
+                </div>
+                <div class="row g-2">
+                    ${assigned.map(applicant => `
+                        <div class="col-md-4 col-lg-3">
+                            <div class="assigned-volunteer card rounded-4 border-success shadow-sm" data-volunteer-id="${applicant.id}">
+                                <div class="card-body p-2 text-center">
+                                    <button type="button" class="btn btn-sm btn-danger remove-btn" data-volunteer-id="${applicant.id}">
+                                        <i class="bi bi-x"></i>
+                                    </button>
+                                    ${this.badge(applicant)}
+                                    ${this.avatar(applicant, 'volunteer-avatar mb-2')}
+                                    <div class="small fw-bold">${this.escape(applicant.first_name)}</div>
+                                    <div class="small text-muted">${this.escape(applicant.last_name)}</div>
+                                    ${applicant.note != null ? `<div class="small text-primary">${this.escape(applicant.note)}</div>` : ''}
+                                </div>
+                            </div>
+                        </div>`).join('')}
+                    ${slot.repeat(slots)}
+                </div>
+            </div>`;
+    },
+
+    renderVolunteerCard(applicant) {
+        const wishes = ['first', 'second', 'third'].map((wish, i) => `
+            <div class="small">${i + 1}) ${this.escape(applicant.wishes[wish].label)}</div>`).join('');
+        const noWish = applicant.wishes.no.label
+            ? `<div class="small text-danger">Nicht: ${this.escape(applicant.wishes.no.label)}</div>`
+            : '';
+        const stelle = applicant.zuteilung
+            ? `<div class="small text-muted">${this.escape(this.stelleName(applicant.zuteilung))}</div>`
+            : '';
+        const selected = applicant.id === this.selectedVolunteer ? 'selected' : '';
+        return `
+            <div class="volunteer-card card mb-2 rounded-4 ${selected}" data-volunteer-id="${applicant.id}">
+                <div class="card-body p-2">
+                    <div class="d-flex align-items-center">
+                        <div class="position-relative me-3">
+                            ${this.avatar(applicant, 'volunteer-avatar')}
+                            ${this.badge(applicant)}
+                        </div>
+                        <div class="flex-grow-1">
+                            <div class="fw-bold">${this.escape(applicant.first_name)} ${this.escape(applicant.last_name.charAt(0))}.</div>
+                            ${applicant.note != null ? `<div class="small text-primary">Note: ${this.escape(applicant.note)}</div>` : ''}
+                            <div class="wish-list">${wishes}${noWish}</div>
+                        </div>
+                        ${stelle}
+                        <div class="ms-2">
+                            <a href="${this.escape(applicant.info_url)}" target="_blank"
+                               class="btn btn-sm btn-outline-info" onclick="event.stopPropagation()">
+                                <i class="bi bi-info-circle"></i>
+                            </a>
+                        </div>
+                    </div>
+                </div>
+            </div>`;
+    },
+
+    renderVolunteers() {
+        const unassigned = this.state.applicants.filter(a => !a.zuteilung);
+        const assigned = this.state.applicants.filter(a => a.zuteilung);
+        document.getElementById('unassignedCount').textContent = unassigned.length;
+        document.getElementById('assignedCount').textContent = assigned.length;
+
+        document.getElementById('unassignedList').innerHTML = unassigned.length
+            ? unassigned.map(a => this.renderVolunteerCard(a)).join('')
+            : `<div class="text-center text-muted py-4">
+                   <i class="bi bi-check-circle fs-1"></i>
+                   <div class="mt-2">Alle Freiwilligen sind zugeteilt!</div>
+               </div>`;
+        document.getElementById('assignedList').innerHTML = assigned.length
+            ? assigned.map(a => this.renderVolunteerCard(a)).join('')
+            : `<div class="text-center text-muted py-4">
+                   <i class="bi bi-person-x fs-1"></i>
+                   <div class="mt-2">Noch keine Zuweisungen</div>
+               </div>`;
+
+        document.querySelectorAll('.volunteer-card').forEach(card => {
+            card.addEventListener('click', () => this.selectVolunteer(Number(card.dataset.volunteerId)));
+            this.bindDraggable(card);
+        });
+        if (this.selectedPosition) {
+            this.filterVolunteersByPosition(this.selectedPosition);
+        }
+    },
+
+    bindDraggable(card) {
+        card.setAttribute('draggable', 'true');
+        card.addEventListener('dragstart', (e) => {
+            e.dataTransfer.setData('text/plain', card.dataset.volunteerId);
+            e.dataTransfer.effectAllowed = 'move';
+        });
+    },
+
+    bindDropZone(zone) {
+        zone.addEventListener('dragover', (e) => {
+            e.preventDefault();
+            zone.classList.add('drop-target');
+        });
+        zone.addEventListener('dragleave', () => zone.classList.remove('drop-target'));
+        zone.addEventListener('drop', (e) => {
+            e.preventDefault();
+            zone.classList.remove('drop-target');
+            const volunteerId = Number(e.dataTransfer.getData('text/plain'));
+            const positionId = zone.dataset.positionId ? Number(zone.dataset.positionId) : null;
+            if (volunteerId) {
+                this.assign(volunteerId, positionId);
+            }
+        });
+    },
+
+    selectVolunteer(volunteerId) {
+        if (this.selectedVolunteer === volunteerId) {
+            this.clearSelection();
+            return;
+        }
+        this.selectedVolunteer = volunteerId;
+        document.querySelectorAll('.volunteer-card').forEach(card => {
+            card.classList.toggle('selected', Number(card.dataset.volunteerId) === volunteerId);
+        });
+        this.highlightMatchingPositions(this.state.applicants.find(a => a.id === volunteerId));
+
+        if (this.selectedPosition) {
+            this.assign(this.selectedVolunteer, this.selectedPosition);
+        }
+    },
+
+    selectPosition(positionId, positionSlot) {
+        if (this.selectedPosition === positionId) {
+            this.clearSelection();
+            return;
+        }
+        document.querySelectorAll('.position-slot').forEach(slot => slot.classList.remove('drop-target'));
+        positionSlot.classList.add('drop-target');
+        this.selectedPosition = positionId;
+        this.filterVolunteersByPosition(positionId);
+
+        if (this.selectedVolunteer) {
+            this.assign(this.selectedVolunteer, this.selectedPosition);
+        }
+    },
+
+    filterVolunteersByPosition(positionId) {
+        const land = this.state.laender.find(l => l.stellen.some(s => s.id === positionId));
+        document.querySelectorAll('.volunteer-card').forEach(card => {
+            const applicant = this.state.applicants.find(a => a.id === Number(card.dataset.volunteerId));
+            // Show only volunteers who wished for this position or its country
+            const matches = ['first', 'second', 'third'].some(wish =>
+                applicant.wishes[wish].stelle === positionId || (land && applicant.wishes[wish].land === land.id)
+            );
+            card.style.display = matches ? '' : 'none';
+        });
+    },
+
+    highlightMatchingPositions(applicant) {
+        document.querySelectorAll('.position-section').forEach(section => {
+            section.classList.remove('border-success', 'border-warning', 'border-danger');
+        });
+        const highlight = (stelleId, cssClass) => {
+            const section = stelleId && document.querySelector(`.position-section[data-position-id="${stelleId}"]`);
+            if (section) section.classList.add(cssClass);
+        };
+        ['first', 'second', 'third'].forEach(wish => highlight(applicant.wishes[wish].stelle, 'border-success'));
+        highlight(applicant.wishes.no.stelle, 'border-danger');
+    },
+
+    clearSelection() {
+        this.selectedVolunteer = null;
+        this.selectedPosition = null;
+        document.querySelectorAll('.volunteer-card').forEach(card => {
+            card.classList.remove('selected');
+            card.style.display = '';
+        });
+        document.querySelectorAll('.position-slot').forEach(slot => slot.classList.remove('drop-target'));
+        document.querySelectorAll('.position-section').forEach(section => {
+            section.classList.remove('border-success', 'border-warning', 'border-danger');
+        });
+    },
+
+    showError(message) {
+        const alert = document.getElementById('assignError');
+        alert.textContent = message;
+        alert.classList.toggle('d-none', !message);
+    },
+
+    assign(volunteerId, positionId) {
+        const applicant = this.state.applicants.find(a => a.id === volunteerId);
+        if (!applicant || applicant.zuteilung === positionId) {
+            return Promise.resolve();
+        }
+        return fetch(this.updateUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': this.csrfToken},
+            body: JSON.stringify({bewerber: volunteerId, stelle: positionId}),
+        })
+            .then(response => response.json().then(data => {
+                if (!response.ok) {
+                    throw new Error(data.error || response.status);
+                }
+                return data;
+            }))
+            .then(data => {
+                const index = this.state.applicants.findIndex(a => a.id === volunteerId);
+                this.state.applicants[index] = data.applicant;
+                this.showError('');
+                this.clearSelection();
+                this.render();
+            })
+            .catch(error => {
+                this.showError('Fehler bei der Zuteilung. Bitte versuche es erneut. (' + error.message + ')');
+                this.reload();
+            });
+    },
+
+    reload() {
+        return fetch(this.dataUrl)
+            .then(response => response.json())
+            .then(board => {
+                this.state = board;
+                this.render();
+            });
+    },
+};
@@ -82,47 +82,30 @@ window.onload = function () {
         }
     });
 
-    let bnts = document.querySelectorAll('div.tab-container button');
+    // Restore answers that are still queued for the server
+    EvaluationQueue.init(evaluation_url, user, csrf_token);
+    let queue = EvaluationQueue.load();
 
-    bnts.forEach(function (btn) {
-        let cookie_name = 'f' + btn.id + 'r' + einheit + 'u' + user
-        let cookie = get_cookies(cookie_name);
-
-        if (cookie) {
-            let data = JSON.parse(cookie);
-            let keys = Object.keys(data);
-
-            for (let i = 0; i < keys.length; i++) {
-                let key = keys[i];
-                let value = data[key];
-                let checkbox = document.getElementById('f' + btn.id + 'q' + key + 'v' + value);
-
-                let parentDiv = checkbox.parentElement;
-                let chosenCheckboxes = parentDiv.querySelectorAll('input[type="checkbox"]:checked');
-
-                for (let j = 0; j < chosenCheckboxes.length; j++) {
-                    chosenCheckboxes[j].checked = false;
-                }
-
-                checkbox.checked = true;
-            }
+    Object.values(queue.ratings).forEach((rating) => {
+        if (String(rating.einheit) !== einheit) {
+            return;
         }
-    })
+        let checkboxes = document.getElementsByName('f' + rating.bewerber + 'q' + rating.frage + 'r' + einheit + 'u' + user);
+        for (let j = 0; j < checkboxes.length; j++) {
+            checkboxes[j].checked = String(checkboxes[j].value) === String(rating.bewertung);
+        }
+    });
 
-    let cookies = get_cookies()
-    let keys = Object.keys(cookies)
-
-    for (let i = 0; i < keys.length; i++) {
-        let key = keys[i]
-        let cookie = cookies[key]
-        if (cookie !== undefined && key.trim().startsWith('comment')) {
-            let value = cookie
-            let textareas = document.getElementsByName(key.trim())
-            for (let j = 0; j < textareas.length; j++) {
-                textareas[j].value = value
-            }
+    Object.values(queue.comments).forEach((comment) => {
+        if (String(comment.einheit) !== einheit) {
+            return;
         }
-    }
+        let id = 'comment' + comment.bewerber + 'r' + einheit + 'u' + user + (comment.kategorie ? 'c' + comment.kategorie : '');
+        let textarea = document.getElementById(id);
+        if (textarea) {
+            textarea.value = comment.text;
+        }
+    });
 
     /*
 let divs = document.querySelectorAll('div.question_checkbox_div');
@@ -176,38 +159,11 @@ function download_all_ansewers() {
 
 
 function on_checkbox_change(checkbox) {
-    //remove_cookies(checkbox.name);
-    /*if (checkbox.checked) {
-        save_cookies(checkbox.name, checkbox.value, 3);
-    } else {
-        console.log('this remove cookie')
-        remove_cookies(checkbox.name);
-    }*/
-
-    // console.log(checkbox.id)
     let id = checkbox.id;
-    let f = id.split('f')[1].split('q');
-    let q = id.split('q')[1].split('v')[0];
-
-    let cookie_name = 'f' + f[0] + 'r' + einheit + 'u' + user
-    let cookie = get_cookies(cookie_name);
-    // console.log(cookie)
-
-    if (cookie) {
-        let data = JSON.parse(cookie);
-        if (data[q]) {
-            delete data[q];
-        } else {
-            data[q] = checkbox.value;
-        }
-        save_cookies(cookie_name, JSON.stringify(data), 3);
-    } else {
-        let data = {};
-        data[q] = checkbox.value;
-        save_cookies(cookie_name, JSON.stringify(data), 3);
-    }
-    // console.log(get_cookies(cookie_name))
+    let bewerber = id.split('f')[1].split('q')[0];
+    let frage = id.split('q')[1].split('v')[0];
 
+    EvaluationQueue.setRating(bewerber, einheit, frage, checkbox.checked ? checkbox.value : null);
 }
 
 function deselect_other_checkboxes(checkbox) {
@@ -223,11 +179,11 @@ function deselect_other_checkboxes(checkbox) {
 }
 
 function onTextChange(textarea) {
-    let id = textarea.name;
-    let value = textarea.value;
-    console.log(id, value)
+    let id = textarea.id.split('comment')[1];
+    let bewerber = id.split('r')[0];
+    let kategorie = id.includes('c') ? id.split('c')[1] : null;
 
-    save_cookies(id, value, 3);
+    EvaluationQueue.setComment(bewerber, einheit, kategorie, textarea.value, textarea.name.endsWith('1'));
 }
 
 function onButtonClick(id) {
@@ -304,19 +260,14 @@ function on_form_submit() {
 
     const formData = new FormData(document.getElementById('form'));
 
-    fetch(refresh_url, {
+    fetch(post_url, {
         method: 'POST',
         body: formData
     })
-        .then(response => response.json())
-        .then(data => {
-            // Handle the response
-            console.log(data)
-        })
+        .then(() => EvaluationQueue.flush())
         .catch(error => {
-            // Handle errors
+            // The answers are still in the queue and are sent later
             console.log(error)
-            console.log('error')
         });
 
     document.getElementById('form').action = post_url
@@ -0,0 +1,94 @@
+// Queue of seminar answers that have not been stored on the server yet.
+// Answers are kept in localStorage, so they survive reloads and connection
+// losses, and are sent in batches to the evaluation endpoint.
+const EvaluationQueue = {
+    url: null,
+    csrfToken: null,
+    storageKey: null,
+    flushTimer: null,
+    flushing: false,
+
+    init(url, user, csrfToken) {
+        this.url = url;
+        this.csrfToken = csrfToken;
+        this.storageKey = 'seminar-evaluation-queue-u' + user;
+
+        window.addEventListener('online', () => this.flush());
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') {
+                this.flush(true);
+            }
+        });
+        setInterval(() => this.flush(), 30000);
+        this.flush();
+    },
+
+    load() {
+        try {
+            return JSON.parse(localStorage.getItem(this.storageKey)) || {ratings: {}, comments: {}};
+        } catch (e) {
+            return {ratings: {}, comments: {}};
+        }
+    },
+
+    save(queue) {
+        localStorage.setItem(this.storageKey, JSON.stringify(queue));
+    },
+
+    setRating(bewerber, einheit, frage, bewertung) {
+        let queue = this.load();
+        queue.ratings[[bewerber, einheit, frage].join(':')] = {bewerber, einheit, frage, bewertung};
+        this.save(queue);
+        this.scheduleFlush();
+    },
+
+    setComment(bewerber, einheit, kategorie, text, show_name) {
+        let queue = this.load();
+        queue.comments[[bewerber, einheit, kategorie || 'ohne'].join(':')] = {bewerber, einheit, kategorie, text, show_name};
+        this.save(queue);
+        this.scheduleFlush();
+    },
+
+    scheduleFlush() {
+        clearTimeout(this.flushTimer);
+        this.flushTimer = setTimeout(() => this.flush(), 1000);
+    },
+
+    flush(keepalive = false) {
+        let queue = this.load();
+        let ratings = Object.values(queue.ratings);
+        let comments = Object.values(queue.comments);
+        if (this.flushing || !this.url || (!ratings.length && !comments.length) || !navigator.onLine) {
+            return Promise.resolve();
+        }
+
+        this.flushing = true;
+        let sent = JSON.stringify(queue);
+        return fetch(this.url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': this.csrfToken},
+            body: JSON.stringify({ratings, comments}),
+            keepalive: keepalive,
+        })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                // Keep entries that changed while the request was running
+                let sentQueue = JSON.parse(sent);
+                let current = this.load();
+                for (const type of ['ratings', 'comments']) {
+                    for (const key of Object.keys(sentQueue[type])) {
+                        if (JSON.stringify(current[type][key]) === JSON.stringify(sentQueue[type][key])) {
+                            delete current[type][key];
+                        }
+                    }
+                }
+                this.save(current);
+            })
+            .catch(error => console.log('Answers stay queued:', error))
+            .finally(() => {
+                this.flushing = false;
+            });
+    },
+};
@@ -1,3 +1,300 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from BW.models import Bewerber
+from Global.models import CustomUser, Einsatzland2, Einsatzstelle2, PersonCluster
+from ORG.models import Organisation
+
+from .assignment import plan_assignments
+from .evaluation_store import save_evaluations
+from .models import Bewertung, Einheit, Frage, Fragekategorie, Kommentar, Seminar
+
+
+class EvaluationStoreTests(TestCase):
+    def setUp(self):
+        self.org = Organisation.objects.create(name='Test Org', email='org@test.com')
+        self.team_cluster = PersonCluster.objects.create(org=self.org, name='Team', view='T')
+        self.bewerber_cluster = PersonCluster.objects.create(org=self.org, name='Bewerber', view='B')
+
+        self.bewerter = User.objects.create_user(username='bewerter', password='testpass123')
+        CustomUser.objects.create(user=self.bewerter, org=self.org, person_cluster=self.team_cluster)
+
+        self.seminar = Seminar.objects.create(org=self.org, name='Seminar', description='Test')
+        self.seminar.verschwiegenheit_von_user.add(self.bewerter)
+
+        self.bewerber = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'bewerber{i}', password='testpass123')
+            CustomUser.objects.create(user=user, org=self.org, person_cluster=self.bewerber_cluster)
+            bewerber, _ = Bewerber.objects.get_or_create(user=user, defaults={'org': self.org})
+            self.seminar.bewerber.add(bewerber)
+            self.bewerber.append(bewerber)
+
+        self.kategorie = Fragekategorie.objects.create(name='Kategorie', org=self.org)
+        self.fragen = [
+            Frage.objects.create(text=f'Frage {i}', kategorie=self.kategorie, org=self.org)
+            for i in range(3)
+        ]
+        self.einheit = Einheit.objects.create(name='Einheit', org=self.org)
+
+    def _ratings(self, value):
+        return [
+            {'bewerber': bewerber.id, 'einheit': self.einheit.id, 'frage': frage.id, 'bewertung': value}
+            for bewerber in self.bewerber
+            for frage in self.fragen
+        ]
+
+    def test_batch_is_inserted_and_updated(self):
+        result = save_evaluations(self.bewerter, self._ratings(3))
+        self.assertEqual(result, {'inserted': 9, 'updated': 0, 'deleted': 0, 'rejected': 0})
+
+        result = save_evaluations(self.bewerter, self._ratings(5))
+        self.assertEqual(result, {'inserted': 0, 'updated': 9, 'deleted': 0, 'rejected': 0})
+        self.assertEqual(Bewertung.objects.count(), 9)
+        self.assertEqual(set(Bewertung.objects.values_list('bewertung', flat=True)), {5})
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            save_evaluations(self.bewerter, self._ratings(3)[:1])
+        with CaptureQueriesContext(connection) as large:
+            save_evaluations(self.bewerter, self._ratings(4))
+        self.assertEqual(len(small), len(large))
+
+    def test_empty_values_delete(self):
+        save_evaluations(self.bewerter, self._ratings(3), [
+            {'bewerber': self.bewerber[0].id, 'einheit': self.einheit.id, 'kategorie': None, 'text': 'Gut'},
+        ])
+        result = save_evaluations(self.bewerter, self._ratings(None), [
+            {'bewerber': self.bewerber[0].id, 'einheit': self.einheit.id, 'kategorie': None, 'text': ''},
+        ])
+        self.assertEqual(result['deleted'], 10)
+        self.assertFalse(Bewertung.objects.exists())
+        self.assertFalse(Kommentar.objects.exists())
+
+    def test_comments_are_upserted_per_category(self):
+        comments = [
+            {'bewerber': self.bewerber[0].id, 'einheit': self.einheit.id, 'kategorie': None, 'text': 'Allgemein'},
+            {'bewerber': self.bewerber[0].id, 'einheit': self.einheit.id, 'kategorie': self.kategorie.id,
+             'text': '<b>Kategorie</b>', 'show_name': False},
+        ]
+        self.assertEqual(save_evaluations(self.bewerter, comments=comments)['inserted'], 2)
+
+        comments[0]['text'] = 'Geändert'
+        self.assertEqual(save_evaluations(self.bewerter, comments=comments)['updated'], 2)
+        self.assertEqual(Kommentar.objects.count(), 2)
+        self.assertEqual(Kommentar.objects.get(kategorie=None).text, 'Geändert')
+        kommentar = Kommentar.objects.get(kategorie=self.kategorie)
+        self.assertEqual(kommentar.text, 'Kategorie')
+        self.assertFalse(kommentar.show_name_at_presentation)
+
+    def test_invalid_entries_are_rejected(self):
+        other_org = Organisation.objects.create(name='Other Org', email='other@test.com')
+        other_einheit = Einheit.objects.create(name='Fremd', org=other_org)
+        ratings = [
+            {'bewerber': self.bewerber[0].id, 'einheit': self.einheit.id, 'frage': self.fragen[0].id, 'bewertung': 9},
+            {'bewerber': self.bewerber[0].id, 'einheit': other_einheit.id, 'frage': self.fragen[0].id, 'bewertung': 3},
+            {'bewerber': 'x', 'einheit': self.einheit.id, 'frage': self.fragen[0].id, 'bewertung': 3},
+            {'bewerber': self.bewerber[0].id, 'einheit': self.einheit.id, 'frage': self.fragen[1].id, 'bewertung': 2},
+        ]
+        result = save_evaluations(self.bewerter, ratings)
+        self.assertEqual(result['rejected'], 3)
+        self.assertEqual(result['inserted'], 1)
+
+    def test_evaluation_sync_endpoint(self):
+        self.client.login(username='bewerter', password='testpass123')
+        response = self.client.post(
+            reverse('evaluation_sync'),
+            data=json.dumps({'ratings': self._ratings(4), 'comments': []}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['inserted'], 9)
+
+        response = self.client.post(reverse('evaluation_sync'), data='[1', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_evaluate_post_stores_form_in_one_batch(self):
+        self.client.login(username='bewerter', password='testpass123')
+        bewerber = self.bewerber[0]
+        data = {
+            f'f{bewerber.id}q{frage.id}r{self.einheit.id}u{self.bewerter.id}': '4'
+            for frage in self.fragen
+        }
+        data[f'comment{bewerber.id}r{self.einheit.id}u{self.bewerter.id}n1'] = 'Kommentar'
+        response = self.client.post(reverse('evaluate-post'), data)
+        self.assertRedirects(response, reverse('seminar_home'), fetch_redirect_response=False)
+        self.assertEqual(Bewertung.objects.filter(bewerter=self.bewerter, bewertung=4).count(), 3)
+        self.assertEqual(Kommentar.objects.get(bewerter=self.bewerter).text, 'Kommentar')
+
+
+class AutoAssignTests(TestCase):
+    def setUp(self):
+        self.org = Organisation.objects.create(name='Test Org', email='org@test.com')
+        self.org_cluster = PersonCluster.objects.create(org=self.org, name='Org', view='O')
+        self.bewerber_cluster = PersonCluster.objects.create(org=self.org, name='Bewerber', view='B')
+
+        self.org_user = User.objects.create_user(username='orgadmin', password='testpass123')
+        CustomUser.objects.create(user=self.org_user, org=self.org, person_cluster=self.org_cluster)
+        self.seminar = Seminar.objects.create(org=self.org, name='Seminar', description='Test')
+
+        land = Einsatzland2.objects.create(org=self.org, name='Kenia')
+        self.stelle_a = Einsatzstelle2.objects.create(org=self.org, land=land, name='A', max_freiwillige=1)
+        self.stelle_b = Einsatzstelle2.objects.create(org=self.org, land=land, name='B', max_freiwillige=1)
+
+    def _bewerber(self, name, endbewertung, note, *wishes, zuteilung=None):
+        user = User.objects.create_user(username=name, password='testpass123')
+        CustomUser.objects.create(user=user, org=self.org, person_cluster=self.bewerber_cluster)
+        bewerber, _ = Bewerber.objects.get_or_create(user=user, defaults={'org': self.org})
+        bewerber.endbewertung = endbewertung
+        bewerber.note = note
+        bewerber.zuteilung = zuteilung
+        for wish_field, stelle in zip(
+            ('first_wish_einsatzstelle', 'second_wish_einsatzstelle', 'third_wish_einsatzstelle'), wishes
+        ):
+            setattr(bewerber, wish_field, stelle)
+        bewerber.save()
+        self.seminar.bewerber.add(bewerber)
+        return bewerber
+
+    def test_greedy_follows_rating_and_grade(self):
+        first = self._bewerber('first', 'G', 1.0, self.stelle_a, self.stelle_b)
+        second = self._bewerber('second', 'G', 2.0, self.stelle_a)
+
+        plan = plan_assignments(self.org, 'greedy')
+        self.assertEqual([(a.bewerber, a.stelle) for a in plan.assignments], [(first, self.stelle_a)])
+        self.assertEqual(plan.unassigned, [second])
+
+    def test_optimal_places_more_applicants(self):
+        first = self._bewerber('first', 'G', 1.0, self.stelle_a, self.stelle_b)
+        second = self._bewerber('second', 'G', 2.0, self.stelle_a)
+
+        plan = plan_assignments(self.org, 'optimal')
+        placed = {a.bewerber: (a.stelle, a.wish) for a in plan.assignments}
+        self.assertEqual(placed, {first: (self.stelle_b, 2), second: (self.stelle_a, 1)})
+        self.assertEqual(plan.unassigned, [])
+
+    def test_optimal_prefers_suitable_applicants(self):
+        suitable = self._bewerber('suitable', 'G', 3.0, self.stelle_a)
+        self._bewerber('conditionally', 'B', 1.0, self.stelle_a)
+
+        plan = plan_assignments(self.org, 'optimal')
+        self.assertEqual([a.bewerber for a in plan.assignments], [suitable])
+
+    def test_existing_assignments_use_capacity(self):
+        self._bewerber('assigned', 'G', 1.0, self.stelle_a, zuteilung=self.stelle_a)
+        waiting = self._bewerber('waiting', 'G', 1.0, self.stelle_a)
+
+        for strategy in ('greedy', 'optimal'):
+            plan = plan_assignments(self.org, strategy)
+            self.assertEqual(plan.assignments, [])
+            self.assertEqual(plan.unassigned, [waiting])
+
+    def test_preview_does_not_save_and_post_saves_in_one_update(self):
+        self.client.login(username='orgadmin', password='testpass123')
+        for i in range(6):
+            self._bewerber(f'bewerber{i}', 'G', float(i), self.stelle_a, self.stelle_b)
+
+        response = self.client.get(reverse('auto_assign'), {'strategy': 'optimal'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['plan'].assignments), 2)
+        self.assertFalse(Bewerber.objects.filter(zuteilung__isnull=False).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('auto_assign'), {'strategy': 'optimal'})
+        self.assertRedirects(response, reverse('assign'), fetch_redirect_response=False)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "BW_bewerber"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Bewerber.objects.filter(zuteilung=self.stelle_a).count(), 1)
+        self.assertEqual(Bewerber.objects.filter(zuteilung=self.stelle_b).count(), 1)
+
+
+class AssignBoardTests(TestCase):
+    def setUp(self):
+        self.org = Organisation.objects.create(name='Test Org', email='org@test.com')
+        self.org_cluster = PersonCluster.objects.create(org=self.org, name='Org', view='O')
+        self.bewerber_cluster = PersonCluster.objects.create(org=self.org, name='Bewerber', view='B')
+
+        self.org_user = User.objects.create_user(username='orgadmin', password='testpass123')
+        CustomUser.objects.create(user=self.org_user, org=self.org, person_cluster=self.org_cluster)
+        self.seminar = Seminar.objects.create(org=self.org, name='Seminar', description='Test')
+        self.client.login(username='orgadmin', password='testpass123')
+
+    def _fill(self, count):
+        land = Einsatzland2.objects.create(org=self.org, name=f'Land {count}', code='KE')
+        stellen = []
+        for i in range(count):
+            stelle = Einsatzstelle2.objects.create(org=self.org, land=land, name=f'Stelle {count}-{i}', max_freiwillige=2)
+            user = User.objects.create_user(username=f'bewerber{count}-{i}', password='testpass123')
+            CustomUser.objects.create(user=user, org=self.org, person_cluster=self.bewerber_cluster)
+            bewerber, _ = Bewerber.objects.get_or_create(user=user, defaults={'org': self.org})
+            bewerber.zuteilung = stelle
+            bewerber.first_wish_einsatzstelle = stelle
+            bewerber.save()
+            self.seminar.bewerber.add(bewerber)
+            stellen.append(stelle)
+        return stellen
+
+    def _board_queries(self):
+        # Profile picture identifiers are generated on first use
+        self.client.get(reverse('assign_board_data'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('assign_board_data'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_board_queries_do_not_grow_with_placements(self):
+        self._fill(2)
+        few, _ = self._board_queries()
+        self._fill(8)
+        many, board = self._board_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(sum(len(land['stellen']) for land in board['laender']), 10)
+        self.assertEqual(len([a for a in board['applicants'] if a['zuteilung']]), 10)
+
+    def test_assign_page_embeds_board(self):
+        self._fill(1)
+        response = self.client.get(reverse('assign'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="assignBoardData"')
+        self.assertContains(response, 'Stelle 1-0')
+
+    def test_assign_update_moves_and_removes(self):
+        first, second = self._fill(2)
+        bewerber = Bewerber.objects.get(zuteilung=first)
+
+        response = self.client.post(
+            reverse('assign_update'), data=json.dumps({'bewerber': bewerber.id, 'stelle': second.id}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['applicant']['zuteilung'], second.id)
+        bewerber.refresh_from_db()
+        self.assertEqual(bewerber.zuteilung, second)
+
+        response = self.client.post(
+            reverse('assign_update'), data=json.dumps({'bewerber': bewerber.id, 'stelle': None}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        bewerber.refresh_from_db()
+        self.assertIsNone(bewerber.zuteilung)
+
+    def test_assign_update_rejects_foreign_placement(self):
+        stelle, = self._fill(1)
+        bewerber = Bewerber.objects.get(zuteilung=stelle)
+        other_org = Organisation.objects.create(name='Other Org', email='other@test.com')
+        other_land = Einsatzland2.objects.create(org=other_org, name='Fremd', code='TZ')
+        other_stelle = Einsatzstelle2.objects.create(org=other_org, land=other_land, name='Fremd')
 
-# Create your tests here.
+        response = self.client.post(
+            reverse('assign_update'), data=json.dumps({'bewerber': bewerber.id, 'stelle': other_stelle.id}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+        bewerber.refresh_from_db()
+        self.assertEqual(bewerber.zuteilung, stelle)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('refresh/', views.refresh, name='refresh'),
     path('evaluate/', views.evaluate, name='evaluate'),
     path('evaluate-post/', views.evaluate_post, name='evaluate-post'),
+    path('evaluations/', views.evaluation_sync, name='evaluation_sync'),
     path('einheit/', views.einheit, name='einheit'),
     path('choose/', views.choose, name='choose'),
     path('land/', views.seminar_land, name='seminar_land'),
@@ -18,6 +19,8 @@ urlpatterns = [
     path('zuteilung/', views.assign, name='assign'),
     path('zuteilung/<int:scroll_to>/', views.assign, name='assign_scroll'),
     path('assign/', views.assign, name='assign_alt'),  # Alternative URL for clarity
+    path('zuteilung/daten/', views.assign_board_data, name='assign_board_data'),
+    path('zuteilung/aendern/', views.assign_update, name='assign_update'),
     path('auto-zuteilung/', views.auto_assign, name='auto_assign'),
     path('alle-zuteilungen-loeschen/', views.clear_assignments, name='clear_assignments'),
     path('sum/', views.summerizeComments, name='summary'),
@@ -1,19 +1,22 @@
 from django.shortcuts import redirect, render, get_object_or_404
 import json
-from datetime import datetime
 from django.contrib.auth.decorators import login_required
 from django.db.models.functions import Round
-from django.http import HttpResponseRedirect, HttpResponse, StreamingHttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.contrib import messages
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from FWMsg.decorators import required_role
 from seminar.models import Einheit, Frage, Fragekategorie, Bewertung, Kommentar, Seminar
 from Global.models import Attribute, Einsatzland2 as Einsatzland, Einsatzstelle2 as Einsatzstelle, UserAttribute
 from BW.models import Bewerber
+from .assign_board import applicant_as_json, applicants_queryset, board_as_json, get_board
+from .assignment import STRATEGIES, apply_plan, plan_assignments
+from .evaluation_store import parse_comment_name, parse_rating_name, save_evaluations
 from .forms import WishForm, BewerterForm
-from django.db.models import Avg, Case, When, IntegerField
+from django.db.models import Avg
 from django.contrib.auth.models import User
 
 def required_verschwiegenheit(view_func):
@@ -39,84 +42,45 @@ def start(request):
     return redirect('login')
 
 
+def _evaluation_message(request, result):
+    messages.success(request,
+                     f'Erfolgreich bewertet, {result["inserted"]} Bewertungen hinzugefügt, {result["updated"]} bearbeitet')
+
+
 @csrf_exempt
 @login_required
 @required_verschwiegenheit
 @required_role('OTE')
 def refresh(request):
+    """Store answers still kept in cookies by older versions of the evaluation page."""
     response = redirect('seminar_home')
-    inserted = []
-    edited = []
-
-    for cookie_name in request.COOKIES:
-        if cookie_name.startswith('f'):
-            data = {}
-
-            data['freiwilliger'] = cookie_name.split('f')[1].split('r')[0]
-            data['einheit'] = cookie_name.split('r')[1].split('u')[0]
-            data['bewerter'] = cookie_name.split('u')[1]
-
-            if data['bewerter'] != str(request.user.id):
-                continue
-
-            cookie = request.COOKIES[cookie_name]
-
-            json_data = json.loads(cookie)
-
-            for key, value in json_data.items():
-                data['frage'] = key
-                data['antwort'] = value
-
-                insert_response = insert_bewertung(data)
-
-                if insert_response == 1:
-                    inserted.append(cookie_name)
-                elif insert_response == 2:
-                    edited.append(cookie_name)
-
-            response.delete_cookie(cookie_name)
-
-        if cookie_name.startswith('comment'):
-            data = {}
+    ratings = []
+    comments = []
 
-            comment = cookie_name.split('comment')[1]
-            data['freiwilliger'] = comment.split('r')[0]
-
-            comment = comment.split('r')[1]
-            data['einheit'] = comment.split('u')[0]
-            comment = comment.split('u')[1]
-
-            if 'c' in comment:
-                user = comment.split('c')[0]
+    for cookie_name, cookie in request.COOKIES.items():
+        try:
+            if cookie_name.startswith('f'):
+                # f<bewerber>r<einheit>u<bewerter> with a JSON object {frage: bewertung}
+                bewerber, rest = cookie_name[1:].split('r', 1)
+                einheit, bewerter = rest.split('u', 1)
+                if bewerter != str(request.user.id):
+                    continue
+                ratings.extend(
+                    {'bewerber': bewerber, 'einheit': einheit, 'frage': frage, 'bewertung': antwort}
+                    for frage, antwort in json.loads(cookie).items()
+                )
+            elif cookie_name.startswith('comment'):
+                comment = parse_comment_name(cookie_name)
+                if comment['bewerter'] != str(request.user.id):
+                    continue
+                comments.append({**comment, 'text': cookie})
             else:
-                user = comment.split('n')[0]
-
-            if user != str(request.user.id):
                 continue
+        except ValueError:
+            continue
+        response.delete_cookie(cookie_name)
 
-            data['bewerter'] = user
-
-            if 'c' in comment:
-                comment = comment.split('c')[1]
-                data['category'] = comment.split('n')[0]
-
-            data['name'] = comment.split('n')[1] == '1'
-
-            cookie = request.COOKIES[cookie_name]
-            data['text'] = cookie
-
-            insert_response = insert_comment(request, data)
-
-            if insert_response == 1:
-                inserted.append(cookie)
-            elif insert_response == 2:
-                edited.append(cookie)
-
-            response.delete_cookie(cookie_name)
-
-    messages.success(request,
-                     f'Erfolgreich bewertet, {len(inserted)} Bewertungen hinzugefügt, {len(edited)} bearbeitet')
-
+    _evaluation_message(request, save_evaluations(request.user, ratings, comments))
     return response
 
 
@@ -237,173 +201,68 @@ def evaluate(request):
     return render(request, 'evaluate.html', context)
 
 
-def insert_bewertung(data):
-    try:
-        freiwilliger = Bewerber.objects.get(id=data['freiwilliger'], seminar_bewerber__isnull=False)
-        bewerter = User.objects.get(id=data['bewerter'])
-        einheit = Einheit.objects.get(id=data['einheit'])
-        antwort = data['antwort']
-        frage = Frage.objects.get(id=data['frage'])
-
-        bewertung, created = Bewertung.objects.get_or_create(
-            org=bewerter.org,
-            bewerber=freiwilliger,
-            einheit=einheit,
-            frage=frage,
-            bewerter=bewerter,
-            defaults={'bewertung': antwort}
-        )
-
-        if not created:
-            bewertung.bewertung = data['antwort']
-            bewertung.save()
-            return 2
-
-        return 1
-
-    except Exception as e:
-        messages.error(request, 'Fehler beim Einfügen der Bewertung')
-    return 0
-
-
-def insert_comment(request, data):
-    try:
-        from django.utils.html import strip_tags
-        
-        bewerber = Bewerber.objects.get(id=data['freiwilliger'], seminar_bewerber__isnull=False)
-        bewerter = User.objects.get(id=data['bewerter'])
-        einheit = Einheit.objects.get(id=data['einheit'])
-        category = Fragekategorie.objects.get(id=data['category']) if 'category' in data else None
-        text = strip_tags(data['text'])
-        show_name = data['name']
-
-        defaults = {'show_name_at_presentation': show_name, 'text': text, 'last_modified': datetime.now()}
-
-        comment_data = {
-            'org': bewerter.org,
-            'bewerber': bewerber,
-            'einheit': einheit,
-            'bewerter': bewerter,
-            'defaults': defaults
-        }
-
-        if category:
-            comment_data['kategorie'] = category
-        else:
-            comment_data['kategorie__isnull'] = True
-
-        comment, created = Kommentar.objects.get_or_create(**comment_data)
-
-        if not created:
-            comment.text = text
-            comment.last_modified = datetime.now()
-            comment.save()
-            return 2
-
-        return 1
-    except Exception as e:
-        messages.error(request, 'Fehler beim Einfügen des Kommentars')
-        return 0
-
-
 @csrf_exempt
 @login_required
 @required_verschwiegenheit
 @required_role('OTE')
 def evaluate_post(request):
-    request_dict = request.POST.dict()
-    inserted = []
-    edited = []
-
-    response = redirect('seminar_home')
-
-    only = request_dict.get('only')
+    only = request.POST.get('only')
+    ratings = []
+    comments = []
 
-    for k, v in request_dict.items():
+    for k, v in request.POST.items():
         if 'csrfmiddlewaretoken' in k or 'refresh' in k or 'only' in k:
             continue
-        
+
         k = k.strip()
         v = v.strip()
 
-        data = {}
-
-        if k.startswith('comment'):
-            if len(v) < 1:
-                continue
-
-            comment = k.split('comment')[1]
-            data['freiwilliger'] = comment.split('r')[0]
-
-            if only and only != data['freiwilliger']:
-                continue
-
-            comment = comment.split('r')[1]
-            data['einheit'] = comment.split('u')[0]
-            comment = comment.split('u')[1]
-
-            if 'c' in comment:
-                user = comment.split('c')[0]
+        try:
+            if k.startswith('comment'):
+                if len(v) < 1:
+                    continue
+                data = parse_comment_name(k)
+                data['text'] = v
+                target = comments
+            elif k.startswith('f'):
+                data = parse_rating_name(k)
+                data['bewertung'] = v
+                target = ratings
             else:
-                user = comment.split('n')[0]
-
-            if user != str(request.user.id):
                 continue
-
-            data['bewerter'] = user
-
-            if 'c' in comment:
-                comment = comment.split('c')[1]
-                data['category'] = comment.split('n')[0]
-
-            data['name'] = comment.split('n')[1] == '1'
-
-            data['text'] = v
-
-            insert_response = insert_comment(request, data)
-
-            if insert_response == 1:
-                inserted.append(k)
-            elif insert_response == 2:
-                edited.append(k)
-
+        except ValueError:
             continue
 
-        elif k.startswith('f'):
-            buf = k.strip().split('f')[1]
-            data['freiwilliger'] = buf.split('q')[0]
-
-            if only and only != data['freiwilliger']:
-                continue
-
-            buf = buf.split('q')[1]
-            data['frage'] = buf.split('r')[0]
-            buf = buf.split('r')[1]
-            data['einheit'] = buf.split('u')[0]
-            buf = buf.split('u')[1]
-            data['bewerter'] = buf
-
-            if data['bewerter'] != str(request.user.id):
-                continue
-
-            data['antwort'] = v
-
-            insert_response = insert_bewertung(data)
-
-            if insert_response == 1:
-                inserted.append(k)
-            elif insert_response == 2:
-                edited.append(k)
+        if only and only != data['bewerber']:
+            continue
+        if data['bewerter'] != str(request.user.id):
+            continue
+        target.append(data)
 
-            cookie_name = f'f{data["freiwilliger"]}q{data["frage"]}r{data["einheit"]}u{data["bewerter"]}'
+    _evaluation_message(request, save_evaluations(request.user, ratings, comments))
+    return redirect('seminar_home')
 
-            if cookie_name in request.COOKIES:
-                response.delete_cookie(cookie_name)
 
-    messages.success(request,
-                     f'Erfolgreich bewertet, {len(inserted)} Bewertungen hinzugefügt, {len(edited)} bearbeitet')
+@login_required
+@required_verschwiegenheit
+@required_role('OTE')
+@require_POST
+def evaluation_sync(request):
+    """
+    Store a batch of queued answers sent as JSON by the evaluation page:
+    ``{"ratings": [...], "comments": [...]}`` as described in
+    ``seminar.evaluation_store.save_evaluations``.
+    """
+    try:
+        payload = json.loads(request.body)
+        ratings = payload.get('ratings', [])
+        comments = payload.get('comments', [])
+        if not isinstance(ratings, list) or not isinstance(comments, list):
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Ungültige Daten'}, status=400)
 
-    return response
+    return JsonResponse(save_evaluations(request.user, ratings, comments))
 
 
 @login_required
@@ -609,126 +468,67 @@ def insert_geeingnet(request):
 @login_required
 @required_role('O')
 def assign(request, scroll_to=None):
-    stelle = request.GET.get('land')
-    freiwilliger = request.GET.get('fw')
-
-    if stelle and freiwilliger:
-        try:
-            freiwilliger_obj = Bewerber.objects.get(id=freiwilliger, org=request.user.org, seminar_bewerber__isnull=False)
-            if stelle == 'None':
-                freiwilliger_obj.zuteilung = None
-            else:
-                stelle_obj = Einsatzstelle.objects.get(id=stelle, org=request.user.org)
-                freiwilliger_obj.zuteilung = stelle_obj
-            
-            freiwilliger_obj.save()
-        except (Bewerber.DoesNotExist, Einsatzstelle.DoesNotExist):
-            messages.error(request, 'Fehler bei der Zuteilung. Bitte versuche es erneut.')
-        
-        if stelle and stelle != 'None':
-            return redirect('assign_scroll', scroll_to=stelle)
-        else:
-            return redirect('assign')
-
-    # Get all volunteers for the current organization
-    freiwillige = (
-        Bewerber.objects
-        .filter(org=request.user.org, seminar_bewerber__isnull=False)
-        .filter(seminar_bewerber__isnull=False)
-        .select_related('user', 'zuteilung', 'first_wish_einsatzstelle', 'first_wish_einsatzland',
-                       'second_wish_einsatzstelle', 'second_wish_einsatzland',
-                       'third_wish_einsatzstelle', 'third_wish_einsatzland',
-                       'no_wish_einsatzstelle', 'no_wish_einsatzland')
-        .annotate(
-            custom_order=Case(
-                When(endbewertung__startswith='G', then=0),
-                When(endbewertung__startswith='B', then=1),
-                When(endbewertung__startswith='N', then=2),
-                default=3,
-                output_field=IntegerField(),
-            )
-        )
-        .order_by('custom_order', 'note')
-        .distinct()
-    )
-
-    freiwillige_ohne_zuteilung = freiwillige.filter(zuteilung=None)
-    freiwillige_mit_zuteilung = freiwillige.exclude(zuteilung=None)
-
-    # Get countries for the current organization
-    laender = Einsatzland.objects.filter(org=request.user.org).order_by('name')
-    
-    laender_arg = []
-
-    for land in laender:
-        land_dict = {}
-        land_dict['land'] = land
-        einsatzstellen = Einsatzstelle.objects.filter(land=land, org=request.user.org).order_by('name')
-        land_dict['stellen'] = []
-        for stelle in einsatzstellen:
-            freiwillige_land = (
-                freiwillige_mit_zuteilung
-                .filter(zuteilung=stelle)
-                .annotate(
-                    custom_order=Case(
-                        When(endbewertung__startswith='G', then=0),
-                        When(endbewertung__startswith='B', then=1),
-                        default=2,
-                        output_field=IntegerField(),
-                    )
-                )
-                .order_by('custom_order', 'note')
-            )
-            land_dict['stellen'].append((stelle, freiwillige_land))
-        laender_arg.append(land_dict)
-
+    """Placement board; the browser renders it from ``board`` and saves changes with ``assign_update``."""
+    laender, applicants = get_board(request.user.org)
     context = {
-        'freiwillige': freiwillige,
-        'freiwillige_ohne_zuteilung': freiwillige_ohne_zuteilung,
-        'freiwillige_mit_zuteilung': freiwillige_mit_zuteilung,
-        'laender': laender_arg,
-        'scroll_to': scroll_to
+        'board': board_as_json(laender, applicants),
+        'scroll_to': scroll_to,
     }
-
     return render(request, 'assign.html', context=context)
 
 
 @login_required
 @required_role('O')
-def auto_assign(request):
-    org = request.user.org
-    
-    freiwillige_geeignet = Bewerber.objects.filter(
-        org=org, endbewertung__startswith='G', zuteilung=None, seminar_bewerber__isnull=False
-    ).order_by('note')
-    freiwillige_bedingt_geeignet = Bewerber.objects.filter(
-        org=org, endbewertung__startswith='B', zuteilung=None, seminar_bewerber__isnull=False
-    ).order_by('note')
-
-    all_freiwille = list(freiwillige_geeignet) + list(freiwillige_bedingt_geeignet)
-    
-    assigned_count = 0
+def assign_board_data(request):
+    laender, applicants = get_board(request.user.org)
+    return JsonResponse(board_as_json(laender, applicants))
 
-    for freiwilliger in all_freiwille:
-        def stelle_verfuegbar(stelle):
-            if not stelle or stelle.max_freiwillige is None:
-                return False
-            freiwilliger_with_stelle = Bewerber.objects.filter(zuteilung=stelle, org=org, seminar_bewerber__isnull=False)
-            return freiwilliger_with_stelle.count() < stelle.max_freiwillige
 
-        first_wish = freiwilliger.first_wish_einsatzstelle
-        second_wish = freiwilliger.second_wish_einsatzstelle
-        third_wish = freiwilliger.third_wish_einsatzstelle
+@login_required
+@required_role('O')
+@require_POST
+def assign_update(request):
+    """
+    Assign an applicant to a placement, or remove the assignment with
+    ``stelle`` null: ``{"bewerber": <id>, "stelle": <id>|null}``. Returns the
+    updated applicant.
+    """
+    try:
+        payload = json.loads(request.body)
+        bewerber_id = int(payload['bewerber'])
+        stelle_id = None if payload.get('stelle') in (None, '', 'None') else int(payload['stelle'])
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Ungültige Daten'}, status=400)
 
-        wish_list = [first_wish, second_wish, third_wish]
+    org = request.user.org
+    if stelle_id is not None and not Einsatzstelle.objects.filter(id=stelle_id, org=org).exists():
+        return JsonResponse({'error': 'Einsatzstelle nicht gefunden'}, status=404)
+    updated = Bewerber.objects.filter(id=bewerber_id, org=org, seminar_bewerber__isnull=False).update(
+        zuteilung_id=stelle_id
+    )
+    if not updated:
+        return JsonResponse({'error': 'Bewerber:in nicht gefunden'}, status=404)
 
-        for wish in wish_list:
-            if wish and stelle_verfuegbar(wish):
-                freiwilliger.zuteilung = wish
-                freiwilliger.save()
-                assigned_count += 1
-                break
+    bewerber = applicants_queryset(org).get(id=bewerber_id)
+    return JsonResponse({'applicant': applicant_as_json(bewerber)})
+
+
+@login_required
+@required_role('O')
+def auto_assign(request):
+    """Preview the automatic assignment (GET) or save it (POST)."""
+    strategy = request.POST.get('strategy') or request.GET.get('strategy') or 'greedy'
+    if strategy not in STRATEGIES:
+        strategy = 'greedy'
+    plan = plan_assignments(request.user.org, strategy)
+
+    if request.method != 'POST':
+        return render(request, 'auto_assign_preview.html', context={
+            'plan': plan,
+            'strategies': STRATEGIES,
+        })
 
+    assigned_count = apply_plan(plan)
     if assigned_count > 0:
         messages.success(request, f'Automatische Zuteilung abgeschlossen. {assigned_count} Freiwillige wurden zugeteilt.')
     else:
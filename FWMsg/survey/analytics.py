@@ -0,0 +1,194 @@
+"""
+Aggregated results of surveys.
+
+Option counts and rating histograms are computed with grouped aggregates (the
+option counts directly on the ``selected_options`` through table), so a
+survey's results take the same small number of queries however many questions
+and answers it has. The results are cached per survey; saving or deleting a
+response, answer, question or option bumps the survey's results version (see
+the receivers in ``survey.models``) and thereby invalidates them.
+
+Cached values only contain plain data (ids, strings, numbers) so that they can
+also be served as JSON for charts.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import SurveyAnswer, SurveyQuestion, SurveyQuestionOption
+
+RESULTS_CACHE_TIMEOUT = 60 * 60
+
+CHOICE_TYPES = ('select', 'radio', 'checkbox')
+RATING_VALUES = range(1, 6)
+
+
+def _version_key(survey_id):
+    return f'survey_results_version_{survey_id}'
+
+
+def _cache_key(kind, survey_id):
+    version = cache.get_or_set(_version_key(survey_id), 1, None)
+    return f'survey_{kind}_{survey_id}_v{version}'
+
+
+def invalidate_survey_results(survey_id):
+    """Drop the cached results and public answers of a survey."""
+    try:
+        cache.incr(_version_key(survey_id))
+    except ValueError:
+        cache.set(_version_key(survey_id), 2, None)
+
+
+def _complete_answers(survey):
+    return SurveyAnswer.objects.filter(response__survey=survey, response__is_complete=True)
+
+
+def _option_counts(survey):
+    """Number of complete answers per selected option id."""
+    through = SurveyAnswer.selected_options.through
+    rows = through.objects.filter(
+        surveyanswer__response__survey=survey, surveyanswer__response__is_complete=True,
+    ).values('surveyquestionoption_id').annotate(count=Count('id'))
+    return {row['surveyquestionoption_id']: row['count'] for row in rows}
+
+
+def _rating_counts(survey):
+    """``{question id: {rating: count}}`` of the rating questions."""
+    rows = _complete_answers(survey).filter(question__question_type='rating').values(
+        'question_id', 'text_answer'
+    ).annotate(count=Count('id'))
+    counts = {}
+    for row in rows:
+        value = row['text_answer'].strip()
+        if value.isdigit():
+            question_counts = counts.setdefault(row['question_id'], {})
+            question_counts[int(value)] = question_counts.get(int(value), 0) + row['count']
+    return counts
+
+
+def _respondent_name(user):
+    if user is None:
+        return None
+    return user.get_full_name() or user.username
+
+
+def compute_survey_results(survey):
+    """
+    Results of all questions of ``survey`` as ``{question id: result}``.
+
+    A result has ``stats``: for choice questions ``{option text: count}`` of
+    the selected options in option order, for ratings the ``average``,
+    ``count`` and ``distribution`` (``{'1': count, ..., '5': count}``); and
+    for all other questions ``answers``, a list of ``(text, respondent
+    username)`` pairs.
+    """
+    questions = list(survey.questions.values('id', 'question_type'))
+    options = SurveyQuestionOption.objects.filter(question__survey=survey).order_by('question_id', 'order', 'id')
+    options_by_question = {}
+    for option in options.values('id', 'question_id', 'option_text'):
+        options_by_question.setdefault(option['question_id'], []).append(option)
+
+    option_counts = _option_counts(survey)
+    rating_counts = _rating_counts(survey)
+    text_answers = {}
+    text_rows = _complete_answers(survey).exclude(
+        question__question_type__in=CHOICE_TYPES + ('rating',)
+    ).exclude(text_answer='').order_by('response__submitted_at', 'id').values_list(
+        'question_id', 'text_answer', 'response__respondent__username'
+    )
+    for question_id, text, username in text_rows:
+        text_answers.setdefault(question_id, []).append((text, username))
+
+    results = {}
+    for question in questions:
+        result = {'stats': {}, 'answers': []}
+        if question['question_type'] in CHOICE_TYPES:
+            for option in options_by_question.get(question['id'], []):
+                count = option_counts.get(option['id'], 0)
+                if count:
+                    result['stats'][option['option_text']] = result['stats'].get(option['option_text'], 0) + count
+        elif question['question_type'] == 'rating':
+            distribution = rating_counts.get(question['id'], {})
+            count = sum(distribution.values())
+            if count:
+                result['stats'] = {
+                    'average': sum(value * n for value, n in distribution.items()) / count,
+                    'count': count,
+                    'distribution': {str(i): distribution.get(i, 0) for i in RATING_VALUES},
+                }
+        else:
+            result['answers'] = text_answers.get(question['id'], [])
+        results[question['id']] = result
+    return results
+
+
+def get_survey_results(survey):
+    """Cached ``compute_survey_results``."""
+    key = _cache_key('results', survey.id)
+    results = cache.get(key)
+    if results is None:
+        results = compute_survey_results(survey)
+        cache.set(key, results, RESULTS_CACHE_TIMEOUT)
+    return results
+
+
+def compute_public_answers(survey):
+    """
+    Answers shown to participants of a survey with public responses, as
+    ``{'question_<id>': [{'respondent': name or None, 'display': text}]}``.
+    """
+    through = SurveyAnswer.selected_options.through
+    selected = {}
+    for answer_id, option_text in through.objects.filter(
+        surveyanswer__response__survey=survey, surveyanswer__response__is_complete=True,
+    ).order_by('surveyquestionoption__order', 'surveyquestionoption_id').values_list(
+        'surveyanswer_id', 'surveyquestionoption__option_text'
+    ):
+        selected.setdefault(answer_id, []).append(option_text)
+
+    public_answers = {f'question_{question_id}': [] for question_id in survey.questions.values_list('id', flat=True)}
+    answers = _complete_answers(survey).select_related(
+        'question', 'response__respondent'
+    ).order_by('question_id', 'id')
+    for answer in answers:
+        if answer.question.question_type in CHOICE_TYPES:
+            display = ', '.join(selected.get(answer.id, []))
+        else:
+            display = answer.text_answer
+        if display:
+            public_answers[f'question_{answer.question_id}'].append({
+                'respondent': _respondent_name(answer.response.respondent),
+                'display': display,
+            })
+    return public_answers
+
+
+def get_public_answers(survey):
+    """Cached ``compute_public_answers``."""
+    key = _cache_key('public_answers', survey.id)
+    public_answers = cache.get(key)
+    if public_answers is None:
+        public_answers = compute_public_answers(survey)
+        cache.set(key, public_answers, RESULTS_CACHE_TIMEOUT)
+    return public_answers
+
+
+def survey_results_as_json(survey, results, total_responses):
+    """Results with their questions, for charts."""
+    anonymous = survey.responses_are_anonymous
+    questions = []
+    for question in SurveyQuestion.objects.filter(survey=survey).order_by('order', 'id'):
+        result = results.get(question.id, {'stats': {}, 'answers': []})
+        questions.append({
+            'id': question.id,
+            'order': question.order,
+            'question_text': question.question_text,
+            'question_type': question.question_type,
+            'stats': result['stats'],
+            'answers': [
+                {'text': text, 'respondent': None if anonymous else username}
+                for text, username in result['answers']
+            ],
+        })
+    return {'total_responses': total_responses, 'questions': questions}
@@ -1,10 +1,9 @@
-import io
 from datetime import date, datetime
 
-import pandas as pd
-from django.http import HttpResponse
 from django.utils.translation import gettext as _
 
+from Global.table_export import EXPORT_CHUNK_SIZE
+
 from .pdf_utils import _get_answer_content, _get_respondent_name
 
 DATE_FORMAT = '%d.%m.%Y'
@@ -50,52 +49,44 @@ def _format_answer_for_excel(question, content):
     return content
 
 
-def generate_survey_all_responses_excel(survey):
-    """Generate an Excel workbook with one row per completed response."""
-    questions = list(survey.questions.all())
-    question_headers = _question_column_headers(questions)
-
-    responses = survey.responses.filter(is_complete=True).order_by(
-        'submitted_at'
-    ).prefetch_related(
-        'answers__question',
-        'answers__selected_options',
-    )
-
-    rows = []
+def _iter_survey_response_rows(survey, responses, questions):
     for survey_response in responses:
         answers_by_question = {
             answer.question_id: answer for answer in survey_response.answers.all()
         }
 
-        row = {}
+        row = []
         if not survey.responses_are_anonymous:
-            row[_("Participant")] = _get_respondent_name(survey_response)
+            row.append(_get_respondent_name(survey_response))
 
-        row[_("Submitted")] = survey_response.submitted_at.strftime(DATE_FORMAT)
+        row.append(survey_response.submitted_at.strftime(DATE_FORMAT))
 
-        for question, header in zip(questions, question_headers):
+        for question in questions:
             answer = answers_by_question.get(question.id)
             if answer:
                 content = _get_answer_content(answer)
-                row[header] = _format_answer_for_excel(question, content)
+                row.append(_format_answer_for_excel(question, content))
             else:
-                row[header] = ''
+                row.append('')
 
-        rows.append(row)
+        yield row
 
-    df = pd.DataFrame(rows)
-    buffer = io.BytesIO()
-    df.to_excel(buffer, index=False)
-    buffer.seek(0)
-    return buffer.getvalue()
 
+def get_survey_all_responses_export(survey):
+    """Headers and a lazy row iterator with one row per completed response."""
+    questions = list(survey.questions.all())
+
+    headers = []
+    if not survey.responses_are_anonymous:
+        headers.append(_("Participant"))
+    headers.append(_("Submitted"))
+    headers.extend(_question_column_headers(questions))
+
+    responses = survey.responses.filter(is_complete=True).order_by(
+        'submitted_at'
+    ).prefetch_related(
+        'answers__question',
+        'answers__selected_options',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
 
-def create_excel_response(excel_content, filename):
-    """Create HTTP response for Excel download."""
-    response = HttpResponse(
-        excel_content,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    return headers, _iter_survey_response_rows(survey, responses, questions)
@@ -1,7 +1,7 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
-from .models import Survey, SurveyQuestion, SurveyQuestionOption, SurveyResponse, SurveyAnswer
+from .models import Survey, SurveyQuestion, SurveyQuestionOption
 
 
 class SurveyForm(forms.ModelForm):
@@ -120,8 +120,9 @@ class SurveyParticipationForm(forms.Form):
         super().__init__(*args, **kwargs)
         self.survey = survey
         self.org = survey.org
+        self.questions = list(survey.questions.prefetch_related('options'))
         
-        for question in survey.questions.all():
+        for question in self.questions:
             field_name = f'question_{question.id}'
             field_kwargs = {
                 'label': question.question_text,
@@ -203,63 +204,15 @@ class SurveyParticipationForm(forms.Form):
                         **field_kwargs
                     )
     
+    def get_answers(self):
+        """Validated answers as plain data (see survey.submissions)"""
+        from .submissions import get_answers
+        return get_answers(self)
+
     def save_response(self, survey, user=None, session_key=None, ip_address=None):
         """Save the form data as a survey response"""
-        # If survey is set to anonymous responses, don't save user information
-        if survey.responses_are_anonymous:
-            user = None
-            session_key = None
-            ip_address = None
-        
-        response = SurveyResponse.objects.create(
-            survey=survey,
-            respondent=user,
-            session_key=session_key,
-            ip_address=ip_address,
-            is_complete=True,
-            org=survey.org
-        )
-        
-        for question in survey.questions.all():
-            field_name = f'question_{question.id}'
-            if field_name in self.cleaned_data:
-                answer_data = self.cleaned_data[field_name]
-                
-                # Create the answer
-                answer = SurveyAnswer.objects.create(
-                    response=response,
-                    question=question,
-                    org=survey.org
-                )
-                
-                if question.question_type in ['checkbox']:
-                    # Handle multiple choice questions
-                    if answer_data:
-                        option_ids = [int(opt_id) for opt_id in answer_data]
-                        options = SurveyQuestionOption.objects.filter(
-                            id__in=option_ids,
-                            question=question
-                        )
-                        answer.selected_options.set(options)
-                
-                elif question.question_type in ['select', 'radio']:
-                    # Handle single choice questions
-                    if answer_data:
-                        try:
-                            option = SurveyQuestionOption.objects.get(
-                                id=int(answer_data),
-                                question=question
-                            )
-                            answer.selected_options.add(option)
-                        except (ValueError, SurveyQuestionOption.DoesNotExist):
-                            pass
-                
-                else:
-                    # Handle text-based questions
-                    answer.text_answer = str(answer_data) if answer_data else ''
-                    answer.save()
-        
-        return response
+        from .submissions import save_response
+        return save_response(survey, self.get_answers(), user=user, session_key=session_key, ip_address=ip_address)
 
 
 # Formset for managing multiple question options
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from survey.models import Survey, SurveyResponse
+
+TEXT_ANSWER = "Das Seminar war hilfreich und gut organisiert."
+
+
+def _form_data(questions):
+    """Random valid answers for all questions of a survey."""
+    data = {}
+    for question in questions:
+        field_name = f'question_{question.id}'
+        option_ids = [option.id for option in question.options.all()]
+        if question.question_type in ('select', 'radio'):
+            if option_ids:
+                data[field_name] = str(random.choice(option_ids))
+        elif question.question_type == 'checkbox':
+            if option_ids:
+                data[field_name] = [str(i) for i in random.sample(option_ids, random.randint(1, len(option_ids)))]
+        elif question.question_type == 'rating':
+            data[field_name] = str(random.randint(1, 5))
+        elif question.question_type == 'number':
+            data[field_name] = str(random.randint(1, 100))
+        elif question.question_type == 'date':
+            data[field_name] = date.today().isoformat()
+        elif question.question_type == 'email':
+            data[field_name] = f'teilnehmer{random.randint(1, 10 ** 6)}@example.com'
+        else:
+            data[field_name] = TEXT_ANSWER
+    return data
+
+
+def _submit(url, data, timeout):
+    """One respondent: load the form for a session and CSRF cookie, then submit it."""
+    with requests.Session() as session:
+        start = time.perf_counter()
+        try:
+            session.get(url, timeout=timeout)
+            response = session.post(
+                url,
+                data={**data, 'csrfmiddlewaretoken': session.cookies.get('csrftoken', '')},
+                headers={'Referer': url},
+                timeout=timeout,
+                allow_redirects=False,
+            )
+            ok = response.status_code == 302 and 'thanks' in response.headers.get('Location', '')
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate many participants submitting a survey at once against a running server. '
+        'The survey must allow participation without login.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_key')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--respondents', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            survey = Survey._base_manager.get(survey_key=options['survey_key'])
+        except Survey.DoesNotExist:
+            raise CommandError('Survey not found')
+        if not survey.allow_anonymous:
+            raise CommandError('The survey must allow participation without login')
+
+        questions = list(survey.questions.prefetch_related('options'))
+        url = options['base_url'].rstrip('/') + reverse('survey:survey_detail', args=[survey.survey_key])
+        jobs = [_form_data(questions) for _ in range(options['respondents'])]
+        responses_before = SurveyResponse._base_manager.filter(survey=survey).count()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(lambda data: _submit(url, data, options['timeout']), jobs))
+        wall = time.perf_counter() - start
+
+        durations = sorted(duration for _, duration in results)
+        failed = sum(1 for ok, _ in results if not ok)
+        p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+        self.stdout.write(
+            f"{len(results)} respondents ({len(questions)} questions, {options['concurrency']} concurrent) "
+            f"in {wall:.2f}s ({len(results) / wall:.1f}/s), {failed} failed - per respondent: "
+            f"mean {statistics.mean(durations) * 1000:.0f}ms, "
+            f"median {statistics.median(durations) * 1000:.0f}ms, "
+            f"p95 {p95 * 1000:.0f}ms"
+        )
+        stored = SurveyResponse._base_manager.filter(survey=survey).count() - responses_before
+        pending = SurveyResponse._base_manager.filter(survey=survey, is_complete=False).count()
+        self.stdout.write(f"{stored} responses stored, {pending} still queued")
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.6 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0007_surveyanswer_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyresponse',
+            name='pending_answers',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Pending answers'),
+        ),
+    ]
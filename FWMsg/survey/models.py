@@ -1,7 +1,10 @@
 from datetime import date
 import uuid
 import secrets
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
@@ -229,6 +232,8 @@ class SurveyResponse(OrgModel):
     )
     submitted_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Submitted at'))
     is_complete = models.BooleanField(default=False, verbose_name=_('Is complete'))
+    # Validated answers of a queued submission until a worker writes them (see survey.submissions)
+    pending_answers = models.JSONField(null=True, blank=True, editable=False, verbose_name=_('Pending answers'))
     
     class Meta:
         verbose_name = _('Survey Response')
@@ -276,6 +281,7 @@ class SurveyAnswer(OrgModel):
         blank=True,
         verbose_name=_('Selected options')
     )
+    updated_at = models.DateTimeField(auto_now=True, null=True, verbose_name=_('Updated at'))
     
     class Meta:
         verbose_name = _('Survey Answer')
@@ -284,3 +290,38 @@ class SurveyAnswer(OrgModel):
     
     def __str__(self):
         return f"{self.response} - {self.question.question_text[:30]}"
+
+
+def _survey_id_of(instance):
+    """Survey an instance of the survey models belongs to, without a query where possible."""
+    try:
+        if isinstance(instance, (SurveyResponse, SurveyQuestion)):
+            return instance.survey_id
+        if isinstance(instance, SurveyQuestionOption):
+            return instance.question.survey_id
+        if isinstance(instance, SurveyAnswer):
+            return instance.response.survey_id
+    except ObjectDoesNotExist:
+        return None
+    return None
+
+
+@receiver(post_save, sender=SurveyResponse)
+@receiver(post_delete, sender=SurveyResponse)
+@receiver(post_save, sender=SurveyAnswer)
+@receiver(post_delete, sender=SurveyAnswer)
+@receiver(post_save, sender=SurveyQuestion)
+@receiver(post_delete, sender=SurveyQuestion)
+@receiver(post_save, sender=SurveyQuestionOption)
+@receiver(post_delete, sender=SurveyQuestionOption)
+def invalidate_survey_results_receiver(sender, instance, **kwargs):
+    from survey.analytics import invalidate_survey_results
+    survey_id = _survey_id_of(instance)
+    if survey_id:
+        invalidate_survey_results(survey_id)
+
+
+@receiver(m2m_changed, sender=SurveyAnswer.selected_options.through)
+def invalidate_survey_results_options_receiver(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_survey_results_receiver(type(instance), instance)
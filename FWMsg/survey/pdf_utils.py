@@ -8,35 +8,18 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, mm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, Flowable
 from reportlab.platypus.flowables import HRFlowable
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from django.conf import settings
 import os
 import re
 import emoji
-import urllib.request
-import hashlib
 
+from Global.pdf_resources import get_emoji_image_path, get_org_logo, get_unicode_fonts
 from .models import SurveyAnswer
 
 
-# Register Unicode fonts for emoji support
-try:
-    # Try to register DejaVu Sans fonts (bundled with ReportLab)
-    from reportlab.pdfbase.pdfmetrics import registerFont
-    from reportlab.pdfbase.ttfonts import TTFont
-    
-    # DejaVu Sans fonts are included with ReportLab
-    pdfmetrics.registerFont(TTFont('DejaVu-Sans', 'DejaVuSans.ttf'))
-    pdfmetrics.registerFont(TTFont('DejaVu-Sans-Bold', 'DejaVuSans-Bold.ttf'))
-    UNICODE_FONT = 'DejaVu-Sans'
-    UNICODE_FONT_BOLD = 'DejaVu-Sans-Bold'
-except Exception:
-    # Fallback to Helvetica if DejaVu Sans is not available
-    UNICODE_FONT = 'Helvetica'
-    UNICODE_FONT_BOLD = 'Helvetica-Bold'
+# Unicode fonts for emoji support, registered once per process
+UNICODE_FONT, UNICODE_FONT_BOLD = get_unicode_fonts()
 
 
 def hex_to_rgb(hex_color):
@@ -48,9 +31,9 @@ def hex_to_rgb(hex_color):
 class LogoWithBackground(Flowable):
     """Custom flowable for logo with colored background and rounded corners"""
     
-    def __init__(self, logo_path, width, height, bg_color, corner_radius=10):
+    def __init__(self, logo, width, height, bg_color, corner_radius=10):
         Flowable.__init__(self)
-        self.logo_path = logo_path
+        self.logo = logo
         self.width = width
         self.height = height
         self.bg_color = bg_color
@@ -88,9 +71,8 @@ class LogoWithBackground(Flowable):
         
         # Draw the logo
         try:
-            img = ImageReader(self.logo_path)
             # Get original image dimensions
-            img_width, img_height = img.getSize()
+            img_width, img_height = self.logo.getSize()
             
             # Calculate scaling to fit within the padded area while maintaining aspect ratio
             scale_x = logo_width / img_width
@@ -105,51 +87,12 @@ class LogoWithBackground(Flowable):
             final_x = logo_x + (logo_width - final_width) / 2
             final_y = logo_y + (logo_height - final_height) / 2
             
-            c.drawImage(self.logo_path, final_x, final_y, final_width, final_height, mask='auto')
+            c.drawImage(self.logo, final_x, final_y, final_width, final_height, mask='auto')
         except Exception:
             # If logo fails to load, just show the background
             pass
 
 
-def get_emoji_cache_dir():
-    """Get or create the emoji cache directory"""
-    cache_dir = os.path.join(settings.MEDIA_ROOT, 'emoji_cache')
-    os.makedirs(cache_dir, exist_ok=True)
-    return cache_dir
-
-
-def emoji_to_codepoint(emoji_char):
-    """Convert emoji character to Unicode codepoint string for Twemoji"""
-    # Get the codepoints of the emoji
-    codepoints = [f"{ord(c):x}" for c in emoji_char]
-    return '-'.join(codepoints)
-
-
-def get_emoji_image_path(emoji_char):
-    """Download and cache emoji image from Twemoji CDN"""
-    try:
-        codepoint = emoji_to_codepoint(emoji_char)
-        cache_dir = get_emoji_cache_dir()
-        cached_path = os.path.join(cache_dir, f"{codepoint}.png")
-        
-        # Return cached image if it exists
-        if os.path.exists(cached_path):
-            return cached_path
-        
-        # Download from Twemoji CDN (SVG to PNG)
-        # Using the 72x72 PNG version for better PDF compatibility
-        twemoji_url = f"https://cdn.jsdelivr.net/gh/twitter/twemoji@latest/assets/72x72/{codepoint}.png"
-        
-        try:
-            urllib.request.urlretrieve(twemoji_url, cached_path)
-            return cached_path
-        except Exception:
-            # If download fails, return None
-            return None
-    except Exception:
-        return None
-
-
 class InlineImage(Flowable):
     """Custom flowable for inline emoji images"""
     
@@ -341,10 +284,10 @@ def generate_survey_response_pdf(survey_response):
         header_data = []
         if org.logo:
             try:
-                logo_path = os.path.join(settings.MEDIA_ROOT, str(org.logo))
-                if os.path.exists(logo_path):
+                logo = get_org_logo(org)
+                if logo:
                     # Small logo without background for header
-                    logo_img = LogoWithBackground(logo_path=logo_path, width=0.8*inch, height=0.4*inch, bg_color=org_color)
+                    logo_img = LogoWithBackground(logo=logo, width=0.8*inch, height=0.4*inch, bg_color=org_color)
                     header_data = [[logo_img, create_paragraph_with_emojis(org.name, org_name_style)]]
                 else:
                     # No logo file, just show org name
@@ -566,10 +509,10 @@ def generate_survey_all_responses_pdf(survey):
         header_data = []
         if org.logo:
             try:
-                logo_path = os.path.join(settings.MEDIA_ROOT, str(org.logo))
-                if os.path.exists(logo_path):
+                logo = get_org_logo(org)
+                if logo:
                     # Small logo without background for header
-                    logo_img = LogoWithBackground(logo_path=logo_path, width=0.6*inch, height=0.6*inch, bg_color=org_color)
+                    logo_img = LogoWithBackground(logo=logo, width=0.6*inch, height=0.6*inch, bg_color=org_color)
                     header_data = [[logo_img, create_paragraph_with_emojis(org.name, org_name_style)]]
                 else:
                     # No logo file, just show org name
@@ -692,3 +635,26 @@ def create_pdf_response(pdf_content, filename):
     response = HttpResponse(pdf_content, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
+
+
+def survey_all_responses_pdf_filename(survey):
+    filename = f"survey_all_responses_{survey.title}_{survey.id}.pdf"
+    filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
+    return filename.replace(' ', '_')
+
+
+def survey_all_responses_pdf_fingerprint(survey):
+    """Fingerprint of everything shown in the all-responses PDF (see Global.pdf_jobs)."""
+    from django.db.models import Count, Max
+    from Global.pdf_jobs import make_pdf_fingerprint
+
+    answers = SurveyAnswer.objects.filter(question__survey=survey).aggregate(
+        count=Count('id'), last_id=Max('id'), updated=Max('updated_at')
+    )
+    questions = list(survey.questions.values_list('id', 'order', 'question_text'))
+    org = survey.org
+    return make_pdf_fingerprint(
+        'survey_all_responses', survey.id, survey.title, survey.responses_are_anonymous,
+        answers['count'], answers['last_id'], answers['updated'], questions,
+        org.name, org.farbe, org.logo,
+    )
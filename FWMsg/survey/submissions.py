@@ -0,0 +1,212 @@
+"""
+Writing survey submissions.
+
+A submission is validated as a whole by ``SurveyParticipationForm`` and turned
+into a list of plain answers (``get_answers``). ``save_response`` writes the
+response, all of its answers (one ``bulk_create``) and the selected options
+(one ``bulk_create`` on the through table) in a single transaction, instead of
+one INSERT per answer and option.
+
+With ``settings.SURVEY_SUBMISSION_QUEUE`` enabled, ``enqueue_response`` only
+stores the response with its validated answers in ``pending_answers``;
+``drain_pending_responses`` (run by ``drain_survey_submissions_task``) then
+writes the answers of many responses per transaction. This keeps the write
+lock short when hundreds of participants submit at once. Queued responses
+count as not complete until they are drained. A batch that cannot be written
+(a question or option was deleted after the response was queued, or another
+worker drained part of it) is written response by response instead, so a
+single broken response does not block the queue.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SurveyAnswer, SurveyQuestion, SurveyQuestionOption, SurveyResponse
+
+logger = logging.getLogger(__name__)
+
+DRAIN_BATCH_SIZE = 200
+CHOICE_TYPES = ('select', 'radio', 'checkbox')
+
+
+def submission_queue_enabled():
+    return getattr(settings, 'SURVEY_SUBMISSION_QUEUE', False)
+
+
+def get_answers(form):
+    """
+    Plain answers of a valid ``SurveyParticipationForm``: one dict per answered
+    field with the ``question`` id, the ``text`` answer and the selected
+    ``options`` ids.
+    """
+    answers = []
+    for question in form.questions:
+        field_name = f'question_{question.id}'
+        if field_name not in form.cleaned_data:
+            continue
+        value = form.cleaned_data[field_name]
+        answer = {'question': question.id, 'text': '', 'options': []}
+        if question.question_type == 'checkbox':
+            answer['options'] = [int(option_id) for option_id in value or []]
+        elif question.question_type in CHOICE_TYPES:
+            answer['options'] = [int(value)] if value else []
+        else:
+            answer['text'] = str(value) if value else ''
+        answers.append(answer)
+    return answers
+
+
+def _response_owner(survey, user, session_key, ip_address):
+    # Anonymous surveys do not store who answered
+    if survey.responses_are_anonymous:
+        return None, None, None
+    return user, session_key, ip_address
+
+
+def write_answers(responses):
+    """
+    Write the answers of ``(response, answers)`` pairs with one ``bulk_create``
+    for the answers and one for their selected options.
+    """
+    now = timezone.now()
+    answer_objects, options = [], []
+    for response, answers in responses:
+        for answer in answers:
+            answer_objects.append(SurveyAnswer(
+                org_id=response.org_id,
+                response=response,
+                question_id=answer['question'],
+                text_answer=answer['text'],
+                # bulk_create sends no signals; the timestamp feeds the PDF fingerprint
+                updated_at=now,
+            ))
+            options.append(answer['options'])
+
+    with transaction.atomic():
+        SurveyAnswer.objects.bulk_create(answer_objects)
+        through = SurveyAnswer.selected_options.through
+        through.objects.bulk_create([
+            through(surveyanswer_id=answer.id, surveyquestionoption_id=option_id)
+            for answer, option_ids in zip(answer_objects, options)
+            for option_id in option_ids
+        ])
+    return len(answer_objects)
+
+
+def _invalidate_results(responses):
+    # bulk_create bypasses the receivers in survey.models
+    from .analytics import invalidate_survey_results
+    for survey_id in {response.survey_id for response in responses}:
+        invalidate_survey_results(survey_id)
+
+
+def save_response(survey, answers, user=None, session_key=None, ip_address=None):
+    """Store a complete response with its answers in one transaction."""
+    user, session_key, ip_address = _response_owner(survey, user, session_key, ip_address)
+    with transaction.atomic():
+        response = SurveyResponse.objects.create(
+            survey=survey,
+            respondent=user,
+            session_key=session_key,
+            ip_address=ip_address,
+            is_complete=True,
+            org=survey.org,
+        )
+        write_answers([(response, answers)])
+    _invalidate_results([response])
+    return response
+
+
+def enqueue_response(survey, answers, user=None, session_key=None, ip_address=None):
+    """
+    Store a response whose answers are written later by the worker. The
+    response row is created right away so a participant cannot submit twice.
+    """
+    from .tasks import drain_survey_submissions_task
+
+    user, session_key, ip_address = _response_owner(survey, user, session_key, ip_address)
+    response = SurveyResponse.objects.create(
+        survey=survey,
+        respondent=user,
+        session_key=session_key,
+        ip_address=ip_address,
+        is_complete=False,
+        pending_answers=answers,
+        org=survey.org,
+    )
+    transaction.on_commit(drain_survey_submissions_task.delay)
+    return response
+
+
+def _existing_answers(answers):
+    """``answers`` without the questions and options deleted in the meantime."""
+    question_ids = set(SurveyQuestion._base_manager.filter(
+        id__in=[answer['question'] for answer in answers]
+    ).values_list('id', flat=True))
+    option_ids = set(SurveyQuestionOption._base_manager.filter(
+        id__in=[option_id for answer in answers for option_id in answer['options']]
+    ).values_list('id', flat=True))
+    return [
+        {**answer, 'options': [option_id for option_id in answer['options'] if option_id in option_ids]}
+        for answer in answers if answer['question'] in question_ids
+    ]
+
+
+def _drain_response(response):
+    """
+    Write the answers of one queued response; returns whether it was completed
+    here. Answers to deleted questions and options are dropped. A response that
+    still cannot be written is logged and taken out of the queue, incomplete.
+    """
+    answers = response.pending_answers
+    for retry in (False, True):
+        if retry:
+            answers = _existing_answers(answers)
+        try:
+            with transaction.atomic():
+                # Claim the response first: drained already by another worker?
+                claimed = SurveyResponse._base_manager.filter(
+                    id=response.id, is_complete=False, pending_answers__isnull=False
+                ).update(is_complete=True, pending_answers=None)
+                if not claimed:
+                    return False
+                write_answers([(response, answers)])
+            return True
+        except IntegrityError:
+            continue
+    logger.error(
+        "Could not write the answers of survey response %s, removed from the queue: %s",
+        response.id, response.pending_answers,
+    )
+    SurveyResponse._base_manager.filter(id=response.id, is_complete=False).update(pending_answers=None)
+    return False
+
+
+def drain_pending_responses(batch_size=DRAIN_BATCH_SIZE):
+    """
+    Write the answers of queued responses, ``batch_size`` responses per
+    transaction, until the queue is empty. Returns the number of completed
+    responses.
+    """
+    completed = 0
+    while True:
+        batch = list(
+            SurveyResponse._base_manager.filter(is_complete=False, pending_answers__isnull=False)
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            return completed
+        try:
+            with transaction.atomic():
+                write_answers([(response, response.pending_answers) for response in batch])
+                SurveyResponse._base_manager.filter(id__in=[response.id for response in batch]).update(
+                    is_complete=True, pending_answers=None
+                )
+        except IntegrityError:
+            logger.warning("Draining %s survey responses one by one", len(batch))
+            batch = [response for response in batch if _drain_response(response)]
+        _invalidate_results(batch)
+        completed += len(batch)
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task
+def drain_survey_submissions_task():
+    """Write the answers of queued survey submissions (see survey.submissions)."""
+    from survey.submissions import drain_pending_responses
+    return drain_pending_responses()
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
@@ -10,6 +10,15 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.messages import get_messages
 from django.utils.translation import gettext_lazy as _
 
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from .analytics import compute_survey_results, get_survey_results
+from .submissions import drain_pending_responses, enqueue_response, save_response
 from .models import Survey, SurveyQuestion, SurveyQuestionOption, SurveyResponse, SurveyAnswer
 from ORG.models import Organisation
 from Global.models import CustomUser, PersonCluster
@@ -515,14 +524,14 @@ class SurveyManagementViewsTests(SurveyViewsTestCase):
             response['Content-Type'],
             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         )
-        self.assertTrue(response.content.startswith(b'PK'))
-        self.assertGreater(len(response.content), 0)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'PK'))
 
         import io
 
         import pandas as pd
 
-        df = pd.read_excel(io.BytesIO(response.content))
+        df = pd.read_excel(io.BytesIO(content))
         self.assertEqual(df['When did you start?'].iloc[0], '10.06.2026')
         submitted_column = df.columns[1]
         submitted = df[submitted_column].iloc[0]
@@ -666,6 +675,217 @@ class SurveyQuestionManagementTests(SurveyViewsTestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class SurveyResultsAnalyticsTests(SurveyViewsTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.rating_question = SurveyQuestion.objects.create(
+            survey=self.survey1, org=self.org1, question_text='Rating', question_type='rating', order=3,
+        )
+
+    def _respond(self, name, option, rating, respondent=None):
+        response = SurveyResponse.objects.create(
+            survey=self.survey1, org=self.org1, respondent=respondent, session_key=name, is_complete=True
+        )
+        SurveyAnswer.objects.create(response=response, org=self.org1, question=self.question1, text_answer=name)
+        answer = SurveyAnswer.objects.create(response=response, org=self.org1, question=self.question2)
+        answer.selected_options.add(option)
+        SurveyAnswer.objects.create(
+            response=response, org=self.org1, question=self.rating_question, text_answer=str(rating)
+        )
+        return response
+
+    def test_results_are_aggregated(self):
+        self._respond('Anna', self.option1, 5, respondent=self.user1)
+        self._respond('Ben', self.option1, 4)
+        self._respond('Cem', self.option2, 'x')
+
+        results = compute_survey_results(self.survey1)
+        self.assertEqual(results[self.question2.id]['stats'], {'Excellent': 2, 'Good': 1})
+        self.assertEqual(results[self.rating_question.id]['stats'], {
+            'average': 4.5, 'count': 2, 'distribution': {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1},
+        })
+        self.assertEqual(results[self.question1.id]['answers'], [('Anna', 'user1'), ('Ben', None), ('Cem', None)])
+
+    def test_query_count_does_not_grow_with_responses(self):
+        self._respond('Anna', self.option1, 5)
+        with CaptureQueriesContext(connection) as few:
+            compute_survey_results(self.survey1)
+        for i in range(10):
+            self._respond(f'Person {i}', self.option2, 3)
+        SurveyQuestion.objects.create(survey=self.survey1, org=self.org1, question_text='More', question_type='checkbox')
+        with CaptureQueriesContext(connection) as many:
+            compute_survey_results(self.survey1)
+        self.assertEqual(len(few), len(many))
+
+    def test_new_response_invalidates_cached_results(self):
+        self._respond('Anna', self.option1, 5)
+        self.assertEqual(get_survey_results(self.survey1)[self.question2.id]['stats'], {'Excellent': 1})
+        with self.assertNumQueries(0):
+            get_survey_results(self.survey1)
+
+        self._respond('Ben', self.option2, 1)
+        self.assertEqual(get_survey_results(self.survey1)[self.question2.id]['stats'], {'Excellent': 1, 'Good': 1})
+
+    def test_results_data_endpoint(self):
+        self._respond('Anna', self.option1, 5)
+        self.client.login(username='user1', password='testpass123')
+        response = self.client.get(reverse('survey:survey_results_data', kwargs={'pk': self.survey1.pk}))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_responses'], 1)
+        questions = {question['id']: question for question in data['questions']}
+        self.assertEqual(questions[self.question2.id]['stats'], {'Excellent': 1})
+        self.assertEqual(questions[self.rating_question.id]['stats']['average'], 5)
+
+    def test_public_answers_are_listed(self):
+        self.survey1.responses_are_public = True
+        self.survey1.save()
+        self._respond('Anna', self.option1, 5, respondent=self.user2)
+
+        response = self.client.get(reverse('survey:survey_detail', kwargs={'survey_key': self.survey1.survey_key}))
+        self.assertEqual(response.status_code, 200)
+        public_answers = response.context['public_answers']
+        self.assertEqual(public_answers[f'question_{self.question2.id}'], [{'respondent': 'User Two', 'display': 'Excellent'}])
+        self.assertEqual(public_answers[f'question_{self.question1.id}'][0]['display'], 'Anna')
+
+
+class SurveySubmissionTests(SurveyViewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.checkbox_question = SurveyQuestion.objects.create(
+            survey=self.survey1, org=self.org1, question_text='Topics', question_type='checkbox', order=3,
+        )
+        self.topic1 = SurveyQuestionOption.objects.create(question=self.checkbox_question, org=self.org1, option_text='A')
+        self.topic2 = SurveyQuestionOption.objects.create(question=self.checkbox_question, org=self.org1, option_text='B')
+
+    def _post(self, name='John Doe'):
+        return self.client.post(reverse('survey:survey_detail', kwargs={'survey_key': self.survey1.survey_key}), data={
+            f'question_{self.question1.id}': name,
+            f'question_{self.question2.id}': str(self.option1.id),
+            f'question_{self.checkbox_question.id}': [str(self.topic1.id), str(self.topic2.id)],
+        })
+
+    def test_answers_and_options_are_stored(self):
+        response = self._post()
+        self.assertEqual(response.status_code, 302)
+        survey_response = SurveyResponse.objects.get(survey=self.survey1)
+        self.assertTrue(survey_response.is_complete)
+        self.assertIsNone(survey_response.pending_answers)
+        answers = {answer.question_id: answer for answer in survey_response.answers.all()}
+        self.assertEqual(answers[self.question1.id].text_answer, 'John Doe')
+        self.assertEqual(list(answers[self.question2.id].selected_options.all()), [self.option1])
+        self.assertEqual(set(answers[self.checkbox_question.id].selected_options.all()), {self.topic1, self.topic2})
+
+    def test_query_count_does_not_grow_with_questions(self):
+        answers = [{'question': self.question2.id, 'text': '', 'options': [self.option2.id]}]
+        with CaptureQueriesContext(connection) as few:
+            save_response(self.survey1, answers)
+        answers = answers + [
+            {'question': self.question1.id, 'text': 'Anna', 'options': []},
+            {'question': self.checkbox_question.id, 'text': '', 'options': [self.topic1.id, self.topic2.id]},
+        ]
+        with CaptureQueriesContext(connection) as many:
+            save_response(self.survey1, answers)
+        self.assertEqual(len(few), len(many))
+
+    def test_anonymous_survey_does_not_store_respondent(self):
+        self.survey1.responses_are_anonymous = True
+        self.survey1.save()
+        self.client.login(username='user1', password='testpass123')
+        self._post()
+        survey_response = SurveyResponse.objects.get(survey=self.survey1)
+        self.assertIsNone(survey_response.respondent)
+        self.assertIsNone(survey_response.session_key)
+        self.assertIsNone(survey_response.ip_address)
+
+    @override_settings(SURVEY_SUBMISSION_QUEUE=True)
+    def test_queued_submission_is_written_by_worker(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._post()
+        self.assertEqual(response.status_code, 302)
+        survey_response = SurveyResponse.objects.get(survey=self.survey1)
+        self.assertFalse(survey_response.is_complete)
+        self.assertEqual(len(survey_response.pending_answers), 3)
+        self.assertFalse(survey_response.answers.exists())
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(drain_pending_responses(), 1)
+        survey_response.refresh_from_db()
+        self.assertTrue(survey_response.is_complete)
+        self.assertIsNone(survey_response.pending_answers)
+        self.assertEqual(survey_response.answers.count(), 3)
+        self.assertEqual(drain_pending_responses(), 0)
+
+    @override_settings(SURVEY_SUBMISSION_QUEUE=True)
+    def test_queued_responses_are_drained_in_batches(self):
+        for i in range(5):
+            self.client = Client()
+            self._post(name=f'Person {i}')
+        self.assertEqual(drain_pending_responses(batch_size=2), 5)
+        self.assertEqual(SurveyAnswer.objects.filter(response__survey=self.survey1).count(), 15)
+        self.assertFalse(SurveyResponse.objects.filter(survey=self.survey1, is_complete=False).exists())
+
+
+class SurveyDrainTests(TransactionTestCase):
+    """Foreign keys are checked on commit, so the drain runs in real transactions."""
+
+    def setUp(self):
+        self.org = Organisation.objects.create(name='Test Org')
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        self.survey = Survey.objects.create(title='Test Survey', org=self.org, created_by=self.user)
+        self.text_question = SurveyQuestion.objects.create(
+            survey=self.survey, org=self.org, question_text='Name', question_type='text', order=1,
+        )
+        self.choice_question = SurveyQuestion.objects.create(
+            survey=self.survey, org=self.org, question_text='Topics', question_type='checkbox', order=2,
+        )
+        self.topic1 = SurveyQuestionOption.objects.create(question=self.choice_question, org=self.org, option_text='A')
+        self.topic2 = SurveyQuestionOption.objects.create(question=self.choice_question, org=self.org, option_text='B')
+
+    def _enqueue(self, name, options):
+        with patch('survey.tasks.drain_survey_submissions_task.delay'):
+            return enqueue_response(self.survey, [
+                {'question': self.text_question.id, 'text': name, 'options': []},
+                {'question': self.choice_question.id, 'text': '', 'options': options},
+            ], session_key=name)
+
+    def test_deleted_option_does_not_block_the_queue(self):
+        first = self._enqueue('Anna', [self.topic1.id])
+        broken = self._enqueue('Ben', [self.topic1.id, self.topic2.id])
+        last = self._enqueue('Cem', [self.topic1.id])
+        SurveyQuestionOption._base_manager.filter(id=self.topic2.id).delete()
+
+        self.assertEqual(drain_pending_responses(), 3)
+        for response in (first, broken, last):
+            response.refresh_from_db()
+            self.assertTrue(response.is_complete)
+            self.assertEqual(response.answers.count(), 2)
+        choice = broken.answers.get(question=self.choice_question)
+        self.assertEqual(list(choice.selected_options.all()), [self.topic1])
+        self.assertEqual(drain_pending_responses(), 0)
+
+    def test_deleted_question_is_dropped_from_the_response(self):
+        response = self._enqueue('Anna', [self.topic1.id])
+        SurveyQuestion._base_manager.filter(id=self.choice_question.id).delete()
+
+        self.assertEqual(drain_pending_responses(), 1)
+        response.refresh_from_db()
+        self.assertTrue(response.is_complete)
+        self.assertEqual([answer.question_id for answer in response.answers.all()], [self.text_question.id])
+
+    def test_response_that_cannot_be_written_leaves_the_queue(self):
+        response = self._enqueue('Anna', [self.topic1.id])
+        with patch('survey.submissions._existing_answers', side_effect=lambda answers: answers):
+            SurveyQuestionOption._base_manager.filter(id=self.topic1.id).delete()
+            with self.assertLogs('survey.submissions', 'ERROR'):
+                self.assertEqual(drain_pending_responses(), 0)
+        response.refresh_from_db()
+        self.assertFalse(response.is_complete)
+        self.assertIsNone(response.pending_answers)
+        self.assertFalse(response.answers.exists())
+
+
 class SurveyAdminViewsTests(SurveyViewsTestCase):
     """Test admin-only survey views"""
     
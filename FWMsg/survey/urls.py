@@ -15,6 +15,7 @@ urlpatterns = [
     path('<int:pk>/edit/', views.SurveyUpdateView.as_view(), name='survey_update'),
     path('<int:pk>/delete/', views.SurveyDeleteView.as_view(), name='survey_delete'),
     path('<int:pk>/results/', views.survey_results, name='survey_results'),
+    path('<int:pk>/results/data/', views.survey_results_data, name='survey_results_data'),
     
     # Question management
     path('<int:survey_pk>/add-question/', views.add_question, name='add_question'),
@@ -22,8 +22,12 @@ from .forms import (
     SurveyForm, SurveyQuestionForm, SurveyQuestionOptionForm, 
     SurveyParticipationForm, SurveyQuestionOptionFormSet
 )
-from .pdf_utils import generate_survey_response_pdf, create_pdf_response, generate_survey_all_responses_pdf
-from .excel_utils import generate_survey_all_responses_excel, create_excel_response
+from .analytics import get_public_answers, get_survey_results, survey_results_as_json
+from .pdf_utils import generate_survey_response_pdf, create_pdf_response
+from .submissions import enqueue_response, save_response, submission_queue_enabled
+from .excel_utils import get_survey_all_responses_export
+from Global.table_export import table_response
+from Global.pdf_jobs import pdf_job_response
 
 
 def get_client_ip(request):
@@ -90,8 +94,10 @@ def survey_detail(request, survey_key):
             if not user and not request.session.session_key:
                 request.session.create()
             
-            response = form.save_response(
-                survey=survey,
+            submit = enqueue_response if submission_queue_enabled() else save_response
+            submit(
+                survey,
+                form.get_answers(),
                 user=user,
                 session_key=request.session.session_key if not user else None,
                 ip_address=get_client_ip(request)
@@ -106,32 +112,7 @@ def survey_detail(request, survey_key):
     context['form'] = form
 
     if survey.responses_are_public:
-        public_answers = {}
-        for question in survey.questions.all():
-            field_name = f'question_{question.id}'
-            entries = []
-            answers = (
-                SurveyAnswer.objects
-                .filter(response__survey=survey, response__is_complete=True, question=question)
-                .select_related('response__respondent')
-                .prefetch_related('selected_options')
-            )
-            for answer in answers:
-                if question.question_type in ('checkbox', 'radio', 'select'):
-                    opts = answer.selected_options.all()
-                    if opts.exists():
-                        entries.append({
-                            'respondent': answer.response.respondent,
-                            'display': ', '.join(o.option_text for o in opts),
-                        })
-                else:
-                    if answer.text_answer:
-                        entries.append({
-                            'respondent': answer.response.respondent,
-                            'display': answer.text_answer,
-                        })
-            public_answers[field_name] = entries
-        context['public_answers'] = public_answers
+        context['public_answers'] = get_public_answers(survey)
 
     return render(request, 'survey/survey_detail.html', context)
 
@@ -364,48 +345,15 @@ def survey_results(request, pk):
         survey = get_object_or_404(Survey, pk=pk, created_by=request.user)
     check_survey_access(request, survey)
     
-    responses = survey.responses.filter(is_complete=True).order_by('submitted_at').prefetch_related(
-        'answers__question',
-        'answers__selected_options'
-    )
-    
-    # Prepare results data
-    results_data = {}
-    for question in survey.questions.all():
-        question_results = {
-            'question': question,
-            'answers': [],
-            'stats': {}
-        }
-        
-        answers = SurveyAnswer.objects.filter(
-            response__in=responses,
-            question=question
-        )
-        
-        if question.question_type in ['select', 'radio', 'checkbox']:
-            # Count option selections
-            option_counts = {}
-            for answer in answers:
-                for option in answer.selected_options.all():
-                    option_counts[option.option_text] = option_counts.get(option.option_text, 0) + 1
-            question_results['stats'] = option_counts
-        
-        elif question.question_type == 'rating':
-            # Calculate rating statistics
-            ratings = [int(answer.text_answer) for answer in answers if answer.text_answer.isdigit()]
-            if ratings:
-                question_results['stats'] = {
-                    'average': sum(ratings) / len(ratings),
-                    'count': len(ratings),
-                    'distribution': {str(i): ratings.count(i) for i in range(1, 6)}
-                }
-        
-        else:
-            # Text answers
-            question_results['answers'] = [(answer.text_answer, answer.response.respondent) for answer in answers if answer.text_answer]
-        
-        results_data[question.id] = question_results
+    responses = survey.responses.filter(is_complete=True).order_by('submitted_at').select_related(
+        'respondent'
+    ).annotate(answer_count=Count('answers'))
+
+    results = get_survey_results(survey)
+    results_data = {
+        question.id: {'question': question, **results.get(question.id, {'stats': {}, 'answers': []})}
+        for question in survey.questions.all()
+    }
     
     context = check_organization_context(request)
     context['survey'] = survey
@@ -415,6 +363,20 @@ def survey_results(request, pk):
     return render(request, 'survey/survey_results.html', context)
 
 
+@login_required
+@required_role('OTE')
+def survey_results_data(request, pk):
+    """Aggregated survey results as JSON for charts"""
+    if request.user.role == 'O':
+        survey = get_object_or_404(Survey, pk=pk)
+    else:
+        survey = get_object_or_404(Survey, pk=pk, created_by=request.user)
+    check_survey_access(request, survey)
+
+    total_responses = survey.responses.filter(is_complete=True).count()
+    return JsonResponse(survey_results_as_json(survey, get_survey_results(survey), total_responses))
+
+
 # AJAX Views for dynamic form handling
 
 @login_required
@@ -559,15 +521,8 @@ def export_survey_all_responses_pdf(request, survey_id):
         survey = get_object_or_404(Survey, id=survey_id, created_by=request.user)
     check_survey_access(request, survey)
     
-    # Generate PDF
-    pdf_content = generate_survey_all_responses_pdf(survey)
-    
-    # Create filename
-    filename = f"survey_all_responses_{survey.title}_{survey.id}.pdf"
-    filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
-    filename = filename.replace(' ', '_')
-    
-    return create_pdf_response(pdf_content, filename)
+    # Rendered in the background and cached until the answers change
+    return pdf_job_response(request, 'survey_all_responses', survey)
 
 
 @login_required
@@ -585,10 +540,7 @@ def export_survey_all_responses_excel(request, survey_id):
         messages.warning(request, _('No completed responses found for this survey.'))
         return redirect('survey:survey_results', pk=survey.id)
 
-    excel_content = generate_survey_all_responses_excel(survey)
-
-    filename = f"survey_all_responses_{survey.title}_{survey.id}.xlsx"
-    filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
-    filename = filename.replace(' ', '_')
+    headers, rows = get_survey_all_responses_export(survey)
+    file_format = 'csv' if request.GET.get('format') == 'csv' else 'xlsx'
 
-    return create_excel_response(excel_content, filename)
\ No newline at end of file
+    return table_response(headers, rows, f"survey_all_responses_{survey.title}_{survey.id}", file_format=file_format)
@@ -488,6 +488,9 @@ data = {
     "db_password": db_password,
     "db_host":     "localhost",
     "db_port":     "5432",
+    "redis_url":        "redis://127.0.0.1:6379",
+    "cache_url":        "redis://127.0.0.1:6379/1",
+    "cache_key_prefix": org_name,
 }
 
 with open(out_path, "w") as f:
@@ -542,6 +545,7 @@ PYEOF
     cd "${APP_DIR}"
     "${PYTHON}" manage.py migrate --noinput
     "${PYTHON}" manage.py collectstatic --noinput --clear
+    "${PYTHON}" manage.py bundle_pdf_emojis || msg_warn "Emoji images for PDFs could not be fetched."
     msg_ok "Migrations and static files done."
 
     # ── Step 8: Redis ─────────────────────────────────────────────────────────
@@ -577,11 +581,27 @@ SyslogIdentifier=fwmsg-daphne
 WantedBy=multi-user.target
 EOF
 
-    # ── Step 10: Celery worker ────────────────────────────────────────────────
+    # ── Step 10: Celery workers, one per queue ───────────────────────────────
+    # Queues and routing: CELERY_TASK_QUEUES / CELERY_TASK_ROUTES in settings.py
+    # profile|queues|worker options
+    CELERY_PROFILES=(
+        "mail|mail|--concurrency=2 --prefetch-multiplier=1"
+        "notifications|notifications,default|--concurrency=2 --prefetch-multiplier=4"
+        "media|media|--concurrency=2 --max-tasks-per-child=50"
+        "exports|exports|--concurrency=4 --prefetch-multiplier=1 --max-memory-per-child=524288"
+    )
+
+    # Replaced by the per-queue workers
+    if [[ -f /etc/systemd/system/fwmsg-celery.service ]]; then
+        systemctl disable --now fwmsg-celery || true
+        rm -f /etc/systemd/system/fwmsg-celery.service
+    fi
 
-    cat > /etc/systemd/system/fwmsg-celery.service <<EOF
+    for celery_profile in "${CELERY_PROFILES[@]}"; do
+        IFS='|' read -r profile queues worker_options <<< "${celery_profile}"
+        cat > "/etc/systemd/system/fwmsg-celery-${profile}.service" <<EOF
 [Unit]
-Description=FWMsg Celery Worker
+Description=FWMsg Celery Worker (${profile})
 After=network.target redis.service postgresql.service
 
 [Service]
@@ -591,23 +611,26 @@ WorkingDirectory=${APP_DIR}
 ExecStart=${VENV_DIR}/bin/celery \\
     -A FWMsg worker \\
     --loglevel=info \\
-    --concurrency=4
+    --hostname=${profile}@%h \\
+    --queues=${queues} \\
+    ${worker_options}
 Restart=always
 RestartSec=10
 StandardOutput=journal
 StandardError=journal
-SyslogIdentifier=fwmsg-celery
+SyslogIdentifier=fwmsg-celery-${profile}
 
 [Install]
 WantedBy=multi-user.target
 EOF
+    done
 
     # ── Step 11: Celery beat ──────────────────────────────────────────────────
 
     cat > /etc/systemd/system/fwmsg-celerybeat.service <<EOF
 [Unit]
 Description=FWMsg Celery Beat Scheduler
-After=network.target redis.service postgresql.service fwmsg-celery.service
+After=network.target redis.service postgresql.service fwmsg-celery-mail.service
 
 [Service]
 User=www-data
@@ -813,7 +836,9 @@ EOF
     msg_step "Starting FWMsg services"
     systemctl daemon-reload
     systemctl enable --now fwmsg-daphne
-    systemctl enable --now fwmsg-celery
+    for celery_profile in "${CELERY_PROFILES[@]}"; do
+        systemctl enable --now "fwmsg-celery-${celery_profile%%|*}"
+    done
     systemctl enable --now fwmsg-celerybeat
     msg_ok "All services started."
 
@@ -850,13 +875,13 @@ EOF
     echo ""
     echo "  Services to check:"
     echo "    systemctl status fwmsg-daphne"
-    echo "    systemctl status fwmsg-celery"
+    echo "    systemctl status 'fwmsg-celery-*'"
     echo "    systemctl status fwmsg-celerybeat"
     echo "    systemctl status nginx redis-server postgresql"
     echo ""
     echo "  Logs:"
     echo "    journalctl -u fwmsg-daphne -f"
-    echo "    journalctl -u fwmsg-celery -f"
+    echo "    journalctl -u 'fwmsg-celery-*' -f"
     echo ""
     echo "  IMPORTANT — edit ${SECRETS_FILE} to configure:"
     echo "    email/SMTP credentials, IMAP settings"